@@ -0,0 +1,320 @@
+# Copyright 2015 PerfKitBenchmarker Authors. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""A controller-side cache of downloaded artifacts, such as tarballs.
+
+Packages call DownloadToVm instead of having each VM download an artifact from
+its origin. With --artifact_cache, the controller downloads each artifact once
+into a content-addressed cache that is kept across runs. It copies the
+artifact to the first VM of a benchmark that asks for it. Later VMs copy it
+from a VM that already has it, so the copies spread through the VMs as a tree.
+Each VM sends at most --artifact_cache_fanout copies at a time.
+"""
+
+import collections
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+import urllib2
+
+from perfkitbenchmarker import context
+from perfkitbenchmarker import errors
+from perfkitbenchmarker import flags
+from perfkitbenchmarker import sample
+from perfkitbenchmarker import vm_util
+
+flags.DEFINE_boolean('artifact_cache', False,
+                     'Download artifacts that packages fetch from the '
+                     'internet, such as the YCSB and Hadoop tarballs, once '
+                     'on the machine running PKB, and copy them to the VMs '
+                     'from there and from VMs that already have them.')
+flags.DEFINE_string('artifact_cache_dir', None,
+                    'Directory in which --artifact_cache keeps downloaded '
+                    'artifacts across runs. Defaults to a directory under '
+                    'the PKB temp directory.')
+flags.DEFINE_integer('artifact_cache_fanout', 2,
+                     'Maximum number of VMs that the machine running PKB, or '
+                     'a VM that has an artifact, copies the artifact to at '
+                     'a time.', lower_bound=1)
+
+FLAGS = flags.FLAGS
+
+_CHUNK_SIZE = 1024 * 1024
+
+_cache_lock = threading.Lock()
+# Maps a cache key to a lock held while the artifact is downloaded.
+_download_locks = collections.defaultdict(threading.Lock)
+# Maps (benchmark uid, cache key) to a _Distribution.
+_distributions = {}
+
+
+class _Stats(object):
+  """Bytes copied for the artifacts of one benchmark.
+
+  Attributes:
+    origin_bytes: int. Bytes downloaded from the artifacts' origins.
+    cache_bytes: int. Bytes copied to VMs from the cache, by the controller
+        or by other VMs.
+    peer_bytes: int. The part of cache_bytes that was copied between VMs.
+    artifacts: set of strings. URLs of the artifacts.
+  """
+
+  def __init__(self):
+    self._lock = threading.Lock()
+    self.origin_bytes = 0
+    self.cache_bytes = 0
+    self.peer_bytes = 0
+    self.artifacts = set()
+
+  def Add(self, url=None, origin_bytes=0, cache_bytes=0, peer_bytes=0):
+    with self._lock:
+      if url:
+        self.artifacts.add(url)
+      self.origin_bytes += origin_bytes
+      self.cache_bytes += cache_bytes
+      self.peer_bytes += peer_bytes
+
+
+# Maps a benchmark uid to its _Stats.
+_stats = collections.defaultdict(_Stats)
+
+
+def _GetStats():
+  spec = context.GetThreadBenchmarkSpec()
+  with _cache_lock:
+    return _stats[spec.uid if spec else None]
+
+
+def _GetCacheDir():
+  return FLAGS.artifact_cache_dir or os.path.join(vm_util.TEMP_DIR,
+                                                  'artifacts')
+
+
+def _GetObjectPath(digest):
+  return os.path.join(_GetCacheDir(), 'objects', digest)
+
+
+def _GetUrlIndexPath(url):
+  return os.path.join(_GetCacheDir(), 'urls',
+                      hashlib.sha256(url).hexdigest())
+
+
+def _GetCachedPath(url, checksum):
+  """Returns the cached copy of an artifact, or None if it isn't cached."""
+  digest = checksum
+  if digest is None:
+    try:
+      with open(_GetUrlIndexPath(url)) as index_file:
+        digest = index_file.read().strip()
+    except IOError:
+      return None
+  path = _GetObjectPath(digest)
+  return path if os.path.exists(path) else None
+
+
+def _Download(url, checksum):
+  """Downloads an artifact into the cache.
+
+  Args:
+    url: string. URL of the artifact.
+    checksum: string or None. Expected SHA-256 hex digest of the artifact.
+
+  Returns:
+    string. Path of the cached artifact.
+
+  Raises:
+    errors.Error: if the download does not match 'checksum'.
+  """
+  cache_dir = _GetCacheDir()
+  for subdir in ('objects', 'urls'):
+    if not os.path.isdir(os.path.join(cache_dir, subdir)):
+      os.makedirs(os.path.join(cache_dir, subdir))
+  sha256 = hashlib.sha256()
+  with tempfile.NamedTemporaryFile(dir=cache_dir, delete=False) as tf:
+    try:
+      response = urllib2.urlopen(url if '://' in url else 'http://' + url)
+      try:
+        while True:
+          chunk = response.read(_CHUNK_SIZE)
+          if not chunk:
+            break
+          sha256.update(chunk)
+          tf.write(chunk)
+      finally:
+        response.close()
+      digest = sha256.hexdigest()
+      if checksum is not None and digest != checksum:
+        raise errors.Error('Downloaded {0} has SHA-256 {1}, expected '
+                           '{2}.'.format(url, digest, checksum))
+    except:
+      os.remove(tf.name)
+      raise
+  path = _GetObjectPath(digest)
+  os.rename(tf.name, path)
+  with tempfile.NamedTemporaryFile(dir=cache_dir, delete=False) as tf:
+    tf.write(digest)
+  os.rename(tf.name, _GetUrlIndexPath(url))
+  _GetStats().Add(origin_bytes=os.path.getsize(path))
+  logging.info('Cached %s as %s.', url, path)
+  return path
+
+
+def Fetch(url, checksum=None):
+  """Returns the path of an artifact in the cache, downloading it if needed.
+
+  Artifacts are stored by the SHA-256 digest of their contents. An artifact
+  with a known checksum is found by the checksum, so it is shared by all the
+  URLs it is downloaded from; otherwise it is found by its URL.
+
+  Args:
+    url: string. URL of the artifact.
+    checksum: string or None. Expected SHA-256 hex digest of the artifact.
+
+  Returns:
+    string. Path of the cached artifact.
+  """
+  key = checksum or url
+  with _cache_lock:
+    download_lock = _download_locks[key]
+  with download_lock:
+    return _GetCachedPath(url, checksum) or _Download(url, checksum)
+
+
+class _Distribution(object):
+  """Copies one artifact to the VMs of one benchmark.
+
+  The first VM gets its copy from the controller. Every other VM waits until a
+  VM with a copy has a free upload slot and copies it from there.
+  """
+
+  def __init__(self, local_path):
+    self._local_path = local_path
+    self._size = os.path.getsize(local_path)
+    self._condition = threading.Condition()
+    self._seeding = False
+    # Maps each VM that has a copy to the copy's path.
+    self._holders = collections.OrderedDict()
+    self._uploads = collections.Counter()
+
+  def _AcquireSource(self, target):
+    """Waits for a VM to copy from, or None to copy from the controller."""
+    with self._condition:
+      while True:
+        peers = [vm for vm in self._holders if vm is not target]
+        sources = [vm for vm in peers
+                   if self._uploads[vm] < FLAGS.artifact_cache_fanout]
+        if sources:
+          source = min(sources, key=self._uploads.__getitem__)
+          self._uploads[source] += 1
+          return source
+        if not peers and not self._seeding:
+          self._seeding = True
+          return None
+        # Using a timeout makes this wait interruptable.
+        self._condition.wait(1000)
+
+  def _ReleaseSource(self, source, vm, remote_path):
+    with self._condition:
+      if source is None:
+        self._seeding = False
+      else:
+        self._uploads[source] -= 1
+      if remote_path:
+        self._holders[vm] = remote_path
+      self._condition.notify_all()
+
+  def CopyTo(self, vm, remote_path, stats):
+    """Copies the artifact to 'remote_path' on 'vm'.
+
+    Args:
+      vm: BaseVirtualMachine. The VM to copy the artifact to.
+      remote_path: string. Path of the copy on the VM.
+      stats: _Stats. Counts the bytes copied.
+    """
+    if self._holders.get(vm) == remote_path:
+      return
+    source = self._AcquireSource(vm)
+    copied = False
+    try:
+      if source is not None:
+        try:
+          source.MoveFile(vm, self._holders[source], remote_path)
+          stats.Add(cache_bytes=self._size, peer_bytes=self._size)
+          copied = True
+        except errors.VirtualMachine.RemoteCommandError:
+          logging.warning('Copying %s from %s to %s failed. Copying it from '
+                          'the controller instead.', self._local_path,
+                          source, vm, exc_info=True)
+      if not copied:
+        vm.RemoteCopy(self._local_path, remote_path)
+        stats.Add(cache_bytes=self._size)
+        copied = True
+    finally:
+      self._ReleaseSource(source, vm, remote_path if copied else None)
+
+
+def DownloadToVm(vm, url, remote_path, checksum=None):
+  """Downloads an artifact to a VM.
+
+  Without --artifact_cache, the VM downloads the artifact from 'url' itself,
+  so it needs the curl package installed.
+
+  Args:
+    vm: BaseVirtualMachine. The VM to download the artifact to.
+    url: string. URL of the artifact.
+    remote_path: string. Path of the artifact on the VM.
+    checksum: string or None. Expected SHA-256 hex digest of the artifact.
+  """
+  if not FLAGS.artifact_cache:
+    vm.RemoteCommand('curl -L -o {0} {1}'.format(remote_path, url))
+    return
+  local_path = Fetch(url, checksum)
+  spec = context.GetThreadBenchmarkSpec()
+  key = spec.uid if spec else None, local_path
+  with _cache_lock:
+    distribution = _distributions.get(key)
+    if distribution is None:
+      distribution = _distributions[key] = _Distribution(local_path)
+  stats = _GetStats()
+  stats.Add(url=url)
+  distribution.CopyTo(vm, remote_path, stats)
+
+
+def CreateSamples(benchmark_uid):
+  """Creates samples of the bytes copied for a benchmark's artifacts.
+
+  The benchmark's statistics and record of which VMs hold which artifacts are
+  discarded, so this should be called once the benchmark is done.
+
+  Args:
+    benchmark_uid: string. The uid of the BenchmarkSpec.
+
+  Returns:
+    List of sample.Sample objects. Empty if the benchmark didn't use the
+    cache.
+  """
+  with _cache_lock:
+    stats = _stats.pop(benchmark_uid, None)
+    for key in [key for key in _distributions if key[0] == benchmark_uid]:
+      del _distributions[key]
+  if stats is None:
+    return []
+  metadata = {'artifacts': len(stats.artifacts),
+              'artifact_cache_fanout': FLAGS.artifact_cache_fanout}
+  return [
+      sample.Sample('Artifact Bytes From Origin', stats.origin_bytes, 'bytes',
+                    metadata),
+      sample.Sample('Artifact Bytes From Cache', stats.cache_bytes, 'bytes',
+                    dict(metadata, peer_bytes=stats.peer_bytes))]
@@ -0,0 +1,283 @@
+# Copyright 2015 PerfKitBenchmarker Authors. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Schedules the benchmarks of a run within VM and vCPU budgets.
+
+With --parallelism greater than one, benchmarks are started longest first,
+using the average 'End to End Runtime' of earlier runs recorded in
+--results_store_path. Benchmarks without a recorded runtime are started
+first, in the order they were given. A benchmark is only started once the VMs
+and vCPUs it needs, worked out from its vm_groups config, fit within
+--max_concurrent_vms and --max_concurrent_vcpus alongside the benchmarks
+already running. Later benchmarks that fit may start ahead of one that does
+not. A benchmark that needs more than the whole budget runs alone.
+"""
+
+import collections
+import logging
+import os
+import re
+import threading
+
+from perfkitbenchmarker import benchmark_spec
+from perfkitbenchmarker import benchmark_status
+from perfkitbenchmarker import flags
+from perfkitbenchmarker import log_util
+from perfkitbenchmarker import results_store
+
+flags.DEFINE_integer('max_concurrent_vms', None,
+                     'With --parallelism, the maximum number of VMs that the '
+                     'benchmarks running at once may use in total. Static '
+                     'VMs are not counted.', lower_bound=1)
+flags.DEFINE_integer('max_concurrent_vcpus', None,
+                     'With --parallelism, the maximum number of vCPUs that '
+                     'the VMs of the benchmarks running at once may have in '
+                     'total. VMs whose machine type has an unknown number of '
+                     'vCPUs count as one vCPU.', lower_bound=1)
+
+FLAGS = flags.FLAGS
+
+RUNTIME_METRIC = 'End to End Runtime'
+
+# Custom machine types, e.g. 'custom-4-16384' or 'n1-custom-4-16384-ext', end
+# with the memory in MB rather than the vCPUs.
+_GCE_CUSTOM_VCPUS_RE = re.compile(r'(?:^|-)custom-(\d+)-\d+(?:-ext)?$')
+_GCE_VCPUS_RE = re.compile(r'-(\d+)$')
+_AWS_VCPUS_RE = re.compile(r'\.(\d*)xlarge$')
+_AWS_VCPUS = {'large': 2, 'medium': 1, 'small': 1, 'micro': 1, 'nano': 1}
+_AZURE_VCPUS = {'ExtraSmall': 1, 'Small': 1, 'Medium': 2, 'Large': 4,
+                'ExtraLarge': 8, 'A5': 2, 'A6': 4, 'A7': 8}
+
+# The resources a benchmark needs while it runs.
+#
+# Attributes:
+#   vms: int. Number of VMs, not counting static VMs.
+#   vcpus: int. Total vCPUs of those VMs.
+Demand = collections.namedtuple('Demand', ['vms', 'vcpus'])
+
+# A benchmark to be scheduled.
+#
+# Attributes:
+#   name: string. Name of the benchmark.
+#   uid: string. Unique id of this run of the benchmark.
+#   run: callable taking no arguments that runs the benchmark.
+#   demand: Demand. What the benchmark needs.
+#   estimated_runtime: float or None. Expected seconds the benchmark takes.
+Task = collections.namedtuple('Task', ['name', 'uid', 'run', 'demand',
+                                       'estimated_runtime'])
+
+
+def GetVcpus(machine_type):
+  """Returns the number of vCPUs of a machine type, or None if it's unknown.
+
+  Args:
+    machine_type: string. A GCE, AWS or Azure machine type, e.g.
+        'n1-standard-4', 'custom-4-16384', 'c3.2xlarge' or 'Large'.
+  """
+  if not machine_type:
+    return None
+  if machine_type in _AZURE_VCPUS:
+    return _AZURE_VCPUS[machine_type]
+  match = _AWS_VCPUS_RE.search(machine_type)
+  if match:
+    return 4 * int(match.group(1) or 1)
+  size = machine_type.rsplit('.', 1)[-1]
+  if '.' in machine_type and size in _AWS_VCPUS:
+    return _AWS_VCPUS[size]
+  match = (_GCE_CUSTOM_VCPUS_RE.search(machine_type) or
+           _GCE_VCPUS_RE.search(machine_type))
+  if match:
+    return int(match.group(1))
+  return None
+
+
+def GetDemand(benchmark_config):
+  """Returns the VMs and vCPUs that a benchmark config asks for.
+
+  Args:
+    benchmark_config: dict. The benchmark's config, as passed to BenchmarkSpec.
+
+  Returns:
+    Demand.
+  """
+  vms = vcpus = 0
+  for group_spec in benchmark_config[benchmark_spec.VM_GROUPS].itervalues():
+    vm_count = group_spec.get(benchmark_spec.VM_COUNT,
+                              benchmark_spec.DEFAULT_COUNT)
+    if vm_count is None:
+      vm_count = FLAGS.num_vms
+    vm_count = max(
+        vm_count - len(group_spec.get(benchmark_spec.STATIC_VMS, ())), 0)
+    # The same precedence as BenchmarkSpec._GetCloudForGroup.
+    if (not FLAGS[benchmark_spec.CLOUD].present and
+        benchmark_spec.CLOUD in group_spec):
+      cloud = group_spec[benchmark_spec.CLOUD]
+    else:
+      cloud = FLAGS.cloud
+    vm_spec = group_spec.get(benchmark_spec.VM_SPEC, {}).get(cloud, {})
+    machine_type = FLAGS.machine_type or vm_spec.get('machine_type')
+    vms += vm_count
+    vcpus += vm_count * (GetVcpus(machine_type) or 1)
+  return Demand(vms, vcpus)
+
+
+def GetEstimatedRuntimes(path):
+  """Returns the average runtimes of the benchmarks recorded in a store.
+
+  Args:
+    path: string or None. Path of a results_store.ResultsStore database.
+
+  Returns:
+    dict mapping benchmark names to average end to end runtimes in seconds.
+    Empty if there is no database at 'path'.
+  """
+  if not path or not os.path.exists(path):
+    return {}
+  with results_store.ResultsStore(path) as store:
+    rows = store.Aggregate('avg', ['test'], metric=RUNTIME_METRIC)
+  return {test: runtime for test, _, runtime in rows}
+
+
+class BenchmarkScheduler(object):
+  """Runs benchmarks, as many at once as the budgets allow.
+
+  Attributes:
+    max_concurrency: int. Maximum number of benchmarks to run at once. If 1,
+        benchmarks run one at a time in the calling thread, in order.
+    max_vms: int or None. Maximum VMs the running benchmarks may use.
+    max_vcpus: int or None. Maximum vCPUs the running benchmarks may use.
+    stop_on_failure: boolean. Whether to stop starting benchmarks once one
+        fails. Benchmarks are always stopped by a KeyboardInterrupt.
+  """
+
+  def __init__(self, max_concurrency, max_vms=None, max_vcpus=None,
+               stop_on_failure=False):
+    self.max_concurrency = max_concurrency
+    self.max_vms = max_vms
+    self.max_vcpus = max_vcpus
+    self.stop_on_failure = stop_on_failure
+
+  def _RunTask(self, tasks, index):
+    """Runs a task.
+
+    Returns:
+      (status, stop) tuple. 'stop' is whether no further tasks should start.
+    """
+    task = tasks[index]
+    try:
+      task.run()
+      return benchmark_status.SUCCEEDED, False
+    except BaseException as e:
+      msg = 'Benchmark {0}/{1} {2} (UID: {3}) failed.'.format(
+          index + 1, len(tasks), task.name, task.uid)
+      if isinstance(e, KeyboardInterrupt) or self.stop_on_failure:
+        logging.error('%s Execution will not continue.', msg)
+        return benchmark_status.FAILED, True
+      logging.error('%s Execution will continue.', msg)
+      return benchmark_status.FAILED, False
+
+  def _ExceedsBudget(self, demand):
+    return ((self.max_vms is not None and demand.vms > self.max_vms) or
+            (self.max_vcpus is not None and demand.vcpus > self.max_vcpus))
+
+  def Run(self, tasks):
+    """Runs benchmarks.
+
+    Args:
+      tasks: list of Task.
+
+    Returns:
+      List of (benchmark name, benchmark uid, status) tuples, in the order of
+      'tasks', where status is a value from benchmark_status.ALL.
+    """
+    statuses = [None] * len(tasks)
+    if self.max_concurrency > 1:
+      self._RunConcurrently(tasks, statuses)
+    else:
+      stop = False
+      for i in xrange(len(tasks)):
+        if stop:
+          statuses[i] = benchmark_status.SKIPPED
+        else:
+          statuses[i], stop = self._RunTask(tasks, i)
+    return [(task.name, task.uid, status)
+            for task, status in zip(tasks, statuses)]
+
+  def _RunConcurrently(self, tasks, statuses):
+    """Runs tasks in threads, longest first, within the budgets."""
+    def Priority(i):
+      runtime = tasks[i].estimated_runtime
+      return float('-inf') if runtime is None else -runtime
+    pending = sorted(xrange(len(tasks)), key=Priority)
+    for i in pending:
+      if self._ExceedsBudget(tasks[i].demand):
+        logging.warning('Benchmark %s (UID: %s) needs %d VMs with %d vCPUs, '
+                        'which exceeds the budget. It will run alone.',
+                        tasks[i].name, tasks[i].uid, tasks[i].demand.vms,
+                        tasks[i].demand.vcpus)
+    condition = threading.Condition()
+    running = {}
+    stopping = []
+    interrupted = []
+    log_context = log_util.GetThreadLogContext()
+
+    def RunTask(i):
+      log_util.SetThreadLogContext(log_util.ThreadLogContext(log_context))
+      status, stop = self._RunTask(tasks, i)
+      with condition:
+        statuses[i] = status
+        del running[i]
+        if stop:
+          stopping.append(i)
+        condition.notify_all()
+
+    def Fits(demand):
+      if len(running) >= self.max_concurrency:
+        return False
+      if not running:
+        return True
+      used_vms = sum(d.vms for d in running.itervalues())
+      used_vcpus = sum(d.vcpus for d in running.itervalues())
+      return ((self.max_vms is None or
+               used_vms + demand.vms <= self.max_vms) and
+              (self.max_vcpus is None or
+               used_vcpus + demand.vcpus <= self.max_vcpus))
+
+    with condition:
+      while pending or running:
+        if stopping and pending:
+          for i in pending:
+            statuses[i] = benchmark_status.SKIPPED
+          del pending[:]
+        # Tasks start in order of priority. Once one doesn't fit, none of the
+        # smaller tasks behind it start in its place, or it could wait until
+        # every one of them has finished.
+        while pending and Fits(tasks[pending[0]].demand):
+          i = pending.pop(0)
+          running[i] = tasks[i].demand
+          thread = threading.Thread(target=RunTask, args=(i,))
+          thread.daemon = True
+          thread.start()
+        if not running:
+          continue
+        try:
+          # Using a timeout makes this wait interruptable.
+          condition.wait(1000)
+        except KeyboardInterrupt:
+          if interrupted:
+            raise
+          logging.error('Interrupted. No further benchmarks will be started. '
+                        'Waiting for %d running benchmarks to clean up; '
+                        'interrupt again to exit immediately.', len(running))
+          interrupted.append(True)
+          stopping.append(None)
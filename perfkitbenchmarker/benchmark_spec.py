@@ -21,6 +21,7 @@ import copy_reg
 import os
 import thread
 import threading
+import time
 import uuid
 
 from perfkitbenchmarker import configs
@@ -29,7 +30,9 @@ from perfkitbenchmarker import disk
 from perfkitbenchmarker import errors
 from perfkitbenchmarker import flags
 from perfkitbenchmarker import static_virtual_machine as static_vm
+from perfkitbenchmarker import tracing
 from perfkitbenchmarker import virtual_machine
+from perfkitbenchmarker import vm_pool
 from perfkitbenchmarker import vm_util
 from perfkitbenchmarker.aws import aws_disk
 from perfkitbenchmarker.aws import aws_network
@@ -215,6 +218,14 @@ class BenchmarkSpec(object):
     self.uuid = str(uuid.uuid4())
     self.always_call_cleanup = False
     self._flags = None
+    # Maps each VM that may be pooled (see vm_pool) to its pool key.
+    self._vm_pool_keys = {}
+    # VMs leased from the pool.
+    self._leased_vms = set()
+    # Networks and firewalls of the leased VMs. They belong to the pool, so
+    # the spec neither creates nor deletes them.
+    self._pooled_networks = set()
+    self._pooled_firewalls = set()
 
     # Set the current thread's BenchmarkSpec object to this one.
     context.SetThreadBenchmarkSpec(self)
@@ -298,45 +309,110 @@ class BenchmarkSpec(object):
       # Create the remaining VMs using the specs we created earlier.
       for _ in xrange(vm_count - len(vms)):
         vm_spec.ApplyFlags(FLAGS)
-        vm = self._CreateVirtualMachine(vm_spec, os_type, cloud)
+        disk_specs = []
         if disk_spec:
-          vm.disk_specs = [copy.copy(disk_spec) for _ in xrange(disk_count)]
+          disk_specs = [copy.copy(disk_spec) for _ in xrange(disk_count)]
           # In the event that we need to create multiple disks from the same
           # DiskSpec, we need to ensure that they have different mount points.
           if (disk_count > 1 and disk_spec.mount_point):
-            for i, spec in enumerate(vm.disk_specs):
+            for i, spec in enumerate(disk_specs):
               spec.mount_point += str(i)
+        pool_key = None
+        vm = None
+        if vm_pool.IsEnabled() and os_type != WINDOWS:
+          pool_key = vm_pool.GetKey(cloud, os_type, vm_spec, disk_specs)
+          vm = vm_pool.Lease(pool_key, self._SharesNetworks)
+        if vm:
+          self._AdoptNetworks(vm)
+          self._leased_vms.add(vm)
+        else:
+          vm = self._CreateVirtualMachine(vm_spec, os_type, cloud)
+          if disk_specs:
+            vm.disk_specs = disk_specs
+        if pool_key and not vm.is_static:
+          self._vm_pool_keys[vm] = pool_key
         vms.append(vm)
 
       self.vm_groups[group_name] = vms
       self.vms.extend(vms)
 
+  def _SharesNetworks(self, vm):
+    """Returns whether a pooled VM is on the spec's network and firewall.
+
+    A VM on a network other than the one the spec uses in its zone, e.g. a
+    different AWS VPC, couldn't reach the spec's other VMs by internal IP.
+    """
+    if vm.network and self.networks.get(
+        (type(vm.network), vm.network.zone), vm.network) is not vm.network:
+      return False
+    if vm.firewall and self.firewalls.get(
+        type(vm.firewall), vm.firewall) is not vm.firewall:
+      return False
+    return True
+
+  def _AdoptNetworks(self, vm):
+    """Makes the VMs the spec creates later use a leased VM's network."""
+    if vm.network:
+      self.networks[type(vm.network), vm.network.zone] = vm.network
+      self._pooled_networks.add(vm.network)
+    if vm.firewall:
+      self.firewalls[type(vm.firewall)] = vm.firewall
+      self._pooled_firewalls.add(vm.firewall)
+
   def Prepare(self):
     """Prepares the VMs and networks necessary for the benchmark to run."""
-    vm_util.RunThreaded(lambda net: net.Create(), self.networks.values())
+    vm_util.RunThreaded(lambda net: net.Create(),
+                        [net for net in self.networks.itervalues()
+                         if net not in self._pooled_networks])
 
     if self.vms:
-      vm_util.RunThreaded(self.PrepareVm, self.vms)
+      # A single VM failing to come up fails the benchmark, so don't start
+      # creating VMs that are still queued once that happens.
+      vm_util.RunThreaded(self.PrepareVm, self.vms, cancel_on_failure=True)
       if FLAGS.os_type != WINDOWS:
         vm_util.GenerateSSHConfig(self.vms)
 
-  def Delete(self):
+  def Delete(self, release_vms=False):
+    """Deletes the VMs, firewalls and networks of the benchmark.
+
+    Args:
+      release_vms: boolean. Whether to return the VMs to the pool (see
+          vm_pool) instead of deleting them, if they may be pooled. The
+          networks and firewalls they use are then deleted with the pool.
+          With --vm_pool, firewalls are always closed with the pool, since
+          pooled VMs may share their rules.
+    """
     if FLAGS.run_stage not in ['all', 'cleanup'] or self.deleted:
       return
 
-    if self.vms:
+    vms = self.vms
+    if release_vms:
+      vms = [vm for vm in vms
+             if not vm_pool.Release(vm, self.networks.values(),
+                                    self.firewalls.values())]
+    if vms:
       try:
-        vm_util.RunThreaded(self.DeleteVm, self.vms)
+        vm_util.RunThreaded(self.DeleteVm, vms)
       except Exception:
         logging.exception('Got an exception deleting VMs. '
                           'Attempting to continue tearing down.')
-    for firewall in self.firewalls.itervalues():
+    if len(vms) < len(self.vms):
+      self.deleted = True
+      return
+    firewalls = [firewall for firewall in self.firewalls.itervalues()
+                 if firewall not in self._pooled_firewalls]
+    if vm_pool.IsEnabled():
+      vm_pool.KeepFirewalls(firewalls)
+      firewalls = []
+    for firewall in firewalls:
       try:
         firewall.DisallowAllPorts()
       except Exception:
         logging.exception('Got an exception disabling firewalls. '
                           'Attempting to continue tearing down.')
     for net in self.networks.itervalues():
+      if net in self._pooled_networks:
+        continue
       try:
         net.Delete()
       except Exception:
@@ -384,17 +460,27 @@ class BenchmarkSpec(object):
   def PrepareVm(self, vm):
     """Creates a single VM and prepares a scratch disk if required.
 
+    A VM leased from the pool is reset instead.
+
     Args:
         vm: The BaseVirtualMachine object representing the VM.
     """
-    vm.Create()
+    if vm in self._leased_vms:
+      vm_pool.Reset(vm, self.uid)
+      vm.AddMetadata(benchmark=self.name, perfkit_uuid=self.uuid,
+                     benchmark_uid=self.uid)
+      return
+    start_time = time.time()
+    with tracing.Span('Create', tracing.RESOURCE, vm=vm):
+      vm.Create()
     logging.info('VM: %s', vm.ip_address)
     logging.info('Waiting for boot completion.')
     for port in vm.remote_access_ports:
       vm.AllowPort(port)
     vm.AddMetadata(benchmark=self.name, perfkit_uuid=self.uuid,
                    benchmark_uid=self.uid)
-    vm.WaitForBootCompletion()
+    with tracing.Span('WaitForBootCompletion', tracing.RESOURCE, vm=vm):
+      vm.WaitForBootCompletion()
     vm.OnStartup()
     if any((spec.disk_type == disk.LOCAL for spec in vm.disk_specs)):
       vm.SetupLocalDisks()
@@ -404,6 +490,8 @@ class BenchmarkSpec(object):
     # This must come after Scratch Disk creation to support the
     # Containerized VM case
     vm.PrepareVMEnvironment()
+    if vm in self._vm_pool_keys:
+      vm_pool.Register(vm, self._vm_pool_keys[vm], time.time() - start_time)
 
   def DeleteVm(self, vm):
     """Deletes a single vm and scratch disk if required.
@@ -413,6 +501,7 @@ class BenchmarkSpec(object):
     """
     if vm.is_static and vm.install_packages:
       vm.PackageCleanup()
+    vm.CloseRemoteConnections()
     vm.Delete()
     vm.DeleteScratchDisks()
 
@@ -18,11 +18,17 @@ Man: http://manpages.ubuntu.com/manpages/natty/man1/fio.1.html
 Quick howto: http://www.bluestop.org/fio/HOWTO.txt
 """
 
+import collections
 import datetime
 import json
 import logging
+import math
+import os
 import posixpath
 import re
+import shutil
+import threading
+import time
 
 import jinja2
 
@@ -31,11 +37,34 @@ from perfkitbenchmarker import data
 from perfkitbenchmarker import errors
 from perfkitbenchmarker import flags
 from perfkitbenchmarker import flag_util
+from perfkitbenchmarker import sample
 from perfkitbenchmarker import vm_util
 from perfkitbenchmarker.packages import fio
 
 LOCAL_JOB_FILE_NAME = 'fio.job'  # used with vm_util.PrependTempDir()
 REMOTE_JOB_FILE_PATH = posixpath.join(vm_util.VM_TMP_DIR, 'fio.job')
+# Prefix of the names of the bandwidth, IOPS and latency logs fio writes.
+REMOTE_LOG_PREFIX = posixpath.join(vm_util.VM_TMP_DIR, 'fio')
+LOCAL_LOG_DIR_NAME = 'fio-logs'  # used with vm_util.PrependTempDir()
+# With --fio_cluster, the job file of each scratch disk.
+CLUSTER_JOB_FILE_NAME = 'fio-disk-%d.job'
+# With --fio_cluster, fio starts on every disk this many seconds after the
+# command to start it is first sent, which leaves time to send it to all VMs.
+CLUSTER_START_DELAY_SECONDS = 15
+# Records the fills of static disks, so that later runs can skip them.
+FILL_RECORD_FILE_NAME = 'fio-fills.json'  # used with vm_util.TEMP_DIR
+FILL_BLOCK_SIZE = 512 * 1024
+# Multipliers of the size suffixes that fio accepts, with its default
+# kb_base of 1024.
+FIO_SIZE_SUFFIXES = {'k': 1 << 10, 'm': 1 << 20, 'g': 1 << 30, 't': 1 << 40,
+                     'p': 1 << 50}
+# Matches the status lines fio prints with --eta=always, e.g.
+# 'Jobs: 4 (f=4): [W(4)] [12.3% done] [0KB/498.2MB/0KB /s] [0/996/0 iops]
+# [eta 01h:02m:03s]'. The groups are the percentage done, the write bandwidth
+# and the estimated time left.
+FILL_STATUS_REGEX = re.compile(
+    r'\[\s*([\d.]+)% done\] \[[^/\]]*/([^/\]]*)/[^/\]]* /s\].*'
+    r'\[eta ([^\]]*)\]')
 DEFAULT_TEMP_FILE_NAME = 'fio-temp-file'
 MINUTES_PER_JOB = 10
 MOUNT_POINT = '/scratch'
@@ -105,6 +134,22 @@ flags.DEFINE_string('fio_fill_size', '100%',
                     'filling and remounted afterwards. Only valid when '
                     '--fio_target_mode is against_device_with_fill or '
                     'against_file_with_fill.')
+flags.DEFINE_integer('fio_fill_jobs', 4,
+                     'The number of fio jobs that fill the device at once, '
+                     'each writing its own contiguous range of it.',
+                     lower_bound=1)
+flags.DEFINE_integer('fio_fill_io_depth', 16,
+                     'The IO queue depth of each job that fills the device.',
+                     lower_bound=1)
+flags.DEFINE_integer('fio_fill_progress_seconds', 60,
+                     'How often to log the progress and bandwidth of a fill.',
+                     lower_bound=1)
+flags.DEFINE_string('fio_fill_record_file', None,
+                    'JSON file that records the fills of static VMs\' disks. '
+                    'A disk that was already filled at least as far as '
+                    '--fio_fill_size is not filled again. Defaults to %s in '
+                    'PKB\'s temp directory, which is kept across runs.' %
+                    FILL_RECORD_FILE_NAME)
 flag_util.DEFINE_integerlist('fio_io_depths', [1],
                              'IO queue depths to run on. Can specify a single '
                              'number, like --fio_io_depths=1, a range, like '
@@ -122,9 +167,54 @@ flags.DEFINE_integer('fio_run_for_minutes', 10,
                      'minutes. Only valid when using --fio_generate_scenarios. '
                      'When using multiple scenarios, each one is run for the '
                      'given number of minutes. Time will be rounded up to the '
-                     'next multiple of %s minutes.' % MINUTES_PER_JOB,
+                     'next multiple of %s minutes. With --fio_steady_state, '
+                     'the maximum number of minutes to run each job for.' %
+                     MINUTES_PER_JOB,
                      lower_bound=0)
-
+flags.DEFINE_boolean('fio_cluster', False,
+                     'Run the job on every scratch disk of every VM, all '
+                     'starting at the same moment, and report the bandwidth '
+                     'and IOPS of the whole cluster and the latency '
+                     'percentiles of all of its IOs. The number of VMs is '
+                     'set with --num_vms, unless the benchmark config sets '
+                     'vm_count, and the number of disks per VM with the '
+                     'config\'s disk_count. Cannot be used with '
+                     '--fio_steady_state or --fio_log_avg_msec.')
+flags.DEFINE_boolean('fio_cluster_per_vm_metadata', False,
+                     'With --fio_cluster, add the bandwidth and IOPS of each '
+                     'VM to the metadata of the cluster\'s bandwidth and IOPS '
+                     'samples.')
+flags.DEFINE_integer('fio_log_avg_msec', None,
+                     'If given, fio logs the bandwidth, IOPS and completion '
+                     'latency of each job, averaged over this many '
+                     'milliseconds, and the logs are reported as samples '
+                     'per --fio_log_window_seconds window.', lower_bound=1)
+flags.DEFINE_integer('fio_log_window_seconds', 60,
+                     'With --fio_log_avg_msec, the length of time that each '
+                     'sample of the logs covers.', lower_bound=1)
+flags.DEFINE_boolean('fio_steady_state', False,
+                     'Run each job in rounds of '
+                     '--fio_steady_state_round_seconds until its IOPS reach '
+                     'steady state as the SNIA Performance Test '
+                     'Specification defines it, or until '
+                     '--fio_run_for_minutes have passed. Only valid when '
+                     'using --fio_generate_scenarios.')
+flags.DEFINE_integer('fio_steady_state_round_seconds', 60,
+                     'With --fio_steady_state, the length of each round.',
+                     lower_bound=1)
+flags.DEFINE_integer('fio_steady_state_rounds', 5,
+                     'With --fio_steady_state, the number of consecutive '
+                     'rounds that must be in steady state.', lower_bound=2)
+flags.DEFINE_float('fio_steady_state_tolerance', 0.2,
+                   'With --fio_steady_state, the largest difference between '
+                   'the IOPS of the rounds, as a fraction of their average, '
+                   'that is steady state. The excursion of the IOPS\' linear '
+                   'fit across the rounds must be within half of this.',
+                   lower_bound=0)
+
+
+# Serializes the reads and writes of the fill records by concurrent fills.
+_fill_record_lock = threading.Lock()
 
 FLAGS_IGNORED_FOR_CUSTOM_JOBFILE = {
     'fio_generate_scenarios', 'fio_io_depths', 'fio_run_for_minutes'}
@@ -148,21 +238,203 @@ def FillTarget():
   return FLAGS.fio_target_mode in FILL_TARGET_MODES
 
 
-def FillDevice(vm, disk, fill_size):
-  """Fill the given disk on the given vm up to fill_size.
+def ParseFillSize(fill_size, device_bytes):
+  """Convert a fill size to a number of bytes.
+
+  Args:
+    fill_size: string. A percentage of the device, like '100%', or a size in
+      fio format, like '4096' or '10G'.
+    device_bytes: int. The size of the device, in bytes.
+
+  Returns:
+    The number of bytes to fill, at most device_bytes.
+
+  Raises:
+    errors.Benchmarks.PrepareException: if fill_size is not a valid size.
+  """
+  fill_size = fill_size.strip()
+  if fill_size.endswith('%'):
+    fill_bytes = int(device_bytes * float(fill_size[:-1]) / 100)
+  else:
+    match = re.match(r'(\d+)([kmgtp]?)i?b?$', fill_size, re.IGNORECASE)
+    if not match:
+      raise errors.Benchmarks.PrepareException(
+          'Invalid fill size: %s' % fill_size)
+    fill_bytes = (int(match.group(1)) *
+                  FIO_SIZE_SUFFIXES.get(match.group(2).lower(), 1))
+  return min(fill_bytes, device_bytes)
+
+
+def GetFillRanges(fill_bytes, num_jobs):
+  """Split the start of a device into ranges that are filled at once.
+
+  Args:
+    fill_bytes: int. The number of bytes to fill, from the start of the
+      device.
+    num_jobs: int. The number of ranges to split them into.
+
+  Returns:
+    A list of (offset, size) tuples, in bytes. All ranges but the last are
+    the same whole number of fill blocks long, and the last one also covers
+    the remainder. There are fewer ranges if fill_bytes is too small.
+  """
+  range_bytes = fill_bytes // num_jobs // FILL_BLOCK_SIZE * FILL_BLOCK_SIZE
+  if not range_bytes:
+    return [(0, fill_bytes)]
+  ranges = [(i * range_bytes, range_bytes) for i in xrange(num_jobs - 1)]
+  last_offset = (num_jobs - 1) * range_bytes
+  ranges.append((last_offset, fill_bytes - last_offset))
+  return ranges
+
+
+def GetFillCommand(device_path, ranges, io_depth, progress_seconds):
+  """Get the fio command that fills ranges of a device at once.
+
+  Args:
+    device_path: string. The path of the device on the VM.
+    ranges: list of (offset, size) tuples, as returned by GetFillRanges.
+    io_depth: int. The IO queue depth of each range's job.
+    progress_seconds: int. How often fio ends its status line with a newline.
+
+  Returns:
+    The command, as a string.
+  """
+  command = [('sudo %s --filename=%s --ioengine=libaio --blocksize=%d '
+              '--iodepth=%d --rw=write --direct=1 --group_reporting '
+              '--eta=always --eta-newline=%ds') %
+             (fio.FIO_PATH, device_path, FILL_BLOCK_SIZE, io_depth,
+              progress_seconds)]
+  for index, (offset, size) in enumerate(ranges):
+    command.append('--name=fill-device-%d --offset=%d --size=%d' %
+                   (index, offset, size))
+  return ' '.join(command)
+
+
+class FillProgressParser(object):
+  """Logs the progress of a fill from the status lines fio prints.
+
+  Instances are line consumers, so they can be given to
+  RobustRemoteCommandAsync. fio rewrites its status line after carriage
+  returns, and only ends it with a newline every --eta-newline, so a line may
+  hold several statuses. The last one is logged.
+
+  Attributes:
+    description: string. What is being filled, for the log messages.
+    percent_done: float. The last percentage done that fio reported.
+  """
+
+  def __init__(self, description):
+    self.description = description
+    self.percent_done = 0.0
+
+  def __call__(self, line):
+    for status in reversed(line.split('\r')):
+      match = FILL_STATUS_REGEX.search(status)
+      if match:
+        break
+    else:
+      return
+    percent_done, bandwidth, eta = match.groups()
+    self.percent_done = float(percent_done)
+    logging.info('Filling %s: %s%% done at %s/s, %s left.', self.description,
+                 percent_done, bandwidth, eta)
+
+
+def GetDiskId(vm, disk):
+  """Get an ID that identifies a disk across runs.
 
   Args:
     vm: a linux_virtual_machine.BaseLinuxMixin object.
     disk: a disk.BaseDisk attached to the given vm.
-    fill_size: amount of device to fill, in fio format.
+
+  Returns:
+    The disk's serial number, or if it has none, like a RAID device, the VM's
+    IP address and the disk's device path.
   """
+  device_path = disk.GetDevicePath()
+  stdout, _ = vm.RemoteCommand(
+      'lsblk --nodeps --noheadings --output SERIAL %s' % device_path,
+      ignore_failure=True)
+  serial = stdout.strip()
+  if serial:
+    return 'serial:%s' % serial
+  return '%s:%s' % (vm.ip_address, device_path)
+
+
+def GetFillRecordPath():
+  """Get the path of the file that records the fills of static disks."""
+  return (FLAGS.fio_fill_record_file or
+          os.path.join(vm_util.TEMP_DIR, FILL_RECORD_FILE_NAME))
+
+
+def _ReadFillRecords():
+  """Read the fill records, a dict mapping disk IDs to bytes filled."""
+  path = GetFillRecordPath()
+  if not os.path.exists(path):
+    return {}
+  with open(path) as record_file:
+    return json.load(record_file)
+
+
+def IsFillRecorded(disk_id, fill_bytes):
+  """Check whether a disk was recorded as filled at least fill_bytes far."""
+  with _fill_record_lock:
+    return _ReadFillRecords().get(disk_id, 0) >= fill_bytes
+
+
+def RecordFill(disk_id, fill_bytes):
+  """Record that a disk was filled fill_bytes far."""
+  with _fill_record_lock:
+    records = _ReadFillRecords()
+    records[disk_id] = max(records.get(disk_id, 0), fill_bytes)
+    path = GetFillRecordPath()
+    if not os.path.isdir(os.path.dirname(path)):
+      os.makedirs(os.path.dirname(path))
+    with open(path, 'w') as record_file:
+      json.dump(records, record_file, indent=2, sort_keys=True)
+
+
+def FillDevice(vm, disk, fill_size):
+  """Fill the given disk on the given vm up to fill_size.
 
-  command = (('sudo %s --filename=%s --ioengine=libaio '
-              '--name=fill-device --blocksize=512k --iodepth=64 '
-              '--rw=write --direct=1 --size=%s') %
-             (fio.FIO_PATH, disk.GetDevicePath(), fill_size))
+  The device is split into --fio_fill_jobs ranges that are filled at once,
+  and the progress of the fill is logged as it runs. The fills of static
+  VMs' disks are recorded, and a disk that was already filled at least as far
+  is not filled again.
 
-  vm.RobustRemoteCommand(command)
+  Args:
+    vm: a linux_virtual_machine.BaseLinuxMixin object.
+    disk: a disk.BaseDisk attached to the given vm.
+    fill_size: amount of device to fill, as a percentage of the device or in
+      fio format.
+  """
+  device_path = disk.GetDevicePath()
+  stdout, _ = vm.RemoteCommand('sudo blockdev --getsize64 %s' % device_path)
+  fill_bytes = ParseFillSize(fill_size, int(stdout))
+  if not fill_bytes:
+    return
+  disk_id = GetDiskId(vm, disk) if vm.is_static else None
+  if disk_id and IsFillRecorded(disk_id, fill_bytes):
+    logging.info('Not filling %s on %s, which was already filled with %s '
+                 'bytes. Remove it from %s to fill it again.', device_path,
+                 vm, fill_bytes, GetFillRecordPath())
+    return
+
+  ranges = GetFillRanges(fill_bytes, FLAGS.fio_fill_jobs)
+  command = GetFillCommand(device_path, ranges, FLAGS.fio_fill_io_depth,
+                           FLAGS.fio_fill_progress_seconds)
+  description = '%s on %s' % (device_path, vm)
+  multiplexer = vm_util.RobustCommandMultiplexer()
+  multiplexer.Add(vm.RobustRemoteCommandAsync(
+      command, stdout_consumer=FillProgressParser(description)))
+  start_time = time.time()
+  multiplexer.WaitAll()
+  elapsed = time.time() - start_time
+  logging.info('Filled %s bytes of %s in %.0f seconds, at %.1f MB/s.',
+               fill_bytes, description, elapsed,
+               fill_bytes / max(elapsed, 1e-3) / (1 << 20))
+  if disk_id:
+    RecordFill(disk_id, fill_bytes)
 
 
 BENCHMARK_NAME = 'fio'
@@ -181,7 +453,7 @@ JOB_FILE_TEMPLATE = """
 ioengine=libaio
 invalidate=1
 direct=1
-runtime={{minutes_per_job}}m
+runtime={{runtime}}
 time_based
 filename={{filename}}
 do_verify=0
@@ -204,7 +476,7 @@ SECONDS_PER_MINUTE = 60
 
 
 def GenerateJobFileString(filename, scenario_strings,
-                          io_depths, working_set_size):
+                          io_depths, working_set_size, runtime=None):
   """Make a string with our fio job file.
 
   Args:
@@ -212,6 +484,8 @@ def GenerateJobFileString(filename, scenario_strings,
     scenario_strings: list of strings with names in SCENARIOS.
     io_depths: iterable of integers. The IO queue depths to test.
     working_set_size: int or None. If int, the size of the working set in GB.
+    runtime: string or None. The runtime of each job, in fio format. If None,
+      MINUTES_PER_JOB minutes.
 
   Returns:
     The contents of a fio job file, as a string.
@@ -231,7 +505,7 @@ def GenerateJobFileString(filename, scenario_strings,
                                       undefined=jinja2.StrictUndefined)
 
   return str(job_file_template.render(
-      minutes_per_job=MINUTES_PER_JOB,
+      runtime=runtime or '%sm' % MINUTES_PER_JOB,
       filename=filename,
       size=size_string,
       scenarios=scenarios,
@@ -262,7 +536,7 @@ def ProcessedJobFileString(fio_jobfile, remove_filename):
 
 def GetOrGenerateJobFileString(job_file_path, scenario_strings,
                                against_device, disk,
-                               io_depths, working_set_size):
+                               io_depths, working_set_size, runtime=None):
   """Get the contents of the fio job file we're working with.
 
   This will either read the user's job file, if given, or generate a
@@ -279,6 +553,8 @@ def GetOrGenerateJobFileString(job_file_path, scenario_strings,
     io_depths: iterable of integers. The IO queue depths to test.
     working_set_size: int or None. If int, the size of the working set
       in GB.
+    runtime: string or None. The runtime of each generated job, in fio
+      format.
 
   Returns:
     A string containing a fio job file.
@@ -299,11 +575,40 @@ def GetOrGenerateJobFileString(job_file_path, scenario_strings,
       filename = DEFAULT_TEMP_FILE_NAME
 
     return GenerateJobFileString(filename, scenario_strings,
-                                 io_depths, working_set_size)
+                                 io_depths, working_set_size, runtime)
+
+
+GLOBAL_SECTION_REGEXP = re.compile(r'^\[global\][ \t]*$', re.MULTILINE)
+
+
+def AddLogParameters(job_file_string, log_prefix, log_avg_msec):
+  """Make fio write bandwidth, IOPS and latency logs for every job.
+
+  Args:
+    job_file_string: string. The contents of a fio job file.
+    log_prefix: string. The path prefix of the log files.
+    log_avg_msec: int. The number of milliseconds to average each log entry
+      over.
+
+  Returns:
+    The job file as a string, with the log parameters in its global section.
+  """
+  log_parameters = ('write_bw_log={0}\nwrite_iops_log={0}\n'
+                    'write_lat_log={0}\nlog_avg_msec={1}').format(
+                        log_prefix, log_avg_msec)
+  if GLOBAL_SECTION_REGEXP.search(job_file_string):
+    return GLOBAL_SECTION_REGEXP.sub(
+        lambda match: match.group(0) + '\n' + log_parameters,
+        job_file_string, count=1)
+  return '[global]\n%s\n%s' % (log_parameters, job_file_string)
 
 
 NEED_SIZE_MESSAGE = ('You must specify the working set size when using '
                      'generated scenarios with a filesystem.')
+STEADY_STATE_MESSAGE = ('--fio_steady_state can only be used with '
+                        '--fio_generate_scenarios.')
+CLUSTER_MESSAGE = ('--fio_cluster cannot be used with --fio_steady_state or '
+                   '--fio_log_avg_msec.')
 
 
 def WarnOnBadFlags():
@@ -318,7 +623,17 @@ def WarnOnBadFlags():
       logging.warning('Fio job file specified. Ignoring options "%s"',
                       ', '.join(ignored_flags))
 
-  if FLAGS.fio_run_for_minutes % MINUTES_PER_JOB != 0:
+  if FLAGS.fio_steady_state and (FLAGS.fio_jobfile or
+                                 not FLAGS.fio_generate_scenarios):
+    logging.error(STEADY_STATE_MESSAGE)
+    raise errors.Benchmarks.PrepareException(STEADY_STATE_MESSAGE)
+
+  if FLAGS.fio_cluster and (FLAGS.fio_steady_state or FLAGS.fio_log_avg_msec):
+    logging.error(CLUSTER_MESSAGE)
+    raise errors.Benchmarks.PrepareException(CLUSTER_MESSAGE)
+
+  if (not FLAGS.fio_steady_state and
+      FLAGS.fio_run_for_minutes % MINUTES_PER_JOB != 0):
     logging.warning('Runtime %s will be rounded up to the next multiple of %s '
                     'minutes.', FLAGS.fio_run_for_minutes, MINUTES_PER_JOB)
 
@@ -354,15 +669,104 @@ def RunForMinutes(proc, mins_to_run, mins_per_call):
          total_repeats=run_reps)
 
 
+def IsSteadyState(values, tolerance):
+  """Check whether measurements are in steady state.
+
+  As in the SNIA Solid State Storage Performance Test Specification, the
+  measurements of a window of rounds are in steady state if the range of the
+  measurements is within 'tolerance' of their average, and the excursion of
+  their least squares linear fit across the window is within half of that.
+
+  Args:
+    values: list of floats. The measurements of the rounds in the window.
+    tolerance: float. The largest allowed range, as a fraction of the
+      average.
+
+  Returns:
+    True if the measurements are in steady state, False if not.
+  """
+  average = sum(values) / float(len(values))
+  if average <= 0:
+    return False
+  if max(values) - min(values) > tolerance * average:
+    return False
+  x_mean = (len(values) - 1) / 2.0
+  slope = (sum((x - x_mean) * (y - average) for x, y in enumerate(values)) /
+           sum((x - x_mean) ** 2 for x in xrange(len(values))))
+  return abs(slope) * (len(values) - 1) <= tolerance / 2 * average
+
+
+def RunUntilSteadyState(proc, max_rounds, window_rounds, tolerance):
+  """Call proc until its measurements reach steady state.
+
+  Args:
+    proc: a procedure to call with the round number, starting at 0, that
+      returns the round's measurement.
+    max_rounds: the maximum number of times to call proc.
+    window_rounds: the number of consecutive rounds that must be in steady
+      state.
+    tolerance: the tolerance passed to IsSteadyState.
+
+  Returns:
+    A (steady, values) tuple, where steady is whether the measurements reached
+    steady state, and values is the list of measurements of each round.
+  """
+  values = []
+  for round_number in xrange(max_rounds):
+    values.append(proc(round_number=round_number))
+    if (len(values) >= window_rounds and
+        IsSteadyState(values[-window_rounds:], tolerance)):
+      return True, values
+  return False, values
+
+
 def GetConfig(user_config):
   config = configs.LoadConfig(BENCHMARK_CONFIG, user_config, BENCHMARK_NAME)
   if FLAGS.fio_target_mode != AGAINST_FILE_WITHOUT_FILL_MODE:
     disk_spec = config['vm_groups']['default']['disk_spec']
     for cloud in disk_spec:
       disk_spec[cloud]['mount_point'] = None
+  if FLAGS.fio_cluster:
+    config['vm_groups']['default'].setdefault('vm_count', None)
   return config
 
 
+def GetClusterTargets(vms):
+  """Get the disks that fio runs on with --fio_cluster.
+
+  Args:
+    vms: list of the benchmark's VMs.
+
+  Returns:
+    A list of (vm, disk index, disk) tuples, one per scratch disk of each VM.
+  """
+  return [(vm, disk_index, disk) for vm in vms
+          for disk_index, disk in enumerate(vm.scratch_disks)]
+
+
+def PrepareDisk(vm, disk, mount_point):
+  """Optionally fill a disk, and mount it if running against a file.
+
+  Args:
+    vm: the linux_virtual_machine.BaseLinuxMixin the disk is attached to.
+    disk: the disk.BaseDisk to prepare.
+    mount_point: where to mount the disk if the target mode is against file
+      with fill.
+  """
+  if FillTarget():
+    logging.info('Fill device %s on %s', disk.GetDevicePath(), vm)
+    FillDevice(vm, disk, FLAGS.fio_fill_size)
+
+  # We only need to format and mount if the target mode is against
+  # file with fill because 1) if we're running against the device, we
+  # don't want it mounted and 2) if we're running against a file
+  # without fill, it was never unmounted (see GetConfig()).
+  if FLAGS.fio_target_mode == AGAINST_FILE_WITH_FILL_MODE:
+    disk.mount_point = mount_point
+    vm.FormatDisk(disk.GetDevicePath())
+    vm.MountDisk(disk.GetDevicePath(), disk.mount_point)
+
+
 def Prepare(benchmark_spec):
 
   """Prepare the virtual machine to run FIO.
@@ -379,25 +783,36 @@ def Prepare(benchmark_spec):
 
   WarnOnBadFlags()
 
+  if FLAGS.fio_cluster:
+    PrepareCluster(benchmark_spec.vms)
+    return
+
   vm = benchmark_spec.vms[0]
   logging.info('FIO prepare on %s', vm)
   vm.Install('fio')
 
   # Choose a disk or file name and optionally fill it
-  disk = vm.scratch_disks[0]
+  PrepareDisk(vm, vm.scratch_disks[0], FLAGS.scratch_dir or MOUNT_POINT)
 
-  if FillTarget():
-    logging.info('Fill device %s on %s', disk.GetDevicePath(), vm)
-    FillDevice(vm, disk, FLAGS.fio_fill_size)
 
-  # We only need to format and mount if the target mode is against
-  # file with fill because 1) if we're running against the device, we
-  # don't want it mounted and 2) if we're running against a file
-  # without fill, it was never unmounted (see GetConfig()).
-  if FLAGS.fio_target_mode == AGAINST_FILE_WITH_FILL_MODE:
-    disk.mount_point = FLAGS.scratch_dir or MOUNT_POINT
-    vm.FormatDisk(disk.GetDevicePath())
-    vm.MountDisk(disk.GetDevicePath(), disk.mount_point)
+def PrepareCluster(vms):
+  """Install fio on every VM and prepare every scratch disk.
+
+  Args:
+    vms: list of the benchmark's VMs.
+  """
+  logging.info('FIO prepare on %s VMs', len(vms))
+  vm_util.RunThreaded(lambda vm: vm.Install('fio'), vms)
+
+  def PrepareTarget(vm, disk_index, disk):
+    mount_point = FLAGS.scratch_dir or MOUNT_POINT
+    if len(vm.scratch_disks) > 1:
+      mount_point += str(disk_index)
+    PrepareDisk(vm, disk, mount_point)
+
+  targets = GetClusterTargets(vms)
+  vm_util.RunThreaded(PrepareTarget, [(target, {}) for target in targets],
+                      max_concurrent_threads=len(targets))
 
 
 def Run(benchmark_spec):
@@ -410,19 +825,29 @@ def Run(benchmark_spec):
   Returns:
     A list of sample.Sample objects.
   """
+  if FLAGS.fio_cluster:
+    return RunCluster(benchmark_spec.vms)
+
   vm = benchmark_spec.vms[0]
   logging.info('FIO running on %s', vm)
 
   disk = vm.scratch_disks[0]
-  mount_point = disk.mount_point
 
+  if FLAGS.fio_steady_state:
+    runtime = '%ds' % FLAGS.fio_steady_state_round_seconds
+  else:
+    runtime = None
   job_file_string = GetOrGenerateJobFileString(
       FLAGS.fio_jobfile,
       FLAGS.fio_generate_scenarios,
       AgainstDevice(),
       disk,
       FLAGS.fio_io_depths,
-      FLAGS.fio_working_set_size)
+      FLAGS.fio_working_set_size,
+      runtime)
+  if FLAGS.fio_log_avg_msec:
+    job_file_string = AddLogParameters(job_file_string, REMOTE_LOG_PREFIX,
+                                       FLAGS.fio_log_avg_msec)
   job_file_path = vm_util.PrependTempDir(LOCAL_JOB_FILE_NAME)
   with open(job_file_path, 'w') as job_file:
     job_file.write(job_file_string)
@@ -430,15 +855,30 @@ def Run(benchmark_spec):
 
   vm.PushFile(job_file_path, REMOTE_JOB_FILE_PATH)
 
-  if AgainstDevice():
-    fio_command = 'sudo %s --output-format=json --filename=%s %s' % (
-        fio.FIO_PATH, disk.GetDevicePath(), REMOTE_JOB_FILE_PATH)
-  else:
-    fio_command = 'sudo %s --output-format=json --directory=%s %s' % (
-        fio.FIO_PATH, mount_point, REMOTE_JOB_FILE_PATH)
+  fio_command = GetFioCommand(disk, REMOTE_JOB_FILE_PATH)
 
   samples = []
 
+  def CollectLogSamples(job_names, base_metadata):
+    """Pull fio's logs from the VM and parse them into samples.
+
+    Args:
+      job_names: the names of the jobs fio ran, in order.
+      base_metadata: extra metadata to annotate the samples with.
+    """
+    if not FLAGS.fio_log_avg_msec:
+      return
+    local_log_dir = vm_util.PrependTempDir(LOCAL_LOG_DIR_NAME)
+    shutil.rmtree(local_log_dir, ignore_errors=True)
+    os.mkdir(local_log_dir)
+    vm.PullFile(local_log_dir, REMOTE_LOG_PREFIX + '_*.log')
+    vm.RemoteCommand('sudo rm -f %s_*.log' % REMOTE_LOG_PREFIX)
+    log_paths = [os.path.join(local_log_dir, file_name)
+                 for file_name in os.listdir(local_log_dir)]
+    samples.extend(fio.ParseLogFiles(
+        job_file_string, job_names, log_paths,
+        FLAGS.fio_log_window_seconds * 1000, base_metadata=base_metadata))
+
   def RunIt(repeat_number=None, minutes_since_start=None, total_repeats=None):
     """Run the actual fio command on the VM and save the results.
 
@@ -465,12 +905,160 @@ def Run(benchmark_spec):
     samples.extend(fio.ParseResults(job_file_string,
                                     json.loads(stdout),
                                     base_metadata=base_metadata))
+    CollectLogSamples(fio.GetJobNames(job_file_string), base_metadata)
+
+  def RunJobToSteadyState(job_name):
+    """Run a job in rounds until its IOPS reach steady state.
+
+    Args:
+      job_name: the name of the job's section in the job file.
+    """
+
+    def RunRound(round_number):
+      logging.info('**** %s steady state round %s ****', job_name,
+                   round_number)
+      stdout, _ = vm.RobustRemoteCommand(
+          '%s --section=%s' % (fio_command, job_name), should_log=True)
+      result = json.loads(stdout)
+      base_metadata = {'steady_state_round': round_number}
+      samples.extend(fio.ParseResults(job_file_string, result,
+                                      base_metadata=base_metadata))
+      CollectLogSamples([job_name], base_metadata)
+      return sum(job[mode]['iops']
+                 for job in result['jobs'] for mode in fio.IO_MODES)
+
+    max_rounds = int(math.ceil(
+        FLAGS.fio_run_for_minutes * SECONDS_PER_MINUTE /
+        float(FLAGS.fio_steady_state_round_seconds)))
+    steady, values = RunUntilSteadyState(
+        RunRound, max_rounds, FLAGS.fio_steady_state_rounds,
+        FLAGS.fio_steady_state_tolerance)
+    if not steady:
+      logging.warning('%s did not reach steady state in %s rounds.',
+                      job_name, len(values))
+    window = values[-FLAGS.fio_steady_state_rounds:]
+    if not window:
+      return
+    metadata = fio.ParseJobFile(job_file_string)[job_name]
+    metadata.update({
+        'fio_job': job_name,
+        'steady_state': steady,
+        'steady_state_rounds': len(values),
+        'steady_state_round_seconds': FLAGS.fio_steady_state_round_seconds,
+        'steady_state_window_rounds': FLAGS.fio_steady_state_rounds,
+        'steady_state_tolerance': FLAGS.fio_steady_state_tolerance})
+    samples.append(sample.Sample('%s:steady_state_iops' % job_name,
+                                 sum(window) / float(len(window)), '',
+                                 metadata))
 
   # TODO(user): This only gives results at the end of a job run
   #      so the program pauses here with no feedback to the user.
   #      This is a pretty lousy experience.
   logging.info('FIO Results:')
 
+  if FLAGS.fio_steady_state:
+    for job_name in fio.GetJobNames(job_file_string):
+      RunJobToSteadyState(job_name)
+  elif not FLAGS['fio_run_for_minutes'].present:
+    RunIt()
+  else:
+    RunForMinutes(RunIt, FLAGS.fio_run_for_minutes, MINUTES_PER_JOB)
+
+  return samples
+
+
+def GetFioCommand(disk, job_file_path):
+  """Get the command that runs fio against a disk.
+
+  Args:
+    disk: the disk.BaseDisk to run against.
+    job_file_path: the path of the job file on the VM.
+
+  Returns:
+    The command, as a string.
+  """
+  if AgainstDevice():
+    return 'sudo %s --output-format=json --filename=%s %s' % (
+        fio.FIO_PATH, disk.GetDevicePath(), job_file_path)
+  else:
+    return 'sudo %s --output-format=json --directory=%s %s' % (
+        fio.FIO_PATH, disk.mount_point, job_file_path)
+
+
+def RunCluster(vms):
+  """Run fio on every scratch disk of every VM at once.
+
+  Each disk gets its own fio process. The processes all wait for the same
+  moment, by the clock of the first VM, to start, and their results are
+  merged into results of the whole cluster.
+
+  Args:
+    vms: list of the benchmark's VMs.
+
+  Returns:
+    A list of sample.Sample objects.
+  """
+  targets = GetClusterTargets(vms)
+  logging.info('FIO running on %s disks of %s VMs', len(targets), len(vms))
+  target_params = [(target, {}) for target in targets]
+
+  def PushJobFile(vm, disk_index, disk):
+    job_file_string = GetOrGenerateJobFileString(
+        FLAGS.fio_jobfile,
+        FLAGS.fio_generate_scenarios,
+        AgainstDevice(),
+        disk,
+        FLAGS.fio_io_depths,
+        FLAGS.fio_working_set_size)
+    job_file_name = CLUSTER_JOB_FILE_NAME % disk_index
+    job_file_path = vm_util.PrependTempDir('%s-%s' % (vm.name, job_file_name))
+    with open(job_file_path, 'w') as job_file:
+      job_file.write(job_file_string)
+    remote_path = posixpath.join(vm_util.VM_TMP_DIR, job_file_name)
+    vm.PushFile(job_file_path, remote_path)
+    return job_file_string, GetFioCommand(disk, remote_path)
+
+  job_files = vm_util.RunThreaded(PushJobFile, target_params,
+                                  max_concurrent_threads=len(targets))
+  # The metadata of the merged samples comes from the first disk's job file.
+  job_file_string = job_files[0][0]
+  samples = []
+
+  def RunIt(repeat_number=None, minutes_since_start=None, total_repeats=None):
+    """Run fio on all disks and save the merged results.
+
+    Args:
+      repeat_number: if given, our number in a sequence of repetitions.
+      minutes_since_start: if given, minutes since the start of repetition.
+      total_repeats: if given, the total number of repetitions to do.
+    """
+    if repeat_number:
+      logging.info('**** Repetition number %s of %s ****',
+                   repeat_number, total_repeats)
+    stdout, _ = vms[0].RemoteCommand('date +%s.%N')
+    start_time = float(stdout) + CLUSTER_START_DELAY_SECONDS
+
+    def RunFio(target_index):
+      vm = targets[target_index][0]
+      command = ('python -c "import time; '
+                 'time.sleep(max(0, %f - time.time()))" && %s' %
+                 (start_time, job_files[target_index][1]))
+      stdout, _ = vm.RobustRemoteCommand(command, should_log=True)
+      return json.loads(stdout)
+
+    results = vm_util.RunThreaded(RunFio, range(len(targets)),
+                                  max_concurrent_threads=len(targets))
+    base_metadata = {'fio_vms': len(vms), 'fio_disks': len(targets)}
+    if repeat_number:
+      base_metadata.update(repeat_number=repeat_number,
+                           minutes_since_start=minutes_since_start)
+    cluster_samples = fio.ParseResults(job_file_string,
+                                       fio.MergeResults(results),
+                                       base_metadata=base_metadata)
+    if FLAGS.fio_cluster_per_vm_metadata:
+      cluster_samples = AddPerVmMetadata(cluster_samples, targets, results)
+    samples.extend(cluster_samples)
+
   if not FLAGS['fio_run_for_minutes'].present:
     RunIt()
   else:
@@ -479,6 +1067,39 @@ def Run(benchmark_spec):
   return samples
 
 
+def AddPerVmMetadata(samples, targets, results):
+  """Add each VM's bandwidth and IOPS to the cluster's samples of them.
+
+  Args:
+    samples: list of sample.Sample objects parsed from merged results.
+    targets: list of (vm, disk index, disk) tuples that fio ran on.
+    results: list of fio results in json format, one per target.
+
+  Returns:
+    A list of sample.Sample objects. Bandwidth samples get a
+    'per_vm_bandwidth' and IOPS samples a 'per_vm_iops' metadata entry such
+    as 'pkb-vm-0=100.0,pkb-vm-1=105.0'.
+  """
+  # Maps (job name, mode, statistic) to an OrderedDict of VM name to total.
+  totals = collections.defaultdict(collections.OrderedDict)
+  for (vm, _, _), result in zip(targets, results):
+    for job in result['jobs']:
+      for mode in fio.IO_MODES:
+        for stat, key in (('bandwidth', 'bw'), ('iops', 'iops')):
+          vm_totals = totals[job['jobname'], mode, stat]
+          vm_totals[vm.name] = vm_totals.get(vm.name, 0) + job[mode][key]
+  new_samples = []
+  for result_sample in samples:
+    key = tuple(result_sample.metric.rsplit(':', 2))
+    if key in totals:
+      metadata = result_sample.metadata.copy()
+      metadata['per_vm_%s' % key[2]] = ','.join(
+          '%s=%s' % item for item in totals[key].iteritems())
+      result_sample = result_sample._replace(metadata=metadata)
+    new_samples.append(result_sample)
+  return new_samples
+
+
 def Cleanup(benchmark_spec):
   """Uninstall packages required for fio and remove benchmark files.
 
@@ -486,6 +1107,15 @@ def Cleanup(benchmark_spec):
     benchmark_spec: The benchmark specification. Contains all data that is
         required to run the benchmark.
   """
+  if FLAGS.fio_cluster:
+    for vm, disk_index, disk in GetClusterTargets(benchmark_spec.vms):
+      vm.RemoveFile(posixpath.join(vm_util.VM_TMP_DIR,
+                                   CLUSTER_JOB_FILE_NAME % disk_index))
+      if not AgainstDevice() and not FLAGS.fio_jobfile:
+        vm.RemoveFile(posixpath.join(disk.mount_point,
+                                     DEFAULT_TEMP_FILE_NAME))
+    return
+
   vm = benchmark_spec.vms[0]
   logging.info('FIO Cleanup up on %s', vm)
   vm.RemoveFile(REMOTE_JOB_FILE_PATH)
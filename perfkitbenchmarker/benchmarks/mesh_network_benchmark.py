@@ -14,18 +14,22 @@
 
 """Runs mesh network benchmarks.
 
-Runs TCP_RR, TCP_STREAM benchmarks from netperf and compute total throughput
-and average latency inside mesh network.
+Runs TCP_RR and TCP_STREAM benchmarks from netperf between pairs of VMs in a
+traffic pattern (see network_mesh), running the pairs that do not share a
+client or a server at once. Reports the throughput and latency of every pair,
+the total throughput of the concurrent pairs, which with the bisection
+pattern is the bisection bandwidth, and the worst pair.
 """
 
 
+import csv
 import logging
-import re
-import threading
+import random
 
 from perfkitbenchmarker import configs
 from perfkitbenchmarker import errors
 from perfkitbenchmarker import flags
+from perfkitbenchmarker import network_mesh
 from perfkitbenchmarker import sample
 from perfkitbenchmarker import vm_util
 from perfkitbenchmarker.packages import netperf
@@ -37,6 +41,20 @@ flags.DEFINE_integer('num_connections', 1,
 flags.DEFINE_integer('num_iterations', 1,
                      'Number of iterations for each run.')
 
+flags.DEFINE_enum('mesh_network_pattern', network_mesh.ALL_PAIRS,
+                  network_mesh.PATTERNS,
+                  'The pairs of VMs that exchange traffic: every VM with '
+                  'every other VM (all_pairs), every VM with the next one '
+                  '(ring), every VM with one other picked at random '
+                  '(permutation), or every VM of one random half of the VMs '
+                  'with one of the other half, in both directions, all at '
+                  'once (bisection).')
+
+flags.DEFINE_integer('mesh_network_seed', None,
+                     'Seed of the random permutation and bisection halves. '
+                     'If not given, a random seed is used. The seed is '
+                     'reported in the samples\' metadata.')
+
 
 FLAGS = flags.FLAGS
 
@@ -53,8 +71,10 @@ mesh_network:
 """
 
 NETPERF_BENCHMARKSS = ['TCP_RR', 'TCP_STREAM']
-VALUE_INDEX = 1
-RESULT_LOCK = threading.Lock()
+# The values netperf prints for each connection, in order.
+NETPERF_OUTPUT_SELECTORS = ['THROUGHPUT', 'THROUGHPUT_UNITS', 'MEAN_LATENCY',
+                            'P50_LATENCY', 'P99_LATENCY']
+MBPS = 'Mbits/sec'
 
 
 def GetConfig(user_config):
@@ -90,50 +110,155 @@ def Prepare(benchmark_spec):
   vm_util.RunThreaded(PrepareVM, vms, len(vms))
 
 
-def RunNetperf(vm, benchmark_name, servers, result):
-  """Spawns netperf on a remote VM, parses results.
+def ParseNetperfOutput(output):
+  """Parses the output of netperf connections run with -P 0.
+
+  Args:
+    output: string. The concatenated output of the connections. Each one
+        prints a line of comma-separated NETPERF_OUTPUT_SELECTORS values.
+
+  Returns:
+    A list of dicts mapping selectors to values, one per connection.
+  """
+  rows = []
+  for row in csv.reader(output.splitlines()):
+    if len(row) != len(NETPERF_OUTPUT_SELECTORS):
+      continue
+    try:
+      float(row[0])
+    except ValueError:
+      continue  # Headers and banners.
+    rows.append(dict(zip(NETPERF_OUTPUT_SELECTORS, row)))
+  return rows
+
+
+def RunNetperf(vm, benchmark_name, server):
+  """Spawns netperf connections from a VM to a server, parses results.
 
   Args:
     vm: The VM running netperf.
     benchmark_name: The netperf benchmark to run.
-    servers: VMs running netserver.
-    result: The result variable shared by all threads.
+    server: The VM running netserver.
+
+  Returns:
+    A dict with the total 'throughput' of the connections, in Mbits/sec for
+    TCP_STREAM and transactions per second for TCP_RR, and for TCP_RR the
+    'mean_latency' and 'p50_latency' averaged over the connections and the
+    largest 'p99_latency', in microseconds.
+
+  Raises:
+    errors.Benchmarks.RunError: if a connection did not report its results.
   """
-  cmd = ''
   if FLAGS.duration_in_seconds:
     cmd_duration_suffix = '-l %s' % FLAGS.duration_in_seconds
   else:
     cmd_duration_suffix = ''
-  for server in servers:
-    if vm != server:
-      cmd += ('./netperf -t '
-              '{benchmark_name} -H {server_ip} -i {iterations} '
-              '{cmd_suffix} & ').format(
-                  benchmark_name=benchmark_name,
-                  server_ip=server.internal_ip,
-                  iterations=FLAGS.num_iterations,
-                  cmd_suffix=cmd_duration_suffix)
-  netperf_cmd = ''
-  for _ in range(FLAGS.num_connections):
-    netperf_cmd += cmd
-  netperf_cmd += 'wait'
-  output, _ = vm.RemoteCommand(netperf_cmd)
+  cmd = ('./netperf -P 0 -j -t {benchmark_name} -H {server_ip} '
+         '-i {iterations} {cmd_suffix} -- -o {selectors} & ').format(
+             benchmark_name=benchmark_name,
+             server_ip=server.internal_ip,
+             iterations=FLAGS.num_iterations,
+             cmd_suffix=cmd_duration_suffix,
+             selectors=','.join(NETPERF_OUTPUT_SELECTORS))
+  output, _ = vm.RemoteCommand(cmd * FLAGS.num_connections + 'wait')
   logging.info(output)
 
-  match = re.findall(r'(\d+\.\d+)\s+\n', output)
-  value = 0
-  expected_num_match = (len(servers) - 1) * FLAGS.num_connections
-  if len(match) != expected_num_match:
+  rows = ParseNetperfOutput(output)
+  if len(rows) != FLAGS.num_connections:
     raise errors.Benchmarks.RunError(
-        'Netserver not reachable. Expecting %s results, got %s.' %
-        (expected_num_match, len(match)))
-  for res in match:
-    if benchmark_name == 'TCP_RR':
-      value += 1.0 / float(res) * 1000.0
-    else:
-      value += float(res)
-  with RESULT_LOCK:
-    result[VALUE_INDEX] += value
+        'Netserver on %s not reachable from %s. Expecting %s results, got '
+        '%s.' % (server, vm, FLAGS.num_connections, len(rows)))
+  result = {'throughput': sum(float(row['THROUGHPUT']) for row in rows)}
+  if benchmark_name == 'TCP_RR':
+    for key in 'MEAN_LATENCY', 'P50_LATENCY':
+      result[key.lower()] = sum(float(row[key]) for row in rows) / len(rows)
+    result['p99_latency'] = max(float(row['P99_LATENCY']) for row in rows)
+  return result
+
+
+def GetPairMetadata(vms, client, server, metadata):
+  """Get the metadata of a pair's samples, on top of 'metadata'."""
+  pair_metadata = metadata.copy()
+  pair_metadata.update(sending_vm=client, receiving_vm=server,
+                       sending_zone=vms[client].zone,
+                       receiving_zone=vms[server].zone)
+  return pair_metadata
+
+
+def MakeStreamSamples(vms, flows, metadata):
+  """Make TCP_STREAM samples from the flows' results.
+
+  Args:
+    vms: The benchmark's VMs.
+    flows: list of network_mesh.FlowResults of RunNetperf.
+    metadata: dict. Metadata of all samples.
+
+  Returns:
+    A list of sample.Sample objects.
+  """
+  matrix = network_mesh.GetMatrix(flows, lambda r: r['throughput'])
+  logging.info('TCP_STREAM throughput matrix, in %s:\n%s', MBPS,
+               network_mesh.FormatMatrix(len(vms), matrix))
+  samples = []
+  for flow in flows:
+    pair_metadata = GetPairMetadata(vms, flow.client, flow.server, metadata)
+    pair_metadata['round'] = flow.round_index
+    samples.append(sample.Sample(
+        'TCP_STREAM_Pair_Throughput', matrix[flow.client, flow.server], MBPS,
+        pair_metadata))
+
+  round_totals = network_mesh.GetRoundTotals(flows, matrix)
+  samples.append(sample.Sample(
+      'TCP_STREAM_Total_Throughput', sum(round_totals) / len(round_totals),
+      MBPS, metadata))
+  if FLAGS.mesh_network_pattern == network_mesh.BISECTION:
+    samples.append(sample.Sample(
+        'TCP_STREAM_Bisection_Bandwidth', round_totals[0], MBPS, metadata))
+  samples.append(sample.Sample(
+      'TCP_STREAM_Average_Pair_Throughput',
+      sum(matrix.itervalues()) / len(matrix), MBPS, metadata))
+  client, server = network_mesh.GetWorstPair(matrix, higher_is_better=True)
+  worst_metadata = GetPairMetadata(vms, client, server, metadata)
+  samples.append(sample.Sample(
+      'TCP_STREAM_Worst_Pair_Throughput', matrix[client, server], MBPS,
+      worst_metadata))
+  return samples
+
+
+def MakeRequestResponseSamples(vms, flows, metadata):
+  """Make TCP_RR samples from the flows' results.
+
+  Args:
+    vms: The benchmark's VMs.
+    flows: list of network_mesh.FlowResults of RunNetperf.
+    metadata: dict. Metadata of all samples.
+
+  Returns:
+    A list of sample.Sample objects.
+  """
+  matrix = network_mesh.GetMatrix(flows, lambda r: r['mean_latency'])
+  logging.info('TCP_RR mean latency matrix, in us:\n%s',
+               network_mesh.FormatMatrix(len(vms), matrix))
+  samples = []
+  for flow in flows:
+    pair_metadata = GetPairMetadata(vms, flow.client, flow.server, metadata)
+    pair_metadata['round'] = flow.round_index
+    pair_metadata.update(transaction_rate=flow.result['throughput'],
+                         p50_latency=flow.result['p50_latency'],
+                         p99_latency=flow.result['p99_latency'])
+    samples.append(sample.Sample(
+        'TCP_RR_Pair_Latency', matrix[flow.client, flow.server], 'us',
+        pair_metadata))
+
+  samples.append(sample.Sample(
+      'TCP_RR_Average_Latency', sum(matrix.itervalues()) / len(matrix) / 1000,
+      'ms', metadata))
+  client, server = network_mesh.GetWorstPair(matrix, higher_is_better=False)
+  worst_metadata = GetPairMetadata(vms, client, server, metadata)
+  samples.append(sample.Sample(
+      'TCP_RR_Worst_Pair_Latency', matrix[client, server], 'us',
+      worst_metadata))
+  return samples
 
 
 def Run(benchmark_spec):
@@ -144,39 +269,33 @@ def Run(benchmark_spec):
         required to run the benchmark.
 
   Returns:
-    Total throughput, average latency in the form of tuple. The tuple contains
-        the sample metric (string), value (float), unit (string).
+    A list of sample.Sample objects.
   """
   vms = benchmark_spec.vms
   num_vms = len(vms)
+  seed = FLAGS.mesh_network_seed
+  if seed is None:
+    seed = random.randint(0, 2 ** 31 - 1)
+  pairs = network_mesh.GetPairs(num_vms, FLAGS.mesh_network_pattern,
+                                random.Random(seed))
+  rounds = network_mesh.ScheduleRounds(pairs)
+  metadata = {
+      'number_machines': num_vms,
+      'number_connections': FLAGS.num_connections,
+      'pattern': FLAGS.mesh_network_pattern,
+      'number_pairs': len(pairs),
+      'number_rounds': len(rounds),
+      'seed': seed
+  }
   results = []
   for netperf_benchmark in NETPERF_BENCHMARKSS:
-    args = []
-    metadata = {
-        'number_machines': num_vms,
-        'number_connections': FLAGS.num_connections
-    }
-
+    flows = network_mesh.RunRounds(
+        vms, rounds,
+        lambda vm, server: RunNetperf(vm, netperf_benchmark, server))
     if netperf_benchmark == 'TCP_STREAM':
-      metric = 'TCP_STREAM_Total_Throughput'
-      unit = 'Mbits/sec'
-      value = 0.0
+      results.extend(MakeStreamSamples(vms, flows, metadata))
     else:
-      metric = 'TCP_RR_Average_Latency'
-      unit = 'ms'
-      value = 0.0
-    result = [metric, value, unit, metadata]
-    args = [((source, netperf_benchmark, vms, result), {}) for source in vms]
-    vm_util.RunThreaded(RunNetperf, args, num_vms)
-    result = sample.Sample(*result)
-    if netperf_benchmark == 'TCP_RR':
-      denom = ((num_vms - 1) *
-               num_vms *
-               FLAGS.num_connections)
-      result = result._replace(value=result.value / denom)
-
-    results.append(result)
-  logging.info(results)
+      results.extend(MakeRequestResponseSamples(vms, flows, metadata))
   return results
 
 
@@ -35,6 +35,7 @@ import uuid
 from perfkitbenchmarker import benchmark_spec as benchmark_spec_class
 from perfkitbenchmarker import configs
 from perfkitbenchmarker import flags
+from perfkitbenchmarker import histogram
 from perfkitbenchmarker import sample
 from perfkitbenchmarker import vm_util
 from perfkitbenchmarker.aws import aws_network
@@ -122,6 +123,9 @@ SYSBENCH_RESULT_NAME_LATENCY = 'sysbench latency'
 NA_UNIT = 'NA'
 SECONDS_UNIT = 'seconds'
 MS_UNIT = 'milliseconds'
+# TPS are recorded with a resolution of 0.01 transactions per second, as
+# sysbench reports them.
+TPS_RESOLUTION = 0.01
 
 # These are the constants that should be specified in GCP's cloud SQL command.
 DEFAULT_BACKUP_START_TIME = '07:00'
@@ -203,7 +207,7 @@ def ParseSysbenchOutput(sysbench_output, results, metadata):
     results: The dictionary to store results based on sysbench output.
     metadata: The metadata to be passed along to the Samples class.
   """
-  all_tps = []
+  all_tps = histogram.Histogram(unit=TPS_RESOLUTION)
   seen_general_statistics = False
   seen_response_time = False
 
@@ -213,7 +217,7 @@ def ParseSysbenchOutput(sysbench_output, results, metadata):
   for line in sysbench_output_io.readlines():
     if re.match('^\[', line):
       tps = re.findall('tps: (.*?),', line)
-      all_tps.append(float(tps[0]))
+      all_tps.Add(float(tps[0]))
       continue
 
     if line.startswith('General statistics:'):
@@ -231,12 +235,11 @@ def ParseSysbenchOutput(sysbench_output, results, metadata):
         if re.findall(search_string, line):
           response_times[token] = float(re.findall(search_string, line)[0])
 
-  tps_line = ', '.join(map(str, all_tps))
-  # Print all tps data points in the log for reference. And report
-  # percentiles of these tps data in the final result set.
-  logging.info('All TPS numbers: \n %s', tps_line)
+  # Print the histogram of all tps data points in the log for reference. And
+  # report percentiles of these tps data in the final result set.
+  logging.info('TPS histogram: %s', all_tps.ToJson())
 
-  tps_percentile = sample.PercentileCalculator(all_tps)
+  tps_percentile = all_tps.Summary(sample.PERCENTILES_LIST)
   for percentile in sample.PERCENTILES_LIST:
     percentile_string = 'p%s' % str(percentile)
     logging.info('%s tps %f', percentile_string,
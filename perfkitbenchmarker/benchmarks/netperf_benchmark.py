@@ -28,6 +28,7 @@ import logging
 
 from perfkitbenchmarker import configs
 from perfkitbenchmarker import flags
+from perfkitbenchmarker import histogram
 from perfkitbenchmarker import sample
 from perfkitbenchmarker import vm_util
 from perfkitbenchmarker.packages import netperf
@@ -42,6 +43,12 @@ flags.DEFINE_integer('netperf_test_length', 60,
                      'netperf test length, in seconds',
                      lower_bound=1)
 
+flags.DEFINE_integer('netperf_num_runs', 1,
+                     'Number of times to run each netperf test. The results '
+                     'of every run are reported, and the latency histograms '
+                     'of the runs of a request/response test are merged.',
+                     lower_bound=1)
+
 
 FLAGS = flags.FLAGS
 
@@ -62,6 +69,9 @@ TRANSACTIONS_PER_SECOND = 'transactions_per_second'
 NETPERF_BENCHMARKS = ['TCP_RR', 'TCP_CRR', 'TCP_STREAM', 'UDP_RR']
 COMMAND_PORT = 20000
 DATA_PORT = 20001
+# Percentiles of the merged latency histograms that are reported, beyond the
+# ones netperf reports for each run.
+HISTOGRAM_PERCENTILES = [99.9, 99.99]
 
 
 def GetConfig(user_config):
@@ -101,17 +111,21 @@ def RunNetperf(vm, benchmark_name, server_ip):
     server_ip: A machine that is running netserver.
 
   Returns:
-    A sample.Sample object with the result.
+    A (samples, latency histogram) tuple. samples is a list of sample.Sample
+    objects with the results. The histogram is a histogram.Histogram of the
+    transactions' latencies, in microseconds, or None if the test is not a
+    request/response test.
   """
   # Flags:
   # -o specifies keys to include in CSV output.
   # -j keeps additional latency numbers
+  # -v 2 prints the histogram of the latencies after the CSV output
   # -I specifies the confidence % and width - here 99% confidence that the true
   #    value is within +/- 2.5% of the reported value
   # -i specifies the maximum and minimum number of iterations.
   confidence = ('-I 99,5 -i {0},3'.format(FLAGS.netperf_max_iter)
                 if FLAGS.netperf_max_iter else '')
-  netperf_cmd = ('{netperf_path} -p {command_port} -j '
+  netperf_cmd = ('{netperf_path} -p {command_port} -j -v 2 '
                  '-t {benchmark_name} -H {server_ip} -l {length} {confidence} '
                  ' -- '
                  '-P {data_port} '
@@ -154,7 +168,7 @@ def RunNetperf(vm, benchmark_name, server_ip):
 
   # No tail latency for throughput.
   if unit == MBPS:
-    return samples
+    return samples, None
 
   for metric_key, metric_name in [
       ('50th Percentile Latency Microseconds', 'p50'),
@@ -164,6 +178,51 @@ def RunNetperf(vm, benchmark_name, server_ip):
     samples.append(
         sample.Sample('%s_Latency_%s' % (benchmark_name, metric_name),
                       float(row[metric_key]), 'us', metadata))
+  return samples, netperf.ParseHistogram(stdout)
+
+
+def RunNetperfRepeatedly(vm, benchmark_name, server_ip, metadata):
+  """Runs a netperf test --netperf_num_runs times.
+
+  Args:
+    vm: The VM that the netperf benchmark will be run upon.
+    benchmark_name: The netperf benchmark to run, see the documentation.
+    server_ip: A machine that is running netserver.
+    metadata: dict. Metadata to add to every sample.
+
+  Returns:
+    A list of sample.Sample objects: those of every run, then for
+    request/response tests the HISTOGRAM_PERCENTILES of the runs' merged
+    latency histogram and a sample whose metadata holds the histogram.
+  """
+  samples = []
+  histograms = []
+  for run_number in xrange(FLAGS.netperf_num_runs):
+    run_samples, latencies = RunNetperf(vm, benchmark_name, server_ip)
+    for run_sample in run_samples:
+      run_sample.metadata.update(metadata)
+      if FLAGS.netperf_num_runs > 1:
+        run_sample.metadata['run_number'] = run_number
+    samples.extend(run_samples)
+    if latencies and latencies.total_count:
+      histograms.append(latencies)
+  if not histograms:
+    return samples
+
+  latencies = histogram.Merge(histograms)
+  histogram_metadata = metadata.copy()
+  histogram_metadata.update(netperf_test_length=FLAGS.netperf_test_length,
+                            max_iter=FLAGS.netperf_max_iter or 1,
+                            num_runs=len(histograms))
+  for label, value in latencies.Percentiles(
+      HISTOGRAM_PERCENTILES).iteritems():
+    samples.append(sample.Sample('%s_Latency_%s' % (benchmark_name, label),
+                                 value, 'us', histogram_metadata))
+  histogram_metadata = histogram_metadata.copy()
+  histogram_metadata['histogram'] = latencies.ToJson()
+  samples.append(sample.Sample('%s_Latency_Histogram' % benchmark_name,
+                               latencies.total_count, 'count',
+                               histogram_metadata))
   return samples
 
 
@@ -194,19 +253,15 @@ def Run(benchmark_spec):
   for netperf_benchmark in NETPERF_BENCHMARKS:
 
     if vm_util.ShouldRunOnExternalIpAddress():
-      external_ip_results = RunNetperf(vm, netperf_benchmark,
-                                       server_vm.ip_address)
-      for external_ip_result in external_ip_results:
-        external_ip_result.metadata.update(metadata)
-      results.extend(external_ip_results)
+      results.extend(RunNetperfRepeatedly(vm, netperf_benchmark,
+                                          server_vm.ip_address, metadata))
 
     if vm_util.ShouldRunOnInternalIpAddress(vm, server_vm):
-      internal_ip_results = RunNetperf(vm, netperf_benchmark,
-                                       server_vm.internal_ip)
-      for internal_ip_result in internal_ip_results:
-        internal_ip_result.metadata.update(metadata)
-        internal_ip_result.metadata['ip_type'] = 'internal'
-      results.extend(internal_ip_results)
+      internal_metadata = metadata.copy()
+      internal_metadata['ip_type'] = 'internal'
+      results.extend(RunNetperfRepeatedly(vm, netperf_benchmark,
+                                          server_vm.internal_ip,
+                                          internal_metadata))
 
   return results
 
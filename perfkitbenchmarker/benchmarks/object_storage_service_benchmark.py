@@ -31,7 +31,7 @@ category:
 Documentation: https://goto.google.com/perfkitbenchmarker-storage
 """
 
-import json
+import inspect
 import logging
 import os
 import re
@@ -42,6 +42,7 @@ from perfkitbenchmarker import configs
 from perfkitbenchmarker import data
 from perfkitbenchmarker import errors
 from perfkitbenchmarker import flags
+from perfkitbenchmarker import histogram
 from perfkitbenchmarker import sample
 from perfkitbenchmarker import vm_util
 from perfkitbenchmarker.sample import PercentileCalculator  # noqa
@@ -178,18 +179,24 @@ class NotEnoughResultsError(Exception):
     pass
 
 
+def _GetHistogramSummary(json_input):
+  """Returns the percentiles, average and stddev of a histogram in Json."""
+  return histogram.Histogram.FromJson(json_input).Summary(
+      sample.PERCENTILES_LIST)
+
+
 def _JsonStringToPercentileResults(results, json_input, metric_name,
                                    metric_unit, metadata):
-  """This function parses a percentile result string in Json format.
+  """This function parses a histogram of results in Json format.
 
   Args:
     results: The final result set to put result in.
-    json_input: The input in Json format about percentiles.
+    json_input: The histogram.Histogram of the results, in Json format.
     metric_name: Name of the metric.
     metric_unit: Unit of the metric.
     metadata: The metadata to be included.
   """
-  result = json.loads(json_input)
+  result = _GetHistogramSummary(json_input)
   for percentile in PERCENTILES_LIST:
     results.append(sample.Sample(
         ('%s %s') % (metric_name, percentile),
@@ -314,7 +321,7 @@ def ApiBasedBenchmarks(results, metadata, vm, storage, test_script_path,
           # Convert Bytes per second to Mega bits per second
           # We use MB (10^6) to be consistent with network
           # bandwidth convention.
-          result = json.loads(result_string[0])
+          result = _GetHistogramSummary(result_string[0])
           for percentile in PERCENTILES_LIST:
             results.append(sample.Sample(
                 ('%s %s') % (sample_name, percentile),
@@ -955,6 +962,8 @@ def Prepare(benchmark_spec):
 
   api_test_script_path = data.ResourcePath(API_TEST_SCRIPT)
   vms[0].PushFile(api_test_script_path, '%s/run/' % scratch_dir)
+  # The API test script records its results in histograms.
+  vms[0].PushFile(inspect.getsourcefile(histogram), '%s/run/' % scratch_dir)
 
 
 def Run(benchmark_spec):
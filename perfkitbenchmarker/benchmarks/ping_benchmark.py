@@ -15,12 +15,18 @@
 """Runs ping.
 
 This benchmark runs ping using the internal ips of vms in the same zone.
+Both VMs ping each other at the same time. The min, average, max and standard
+deviation of the latency are those reported by the first VM's ping, while the
+latency percentiles are those of a histogram of the replies to both VMs.
 """
 
 import logging
+import re
+
 from perfkitbenchmarker import configs
+from perfkitbenchmarker import histogram
 from perfkitbenchmarker import sample
-import re
+from perfkitbenchmarker import vm_util
 
 
 BENCHMARK_NAME = 'ping'
@@ -34,6 +40,12 @@ ping:
 """
 
 METRICS = ('Min Latency', 'Average Latency', 'Max Latency', 'Latency Std Dev')
+PERCENTILES = [50, 90, 99, 99.9]
+# Reply times are recorded with microsecond resolution.
+LATENCY_RESOLUTION_MS = 0.001
+
+# e.g. '64 bytes from 10.240.0.3: icmp_seq=1 ttl=64 time=0.345 ms'
+_REPLY_TIME_RE = re.compile(r'time=([0-9.]+) ms')
 
 
 def GetConfig(user_config):
@@ -50,6 +62,32 @@ def Prepare(benchmark_spec):  # pylint: disable=unused-argument
   pass
 
 
+def ParseReplyTimes(ping_output):
+  """Records the reply times of a ping's output in a histogram.
+
+  Args:
+    ping_output: string. The output of ping.
+
+  Returns:
+    A histogram.Histogram of the reply times, in ms.
+  """
+  latencies = histogram.Histogram(unit=LATENCY_RESOLUTION_MS)
+  for match in _REPLY_TIME_RE.finditer(ping_output):
+    latencies.Add(float(match.group(1)))
+  return latencies
+
+
+def _Ping(vm, target_vm):
+  """Pings a VM's internal IP.
+
+  Returns:
+    (ping output, histogram.Histogram of the reply times) tuple.
+  """
+  ping_cmd = 'ping -c 100 %s' % target_vm.internal_ip
+  stdout, _ = vm.RemoteCommand(ping_cmd, should_log=True)
+  return stdout, ParseReplyTimes(stdout)
+
+
 def Run(benchmark_spec):
   """Run ping on the target vm.
 
@@ -64,16 +102,29 @@ def Run(benchmark_spec):
   if not vms[0].IsReachable(vms[1]):
     logging.warn('%s is not reachable from %s', vms[1], vms[0])
     return []
-  vm = vms[0]
   logging.info('Ping results:')
-  ping_cmd = 'ping -c 100 %s' % vms[1].internal_ip
-  stdout, _ = vm.RemoteCommand(ping_cmd, should_log=True)
+  outputs = vm_util.RunThreaded(
+      _Ping, [((vms[0], vms[1]), {}), ((vms[1], vms[0]), {})])
+  stdout = outputs[0][0]
   stats = re.findall('([0-9]*\\.[0-9]*)', stdout.splitlines()[-1])
   assert len(stats) == len(METRICS), stats
   results = []
   metadata = {'ip_type': 'internal'}
   for i, metric in enumerate(METRICS):
     results.append(sample.Sample(metric, float(stats[i]), 'ms', metadata))
+
+  latencies = histogram.Merge(vm_latencies for _, vm_latencies in outputs)
+  if not latencies.total_count:
+    return results
+  histogram_metadata = metadata.copy()
+  histogram_metadata['num_vms'] = len(outputs)
+  for label, value in latencies.Percentiles(PERCENTILES).iteritems():
+    results.append(sample.Sample('Latency %s' % label, value, 'ms',
+                                 histogram_metadata))
+  histogram_metadata = histogram_metadata.copy()
+  histogram_metadata['histogram'] = latencies.ToJson()
+  results.append(sample.Sample('Latency Histogram', latencies.total_count,
+                               'count', histogram_metadata))
   return results
 
 
@@ -46,6 +46,10 @@ after_phase = _events.signal('after-phase', doc="""
 Signal sent immediately after a phase runs, regardless of whether it was
 successful.
 
+Receivers may return a list of sample.Sample objects, such as summaries of
+performance counters traced during the phase. They are added to the phase's
+samples.
+
 Sender: the phase. Currently only RUN_PHASE.
 Payload: benchmark_spec.""")
 
@@ -54,6 +58,8 @@ Called with sample object and benchmark spec.
 
 Signal sent immediately after a sample is created by a publisher.
 The sample's metadata is mutable, and may be updated by the subscriber.
+Updating it gives the sample a private copy of its metadata.
 
 Sender: None
-Payload: benchmark_spec (BenchmarkSpec), sample (dict).""")
+Payload: benchmark_spec (BenchmarkSpec), sample (dict-like
+publisher.AnnotatedSample).""")
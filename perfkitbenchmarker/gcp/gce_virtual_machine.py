@@ -29,7 +29,6 @@ import re
 
 from perfkitbenchmarker import disk
 from perfkitbenchmarker import errors
-from perfkitbenchmarker import events
 from perfkitbenchmarker import flags
 from perfkitbenchmarker import linux_virtual_machine as linux_vm
 from perfkitbenchmarker import virtual_machine
@@ -117,8 +116,6 @@ class GceVirtualMachine(virtual_machine.BaseVirtualMachine):
 
     self.preemptible = vm_spec.preemptible
 
-    events.sample_created.connect(self.AnnotateSample, weak=False)
-
   def _CreateDependencies(self):
     """Create VM dependencies."""
     self.boot_disk.Create()
@@ -254,8 +251,8 @@ class GceVirtualMachine(virtual_machine.BaseVirtualMachine):
     cmd.extend(util.GetDefaultGcloudFlags(self))
     vm_util.IssueCommand(cmd)
 
-  def AnnotateSample(self, unused_sender, benchmark_spec, sample):
-    sample['metadata']['preemptible'] = self.preemptible
+  def GetSampleMetadata(self):
+    return {'preemptible': self.preemptible}
 
 
 class ContainerizedGceVirtualMachine(GceVirtualMachine,
@@ -0,0 +1,297 @@
+# Copyright 2015 PerfKitBenchmarker Authors. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""A compact, mergeable histogram with log-spaced buckets.
+
+Buckets are laid out as in HdrHistogram: values below 'sub_bucket_count' units
+each get their own bucket, and above that every power-of-two range is split
+into sub_bucket_count / 2 equal buckets. The relative error of a recorded value
+is therefore at most 2 / sub_bucket_count, while the number of buckets only
+grows logarithmically with the largest value.
+
+Counts are kept in a flat array indexed by bucket, so histograms from many
+sources can be merged by adding arrays, and any number of percentiles can be
+read from a single cumulative pass. The mean and standard deviation of the
+recorded values are tracked exactly, and merge too.
+
+This module only uses the standard library, so that it can be copied to VMs
+and imported by the scripts that record values there. Their histograms are
+then serialized with ToJson and merged on the controller, instead of shipping
+every value.
+"""
+
+import array
+import collections
+import json
+import math
+
+# Gives at least three significant decimal digits of precision, like
+# HdrHistogram's default.
+DEFAULT_SUB_BUCKET_COUNT = 2048
+# Fraction of a unit by which a value may fall short of a bucket boundary and
+# still be recorded in that bucket.
+_UNIT_TOLERANCE = 1e-6
+
+
+def _PercentileLabel(percentile):
+  """Returns e.g. 'p50' for 50.0 and 'p99.9' for 99.9."""
+  if math.modf(percentile)[0] < 1e-7:
+    percentile = int(percentile)
+  return 'p{0}'.format(percentile)
+
+
+class Histogram(object):
+  """A histogram of non-negative values.
+
+  Attributes:
+    sub_bucket_count: int. Power of two. Values below this many units are
+        recorded exactly.
+    unit: int or float. The resolution of recorded values. Values are floored
+        to a multiple of it.
+  """
+
+  def __init__(self, sub_bucket_count=DEFAULT_SUB_BUCKET_COUNT, unit=1):
+    if sub_bucket_count < 2 or sub_bucket_count & (sub_bucket_count - 1):
+      raise ValueError('sub_bucket_count must be a power of two >= 2, got '
+                       '{0}'.format(sub_bucket_count))
+    self.sub_bucket_count = sub_bucket_count
+    self.unit = unit
+    self._half_count = sub_bucket_count // 2
+    self._shift = sub_bucket_count.bit_length() - 1
+    # Doubles hold integer counts exactly up to 2 ** 53.
+    self._counts = array.array('d')
+    # Number, sum and sum of squared deviations from the mean of the values
+    # recorded, before they are floored to a bucket. The latter is updated with
+    # Welford's method.
+    self._count = 0
+    self._sum = 0.0
+    self._m2 = 0.0
+
+  def _GetIndex(self, value):
+    if value < 0:
+      raise ValueError('Histogram values must be non-negative, got '
+                       '{0}'.format(value))
+    # Allow for floating point error, so that e.g. 0.345 with a unit of 0.001
+    # is recorded as 345 units rather than 344.
+    n = int(value / self.unit + _UNIT_TOLERANCE)
+    if n < self.sub_bucket_count:
+      return n
+    exponent = n.bit_length() - self._shift
+    return (self.sub_bucket_count + (exponent - 1) * self._half_count +
+            (n >> exponent) - self._half_count)
+
+  def _GetLowerBound(self, index):
+    if index < self.sub_bucket_count:
+      n = index
+    else:
+      exponent, offset = divmod(index - self.sub_bucket_count,
+                                self._half_count)
+      n = (offset + self._half_count) << (exponent + 1)
+    return n * self.unit
+
+  def _Grow(self, size):
+    if len(self._counts) < size:
+      self._counts.extend([0.] * (size - len(self._counts)))
+
+  def _AddStats(self, count, total, m2):
+    if not count:
+      return
+    if self._count:
+      delta = total / count - self._sum / self._count
+      m2 += delta * delta * self._count * count / (self._count + count)
+    self._count += count
+    self._sum += total
+    self._m2 += m2
+
+  def Add(self, value, count=1):
+    """Records 'count' occurrences of 'value'."""
+    index = self._GetIndex(value)
+    self._Grow(index + 1)
+    self._counts[index] += count
+    self._AddStats(count, float(value) * count, 0.0)
+
+  def AddAll(self, value_count_pairs):
+    """Records each (value, count) pair in an iterable."""
+    for value, count in value_count_pairs:
+      self.Add(value, count)
+
+  def Merge(self, other):
+    """Adds the counts of another histogram to this one.
+
+    Args:
+      other: Histogram with the same sub_bucket_count and unit.
+
+    Returns:
+      This histogram.
+    """
+    if (other.sub_bucket_count != self.sub_bucket_count or
+        other.unit != self.unit):
+      raise ValueError('Cannot merge histograms with different buckets.')
+    self._Grow(len(other._counts))
+    counts = self._counts
+    for index, count in enumerate(other._counts):
+      if count:
+        counts[index] += count
+    self._AddStats(other._count, other._sum, other._m2)
+    return self
+
+  @property
+  def total_count(self):
+    return int(sum(self._counts))
+
+  @property
+  def mean(self):
+    """The mean of the recorded values, or None if there are none."""
+    return self._sum / self._count if self._count else None
+
+  @property
+  def stddev(self):
+    """The sample standard deviation of the recorded values.
+
+    0 if a single value was recorded, and None if none were.
+    """
+    if not self._count:
+      return None
+    if self._count == 1:
+      return 0
+    return (self._m2 / (self._count - 1)) ** 0.5
+
+  def Items(self):
+    """Returns a list of (bucket lower bound, count) for non-empty buckets."""
+    return [(self._GetLowerBound(index), int(count))
+            for index, count in enumerate(self._counts) if count]
+
+  def Percentiles(self, percentiles):
+    """Computes several percentiles in one pass over the buckets.
+
+    Each percentile is the lower bound of the first bucket at which the
+    cumulative count reaches that fraction of the total count.
+
+    Args:
+      percentiles: iterable of floats in the interval [0, 100].
+
+    Returns:
+      OrderedDict mapping labels such as 'p50' or 'p99.9' to values, in the
+      order of 'percentiles'.
+
+    Raises:
+      ValueError: if a percentile is out of range or the histogram is empty.
+    """
+    percentiles = list(percentiles)
+    for percentile in percentiles:
+      if percentile < 0 or percentile > 100:
+        raise ValueError('Invalid percentile: {0}'.format(percentile))
+    total = sum(self._counts)
+    if not total:
+      raise ValueError('Cannot compute percentiles of an empty histogram.')
+
+    values = {}
+    targets = sorted(percentiles)
+    target_index = 0
+    cumulative = 0
+    last_index = None
+    for index, count in enumerate(self._counts):
+      if not count:
+        continue
+      last_index = index
+      cumulative += count
+      while (target_index < len(targets) and
+             cumulative >= total * (targets[target_index] * 0.01)):
+        values[targets[target_index]] = self._GetLowerBound(index)
+        target_index += 1
+      if target_index == len(targets):
+        break
+    # Floating point error may leave the highest targets unmet.
+    for percentile in targets[target_index:]:
+      values[percentile] = self._GetLowerBound(last_index)
+
+    return collections.OrderedDict(
+        (_PercentileLabel(p), values[p]) for p in percentiles)
+
+  def Summary(self, percentiles):
+    """Computes percentiles, mean and standard deviation.
+
+    Args:
+      percentiles: iterable of floats in the interval [0, 100].
+
+    Returns:
+      A dict mapping the labels of Percentiles, 'average' and 'stddev' to
+      values, like sample.PercentileCalculator.
+
+    Raises:
+      ValueError: if a percentile is out of range or the histogram is empty.
+    """
+    result = dict(self.Percentiles(percentiles))
+    result['average'] = self.mean
+    result['stddev'] = self.stddev
+    return result
+
+  def ToDict(self):
+    """Returns a JSON-serializable representation of the histogram."""
+    return {'sub_bucket_count': self.sub_bucket_count,
+            'unit': self.unit,
+            'buckets': [[index, int(count)]
+                        for index, count in enumerate(self._counts) if count],
+            'sum': self._sum,
+            'm2': self._m2}
+
+  @classmethod
+  def FromDict(cls, histogram_dict):
+    """Creates a histogram from the output of ToDict."""
+    histogram = cls(histogram_dict['sub_bucket_count'],
+                    histogram_dict['unit'])
+    buckets = histogram_dict['buckets']
+    if buckets:
+      histogram._Grow(buckets[-1][0] + 1)
+    for index, count in buckets:
+      histogram._counts[index] = count
+    if 'sum' in histogram_dict:
+      histogram._count = histogram.total_count
+      histogram._sum = histogram_dict['sum']
+      histogram._m2 = histogram_dict['m2']
+    else:
+      # Histograms serialized without their statistics only know the bucket
+      # that each value fell in.
+      for index, count in buckets:
+        histogram._AddStats(count, histogram._GetLowerBound(index) * count,
+                            0.0)
+    return histogram
+
+  def ToJson(self):
+    """Returns the histogram as a compact JSON string."""
+    return json.dumps(self.ToDict(), separators=(',', ':'), sort_keys=True)
+
+  @classmethod
+  def FromJson(cls, json_string):
+    """Creates a histogram from the output of ToJson."""
+    return cls.FromDict(json.loads(json_string))
+
+  def __eq__(self, other):
+    return (isinstance(other, Histogram) and
+            self.ToDict() == other.ToDict())
+
+  def __ne__(self, other):
+    return not self == other
+
+  def __repr__(self):
+    return '<Histogram total_count={0} sub_bucket_count={1} unit={2}>'.format(
+        self.total_count, self.sub_bucket_count, self.unit)
+
+
+def Merge(histograms):
+  """Returns a new Histogram holding the counts of all of 'histograms'."""
+  histograms = list(histograms)
+  result = Histogram(histograms[0].sub_bucket_count, histograms[0].unit)
+  for histogram in histograms:
+    result.Merge(histogram)
+  return result
@@ -14,6 +14,7 @@
 
 """Utilities for dynamically importing python files."""
 
+import collections
 import importlib
 import pkgutil
 
@@ -38,3 +39,53 @@ def LoadModulesForPath(path, package_prefix=None):
   for _, modname, ispkg in module_iter:
     if not ispkg:
       yield importlib.import_module(modname)
+
+
+def ListModulesForPath(path, package_prefix=None):
+  """Lists the modules on 'path', with prefix 'package_prefix'.
+
+  Unlike LoadModulesForPath, this doesn't import the modules.
+
+  Args:
+    path: Path containing python modules.
+    package_prefix: prefix (e.g., package name) to prefix all modules.
+      'path' and 'package_prefix' will be joined with a '.'.
+  Returns:
+    List of full module names.
+  """
+  prefix = ''
+  if package_prefix:
+    prefix = package_prefix + '.'
+  return [modname for _, modname, ispkg in
+          pkgutil.iter_modules(path, prefix=prefix) if not ispkg]
+
+
+class LazyModuleDict(collections.Mapping):
+  """A read-only mapping from short module names to modules on a path.
+
+  The module names are indexed up front from the directory listing, but each
+  module is only imported the first time it is looked up.
+
+  Example usage:
+    PACKAGES = LazyModuleDict(__path__, __name__)
+    PACKAGES['ycsb']  # Imports <__name__>.ycsb.
+  """
+
+  def __init__(self, path, package_prefix=None):
+    self._module_names = {
+        modname.split('.')[-1]: modname
+        for modname in ListModulesForPath(path, package_prefix)}
+    self._modules = {}
+
+  def __getitem__(self, key):
+    module = self._modules.get(key)
+    if module is None:
+      module = importlib.import_module(self._module_names[key])
+      self._modules[key] = module
+    return module
+
+  def __iter__(self):
+    return iter(self._module_names)
+
+  def __len__(self):
+    return len(self._module_names)
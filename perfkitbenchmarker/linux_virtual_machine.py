@@ -26,6 +26,7 @@ file name minus .py). The framework will take care of all cleanup
 for you.
 """
 
+import collections
 import logging
 import os
 import pipes
@@ -39,6 +40,7 @@ from perfkitbenchmarker import disk
 from perfkitbenchmarker import errors
 from perfkitbenchmarker import flags
 from perfkitbenchmarker import packages
+from perfkitbenchmarker import tracing
 from perfkitbenchmarker import virtual_machine
 from perfkitbenchmarker import vm_util
 
@@ -66,10 +68,307 @@ EXECUTE_COMMAND = 'execute_command.py'
 # then copies the stdout and stderr, exiting with the status of the command run
 # by EXECUTE_COMMAND.
 WAIT_FOR_COMMAND = 'wait_for_command.py'
+# POLL_COMMANDS checks, without blocking, which of several commands started by
+# EXECUTE_COMMAND have completed.
+POLL_COMMANDS = 'poll_commands.py'
+# What POLL_COMMANDS prints in place of the exit status of a command whose
+# status file does not exist.
+POLL_COMMANDS_MISSING = 'missing'
+
+# Prefix of the lines that RemoteCommandBatch writes after each command to
+# separate the commands' output.
+BATCH_END_MARKER = 'PKB_BATCH_END'
+
+# Result of a single command run by RemoteCommandBatch.
+#
+# Attributes:
+#   command: string. The command that was run.
+#   stdout: string. What the command wrote to stdout.
+#   stderr: string. What the command wrote to stderr.
+#   retcode: int. The exit status of the command.
+RemoteCommandResult = collections.namedtuple('RemoteCommandResult', [
+    'command', 'stdout', 'stderr', 'retcode'])
 
 flags.DEFINE_bool('setup_remote_firewall', False,
                   'Whether PKB should configure the firewall of each remote'
                   'VM to make sure it accepts all internal connections.')
+flags.DEFINE_bool('ssh_reuse_connections', True,
+                  'Whether PKB should keep a persistent, multiplexed SSH '
+                  'connection (ControlMaster) open to each Linux VM and run '
+                  'remote commands and copies over it. Ignored when PKB is '
+                  'running on Windows.')
+flags.DEFINE_integer('ssh_control_persist', 1800,
+                     'Number of seconds an idle multiplexed SSH master '
+                     'connection stays open. Only applicable when '
+                     '--ssh_reuse_connections is set.',
+                     lower_bound=1)
+
+
+class SshConnectionPool(object):
+  """Shares a single SSH master connection among all sessions to a VM.
+
+  The first successful connection to the VM starts a background ssh master
+  process (see ControlMaster in ssh_config(5)) that listens on a Unix socket in
+  the run's temporary directory. Later ssh and scp invocations pass the socket
+  via ControlPath and skip the TCP and key exchange handshakes entirely. The
+  master exits after --ssh_control_persist idle seconds, or when Close is
+  called. If the master fails to start, it is not retried, and every session
+  connects directly.
+
+  Attributes:
+    control_path: string. Path of the master connection's Unix socket.
+    reused_connections: int. Number of sessions run over the master.
+    new_connections: int. Number of sessions that connected directly.
+  """
+
+  def __init__(self, vm):
+    """Initializes the pool.
+
+    Args:
+      vm: BaseLinuxMixin. The VM to connect to.
+    """
+    self._vm = vm
+    self._lock = threading.Lock()
+    self._opening = False
+    self._failed = False
+    self.control_path = os.path.join(vm_util.GetTempDir(), 'ssh-%s' % vm.name)
+    self.reused_connections = 0
+    self.new_connections = 0
+
+  @staticmethod
+  def IsEnabled():
+    """Returns whether SSH connections should be multiplexed."""
+    return FLAGS.ssh_reuse_connections and not vm_util.RunningOnWindows()
+
+  def _IsOpen(self):
+    return os.path.exists(self.control_path)
+
+  def GetSshOptions(self):
+    """Returns the ssh/scp options for the next session to the VM.
+
+    If the master connection is up, the options route the session through it.
+    Otherwise they are empty and the session connects directly.
+    """
+    with self._lock:
+      if self._IsOpen():
+        self.reused_connections += 1
+        return ['-o', 'ControlMaster=no',
+                '-o', 'ControlPath=%s' % self.control_path]
+      self.new_connections += 1
+      return []
+
+  def Open(self):
+    """Starts the master connection if it is not already running.
+
+    This should be called once the VM is known to accept SSH connections.
+    Does nothing once starting the master has failed.
+    """
+    with self._lock:
+      if self._opening or self._failed or self._IsOpen():
+        return
+      self._opening = True
+    try:
+      vm = self._vm
+      master_cmd = ['ssh', '-N', '-p', str(vm.ssh_port),
+                    '%s@%s' % (vm.user_name, vm.ip_address),
+                    '-o', 'ControlMaster=yes',
+                    '-o', 'ControlPath=%s' % self.control_path,
+                    '-o', 'ControlPersist=%d' % FLAGS.ssh_control_persist]
+      master_cmd.extend(vm_util.GetSshOptions(vm.ssh_private_key))
+      # The master daemonizes once it has authenticated, but keeps stderr
+      # open, so its output has to go to a file rather than a pipe.
+      log_path = self.control_path + '.log'
+      process = vm_util.IssueBackgroundCommand(master_cmd, os.devnull,
+                                               log_path)
+      if process.wait():
+        self._failed = True
+        logging.warning('Could not open a shared SSH connection to %s. See '
+                        '%s. Falling back to one connection per command.',
+                        vm, log_path)
+    finally:
+      with self._lock:
+        self._opening = False
+
+  def Close(self):
+    """Stops the master connection and logs how often it was reused."""
+    if self._IsOpen():
+      vm = self._vm
+      vm_util.IssueCommand(
+          ['ssh', '-O', 'exit', '-o', 'ControlPath=%s' % self.control_path,
+           '%s@%s' % (vm.user_name, vm.ip_address)], suppress_warning=True)
+    total = self.reused_connections + self.new_connections
+    if total:
+      logging.info('SSH connection pool for %s: %d of %d sessions (%.1f%%) '
+                   'reused the shared connection.', self._vm,
+                   self.reused_connections, total,
+                   100.0 * self.reused_connections / total)
+
+
+def _RunCommandBatch(run_command, commands, should_log, ignore_failure,
+                     suppress_warning, timeout):
+  """Runs a list of commands as a single script, stopping at the first failure.
+
+  Args:
+    run_command: function. RemoteCommand or RemoteHostCommand of a VM.
+    commands: list of strings. Valid bash commands.
+    should_log: See RemoteCommand.
+    ignore_failure: See RemoteCommandBatch.
+    suppress_warning: See RemoteCommand.
+    timeout: See RemoteCommand. Applies to the batch as a whole.
+
+  Returns:
+    list of RemoteCommandResults.
+
+  Raises:
+    RemoteCommandError: See RemoteCommandBatch.
+  """
+  if not commands:
+    return []
+  marker = '%s_%s' % (BATCH_END_MARKER, uuid.uuid4().hex)
+  script = []
+  for command in commands:
+    # Each command runs in a subshell so that, as with separate calls to
+    # RemoteCommand, it can't change the directory or environment of the next.
+    script.extend([
+        '(\n%s\n)' % command,
+        '__pkb_rc=$?',
+        "printf '\\n%s %%d\\n' $__pkb_rc" % marker,
+        "printf '\\n%s\\n' >&2" % marker,
+        '[ $__pkb_rc -eq 0 ] || exit $__pkb_rc'])
+  stdout, stderr = run_command('\n'.join(script), should_log=should_log,
+                               ignore_failure=True,
+                               suppress_warning=suppress_warning,
+                               timeout=timeout)
+
+  stdout_parts = re.split(r'\n%s (\d+)\n' % marker, stdout)
+  stderr_parts = re.split(r'\n%s\n' % marker, stderr)
+  results = []
+  for i in xrange(len(stdout_parts) // 2):
+    results.append(RemoteCommandResult(
+        commands[i], stdout_parts[2 * i],
+        stderr_parts[i] if i < len(stderr_parts) else '',
+        int(stdout_parts[2 * i + 1])))
+
+  if results and results[-1].retcode:
+    error_text = ('Got non-zero return code (%s) executing %s\n'
+                  'STDOUT: %sSTDERR: %s' % (
+                      results[-1].retcode, results[-1].command,
+                      results[-1].stdout, results[-1].stderr))
+  elif len(results) < len(commands):
+    error_text = ('Command batch stopped after %s of %s commands.\n'
+                  'STDOUT: %sSTDERR: %s' % (
+                      len(results), len(commands), stdout_parts[-1],
+                      stderr_parts[-1]))
+  else:
+    return results
+  if not ignore_failure:
+    raise errors.VirtualMachine.RemoteCommandError(error_text)
+  return results
+
+
+class RobustCommandHandle(object):
+  """A command started on a VM by RobustRemoteCommandAsync.
+
+  Attributes:
+    vm: The BaseLinuxMixin that the command runs on.
+    command: string. The command.
+    stdout_file: string. Path on the VM that receives the command's stdout.
+    stderr_file: string. Path on the VM that receives the command's stderr.
+    status_file: string. Path on the VM that receives the command's exit
+        status. It is locked while the command runs.
+    wrapper_log: string. Path on the VM that receives the output of the
+        EXECUTE_COMMAND wrapper script itself.
+    stdout_consumer: callable or None. Receives each line of the command's
+        stdout, either from ReadNewOutput while the command runs or from Wait.
+    stderr_consumer: callable or None. Like stdout_consumer, but for stderr.
+  """
+
+  def __init__(self, vm, command, file_base, stdout_consumer=None,
+               stderr_consumer=None):
+    self.vm = vm
+    self.command = command
+    self.stdout_file = file_base + '.stdout'
+    self.stderr_file = file_base + '.stderr'
+    self.status_file = file_base + '.status'
+    self.wrapper_log = file_base + '.log'
+    self.stdout_consumer = stdout_consumer
+    self.stderr_consumer = stderr_consumer
+    # Number of bytes of each output file already passed to its consumer.
+    self._stdout_offset = 0
+    self._stderr_offset = 0
+
+  def _ReadNewLines(self, path, offset, consumer):
+    """Passes complete lines of 'path' after byte 'offset' to 'consumer'.
+
+    Returns:
+      The offset of the first byte that has not been consumed. The output is
+      assumed to be ASCII, so that characters and bytes line up.
+    """
+    stdout, _ = self.vm.RemoteCommand(
+        'tail -c +%d %s' % (offset + 1, path), should_log=False,
+        ignore_failure=True, suppress_warning=True)
+    end = stdout.rfind('\n') + 1
+    for line in stdout[:end].splitlines(True):
+      consumer(line)
+    return offset + end
+
+  def ReadNewOutput(self):
+    """Passes output written since the last call to the handle's consumers.
+
+    Only complete lines are passed on. Output consumed here is not passed to
+    the consumers again by Wait.
+    """
+    try:
+      if self.stdout_consumer:
+        self._stdout_offset = self._ReadNewLines(
+            self.stdout_file, self._stdout_offset, self.stdout_consumer)
+      if self.stderr_consumer:
+        self._stderr_offset = self._ReadNewLines(
+            self.stderr_file, self._stderr_offset, self.stderr_consumer)
+    except errors.VirtualMachine.RemoteCommandError:
+      logging.warning('Could not read output of "%s" on %s. Will try again.',
+                      self.command, self.vm, exc_info=True)
+
+  def Wait(self, should_log=False):
+    """Waits for the command to complete.
+
+    Holds an SSH session open until the command has completed, so this should
+    only be called directly for short commands, or once the command is known
+    to have completed.
+
+    Args:
+      should_log: A boolean indicating whether the command's output should be
+          logged at the info level.
+
+    Returns:
+      A tuple of stdout and stderr from running the command.
+
+    Raises:
+      RemoteCommandError: If the command exited with a non-zero status.
+    """
+    wait_path = os.path.join(vm_util.VM_TMP_DIR,
+                             os.path.basename(WAIT_FOR_COMMAND))
+    wait_command = ['python', wait_path, '--stdout', self.stdout_file,
+                    '--stderr', self.stderr_file,
+                    '--status', self.status_file,
+                    '--delete']
+    if self._stdout_offset:
+      wait_command.extend(('--stdout-offset', str(self._stdout_offset)))
+    if self._stderr_offset:
+      wait_command.extend(('--stderr-offset', str(self._stderr_offset)))
+    try:
+      return self.vm.RemoteCommand(' '.join(wait_command),
+                                   should_log=should_log,
+                                   stdout_consumer=self.stdout_consumer,
+                                   stderr_consumer=self.stderr_consumer)
+    except:
+      # In case the error was with the wrapper script itself, print the log.
+      stdout, _ = self.vm.RemoteCommand('cat %s' % self.wrapper_log,
+                                        should_log=False)
+      if stdout.strip():
+        logging.warn('Exception during RobustRemoteCommand. '
+                     'Wrapper script log:\n%s', stdout)
+      raise
 
 
 class BaseLinuxMixin(virtual_machine.BaseOsMixin):
@@ -88,6 +387,32 @@ class BaseLinuxMixin(virtual_machine.BaseOsMixin):
 
     self._remote_command_script_upload_lock = threading.Lock()
     self._has_remote_command_script = False
+    self._ssh_connection_pool = None
+    # Package managers hold a lock on their database, so packages installed
+    # concurrently must take turns calling them.
+    self._package_manager_lock = threading.Lock()
+
+  @property
+  def ssh_connection_pool(self):
+    """The VM's SshConnectionPool, or None if connections are not shared."""
+    if self._ssh_connection_pool is None and SshConnectionPool.IsEnabled():
+      self._ssh_connection_pool = SshConnectionPool(self)
+    return self._ssh_connection_pool
+
+  def _GetSshMultiplexingOptions(self):
+    """Returns ssh/scp options for sharing the VM's master connection."""
+    pool = self.ssh_connection_pool
+    return pool.GetSshOptions() if pool else []
+
+  def _OnSshSessionSucceeded(self, multiplexed):
+    """Opens the shared connection after the VM first accepts a session."""
+    if not multiplexed and self.ssh_connection_pool:
+      self.ssh_connection_pool.Open()
+
+  def CloseRemoteConnections(self):
+    """Closes the shared SSH connection to the VM, if one is open."""
+    if self._ssh_connection_pool:
+      self._ssh_connection_pool.Close()
 
   def _PushRobustCommandScripts(self):
     """Pushes the scripts required by RobustRemoteCommand to this VM.
@@ -96,7 +421,7 @@ class BaseLinuxMixin(virtual_machine.BaseOsMixin):
     """
     with self._remote_command_script_upload_lock:
       if not self._has_remote_command_script:
-        for f in (EXECUTE_COMMAND, WAIT_FOR_COMMAND):
+        for f in (EXECUTE_COMMAND, WAIT_FOR_COMMAND, POLL_COMMANDS):
           self.PushDataFile(f, os.path.join(vm_util.VM_TMP_DIR,
                                             os.path.basename(f)))
         self._has_remote_command_script = True
@@ -117,54 +442,92 @@ class BaseLinuxMixin(virtual_machine.BaseOsMixin):
     If should_log is True, log the command's output at the info
     level. If False, log the command's output at the debug level.
     """
+    return self.RobustRemoteCommandAsync(command).Wait(should_log=should_log)
+
+  def RobustRemoteCommandAsync(self, command, stdout_consumer=None,
+                               stderr_consumer=None):
+    """Starts a command on the VM as RobustRemoteCommand does, but doesn't wait.
+
+    Args:
+      command: A valid bash command, or a list of strings to be joined into
+          one.
+      stdout_consumer: A callable that receives each line of the command's
+          stdout. A vm_util.RobustCommandMultiplexer passes it lines while the
+          command runs. The handle's Wait method then returns only the tail of
+          stdout.
+      stderr_consumer: Like stdout_consumer, but for stderr.
+
+    Returns:
+      A RobustCommandHandle. Its Wait method returns what RobustRemoteCommand
+      would have. To wait on many handles without holding an SSH session open
+      for each one, use a vm_util.RobustCommandMultiplexer.
+    """
     self._PushRobustCommandScripts()
 
     execute_path = os.path.join(vm_util.VM_TMP_DIR,
                                 os.path.basename(EXECUTE_COMMAND))
-    wait_path = os.path.join(vm_util.VM_TMP_DIR,
-                             os.path.basename(WAIT_FOR_COMMAND))
 
     uid = uuid.uuid4()
     file_base = os.path.join(vm_util.VM_TMP_DIR, 'cmd%s' % uid)
-    wrapper_log = file_base + '.log'
-    stdout_file = file_base + '.stdout'
-    stderr_file = file_base + '.stderr'
-    status_file = file_base + '.status'
 
     if not isinstance(command, basestring):
       command = ' '.join(command)
+    handle = RobustCommandHandle(self, command, file_base,
+                                 stdout_consumer=stdout_consumer,
+                                 stderr_consumer=stderr_consumer)
 
     start_command = ['nohup', 'python', execute_path,
-                     '--stdout', stdout_file,
-                     '--stderr', stderr_file,
-                     '--status', status_file,
+                     '--stdout', handle.stdout_file,
+                     '--stderr', handle.stderr_file,
+                     '--status', handle.status_file,
                      '--command', pipes.quote(command)]
 
     start_command = '%s 1> %s 2>&1 &' % (' '.join(start_command),
-                                         wrapper_log)
+                                         handle.wrapper_log)
     self.RemoteCommand(start_command)
+    return handle
 
-    wait_command = ['python', wait_path, '--stdout', stdout_file,
-                    '--stderr', stderr_file,
-                    '--status', status_file,
-                    '--delete']
-    try:
-      return self.RemoteCommand(' '.join(wait_command), should_log=should_log)
-    except:
-      # In case the error was with the wrapper script itself, print the log.
-      stdout, _ = self.RemoteCommand('cat %s' % wrapper_log, should_log=False)
-      if stdout.strip():
-        logging.warn('Exception during RobustRemoteCommand. '
-                     'Wrapper script log:\n%s', stdout)
-      raise
+  def PollRobustCommands(self, handles):
+    """Checks which commands started by RobustRemoteCommandAsync have ended.
+
+    All of the handles are checked with a single, non-blocking remote command.
+
+    Args:
+      handles: list of RobustCommandHandles of commands started on this VM.
+
+    Returns:
+      dict mapping the status file of each command that is no longer running
+      to its exit status as a string. The string is empty if the wrapper
+      script was interrupted or has not started the command yet. The status
+      is None if the status file does not exist, because the wrapper script
+      has not created it yet or never started.
+    """
+    poll_path = os.path.join(vm_util.VM_TMP_DIR,
+                             os.path.basename(POLL_COMMANDS))
+    stdout, _ = self.RemoteCommand(
+        ' '.join(['python', poll_path] + [h.status_file for h in handles]))
+    statuses = {}
+    for line in stdout.splitlines():
+      status_file, _, status = line.partition(' ')
+      statuses[status_file] = (None if status == POLL_COMMANDS_MISSING
+                               else status)
+    return statuses
 
   def SetupRemoteFirewall(self):
     """Sets up IP table configurations on the VM."""
-    self.RemoteHostCommand('sudo iptables -A INPUT -j ACCEPT')
-    self.RemoteHostCommand('sudo iptables -A OUTPUT -j ACCEPT')
+    self.RemoteHostCommandBatch(['sudo iptables -A INPUT -j ACCEPT',
+                                 'sudo iptables -A OUTPUT -j ACCEPT'])
 
   def SetupProxy(self):
     """Sets up proxy configuration variables for the cloud environment."""
+    self.RemoteCommandBatch(self._GetProxySetupCommands())
+
+  def _GetProxySetupCommands(self):
+    """Returns the commands that SetupProxy runs.
+
+    Specific Linux flavors should extend this to configure their package
+    managers.
+    """
     env_file = "/etc/environment"
     commands = []
 
@@ -180,16 +543,15 @@ class BaseLinuxMixin(virtual_machine.BaseOsMixin):
       commands.append("echo 'ftp_proxy=%s' | sudo tee -a %s" % (
           FLAGS.ftp_proxy, env_file))
 
-    if commands:
-      self.RemoteCommand(";".join(commands))
+    return commands
 
   def SetupPackageManager(self):
     """Specific Linux flavors should override this."""
     pass
 
   def PrepareVMEnvironment(self):
-    self.SetupProxy()
-    self.RemoteCommand('mkdir -p %s' % vm_util.VM_TMP_DIR)
+    self.RemoteCommandBatch(
+        self._GetProxySetupCommands() + ['mkdir -p %s' % vm_util.VM_TMP_DIR])
     if FLAGS.setup_remote_firewall:
       self.SetupRemoteFirewall()
     if self.is_static and self.install_packages:
@@ -215,6 +577,85 @@ class BaseLinuxMixin(virtual_machine.BaseOsMixin):
     """Restores the currently installed packages to those snapshotted."""
     pass
 
+  def ResetPackages(self):
+    """Resets the VM's packages so that the VM can be reused.
+
+    Uninstalls all PerfKit packages, restores the snapshotted system packages
+    and empties the temp directory, then takes a new snapshot.
+    """
+    for package_name in self._installed_packages:
+      self.Uninstall(package_name)
+    self._installed_packages.clear()
+    self.package_install_times.clear()
+    self.RestorePackages()
+    self.RemoteCommand('rm -rf {0} && mkdir -p {0}'.format(vm_util.VM_TMP_DIR))
+    self.SnapshotPackages()
+
+  def Install(self, package_name):
+    """Installs a PerfKit package and the packages it depends on on the VM.
+
+    Packages are installed level by level from their dependency graph (see
+    packages.GetInstallLevels).
+    """
+    if ((self.is_static and not self.install_packages) or
+        not FLAGS.install_packages):
+      return
+    if package_name in self._installed_packages:
+      return
+    with tracing.Span('Install', tracing.INSTALL, vm=self,
+                      package=package_name):
+      for level in packages.GetInstallLevels([package_name],
+                                             self._installed_packages):
+        self._InstallPackageLevel(level)
+
+  def _InstallPackageLevel(self, package_names):
+    """Installs PerfKit packages whose dependencies are all installed.
+
+    The system packages of the whole level are installed by one
+    InstallPackages call, then the packages' install functions run
+    concurrently. Each package's install time is measured from the start of
+    the level, since it includes the shared InstallPackages call.
+
+    Args:
+      package_names: list of PerfKit package names.
+    """
+    start_time = time.time()
+    system_packages = [self._GetSystemPackages(packages.PACKAGES[name])
+                       for name in package_names]
+    system_packages = ' '.join(p for p in system_packages if p)
+    if system_packages:
+      self.InstallPackages(system_packages)
+
+    def InstallPackage(package_name):
+      install = self._GetInstallFunction(packages.PACKAGES[package_name])
+      if install:
+        install(self)
+      self._installed_packages.add(package_name)
+      install_time = time.time() - start_time
+      self.package_install_times[package_name] = install_time
+      logging.info('Installed package %s on %s in %.1f seconds.',
+                   package_name, self, install_time)
+
+    if len(package_names) == 1:
+      InstallPackage(package_names[0])
+    else:
+      vm_util.RunThreaded(InstallPackage, package_names)
+
+  def _GetSystemPackages(self, package):
+    """Returns the system packages a PerfKit package module declares.
+
+    Args:
+      package: PerfKit package module.
+
+    Returns:
+      string. Space separated system package names, or None.
+    """
+    return None
+
+  def _GetInstallFunction(self, package):
+    """Returns the install function of a PerfKit package module, or None."""
+    return None
+
   def PackageCleanup(self):
     """Cleans up all installed packages.
 
@@ -253,12 +694,16 @@ class BaseLinuxMixin(virtual_machine.BaseOsMixin):
 
   def MountDisk(self, device_path, mount_path):
     """Mounts a formatted disk in the VM."""
-    mnt_cmd = ('sudo mkdir -p {1};sudo mount {0} {1};'
-               'sudo chown -R $USER:$USER {1};').format(device_path, mount_path)
-    self.RemoteHostCommand(mnt_cmd)
+    self.RemoteHostCommandBatch([
+        'sudo mkdir -p {0}'.format(mount_path),
+        'sudo mount {0} {1}'.format(device_path, mount_path),
+        'sudo chown -R $USER:$USER {0}'.format(mount_path)])
 
   def RemoteCopy(self, file_path, remote_path='', copy_to=True):
-    self.RemoteHostCopy(file_path, remote_path, copy_to)
+    with tracing.Span('RemoteCopy', tracing.REMOTE_COMMAND, vm=self,
+                      file_path=file_path, remote_path=remote_path,
+                      copy_to=copy_to):
+      self.RemoteHostCopy(file_path, remote_path, copy_to)
 
   def RemoteHostCopy(self, file_path, remote_path='', copy_to=True):
     """Copies a file to or from the VM.
@@ -282,6 +727,8 @@ class BaseLinuxMixin(virtual_machine.BaseOsMixin):
         self.user_name, self.ip_address, remote_path)
     scp_cmd = ['scp', '-P', str(self.ssh_port), '-pr']
     scp_cmd.extend(vm_util.GetSshOptions(self.ssh_private_key))
+    multiplexing_options = self._GetSshMultiplexingOptions()
+    scp_cmd.extend(multiplexing_options)
     if copy_to:
       scp_cmd.extend([file_path, remote_location])
     else:
@@ -295,19 +742,23 @@ class BaseLinuxMixin(virtual_machine.BaseOsMixin):
                     'STDOUT: %sSTDERR: %s' %
                     (retcode, full_cmd, stdout, stderr))
       raise errors.VirtualMachine.RemoteCommandError(error_text)
+    self._OnSshSessionSucceeded(bool(multiplexing_options))
 
   def RemoteCommand(self, command,
                     should_log=False, retries=SSH_RETRIES,
                     ignore_failure=False, login_shell=False,
-                    suppress_warning=False, timeout=None):
+                    suppress_warning=False, timeout=None,
+                    stdout_consumer=None, stderr_consumer=None):
     return self.RemoteHostCommand(command, should_log, retries,
                                   ignore_failure, login_shell,
-                                  suppress_warning, timeout)
+                                  suppress_warning, timeout,
+                                  stdout_consumer, stderr_consumer)
 
   def RemoteHostCommand(self, command,
                         should_log=False, retries=SSH_RETRIES,
                         ignore_failure=False, login_shell=False,
-                        suppress_warning=False, timeout=None):
+                        suppress_warning=False, timeout=None,
+                        stdout_consumer=None, stderr_consumer=None):
     """Runs a command on the VM.
 
     This is guaranteed to run on the host VM, whereas RemoteCommand might run
@@ -324,6 +775,12 @@ class BaseLinuxMixin(virtual_machine.BaseOsMixin):
       login_shell: Run command in a login shell.
       suppress_warning: Suppress the result logging from IssueCommand when the
           return code is non-zero.
+      timeout: The time to wait in seconds for the command before exiting.
+          None means no timeout.
+      stdout_consumer: A callable that receives each line of the command's
+          stdout as it arrives. See vm_util.IssueCommand. If set, only the
+          tail of stdout is returned.
+      stderr_consumer: Like stdout_consumer, but for stderr.
 
     Returns:
       A tuple of stdout and stderr from running the command.
@@ -339,6 +796,8 @@ class BaseLinuxMixin(virtual_machine.BaseOsMixin):
     user_host = '%s@%s' % (self.user_name, self.ip_address)
     ssh_cmd = ['ssh', '-A', '-p', str(self.ssh_port), user_host]
     ssh_cmd.extend(vm_util.GetSshOptions(self.ssh_private_key))
+    multiplexing_options = self._GetSshMultiplexingOptions()
+    ssh_cmd.extend(multiplexing_options)
     try:
       if login_shell:
         ssh_cmd.extend(['-t', '-t', 'bash -l -c "%s"' % command])
@@ -346,13 +805,17 @@ class BaseLinuxMixin(virtual_machine.BaseOsMixin):
       else:
         ssh_cmd.append(command)
 
-      for _ in range(retries):
-        stdout, stderr, retcode = vm_util.IssueCommand(
-            ssh_cmd, force_info_log=should_log,
-            suppress_warning=suppress_warning,
-            timeout=timeout)
-        if retcode != 255:  # Retry on 255 because this indicates an SSH failure
-          break
+      with tracing.Span('RemoteHostCommand', tracing.REMOTE_COMMAND, vm=self,
+                        command=command):
+        for _ in range(retries):
+          stdout, stderr, retcode = vm_util.IssueCommand(
+              ssh_cmd, force_info_log=should_log,
+              suppress_warning=suppress_warning,
+              timeout=timeout, stdout_consumer=stdout_consumer,
+              stderr_consumer=stderr_consumer)
+          # Retry on 255 because this indicates an SSH failure.
+          if retcode != 255:
+            break
     finally:
       if login_shell:
         self._pseudo_tty_lock.release()
@@ -365,8 +828,52 @@ class BaseLinuxMixin(virtual_machine.BaseOsMixin):
       if not ignore_failure:
         raise errors.VirtualMachine.RemoteCommandError(error_text)
 
+    if retcode != 255:
+      self._OnSshSessionSucceeded(bool(multiplexing_options))
     return stdout, stderr
 
+  def RemoteCommandBatch(self, commands, should_log=False,
+                         ignore_failure=False, suppress_warning=False,
+                         timeout=None):
+    """Runs several commands on the VM in a single remote session.
+
+    The commands run in order, each in its own subshell, as if each had been
+    passed to RemoteCommand, but the whole batch needs only one SSH round
+    trip. The batch stops at the first command that exits with a non-zero
+    status.
+
+    Args:
+      commands: A list of valid bash commands.
+      should_log: A boolean indicating whether the batch's output should be
+          logged at the info level.
+      ignore_failure: If True, a failing command ends the batch without
+          raising an exception.
+      suppress_warning: Suppress the result logging from IssueCommand when the
+          return code is non-zero.
+      timeout: The time to wait in seconds for the whole batch before exiting.
+          None means no timeout.
+
+    Returns:
+      A list of RemoteCommandResults, one for each command that was run. If a
+      command failed, it is the last element.
+
+    Raises:
+      RemoteCommandError: If a command failed, or the batch could not be run,
+          and ignore_failure is False.
+    """
+    return _RunCommandBatch(self.RemoteCommand, commands, should_log,
+                            ignore_failure, suppress_warning, timeout)
+
+  def RemoteHostCommandBatch(self, commands, should_log=False,
+                             ignore_failure=False, suppress_warning=False,
+                             timeout=None):
+    """Runs several commands on the host VM in a single remote session.
+
+    This is to RemoteCommandBatch what RemoteHostCommand is to RemoteCommand.
+    """
+    return _RunCommandBatch(self.RemoteHostCommand, commands, should_log,
+                            ignore_failure, suppress_warning, timeout)
+
   def MoveFile(self, target, source_path, remote_path=''):
     self.MoveHostFile(target, source_path, remote_path)
 
@@ -588,21 +1095,21 @@ class RhelMixin(BaseLinuxMixin):
 
   def InstallPackages(self, packages):
     """Installs packages using the yum package manager."""
-    self.RemoteCommand('sudo yum install -y %s' % packages)
+    with self._package_manager_lock:
+      self.RemoteCommand('sudo yum install -y %s' % packages)
 
   def InstallPackageGroup(self, package_group):
     """Installs a 'package group' using the yum package manager."""
-    self.RemoteCommand('sudo yum groupinstall -y "%s"' % package_group)
+    with self._package_manager_lock:
+      self.RemoteCommand('sudo yum groupinstall -y "%s"' % package_group)
 
-  def Install(self, package_name):
-    """Installs a PerfKit package on the VM."""
-    if ((self.is_static and not self.install_packages) or
-        not FLAGS.install_packages):
-      return
-    if package_name not in self._installed_packages:
-      package = packages.PACKAGES[package_name]
-      package.YumInstall(self)
-      self._installed_packages.add(package_name)
+  def _GetSystemPackages(self, package):
+    """Returns the system packages a PerfKit package module declares."""
+    return getattr(package, 'YUM_PACKAGES', None)
+
+  def _GetInstallFunction(self, package):
+    """Returns the install function of a PerfKit package module, or None."""
+    return getattr(package, 'YumInstall', None)
 
   def Uninstall(self, package_name):
     """Uninstalls a PerfKit package on the VM."""
@@ -630,15 +1137,17 @@ class RhelMixin(BaseLinuxMixin):
     package = packages.PACKAGES[package_name]
     return package.YumGetServiceName(self)
 
-  def SetupProxy(self):
-    """Sets up proxy configuration variables for the cloud environment."""
-    super(RhelMixin, self).SetupProxy()
+  def _GetProxySetupCommands(self):
+    """Returns the commands that SetupProxy runs."""
+    commands = super(RhelMixin, self)._GetProxySetupCommands()
     yum_proxy_file = "/etc/yum.conf"
 
     if FLAGS.http_proxy:
-      self.RemoteCommand("echo -e 'proxy= \"%s\";' | sudo tee -a %s" % (
+      commands.append("echo -e 'proxy= \"%s\";' | sudo tee -a %s" % (
           FLAGS.http_proxy, yum_proxy_file))
 
+    return commands
+
 
 class DebianMixin(BaseLinuxMixin):
   """Class holding Debian specific VM methods and attributes."""
@@ -669,39 +1178,38 @@ class DebianMixin(BaseLinuxMixin):
 
   def RestorePackages(self):
     """Restores the currently installed packages to those snapshotted."""
-    self.RemoteCommand('sudo dpkg --clear-selections')
-    self.RemoteCommand(
-        'sudo dpkg --set-selections < %s/dpkg_selections' % vm_util.VM_TMP_DIR)
-    self.RemoteCommand('sudo DEBIAN_FRONTEND=\'noninteractive\' '
-                       'apt-get --purge -y dselect-upgrade')
+    self.RemoteCommandBatch([
+        'sudo dpkg --clear-selections',
+        'sudo dpkg --set-selections < %s/dpkg_selections' % vm_util.VM_TMP_DIR,
+        'sudo DEBIAN_FRONTEND=\'noninteractive\' '
+        'apt-get --purge -y dselect-upgrade'])
 
   @vm_util.Retry()
   def InstallPackages(self, packages):
     """Installs packages using the apt package manager."""
-    try:
-      install_command = ('sudo DEBIAN_FRONTEND=\'noninteractive\' '
-                         '/usr/bin/apt-get -y install %s' % (packages))
-      self.RemoteCommand(install_command)
-    except errors.VirtualMachine.RemoteCommandError as e:
-      # TODO(user): Remove code below after Azure fix their package repository,
-      # or add code to recover the sources.list
-      self.RemoteCommand(
-          'sudo sed -i.bk "s/azure.archive.ubuntu.com/archive.ubuntu.com/g" '
-          '/etc/apt/sources.list')
-      logging.info('Installing "%s" failed on %s. This may be transient. '
-                   'Updating package list.', packages, self)
-      self.AptUpdate()
-      raise e
+    with self._package_manager_lock:
+      try:
+        install_command = ('sudo DEBIAN_FRONTEND=\'noninteractive\' '
+                           '/usr/bin/apt-get -y install %s' % (packages))
+        self.RemoteCommand(install_command)
+      except errors.VirtualMachine.RemoteCommandError as e:
+        # TODO(user): Remove code below after Azure fix their package
+        # repository, or add code to recover the sources.list
+        self.RemoteCommand(
+            'sudo sed -i.bk "s/azure.archive.ubuntu.com/archive.ubuntu.com/g" '
+            '/etc/apt/sources.list')
+        logging.info('Installing "%s" failed on %s. This may be transient. '
+                     'Updating package list.', packages, self)
+        self.AptUpdate()
+        raise e
 
-  def Install(self, package_name):
-    """Installs a PerfKit package on the VM."""
-    if ((self.is_static and not self.install_packages) or
-        not FLAGS.install_packages):
-      return
-    if package_name not in self._installed_packages:
-      package = packages.PACKAGES[package_name]
-      package.AptInstall(self)
-      self._installed_packages.add(package_name)
+  def _GetSystemPackages(self, package):
+    """Returns the system packages a PerfKit package module declares."""
+    return getattr(package, 'APT_PACKAGES', None)
+
+  def _GetInstallFunction(self, package):
+    """Returns the install function of a PerfKit package module, or None."""
+    return getattr(package, 'AptInstall', None)
 
   def Uninstall(self, package_name):
     """Uninstalls a PerfKit package on the VM."""
@@ -729,11 +1237,10 @@ class DebianMixin(BaseLinuxMixin):
     package = packages.PACKAGES[package_name]
     return package.AptGetServiceName(self)
 
-  def SetupProxy(self):
-    """Sets up proxy configuration variables for the cloud environment."""
-    super(DebianMixin, self).SetupProxy()
+  def _GetProxySetupCommands(self):
+    """Returns the commands that SetupProxy runs."""
+    commands = super(DebianMixin, self)._GetProxySetupCommands()
     apt_proxy_file = "/etc/apt/apt.conf"
-    commands = []
 
     if FLAGS.http_proxy:
       commands.append("echo -e 'Acquire::http::proxy \"%s\";' |"
@@ -743,8 +1250,7 @@ class DebianMixin(BaseLinuxMixin):
       commands.append("echo -e 'Acquire::https::proxy \"%s\";' |"
                       'sudo tee -a %s' % (FLAGS.https_proxy, apt_proxy_file))
 
-    if commands:
-      self.RemoteCommand(";".join(commands))
+    return commands
 
 
 class ContainerizedDebianMixin(DebianMixin):
@@ -796,7 +1302,8 @@ class ContainerizedDebianMixin(DebianMixin):
   def RemoteCommand(self, command,
                     should_log=False, retries=SSH_RETRIES,
                     ignore_failure=False, login_shell=False,
-                    suppress_warning=False, timeout=None):
+                    suppress_warning=False, timeout=None,
+                    stdout_consumer=None, stderr_consumer=None):
     """Runs a command inside the container.
 
     Args:
@@ -810,6 +1317,11 @@ class ContainerizedDebianMixin(DebianMixin):
       login_shell: Run command in a login shell.
       suppress_warning: Suppress the result logging from IssueCommand when the
           return code is non-zero.
+      timeout: The time to wait in seconds for the command before exiting.
+          None means no timeout.
+      stdout_consumer: A callable that receives each line of stdout as it
+          arrives. See RemoteHostCommand.
+      stderr_consumer: Like stdout_consumer, but for stderr.
 
     Returns:
       A tuple of stdout and stderr from running the command.
@@ -820,7 +1332,8 @@ class ContainerizedDebianMixin(DebianMixin):
     logging.info('Docker running: %s' % command)
     command = "sudo docker exec %s bash -c '%s'" % (self.docker_id, command)
     return self.RemoteHostCommand(command, should_log, retries,
-                                  ignore_failure, login_shell, suppress_warning)
+                                  ignore_failure, login_shell, suppress_warning,
+                                  timeout, stdout_consumer, stderr_consumer)
 
   def ContainerCopy(self, file_name, container_path='', copy_to=True):
     """Copies a file to and from container_path to the host's vm_util.VM_TMP_DIR.
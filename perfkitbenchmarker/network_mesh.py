@@ -0,0 +1,215 @@
+# Copyright 2015 PerfKitBenchmarker Authors. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Schedules network flows between pairs of VMs in a cluster.
+
+A traffic pattern picks the (client, server) pairs of VMs that exchange
+traffic:
+
+  all_pairs: every VM to every other VM.
+  ring: every VM to the next one.
+  permutation: every VM to another VM picked at random, each VM receiving
+      from exactly one other.
+  bisection: the VMs are split into two random halves, and every VM of one
+      half exchanges traffic with a VM of the other half, in both directions.
+
+The pairs are scheduled in rounds in which no VM is the client of more than
+one flow or the server of more than one flow, so that the flows of a round
+can run at once without two of them competing for the same end of a VM's
+link. Rounds run one after the other.
+
+The results of the flows form a matrix indexed by client and server, from
+which the total throughput of a round, such as the bisection bandwidth, and
+the worst pair are derived.
+"""
+
+import collections
+import logging
+
+from perfkitbenchmarker import vm_util
+
+ALL_PAIRS = 'all_pairs'
+RING = 'ring'
+PERMUTATION = 'permutation'
+BISECTION = 'bisection'
+PATTERNS = [ALL_PAIRS, RING, PERMUTATION, BISECTION]
+
+# A flow that ran in a round.
+#
+# Attributes:
+#   client: int. Index of the VM that started the flow.
+#   server: int. Index of the VM the flow went to.
+#   round_index: int. Index of the round the flow ran in.
+#   result: The value returned by the function that ran the flow.
+FlowResult = collections.namedtuple('FlowResult', [
+    'client', 'server', 'round_index', 'result'])
+
+
+def GetPairs(num_vms, pattern, rand):
+  """Gets the pairs of VMs that exchange traffic in a pattern.
+
+  Args:
+    num_vms: int. The number of VMs, at least 2.
+    pattern: string. One of PATTERNS.
+    rand: random.Random. Source of the permutation and the bisection halves.
+
+  Returns:
+    A list of (client index, server index) tuples.
+
+  Raises:
+    ValueError: if the pattern is unknown.
+  """
+  if pattern == ALL_PAIRS:
+    # Ordered by the distance from client to server, so that ScheduleRounds
+    # makes one round per distance, each with every VM as client once.
+    return [(client, (client + distance) % num_vms)
+            for distance in xrange(1, num_vms)
+            for client in xrange(num_vms)]
+  elif pattern == RING:
+    return [(client, (client + 1) % num_vms) for client in xrange(num_vms)]
+  elif pattern == PERMUTATION:
+    servers = range(num_vms)
+    while any(client == server for client, server in enumerate(servers)):
+      rand.shuffle(servers)
+    return list(enumerate(servers))
+  elif pattern == BISECTION:
+    vms = range(num_vms)
+    rand.shuffle(vms)
+    half = num_vms // 2
+    pairs = zip(vms[:half], vms[half:2 * half])
+    return pairs + [(server, client) for client, server in pairs]
+  raise ValueError('Unknown traffic pattern: %s' % pattern)
+
+
+def ScheduleRounds(pairs):
+  """Groups pairs into rounds whose flows can run at once.
+
+  Each pair goes into the first round in which neither its client is already
+  a client nor its server already a server.
+
+  Args:
+    pairs: list of (client index, server index) tuples.
+
+  Returns:
+    A list of rounds, each a list of (client index, server index) tuples.
+  """
+  rounds = []
+  for client, server in pairs:
+    for round_pairs, clients, servers in rounds:
+      if client not in clients and server not in servers:
+        break
+    else:
+      round_pairs, clients, servers = [], set(), set()
+      rounds.append((round_pairs, clients, servers))
+    round_pairs.append((client, server))
+    clients.add(client)
+    servers.add(server)
+  return [scheduled for scheduled, _, _ in rounds]
+
+
+def RunRounds(vms, rounds, run_flow):
+  """Runs the flows of each round at once, one round after the other.
+
+  Args:
+    vms: list of VMs. The pairs index into it.
+    rounds: list of rounds, as returned by ScheduleRounds.
+    run_flow: function that takes the client and server VMs, runs a flow
+        between them and returns its result.
+
+  Returns:
+    A list of FlowResults, in the order of the rounds and their pairs.
+  """
+  flows = []
+  for round_index, round_pairs in enumerate(rounds):
+    logging.info('Running round %s of %s, with %s flows.', round_index + 1,
+                 len(rounds), len(round_pairs))
+    results = vm_util.RunThreaded(
+        run_flow,
+        [((vms[client], vms[server]), {}) for client, server in round_pairs],
+        max_concurrent_threads=len(round_pairs))
+    flows.extend(FlowResult(client, server, round_index, result)
+                 for (client, server), result in zip(round_pairs, results))
+  return flows
+
+
+def GetMatrix(flows, get_value=lambda result: result):
+  """Gets a matrix of the flows' results.
+
+  Args:
+    flows: list of FlowResults.
+    get_value: function that returns the value of a flow's result to put in
+        the matrix.
+
+  Returns:
+    A dict mapping (client index, server index) tuples to values.
+  """
+  return {(flow.client, flow.server): get_value(flow.result)
+          for flow in flows}
+
+
+def GetRoundTotals(flows, matrix):
+  """Gets the total of each round's values, such as its total throughput.
+
+  With the bisection pattern there is a single round, whose total throughput
+  is the bisection bandwidth.
+
+  Args:
+    flows: list of FlowResults.
+    matrix: dict returned by GetMatrix for the flows.
+
+  Returns:
+    A list of the total of the values of each round's flows, by round index.
+  """
+  totals = collections.defaultdict(float)
+  for flow in flows:
+    totals[flow.round_index] += matrix[flow.client, flow.server]
+  return [totals[round_index] for round_index in sorted(totals)]
+
+
+def GetWorstPair(matrix, higher_is_better):
+  """Gets the pair with the worst value.
+
+  Args:
+    matrix: dict returned by GetMatrix.
+    higher_is_better: boolean. True for values like throughput, False for
+        values like latency.
+
+  Returns:
+    A (client index, server index) tuple.
+  """
+  choose = min if higher_is_better else max
+  return choose(sorted(matrix), key=lambda pair: matrix[pair])
+
+
+def FormatMatrix(num_vms, matrix, value_format='%.1f'):
+  """Formats a matrix as a table, with a row per client and column per server.
+
+  Args:
+    num_vms: int. The number of VMs.
+    matrix: dict returned by GetMatrix.
+    value_format: string. Format of each value.
+
+  Returns:
+    A string. Pairs that are not in the matrix are shown as '-'.
+  """
+  rows = [['client'] + [str(server) for server in xrange(num_vms)]]
+  for client in xrange(num_vms):
+    rows.append([str(client)] + [
+        value_format % matrix[client, server]
+        if (client, server) in matrix else '-'
+        for server in xrange(num_vms)])
+  label_width = len(rows[0][0])
+  width = max(len(cell) for row in rows for cell in row[1:])
+  return '\n'.join(
+      ' '.join([row[0].rjust(label_width)] +
+               [cell.rjust(width) for cell in row[1:]]) for row in rows)
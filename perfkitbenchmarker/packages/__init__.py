@@ -31,6 +31,15 @@ All functions in each package module should be prefixed with the type of package
 manager, and all functions should accept a BaseVirtualMachine object as their
 only arguments.
 
+Packages that need other packages installed first should list their names in a
+module-level DEPENDENCIES list rather than calling vm.Install from their
+install functions, so that independent packages can be installed concurrently.
+System packages that a package installs through the package manager may be
+listed in APT_PACKAGES and YUM_PACKAGES strings instead of being installed by
+AptInstall and YumInstall, which are then optional. The system packages of all
+packages being installed at the same time are installed by a single
+InstallPackages call.
+
 See perfkitbenchmarker/package_managers.py for more information on how to use
 packages in benchmarks.
 """
@@ -38,9 +47,55 @@ packages in benchmarks.
 from perfkitbenchmarker import import_util
 
 
-def _LoadPackages():
-  return dict([(module.__name__.split('.')[-1], module) for module in
-               import_util.LoadModulesForPath(__path__, __name__)])
+# Maps package names to package modules. Each module is only imported when it
+# is first looked up, e.g. by vm.Install.
+PACKAGES = import_util.LazyModuleDict(__path__, __name__)
+
+
+def GetDependencies(package_name):
+  """Returns the names of the packages that a package depends on."""
+  return getattr(PACKAGES[package_name], 'DEPENDENCIES', ())
+
+
+def GetInstallLevels(package_names, installed=()):
+  """Orders packages and their dependencies for installation.
+
+  Args:
+    package_names: iterable of package names to install.
+    installed: collection of names of packages that are already installed.
+        They and their dependencies are left out.
+
+  Returns:
+    List of lists of package names. Every package comes in a later level than
+    all of its dependencies, so the packages within a level may be installed
+    concurrently once the previous levels are installed.
+
+  Raises:
+    ValueError: if the dependencies contain a cycle.
+  """
+  # Maps each package to install to the length of its longest dependency
+  # chain.
+  depths = {}
+  visiting = set()
 
+  def Visit(name):
+    if name in depths:
+      return depths[name]
+    if name in visiting:
+      raise ValueError('Package {0} has a circular dependency.'.format(name))
+    visiting.add(name)
+    depth = 0
+    for dependency in GetDependencies(name):
+      if dependency not in installed:
+        depth = max(depth, Visit(dependency) + 1)
+    visiting.remove(name)
+    depths[name] = depth
+    return depth
 
-PACKAGES = _LoadPackages()
+  for name in package_names:
+    if name not in installed:
+      Visit(name)
+  levels = [[] for _ in range(max(depths.values()) + 1 if depths else 0)]
+  for name in sorted(depths):
+    levels[depths[name]].append(name)
+  return levels
@@ -24,10 +24,11 @@ ANT_TAR_URL = ('archive.apache.org/dist/ant/binaries/'
 
 ANT_HOME_DIR = posixpath.join(vm_util.VM_TMP_DIR, 'ant')
 
+DEPENDENCIES = ['wget']
+
 
 def _Install(vm):
   """Installs the Ant package on the VM."""
-  vm.Install('wget')
   vm.RemoteCommand('mkdir -p {0} && '
                    'cd {0} && '
                    'wget {1} && '
@@ -15,12 +15,9 @@
 
 """Module containing build tools installation and cleanup functions."""
 
+APT_PACKAGES = 'build-essential git libtool autoconf automake'
+
 
 def YumInstall(vm):
   """Installs build tools on the VM."""
   vm.InstallPackageGroup('Development Tools')
-
-
-def AptInstall(vm):
-  """Installs build tools on the VM."""
-  vm.InstallPackages('build-essential git libtool autoconf automake')
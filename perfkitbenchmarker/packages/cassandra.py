@@ -24,6 +24,7 @@ import os
 import posixpath
 import time
 
+from perfkitbenchmarker import artifact_cache
 from perfkitbenchmarker import data
 from perfkitbenchmarker import errors
 from perfkitbenchmarker import vm_util
@@ -42,6 +43,8 @@ CASSANDRA_OUT = posixpath.join(CASSANDRA_DIR, 'cassandra.out')
 CASSANDRA_ERR = posixpath.join(CASSANDRA_DIR, 'cassandra.err')
 NODETOOL = posixpath.join(CASSANDRA_DIR, 'bin', 'nodetool')
 
+DEPENDENCIES = ['ant', 'build_tools', 'openjdk7', 'curl']
+
 
 # Number of times to attempt to start the cluster.
 CLUSTER_START_TRIES = 10
@@ -63,10 +66,6 @@ def CheckPrerequisites():
 
 def _Install(vm):
   """Installs Cassandra from a tarball."""
-  vm.Install('ant')
-  vm.Install('build_tools')
-  vm.Install('openjdk7')
-  vm.Install('curl')
   vm.RemoteCommand(
       'cd {0}; git clone {1}; cd {2}; git checkout {3}; {4}/bin/ant'.format(
           vm_util.VM_TMP_DIR,
@@ -75,9 +74,9 @@ def _Install(vm):
           CASSANDRA_VERSION,
           ANT_HOME_DIR))
   # Add JNA
-  vm.RemoteCommand('cd {0} && curl -LJO {1}'.format(
-      posixpath.join(CASSANDRA_DIR, 'lib'),
-      JNA_JAR_URL))
+  artifact_cache.DownloadToVm(
+      vm, JNA_JAR_URL,
+      posixpath.join(CASSANDRA_DIR, 'lib', posixpath.basename(JNA_JAR_URL)))
 
 
 def YumInstall(vm):
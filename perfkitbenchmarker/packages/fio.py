@@ -15,8 +15,11 @@
 """Module containing fio installation, cleanup, parsing functions."""
 import ConfigParser
 import io
+import os
+import re
 import time
 
+from perfkitbenchmarker import histogram
 from perfkitbenchmarker import regex_util
 from perfkitbenchmarker import sample
 from perfkitbenchmarker import vm_util
@@ -35,6 +38,20 @@ CMD_PARAMETER_REGEX = r'--(\w+=[/\w\d]+)\n'
 CMD_PARAMETER_REPL_REGEX = r'\1\n'
 CMD_STONEWALL_PARAMETER = '--stonewall'
 JOB_STONEWALL_PARAMETER = 'stonewall'
+# The data directions of fio results, in the order of the data direction
+# numbers in fio logs.
+IO_MODES = ['read', 'write', 'trim']
+# The completion latency percentiles in fio's JSON output.
+CLAT_PERCENTILES = [1, 5, 10, 20, 30, 40, 50, 60, 70, 80, 90, 95, 99, 99.5,
+                    99.9, 99.95, 99.99]
+# Matches the names of the log files written with write_bw_log,
+# write_iops_log and write_lat_log that are parsed, e.g. 'fio_bw.1.log'. The
+# groups are the log type and the 1-based index of the job that wrote it.
+LOG_FILE_REGEX = re.compile(r'_(bw|iops|clat)(?:\.(\d+))?\.log$')
+# Maps each parsed log type to the statistic it holds and the unit.
+LOG_STATS = {'bw': ('bandwidth', 'KB/s'),
+             'iops': ('iops', ''),
+             'clat': ('latency', 'usec')}
 
 
 def _Install(vm):
@@ -84,6 +101,17 @@ def ParseJobFile(job_file):
   return section_metadata
 
 
+def GetJobNames(job_file):
+  """Returns the names of the jobs in a fio job file, in order.
+
+  Args:
+    job_file: The contents of fio job file.
+  """
+  config = ConfigParser.RawConfigParser(allow_no_value=True)
+  config.readfp(io.BytesIO(job_file))
+  return [section for section in config.sections() if section != GLOBAL]
+
+
 def FioParametersToJob(fio_parameters):
   """Translate fio parameters into a job config file.
 
@@ -131,10 +159,9 @@ def ParseResults(job_file, fio_json_result, base_metadata=None):
   # come from the same fio run.
   timestamp = time.time()
   parameter_metadata = ParseJobFile(job_file)
-  io_modes = ['read', 'write', 'trim']
   for job in fio_json_result['jobs']:
     job_name = job['jobname']
-    for mode in io_modes:
+    for mode in IO_MODES:
       if job[mode]['io_bytes']:
         metric_name = '%s:%s' % (job_name, mode)
         parameters = parameter_metadata[job_name]
@@ -203,6 +230,171 @@ def ParseResults(job_file, fio_json_result, base_metadata=None):
   return samples
 
 
+def _MergeModeResults(mode_results):
+  """Merges the results of one data direction of a job on several targets.
+
+  See MergeResults.
+  """
+  bandwidths = [result['bw'] for result in mode_results]
+  bw_mean = sum(bandwidths) / float(len(bandwidths))
+  merged = {
+      'io_bytes': sum(result['io_bytes'] for result in mode_results),
+      'bw': sum(bandwidths),
+      'iops': sum(result['iops'] for result in mode_results),
+      'runtime': max(result['runtime'] for result in mode_results),
+      'bw_min': min(bandwidths),
+      'bw_max': max(bandwidths),
+      'bw_mean': bw_mean,
+      'bw_dev': (sum((bw - bw_mean) ** 2 for bw in bandwidths) /
+                 len(bandwidths)) ** 0.5,
+      'bw_agg': 100.0}
+  # fio only reports percentiles of the completion latency, so each
+  # target's latency distribution is rebuilt from them, weighted by the
+  # number of IOs it completed.
+  latencies = histogram.Histogram()
+  clats = []
+  for result in mode_results:
+    io_count = result['iops'] * result['runtime'] / 1000.0
+    if not io_count:
+      continue
+    clat = result['clat']
+    clats.append((io_count, clat))
+    previous = 0
+    for percentile in CLAT_PERCENTILES:
+      latencies.Add(clat['percentile']['%f' % percentile],
+                    io_count * (percentile - previous) / 100.0)
+      previous = percentile
+    latencies.Add(clat['max'], io_count * (100 - previous) / 100.0)
+  if not clats:
+    merged['io_bytes'] = 0
+    return merged
+  total_count = sum(io_count for io_count, _ in clats)
+  mean = sum(io_count * clat['mean'] for io_count, clat in clats) / total_count
+  mean_square = sum(io_count * (clat['stddev'] ** 2 + clat['mean'] ** 2)
+                    for io_count, clat in clats) / total_count
+  # Each percentile is read just below its rank, so that rounding error in
+  # the cumulative counts can't move it to the next target's percentile.
+  percentiles = latencies.Percentiles(
+      percentile * (1 - 1e-9) for percentile in CLAT_PERCENTILES).values()
+  merged['clat'] = {
+      'min': min(clat['min'] for _, clat in clats),
+      'max': max(clat['max'] for _, clat in clats),
+      'mean': mean,
+      'stddev': max(mean_square - mean ** 2, 0) ** 0.5,
+      'percentile': {'%f' % percentile: value for percentile, value
+                     in zip(CLAT_PERCENTILES, percentiles)}}
+  return merged
+
+
+def MergeResults(fio_json_results):
+  """Merges the results of running a job file on several targets at once.
+
+  Bandwidth and IOPS are summed over the targets. Completion latency
+  percentiles are those of the IOs of all targets, estimated from each
+  target's percentiles. Since a cluster has no single bandwidth log, bw_min,
+  bw_max, bw_mean and bw_dev describe the spread of the targets' bandwidths.
+
+  Args:
+    fio_json_results: list of fio results in json format, one per target.
+
+  Returns:
+    The merged results, in fio's json format, for ParseResults.
+  """
+  merged_jobs = []
+  for jobs in zip(*(result['jobs'] for result in fio_json_results)):
+    merged_job = {'jobname': jobs[0]['jobname']}
+    for mode in IO_MODES:
+      merged_job[mode] = _MergeModeResults([job[mode] for job in jobs])
+    merged_jobs.append(merged_job)
+  return {'jobs': merged_jobs}
+
+
+def _WindowAverages(window, totals, window_msec):
+  for direction in sorted(totals):
+    total, count = totals[direction]
+    yield IO_MODES[direction], window * window_msec, total / count
+
+
+def ParseLogFile(log_file, window_msec):
+  """Averages the entries of a fio log over consecutive windows of time.
+
+  The log is read a line at a time and only the current window's totals are
+  kept, so logs of long runs needn't fit in memory.
+
+  Args:
+    log_file: An iterable of the lines of a fio bandwidth, IOPS or latency
+        log written with log_avg_msec. Each line is 'time in msec, value, data
+        direction, block size', and holds the average of the interval ending
+        at that time.
+    window_msec: int. The length of the windows, in milliseconds.
+
+  Yields:
+    (mode, window start in msec, average value) tuples in time order, where
+    mode is one of IO_MODES.
+  """
+  window = None
+  totals = {}
+  for line in log_file:
+    fields = line.split(',')
+    if len(fields) < 3:
+      continue
+    time_msec, value, direction = (int(fields[0]), float(fields[1]),
+                                   int(fields[2]))
+    line_window = max(time_msec - 1, 0) // window_msec
+    if line_window != window:
+      for average in _WindowAverages(window, totals, window_msec):
+        yield average
+      window = line_window
+      totals = {}
+    total, count = totals.get(direction, (0.0, 0))
+    totals[direction] = total + value, count + 1
+  for average in _WindowAverages(window, totals, window_msec):
+    yield average
+
+
+def ParseLogFiles(job_file, job_names, log_paths, window_msec,
+                  base_metadata=None):
+  """Parses fio bandwidth, IOPS and completion latency logs into samples.
+
+  Args:
+    job_file: The contents of the fio job file.
+    job_names: list of strings. The names of the jobs that fio ran, in order.
+        The logs of the first job are numbered 1.
+    log_paths: list of strings. Local paths of the logs. Files whose names
+        don't match LOG_FILE_REGEX are ignored.
+    window_msec: int. The length of time that each sample covers, in
+        milliseconds.
+    base_metadata: Extra metadata to annotate the samples with.
+
+  Returns:
+    A list of sample.Sample objects, one per job, data direction, statistic
+    and window, with metrics such as '<job name>:write:iops:window'.
+  """
+  samples = []
+  parameter_metadata = ParseJobFile(job_file)
+  for log_path in sorted(log_paths):
+    match = LOG_FILE_REGEX.search(os.path.basename(log_path))
+    if not match:
+      continue
+    stat, unit = LOG_STATS[match.group(1)]
+    job_index = int(match.group(2) or 1) - 1
+    if job_index >= len(job_names):
+      continue
+    job_name = job_names[job_index]
+    parameters = parameter_metadata[job_name].copy()
+    if base_metadata:
+      parameters.update(base_metadata)
+    parameters.update(fio_job=job_name, window_seconds=window_msec / 1000.0)
+    with open(log_path) as log_file:
+      for mode, start_msec, value in ParseLogFile(log_file, window_msec):
+        metadata = parameters.copy()
+        metadata['window_start_seconds'] = start_msec / 1000.0
+        samples.append(sample.Sample(
+            '%s:%s:%s:window' % (job_name, mode, stat), value, unit,
+            metadata))
+  return samples
+
+
 def DeleteParameterFromJobFile(job_file, parameter):
   """Delete all occurance of parameter from job_file.
 
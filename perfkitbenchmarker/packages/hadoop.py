@@ -23,6 +23,7 @@ import posixpath
 import re
 import time
 
+from perfkitbenchmarker import artifact_cache
 from perfkitbenchmarker import data
 from perfkitbenchmarker import regex_util
 from perfkitbenchmarker import vm_util
@@ -42,6 +43,10 @@ HADOOP_SBIN = posixpath.join(HADOOP_DIR, 'sbin')
 HADOOP_CONF_DIR = posixpath.join(HADOOP_DIR, 'etc', 'hadoop')
 HADOOP_PRIVATE_KEY = posixpath.join(HADOOP_CONF_DIR, 'hadoop_keyfile')
 
+DEPENDENCIES = ['openjdk7', 'curl']
+APT_PACKAGES = 'libsnappy1 libsnappy-dev'
+YUM_PACKAGES = 'snappy snappy-devel'
+
 
 def CheckPrerequisites():
   """Verifies that the required resources are present.
@@ -54,22 +59,21 @@ def CheckPrerequisites():
 
 
 def _Install(vm):
-  vm.Install('openjdk7')
-  vm.Install('curl')
-  vm.RemoteCommand(('mkdir {0} && curl -L {1} | '
-                    'tar -C {0} --strip-components=1 -xzf -').format(
-                        HADOOP_DIR, HADOOP_URL))
+  tar_path = posixpath.join(vm_util.VM_TMP_DIR,
+                            posixpath.basename(HADOOP_URL))
+  artifact_cache.DownloadToVm(vm, HADOOP_URL, tar_path)
+  vm.RemoteCommand(('mkdir {0} && '
+                    'tar -C {0} --strip-components=1 -xzf {1}').format(
+                        HADOOP_DIR, tar_path))
 
 
 def YumInstall(vm):
   """Installs Hadoop on the VM."""
-  vm.InstallPackages('snappy snappy-devel')
   _Install(vm)
 
 
 def AptInstall(vm):
   """Installs Hadoop on the VM."""
-  vm.InstallPackages('libsnappy1 libsnappy-dev')
   _Install(vm)
 
 
@@ -21,6 +21,7 @@ import functools
 import os
 import posixpath
 
+from perfkitbenchmarker import artifact_cache
 from perfkitbenchmarker import data
 from perfkitbenchmarker import vm_util
 from perfkitbenchmarker.packages import hadoop
@@ -36,6 +37,8 @@ HBASE_DIR = posixpath.join(vm_util.VM_TMP_DIR, 'hbase')
 HBASE_BIN = posixpath.join(HBASE_DIR, 'bin')
 HBASE_CONF_DIR = posixpath.join(HBASE_DIR, 'conf')
 
+DEPENDENCIES = ['hadoop', 'curl']
+
 
 def CheckPrerequisites():
   """Verifies that the required resources are present.
@@ -48,11 +51,12 @@ def CheckPrerequisites():
 
 
 def _Install(vm):
-  vm.Install('hadoop')
-  vm.Install('curl')
-  vm.RemoteCommand(('mkdir {0} && curl -L {1} | '
-                    'tar -C {0} --strip-components=1 -xzf -').format(
-                        HBASE_DIR, HBASE_URL))
+  tar_path = posixpath.join(vm_util.VM_TMP_DIR,
+                            posixpath.basename(HBASE_URL))
+  artifact_cache.DownloadToVm(vm, HBASE_URL, tar_path)
+  vm.RemoteCommand(('mkdir {0} && '
+                    'tar -C {0} --strip-components=1 -xzf {1}').format(
+                        HBASE_DIR, tar_path))
 
 
 def YumInstall(vm):
@@ -22,11 +22,11 @@ MVN_URL = ('http://www.us.apache.org/dist/maven/maven-3/3.3.3/binaries/' +
            MVN_TAR)
 MVN_DIR = '%s/apache-maven-3.3.3' % vm_util.VM_TMP_DIR
 
+DEPENDENCIES = ['openjdk7', 'wget']
+
 
 def _Install(vm):
   """Installs the maven package on the VM."""
-  vm.Install('openjdk7')
-  vm.Install('wget')
   vm.RemoteCommand('wget %s -P %s' % (MVN_URL, vm_util.VM_TMP_DIR))
   vm.RemoteCommand('cd %s && tar xvzf %s' % (vm_util.VM_TMP_DIR, MVN_TAR))
 
@@ -33,26 +33,26 @@ def YumInstall(vm):
   vm.Install('build_tools')
   vm.InstallPackages(YUM_PACKAGES)
   vm.Install('wget')
-  vm.RemoteCommand('wget {0} -P {1}'.format(LIBEVENT_URL, vm_util.VM_TMP_DIR))
-  vm.RemoteCommand('cd {0} && tar xvzf {1}'.format(vm_util.VM_TMP_DIR,
-                                                   LIBEVENT_TAR))
-  vm.RemoteCommand('cd {0} && ./configure && sudo make install'.format(
-      LIBEVENT_DIR))
-  vm.RemoteCommand('git clone {0} {1}'.format(GIT_REPO, MEMTIER_DIR))
-  vm.RemoteCommand('cd {0} && git checkout {1}'.format(MEMTIER_DIR, GIT_TAG))
   pkg_config = 'PKG_CONFIG_PATH=/usr/local/lib/pkgconfig:${PKG_CONFIG_PATH}'
-  vm.RemoteCommand('cd {0} && autoreconf -ivf && {1} ./configure && '
-                   'sudo make install'.format(MEMTIER_DIR, pkg_config))
+  vm.RemoteCommandBatch([
+      'wget {0} -P {1}'.format(LIBEVENT_URL, vm_util.VM_TMP_DIR),
+      'cd {0} && tar xvzf {1}'.format(vm_util.VM_TMP_DIR, LIBEVENT_TAR),
+      'cd {0} && ./configure && sudo make install'.format(LIBEVENT_DIR),
+      'git clone {0} {1}'.format(GIT_REPO, MEMTIER_DIR),
+      'cd {0} && git checkout {1}'.format(MEMTIER_DIR, GIT_TAG),
+      'cd {0} && autoreconf -ivf && {1} ./configure && '
+      'sudo make install'.format(MEMTIER_DIR, pkg_config)])
 
 
 def AptInstall(vm):
   """Installs the memtier package on the VM."""
   vm.Install('build_tools')
   vm.InstallPackages(APT_PACKAGES)
-  vm.RemoteCommand('git clone {0} {1}'.format(GIT_REPO, MEMTIER_DIR))
-  vm.RemoteCommand('cd {0} && git checkout {1}'.format(MEMTIER_DIR, GIT_TAG))
-  vm.RemoteCommand('cd {0} && autoreconf -ivf && ./configure && '
-                   'sudo make install'.format(MEMTIER_DIR))
+  vm.RemoteCommandBatch([
+      'git clone {0} {1}'.format(GIT_REPO, MEMTIER_DIR),
+      'cd {0} && git checkout {1}'.format(MEMTIER_DIR, GIT_TAG),
+      'cd {0} && autoreconf -ivf && ./configure && '
+      'sudo make install'.format(MEMTIER_DIR)])
 
 
 def _Uninstall(vm):
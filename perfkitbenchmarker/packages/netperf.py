@@ -13,8 +13,11 @@
 # limitations under the License.
 
 
-"""Module containing netperf installation and cleanup functions."""
+"""Module containing netperf installation, cleanup and parsing functions."""
 
+import re
+
+from perfkitbenchmarker import histogram
 from perfkitbenchmarker import vm_util
 
 NETPERF_TAR = 'netperf-2.6.0.tar.gz'
@@ -22,6 +25,16 @@ NETPERF_URL = 'ftp://ftp.netperf.org/netperf/archive/%s' % NETPERF_TAR
 NETPERF_DIR = '%s/netperf-2.6.0' % vm_util.VM_TMP_DIR
 NETSERVER_PATH = NETPERF_DIR + '/src/netserver'
 NETPERF_PATH = NETPERF_DIR + '/src/netperf'
+# The rows of the histogram that netperf prints with -v 2, in order. Each row
+# has ten buckets, and the buckets of a row are ten times as wide as those of
+# the previous one, starting at 1 microsecond.
+HISTOGRAM_ROWS = ['UNIT_USEC', 'TEN_USEC', 'HUNDRED_USEC', 'UNIT_MSEC',
+                  'TEN_MSEC', 'HUNDRED_MSEC', 'UNIT_SEC', 'TEN_SEC']
+HISTOGRAM_ROW_REGEX = re.compile(r'^(%s)\s*((?::\s*\d+\s*)+)$' %
+                                 '|'.join(HISTOGRAM_ROWS), re.MULTILINE)
+# Latencies of 100 seconds or more are only counted, in this row.
+HISTOGRAM_OVERFLOW_REGEX = re.compile(r'^>100_SECS:\s*(\d+)', re.MULTILINE)
+HISTOGRAM_HEADER = 'Histogram of'
 
 
 def _Install(vm):
@@ -31,7 +44,8 @@ def _Install(vm):
   vm.RemoteCommand('curl %s -o %s/%s' % (
       NETPERF_URL, vm_util.VM_TMP_DIR, NETPERF_TAR))
   vm.RemoteCommand('cd %s && tar xvzf %s' % (vm_util.VM_TMP_DIR, NETPERF_TAR))
-  vm.RemoteCommand('cd %s && ./configure && make' % NETPERF_DIR)
+  vm.RemoteCommand('cd %s && ./configure --enable-histogram && make' %
+                   NETPERF_DIR)
 
 
 def YumInstall(vm):
@@ -42,3 +56,40 @@ def YumInstall(vm):
 def AptInstall(vm):
   """Installs the netperf package on the VM."""
   _Install(vm)
+
+
+def ParseHistogram(netperf_stdout):
+  """Parses the latency histogram that netperf prints with -v 2.
+
+  Example histogram rows:
+
+    Histogram of request/response times
+    UNIT_USEC     :    0:    0:    0:    0:    0:    0:    0:    0:    0:    0
+    TEN_USEC      :    0:    0:    0:    0:    0:    0:    0:    0:    0:    0
+    HUNDRED_USEC  :    0: 3580: 5325:  281:   53:   12:    4:    2:    1:    0
+    ...
+    >100_SECS: 0
+    HIST_TOTAL:      9258
+
+  Args:
+    netperf_stdout: string. The stdout of netperf.
+
+  Returns:
+    A histogram.Histogram of the latencies, in microseconds. Each count is
+    recorded at the lower bound of its netperf bucket. None if the output has
+    no histogram, as with TCP_STREAM.
+  """
+  start = netperf_stdout.find(HISTOGRAM_HEADER)
+  if start < 0:
+    return None
+  netperf_stdout = netperf_stdout[start:]
+  latencies = histogram.Histogram()
+  for row_name, row in HISTOGRAM_ROW_REGEX.findall(netperf_stdout):
+    bucket_width = 10 ** HISTOGRAM_ROWS.index(row_name)
+    for index, count in enumerate(row.split(':')[1:]):
+      if int(count):
+        latencies.Add(index * bucket_width, int(count))
+  overflow = HISTOGRAM_OVERFLOW_REGEX.search(netperf_stdout)
+  if overflow and int(overflow.group(1)):
+    latencies.Add(100 * 10 ** 6, int(overflow.group(1)))
+  return latencies
@@ -17,12 +17,5 @@
 
 JAVA_HOME = '/usr'
 
-
-def YumInstall(vm):
-  """Installs the OpenJDK7 package on the VM."""
-  vm.InstallPackages('java-1.7.0-openjdk-devel')
-
-
-def AptInstall(vm):
-  """Installs the OpenJDK7 package on the VM."""
-  vm.InstallPackages('openjdk-7-jdk')
+APT_PACKAGES = 'openjdk-7-jdk'
+YUM_PACKAGES = 'java-1.7.0-openjdk-devel'
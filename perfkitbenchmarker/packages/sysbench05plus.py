@@ -28,20 +28,19 @@ def YumInstall(vm):
   vm.Install('build_tools')
   vm.InstallPackages('bzr')
   vm.InstallPackages('mysql mysql-server mysql-devel')
-  vm.RemoteCommand('cd ~ && bzr branch lp:sysbench')
-  vm.RemoteCommand(('cd ~/sysbench && ./autogen.sh &&'
-                    ' ./configure --prefix=%s --mandir=%s/share/man &&'
-                    ' make') % (vm_util.VM_TMP_DIR, vm_util.VM_TMP_DIR))
-  vm.RemoteCommand('cd ~/sysbench && sudo make install')
-  vm.RemoteCommand('sudo mkdir %s/share/doc/sysbench/tests/db -p' %
-                   vm_util.VM_TMP_DIR)
-  vm.RemoteCommand('sudo cp ~/sysbench/sysbench/tests/db/*'
-                   ' %s/share/doc/sysbench/tests/db/' % vm_util.VM_TMP_DIR)
-  vm.RemoteCommand('echo "export PATH=$PATH:%s/bin" >> ~/.bashrc && '
-                   'source ~/.bashrc' % vm_util.VM_TMP_DIR)
-
-  # Cleanup the source code enlisthment from bzr, we don't need it anymore.
-  vm.RemoteCommand('cd ~ && rm -fr ./sysbench')
+  vm.RemoteCommandBatch([
+      'cd ~ && bzr branch lp:sysbench',
+      ('cd ~/sysbench && ./autogen.sh &&'
+       ' ./configure --prefix=%s --mandir=%s/share/man &&'
+       ' make') % (vm_util.VM_TMP_DIR, vm_util.VM_TMP_DIR),
+      'cd ~/sysbench && sudo make install',
+      'sudo mkdir %s/share/doc/sysbench/tests/db -p' % vm_util.VM_TMP_DIR,
+      'sudo cp ~/sysbench/sysbench/tests/db/*'
+      ' %s/share/doc/sysbench/tests/db/' % vm_util.VM_TMP_DIR,
+      'echo "export PATH=$PATH:%s/bin" >> ~/.bashrc && '
+      'source ~/.bashrc' % vm_util.VM_TMP_DIR,
+      # Cleanup the source code enlisthment from bzr, we don't need it anymore.
+      'cd ~ && rm -fr ./sysbench'])
 
 
 def AptInstall(vm):
@@ -49,15 +48,16 @@ def AptInstall(vm):
 
   # Setup the proper sources list so apt get will get the latest version
   # of sysbench. By default, it only gets version earlier than 0.5.
-  vm.RemoteCommand('sudo bash -c \'echo "deb http://repo.percona.com/apt'
-                   ' trusty main">>/etc/apt/sources.list.d/percona.list\'')
-  vm.RemoteCommand('sudo bash -c \'echo "deb-src http://repo.percona.com/apt'
-                   ' trusty main">>/etc/apt/sources.list.d/percona.list\'')
-  vm.RemoteCommand('sudo bash -c \'echo "deb http://security.ubuntu.com/ubuntu'
-                   ' trusty-security main">>/etc/apt/sources.list\'')
-  vm.RemoteCommand('sudo apt-key adv --keyserver keys.gnupg.net --recv-keys'
-                   ' 1C4CBDCDCD2EFD2A')
-  vm.RemoteCommand('sudo apt-get update')
+  vm.RemoteCommandBatch([
+      'sudo bash -c \'echo "deb http://repo.percona.com/apt'
+      ' trusty main">>/etc/apt/sources.list.d/percona.list\'',
+      'sudo bash -c \'echo "deb-src http://repo.percona.com/apt'
+      ' trusty main">>/etc/apt/sources.list.d/percona.list\'',
+      'sudo bash -c \'echo "deb http://security.ubuntu.com/ubuntu'
+      ' trusty-security main">>/etc/apt/sources.list\'',
+      'sudo apt-key adv --keyserver keys.gnupg.net --recv-keys'
+      ' 1C4CBDCDCD2EFD2A',
+      'sudo apt-get update'])
   vm.InstallPackages('libc6')
   vm.InstallPackages('mysql-client')
   vm.InstallPackages('sysbench')
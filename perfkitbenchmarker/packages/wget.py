@@ -15,17 +15,5 @@
 
 """Module containing wget installation and cleanup functions."""
 
-
-def _Install(vm):
-  """Installs the wget package on the VM."""
-  vm.InstallPackages('wget')
-
-
-def YumInstall(vm):
-  """Installs the wget package on the VM."""
-  _Install(vm)
-
-
-def AptInstall(vm):
-  """Installs the wget package on the VM."""
-  _Install(vm)
+APT_PACKAGES = 'wget'
+YUM_PACKAGES = 'wget'
@@ -35,21 +35,27 @@ By default, this runs YCSB workloads A and B against the database, 32 threads
 per client VM, with an initial database size of 1GB (1k records).
 Each workload runs for at most 30 minutes.
 """
-import bisect
+import calendar
 import collections
 import copy
 import csv
+import datetime
 import io
 import itertools
-import math
+import json
 import re
 import logging
 import operator
 import os
 import posixpath
+import Queue
+import threading
+import time
 
+from perfkitbenchmarker import artifact_cache
 from perfkitbenchmarker import data
 from perfkitbenchmarker import flags
+from perfkitbenchmarker import histogram as histogram_lib
 from perfkitbenchmarker import sample
 from perfkitbenchmarker import vm_util
 
@@ -60,8 +66,49 @@ YCSB_TAR_URL = ('https://github.com/brianfrankcooper/YCSB/releases/'
 YCSB_DIR = posixpath.join(vm_util.VM_TMP_DIR, 'ycsb')
 YCSB_EXE = posixpath.join(YCSB_DIR, 'bin', 'ycsb')
 
+DEPENDENCIES = ['openjdk7', 'curl']
+
 _DEFAULT_PERCENTILES = 50, 75, 90, 95, 99, 99.9
 
+# Matches the start of a status line, which YCSB prints to stderr every status
+# interval when run with '-s'.
+_STATUS_LINE_RE = re.compile(
+    r'(?P<time>\d{4}-\d\d-\d\d \d\d:\d\d:\d\d:\d{3}) (?P<elapsed>\d+) sec: '
+    r'(?P<operations>\d+) operations;'
+    r'(?: (?P<throughput>[\d.]+) current ops/sec;)?')
+# Matches the statistics of one operation in a status line, e.g.
+# "[READ AverageLatency(us)=1295.13]" or "[READ: Count=10, ..., Avg=1295.1]".
+_STATUS_GROUP_RE = re.compile(r'\[([A-Z][A-Z_-]*):? ([^\]]*)\]')
+_STATUS_AVERAGE_RE = re.compile(r'(?:AverageLatency\(us\)|Avg)=([\d.]+)')
+_STATUS_COUNT_RE = re.compile(r'Count=(\d+)')
+_STATUS_TIME_FORMAT = '%Y-%m-%d %H:%M:%S:%f'
+
+# One iteration of a target throughput search.
+#
+# Attributes:
+#   target: int or None. Target throughput in ops/sec, or None if unthrottled.
+#   throughput: float. Measured throughput in ops/sec.
+#   latency: float or None. Highest latency percentile of any operation, in ms.
+#   meets_slo: bool. Whether the iteration met the latency SLO and, if
+#       throttled, its target.
+TargetSearchPoint = collections.namedtuple(
+    'TargetSearchPoint', ['target', 'throughput', 'latency', 'meets_slo'])
+
+# A contiguous range of records loaded by one 'ycsb load' command.
+LoadChunk = collections.namedtuple('LoadChunk', ['insertstart', 'insertcount'])
+
+# One status interval of one or more YCSB clients.
+#
+# Attributes:
+#   timestamp: float. Unix time of the start of the interval.
+#   throughput: float. Operations per second during the interval.
+#   latencies: dict mapping lower-case operation name to a tuple of
+#       (average latency in ms, weight). The weight is the number of
+#       operations, if YCSB reports it, and otherwise the throughput.
+#   clients: int. Number of clients that reported during the interval.
+StatusInterval = collections.namedtuple(
+    'StatusInterval', ['timestamp', 'throughput', 'latencies', 'clients'])
+
 # Binary operators to aggregate reported statistics.
 # Statistics with operator 'None' will be dropped.
 AGGREGATE_OPERATORS = {
@@ -82,6 +129,11 @@ AGGREGATE_OPERATORS = {
 flags.DEFINE_boolean('ycsb_histogram', True, 'Include individual '
                      'histogram results from YCSB (will increase sample '
                      'count).')
+flags.DEFINE_boolean('ycsb_histogram_single_sample', False,
+                     'When --ycsb_histogram is set, publish each latency '
+                     'histogram as one sample holding the whole histogram as '
+                     'JSON in its "histogram" metadata, rather than as one '
+                     'sample per bucket.')
 flags.DEFINE_boolean('ycsb_load_samples', True, 'Include samples '
                      'from pre-populating database.')
 flags.DEFINE_boolean('ycsb_include_individual_results', False,
@@ -110,6 +162,50 @@ flags.DEFINE_integer('ycsb_operation_count', 1000000, 'Number of operations '
 flags.DEFINE_integer('ycsb_timelimit', 1800, 'Maximum amount of time to run '
                      'each workload / client count combination. Set to 0 for '
                      'unlimited time.')
+flags.DEFINE_integer('ycsb_load_chunk_size', 0, 'If positive, split the load '
+                     'stage into chunks of this many records, which are '
+                     'handed out to client VMs from a work queue. Completed '
+                     'chunks are recorded in the run\'s temporary directory, '
+                     'so that a retried load only loads missing chunks.',
+                     lower_bound=0)
+flags.DEFINE_integer('ycsb_load_concurrency_per_vm', 1, 'Number of load '
+                     'chunks to load concurrently on each client VM when '
+                     '--ycsb_load_chunk_size is set. Each chunk uses '
+                     '--ycsb_preload_threads threads.', lower_bound=1)
+flags.DEFINE_boolean('ycsb_timeseries', False, 'Have YCSB report its status '
+                     'periodically, and include per-interval throughput and '
+                     'average latency samples, aligned across client VMs on '
+                     'wall-clock time.')
+flags.DEFINE_integer('ycsb_status_interval', 10, 'Number of seconds between '
+                     'YCSB status reports when --ycsb_timeseries is set.',
+                     lower_bound=1)
+flags.DEFINE_integer('ycsb_timeseries_warmup_seconds', 0, 'Number of seconds '
+                     'at the start of each YCSB timeseries to exclude from the '
+                     'steady state samples.', lower_bound=0)
+flags.DEFINE_integer('ycsb_timeseries_cooldown_seconds', 0, 'Number of '
+                     'seconds at the end of each YCSB timeseries to exclude '
+                     'from the steady state samples.', lower_bound=0)
+flags.DEFINE_boolean('ycsb_target_search', False, 'Rather than running each '
+                     'workload once per --ycsb_threads_per_client value, '
+                     'search for the highest target throughput at which the '
+                     '--ycsb_target_search_percentile latency of every '
+                     'operation stays within --ycsb_target_search_slo_ms.')
+flags.DEFINE_float('ycsb_target_search_slo_ms', 10.0, 'Latency SLO of the '
+                   'target throughput search, in milliseconds.')
+flags.DEFINE_float('ycsb_target_search_percentile', 99.0, 'Latency '
+                   'percentile that must meet the SLO in the target '
+                   'throughput search.')
+flags.DEFINE_integer('ycsb_target_search_iteration_seconds', 120, 'Maximum '
+                     'run time of each iteration of the target throughput '
+                     'search.', lower_bound=1)
+flags.DEFINE_integer('ycsb_target_search_max_iterations', 8, 'Maximum number '
+                     'of iterations of the target throughput search, '
+                     'including the initial unthrottled run.', lower_bound=1)
+flags.DEFINE_float('ycsb_target_search_tolerance', 0.05, 'The target '
+                   'throughput search stops once the search range is '
+                   'narrower than this fraction of the unthrottled '
+                   'throughput. Iterations whose throughput falls short of '
+                   'their target by more than this fraction miss the SLO.')
 
 
 def _GetThreadsPerLoaderList():
@@ -139,11 +235,12 @@ def CheckPrerequisites():
 
 def _Install(vm):
   """Installs the YCSB package on the VM."""
-  vm.Install('openjdk7')
-  vm.Install('curl')
-  vm.RemoteCommand(('mkdir -p {0} && curl -L {1} | '
-                    'tar -C {0} --strip-components=1 -xzf -').format(
-                        YCSB_DIR, YCSB_TAR_URL))
+  tar_path = posixpath.join(vm_util.VM_TMP_DIR,
+                            posixpath.basename(YCSB_TAR_URL))
+  artifact_cache.DownloadToVm(vm, YCSB_TAR_URL, tar_path)
+  vm.RemoteCommand(('mkdir -p {0} && '
+                    'tar -C {0} --strip-components=1 -xzf {1}').format(
+                        YCSB_DIR, tar_path))
 
 
 def YumInstall(vm):
@@ -244,46 +341,156 @@ def ParseResults(ycsb_result_string, data_type='histogram'):
   return result
 
 
-def _CumulativeSum(xs):
-  total = 0
-  for x in xs:
-    total += x
-    yield total
+def _ParseStatusTime(time_string):
+  """Converts a YCSB status time to a Unix time.
+
+  YCSB prints local time. Client VMs are assumed to share a time zone, which is
+  treated as UTC; only the alignment of the clients matters.
+  """
+  parsed = datetime.datetime.strptime(time_string, _STATUS_TIME_FORMAT)
+  return calendar.timegm(parsed.timetuple()) + parsed.microsecond / 1e6
+
+
+class StatusParser(object):
+  """Parses the status lines that YCSB prints with '-s' into a timeseries.
+
+  Instances are line consumers, so they can be given to
+  RobustRemoteCommandAsync to parse YCSB's stderr as the command runs. Other
+  lines are ignored.
+
+  Example status line (wrapped):
+
+    2015-09-18 22:13:41:553 10 sec: 7528 operations; 752.8 current ops/sec;
+    [INSERT AverageLatency(us)=1295.13]
+
+  Each status line reports on the interval that ends at its time. Intervals are
+  aligned to wall-clock windows of 'interval_seconds', so that intervals from
+  different clients can be merged: an interval is assigned to the window that
+  contains its midpoint.
+
+  Attributes:
+    interval_seconds: int. YCSB's status interval.
+    intervals: list of StatusInterval, in order. Timestamps are window starts.
+  """
+
+  def __init__(self, interval_seconds):
+    self.interval_seconds = interval_seconds
+    self.intervals = []
+    self._last_elapsed = 0
+    self._last_operations = 0
+
+  def __call__(self, line):
+    match = _STATUS_LINE_RE.search(line)
+    if not match:
+      return
+    elapsed = int(match.group('elapsed'))
+    operations = int(match.group('operations'))
+    if self.intervals and elapsed <= self._last_elapsed:
+      return
+
+    if match.group('throughput') is not None:
+      throughput = float(match.group('throughput'))
+    elif elapsed > self._last_elapsed:
+      throughput = ((operations - self._last_operations) /
+                    float(elapsed - self._last_elapsed))
+    else:
+      throughput = 0.0
+
+    latencies = {}
+    for name, statistics in _STATUS_GROUP_RE.findall(line[match.end():]):
+      average = _STATUS_AVERAGE_RE.search(statistics)
+      if not average:
+        continue
+      count = _STATUS_COUNT_RE.search(statistics)
+      weight = int(count.group(1)) if count else throughput
+      latencies[name.lower()] = (float(average.group(1)) / 1000.0, weight)
+
+    midpoint = (_ParseStatusTime(match.group('time')) -
+                self.interval_seconds / 2.0)
+    window = midpoint // self.interval_seconds * self.interval_seconds
+    self.intervals.append(StatusInterval(window, throughput, latencies, 1))
+    self._last_elapsed = elapsed
+    self._last_operations = operations
+
+
+def _CombineStatusIntervals(timestamp, intervals, throughput, clients):
+  """Combines StatusIntervals, weighting their average latencies.
+
+  Args:
+    timestamp: float. Timestamp of the result.
+    intervals: list of StatusInterval.
+    throughput: float. Throughput of the result.
+    clients: int. Number of clients of the result.
+
+  Returns:
+    StatusInterval.
+  """
+  weighted_sums = collections.defaultdict(float)
+  weights = collections.defaultdict(float)
+  sums = collections.defaultdict(float)
+  counts = collections.defaultdict(int)
+  for interval in intervals:
+    for name, (average, weight) in interval.latencies.iteritems():
+      weighted_sums[name] += average * weight
+      weights[name] += weight
+      sums[name] += average
+      counts[name] += 1
+  latencies = {}
+  for name, count in counts.iteritems():
+    if weights[name]:
+      latencies[name] = (weighted_sums[name] / weights[name], weights[name])
+    else:
+      latencies[name] = (sums[name] / count, 0)
+  return StatusInterval(timestamp, throughput, latencies, clients)
 
 
-def _WeightedQuantile(x, weights, p):
-  """Weighted quantile measurement for an ordered list.
+def _MergeStatusIntervals(interval_lists):
+  """Merges the StatusParser intervals of several clients per window.
 
-  This method interpolates to the higher value when the quantile is not a direct
-  member of the list. This works well for YCSB, since latencies are floored.
+  Throughput is summed across clients, and average latencies are weighted by
+  operation count. If clock adjustments put several intervals of one client in
+  the same window, they are averaged first.
 
   Args:
-    x: List of values.
-    weights: List of numeric weights.
-    p: float. Desired quantile in the interval [0, 1].
+    interval_lists: list of lists of StatusInterval, one list per client.
 
   Returns:
-    float.
+    list of StatusInterval, one per window, in order.
+  """
+  by_window = collections.defaultdict(list)
+  for intervals in interval_lists:
+    client_windows = collections.OrderedDict()
+    for interval in intervals:
+      client_windows.setdefault(interval.timestamp, []).append(interval)
+    for window, client_intervals in client_windows.iteritems():
+      throughput = (sum(i.throughput for i in client_intervals) /
+                    len(client_intervals))
+      by_window[window].append(_CombineStatusIntervals(
+          window, client_intervals, throughput,
+          max(i.clients for i in client_intervals)))
+
+  return [_CombineStatusIntervals(window, by_window[window],
+                                  sum(i.throughput for i in by_window[window]),
+                                  sum(i.clients for i in by_window[window]))
+          for window in sorted(by_window)]
+
+
+def _TrimStatusIntervals(intervals, warmup_seconds, cooldown_seconds):
+  """Drops the intervals in the warm-up and cool-down periods of a timeseries.
+
+  Args:
+    intervals: list of StatusInterval, in order.
+    warmup_seconds: Number of seconds to drop from the start.
+    cooldown_seconds: Number of seconds to drop from the end.
 
-  Raises:
-    ValueError: When 'x' and 'weights' are not the same length, or 'p' is not in
-      the interval [0, 1].
+  Returns:
+    list of StatusInterval.
   """
-  if len(x) != len(weights):
-    raise ValueError('Lengths do not match: {0} != {1}'.format(
-        len(x), len(weights)))
-  if p < 0 or p > 1:
-    raise ValueError('Invalid quantile: {0}'.format(p))
-  n = sum(weights)
-  target = n * float(p)
-  cumulative = list(_CumulativeSum(weights))
-
-  # Find the first cumulative weight >= target
-  i = bisect.bisect_left(cumulative, target)
-  if i == len(x):
-    return x[-1]
-  else:
-    return x[i]
+  if not intervals:
+    return []
+  start = intervals[0].timestamp + warmup_seconds
+  end = intervals[-1].timestamp - cooldown_seconds
+  return [i for i in intervals if start <= i.timestamp <= end]
 
 
 def _PercentilesFromHistogram(ycsb_histogram, percentiles=_DEFAULT_PERCENTILES):
@@ -296,18 +503,14 @@ def _PercentilesFromHistogram(ycsb_histogram, percentiles=_DEFAULT_PERCENTILES):
   Returns:
     dict, mapping from percentile to value.
   """
-  result = collections.OrderedDict()
-  histogram = sorted(ycsb_histogram)
-  for percentile in percentiles:
-    if percentile < 0 or percentile > 100:
-      raise ValueError('Invalid percentile: {0}'.format(percentile))
-    if math.modf(percentile)[0] < 1e-7:
-      percentile = int(percentile)
-    label = 'p{0}'.format(percentile)
-    latencies, freqs = zip(*histogram)
-    time_ms = _WeightedQuantile(latencies, freqs, percentile * 0.01)
-    result[label] = time_ms
-  return result
+  return _ToHistogram(ycsb_histogram).Percentiles(percentiles)
+
+
+def _ToHistogram(ycsb_histogram):
+  """Converts a list of (time_ms, frequency) tuples to a Histogram."""
+  histogram = histogram_lib.Histogram()
+  histogram.AddAll(ycsb_histogram)
+  return histogram
 
 
 def _CombineResults(result_list, combine_histograms=True):
@@ -315,7 +518,8 @@ def _CombineResults(result_list, combine_histograms=True):
 
   Reduces a list of YCSB results (the output of ParseResults)
   into a single result. Histogram bin counts, operation counts, and throughput
-  are summed; RunTime is replaced by the maximum runtime of any result.
+  are summed; RunTime is replaced by the maximum runtime of any result. If every
+  result has status intervals, they are merged per window.
 
   Args:
     result_list: List of ParseResults outputs.
@@ -331,17 +535,10 @@ def _CombineResults(result_list, combine_histograms=True):
       for k in drop_keys:
         group['statistics'].pop(k, None)
 
-  def CombineHistograms(hist1, hist2):
-    h1 = dict(hist1)
-    h2 = dict(hist2)
-    keys = sorted(frozenset(h1) | frozenset(h2))
-    result = []
-    for k in keys:
-      result.append((k, h1.get(k, 0) + h2.get(k, 0)))
-    return result
-
   result = copy.deepcopy(result_list[0])
   DropUnaggregated(result)
+  # Maps group name to the Histogram accumulating its combined histogram.
+  histograms = {}
 
   for indiv in result_list[1:]:
     for group_name, group in indiv['groups'].iteritems():
@@ -374,9 +571,10 @@ def _CombineResults(result_list, combine_histograms=True):
             op(result['groups'][group_name]['statistics'][k], v))
 
       if combine_histograms:
-        result['groups'][group_name]['histogram'] = CombineHistograms(
-            result['groups'][group_name]['histogram'],
-            group['histogram'])
+        if group_name not in histograms:
+          histograms[group_name] = _ToHistogram(
+              result['groups'][group_name]['histogram'])
+        histograms[group_name].AddAll(group['histogram'])
       else:
         result['groups'][group_name].pop('histogram', None)
     result['client'] = ' '.join((result['client'], indiv['client']))
@@ -385,9 +583,161 @@ def _CombineResults(result_list, combine_histograms=True):
     if 'target' in result and 'target' in indiv:
       result['target'] += indiv['target']
 
+  for group_name, histogram in histograms.iteritems():
+    result['groups'][group_name]['histogram'] = histogram.Items()
+
+  if all('status_intervals' in indiv for indiv in result_list):
+    result['status_intervals'] = _MergeStatusIntervals(
+        [indiv['status_intervals'] for indiv in result_list])
+  else:
+    result.pop('status_intervals', None)
+
   return result
 
 
+def _LatencyPercentile(ycsb_result, percentile):
+  """Returns the highest latency percentile of any operation, or None.
+
+  Args:
+    ycsb_result: dict. Result of ParseResults or _CombineResults.
+    percentile: float. Percentile to compute.
+
+  Returns:
+    float, in ms, or None if no operation has a histogram.
+  """
+  latencies = []
+  for group_name, group in ycsb_result['groups'].iteritems():
+    if group_name in ('overall', 'cleanup') or not group.get('histogram'):
+      continue
+    latencies.extend(
+        _PercentilesFromHistogram(group['histogram'], [percentile]).values())
+  return max(latencies) if latencies else None
+
+
+def _SearchTarget(measure, max_iterations, tolerance):
+  """Searches for the highest target throughput that meets a latency SLO.
+
+  The first iteration is unthrottled, to find the throughput at saturation. If
+  it meets the SLO, the search is over. Otherwise the target is bisected
+  between 0 and the saturation throughput, until the range is narrower than
+  'tolerance' times the saturation throughput or 'max_iterations' have run.
+
+  Args:
+    measure: function taking a target throughput, or None for an unthrottled
+      run, and returning a TargetSearchPoint.
+    max_iterations: int. Maximum number of calls to 'measure'.
+    tolerance: float. Fraction of the saturation throughput at which to stop.
+
+  Returns:
+    A tuple of the highest TargetSearchPoint that met the SLO, or None, and a
+    list of all TargetSearchPoints in the order they were measured.
+  """
+  saturation = measure(None)
+  points = [saturation]
+  if saturation.meets_slo:
+    return saturation, points
+
+  best = None
+  low, high = 0, saturation.throughput
+  while len(points) < max_iterations and high - low > tolerance * high:
+    target = int((low + high) / 2)
+    if target <= low:
+      break
+    point = measure(target)
+    points.append(point)
+    if point.meets_slo:
+      best = point
+      low = target
+    else:
+      high = target
+  return best, points
+
+
+def _CreateTargetSearchSamples(best, points, slo_ms, percentile, metadata):
+  """Create PKB samples from a target throughput search.
+
+  Args:
+    best: TargetSearchPoint or None. Result of the search.
+    points: list of TargetSearchPoint. Every iteration of the search.
+    slo_ms: float. Latency SLO of the search.
+    percentile: float. Latency percentile of the SLO.
+    metadata: dict. Base metadata for each sample.
+
+  Returns:
+    List of sample.Sample objects: the latency and throughput of each
+    iteration, followed by the highest throughput that met the SLO (0 if none
+    did).
+  """
+  base_metadata = metadata.copy()
+  base_metadata.update(latency_slo_ms=slo_ms, latency_percentile=percentile)
+  samples = []
+  for iteration, point in enumerate(points):
+    meta = base_metadata.copy()
+    meta.update(iteration=iteration, target=point.target,
+                throughput=point.throughput, meets_slo=point.meets_slo)
+    if point.latency is not None:
+      samples.append(sample.Sample('target search latency', point.latency,
+                                   'ms', meta))
+    samples.append(sample.Sample('target search throughput',
+                                 point.throughput, 'ops/sec', meta))
+
+  meta = base_metadata.copy()
+  meta.update(iterations=len(points))
+  if best is None:
+    logging.warning('No YCSB target throughput met the p%s latency SLO of '
+                    '%s ms.', percentile, slo_ms)
+    throughput = 0.0
+  else:
+    meta.update(target=best.target, latency=best.latency)
+    throughput = best.throughput
+  samples.append(sample.Sample('max throughput under latency SLO', throughput,
+                               'ops/sec', meta))
+  return samples
+
+
+def _SplitLoadChunks(record_count, chunk_size):
+  """Splits 'record_count' records into LoadChunks of at most 'chunk_size'."""
+  return [LoadChunk(start, min(chunk_size, record_count - start))
+          for start in xrange(0, record_count, chunk_size)]
+
+
+class _LoadCheckpoint(object):
+  """Records completed load chunks in a local file.
+
+  Each completed chunk is appended to the file as one line of JSON, so the
+  record survives PKB being interrupted, and a line cut short by a crash only
+  loses that chunk.
+  """
+
+  def __init__(self, path):
+    self.path = path
+    self._lock = threading.Lock()
+
+  def CompletedChunks(self):
+    """Returns the set of LoadChunks recorded as complete."""
+    completed = set()
+    if not os.path.exists(self.path):
+      return completed
+    with open(self.path) as fp:
+      for line in fp:
+        try:
+          record = json.loads(line)
+        except ValueError:
+          continue
+        completed.add(LoadChunk(record['insertstart'], record['insertcount']))
+    return completed
+
+  def Record(self, chunk, **kwargs):
+    """Records 'chunk' as complete, along with any keyword arguments."""
+    record = dict(kwargs, insertstart=chunk.insertstart,
+                  insertcount=chunk.insertcount)
+    with self._lock:
+      with open(self.path, 'a') as fp:
+        fp.write(json.dumps(record, sort_keys=True) + '\n')
+        fp.flush()
+        os.fsync(fp.fileno())
+
+
 def _ParseWorkload(contents):
   """Parse a YCSB workload file.
 
@@ -413,12 +763,72 @@ def _ParseWorkload(contents):
   return result
 
 
-def _CreateSamples(ycsb_result, include_histogram=True, **kwargs):
+def _CreateTimeseriesSamples(intervals, metadata, warmup_seconds=0,
+                             cooldown_seconds=0):
+  """Create PKB samples from merged status intervals.
+
+  Args:
+    intervals: list of StatusInterval, in order.
+    metadata: dict. Base metadata for each sample.
+    warmup_seconds: Number of seconds at the start of the timeseries to
+      exclude from the steady state samples.
+    cooldown_seconds: Number of seconds at the end of the timeseries to exclude
+      from the steady state samples.
+
+  Returns:
+    List of sample.Sample objects. There is one throughput sample and one
+    latency sample per operation for each interval, timestamped with the start
+    of the interval, followed by steady state throughput and latencies.
+  """
+  samples = []
+  steady_state = _TrimStatusIntervals(intervals, warmup_seconds,
+                                      cooldown_seconds)
+  steady_state_windows = frozenset(i.timestamp for i in steady_state)
+  for interval in intervals:
+    meta = metadata.copy()
+    meta.update(elapsed_seconds=interval.timestamp - intervals[0].timestamp,
+                clients_reporting=interval.clients,
+                steady_state=interval.timestamp in steady_state_windows)
+    samples.append(sample.Sample('overall interval throughput',
+                                 interval.throughput, 'ops/sec', meta,
+                                 timestamp=interval.timestamp))
+    for name, (average, _) in sorted(interval.latencies.iteritems()):
+      samples.append(sample.Sample(' '.join([name, 'interval average latency']),
+                                   average, 'ms', meta,
+                                   timestamp=interval.timestamp))
+
+  if steady_state:
+    meta = metadata.copy()
+    meta.update(warmup_seconds=warmup_seconds,
+                cooldown_seconds=cooldown_seconds,
+                steady_state_intervals=len(steady_state))
+    throughput = (sum(i.throughput for i in steady_state) /
+                  len(steady_state))
+    combined = _CombineStatusIntervals(None, steady_state, throughput, None)
+    samples.append(sample.Sample('overall steady state throughput',
+                                 throughput, 'ops/sec', meta))
+    for name, (average, _) in sorted(combined.latencies.iteritems()):
+      samples.append(sample.Sample(
+          ' '.join([name, 'steady state average latency']), average, 'ms',
+          meta))
+  return samples
+
+
+def _CreateSamples(ycsb_result, include_histogram=True,
+                   single_histogram_sample=False, timeseries_warmup_seconds=0,
+                   timeseries_cooldown_seconds=0, **kwargs):
   """Create PKB samples from a YCSB result.
 
   Args:
     ycsb_result: dict. Result of ParseResults.
     include_histogram: bool. If True, include records for each histogram bin.
+    single_histogram_sample: bool. If True, and include_histogram is True,
+      include one record per histogram, holding the serialized histogram in
+      its metadata, rather than one record per bin.
+    timeseries_warmup_seconds: int. If the result has status intervals, the
+      number of seconds to exclude from the start of the steady state.
+    timeseries_cooldown_seconds: int. Like timeseries_warmup_seconds, but for
+      the end of the steady state.
     **kwargs: Base metadata for each sample.
 
   Returns:
@@ -449,12 +859,53 @@ def _CreateSamples(ycsb_result, include_histogram=True, **kwargs):
         yield sample.Sample(' '.join([group_name, label, 'latency']),
                             value, 'ms', meta)
 
-    if include_histogram:
+    if include_histogram and single_histogram_sample:
+      if group['histogram']:
+        histogram = _ToHistogram(group['histogram'])
+        histogram_meta = meta.copy()
+        histogram_meta['histogram'] = histogram.ToJson()
+        yield sample.Sample('{0}_latency_histogram'.format(group_name),
+                            histogram.total_count, 'count', histogram_meta)
+    elif include_histogram:
       for time_ms, count in group['histogram']:
         yield sample.Sample(
             '{0}_latency_histogram_{1}_ms'.format(group_name, time_ms),
             count, 'count', meta)
 
+  if ycsb_result.get('status_intervals'):
+    for s in _CreateTimeseriesSamples(ycsb_result['status_intervals'],
+                                      base_metadata,
+                                      timeseries_warmup_seconds,
+                                      timeseries_cooldown_seconds):
+      yield s
+
+
+def _WaitForResults(handles):
+  """Waits for YCSB commands started on client VMs and parses their output.
+
+  Args:
+    handles: list of RobustCommandHandles.
+
+  Returns:
+    List of parsed results, as returned by ParseResults, in the order of
+    'handles'. If a handle's stderr was consumed by a StatusParser, its result
+    also has a 'status_intervals' key with the parser's intervals.
+  """
+  multiplexer = vm_util.RobustCommandMultiplexer()
+  for handle in handles:
+    multiplexer.Add(handle)
+  return [_ParseHandleResult(handle, stdout)
+          for handle, (stdout, _) in zip(handles, multiplexer.WaitAll())]
+
+
+def _ParseHandleResult(handle, stdout):
+  """Parses the stdout of a YCSB command started by YCSBExecutor."""
+  result = ParseResults(str(stdout))
+  if isinstance(handle.stderr_consumer, StatusParser):
+    result['status_intervals'] = _MergeStatusIntervals(
+        [handle.stderr_consumer.intervals])
+  return result
+
 
 class YCSBExecutor(object):
   """Load data and run benchmarks using YCSB.
@@ -491,8 +942,11 @@ class YCSBExecutor(object):
     self.parameter_files = parameter_files or []
     self.parameters = kwargs.copy()
 
-  def _BuildCommand(self, command_name, parameter_files=None, **kwargs):
+  def _BuildCommand(self, command_name, parameter_files=None,
+                    report_status=False, **kwargs):
     command = [YCSB_EXE, command_name, self.database]
+    if report_status:
+      command.append('-s')
 
     parameters = self.parameters.copy()
     parameters.update(kwargs)
@@ -512,16 +966,28 @@ class YCSBExecutor(object):
 
     return ' '.join(command)
 
-  def _Load(self, vm, **kwargs):
-    """Execute 'ycsb load' on 'vm'."""
+  def _StartCommand(self, vm, command_name, **kwargs):
+    """Start a YCSB command on 'vm'. Returns a RobustCommandHandle.
+
+    With --ycsb_timeseries, YCSB's status output is parsed by a StatusParser
+    as the command runs.
+    """
+    status_parser = None
+    if FLAGS.ycsb_timeseries:
+      kwargs['status.interval'] = FLAGS.ycsb_status_interval
+      status_parser = StatusParser(FLAGS.ycsb_status_interval)
+    command = self._BuildCommand(command_name,
+                                 report_status=FLAGS.ycsb_timeseries, **kwargs)
+    return vm.RobustRemoteCommandAsync(command, stderr_consumer=status_parser)
+
+  def _StartLoad(self, vm, **kwargs):
+    """Start 'ycsb load' on 'vm'. Returns a RobustCommandHandle."""
     kwargs.setdefault('threads', FLAGS.ycsb_preload_threads)
     kwargs.setdefault('recordcount', FLAGS.ycsb_record_count)
     for pv in FLAGS.ycsb_load_parameters:
       param, value = pv.split('=', 1)
       kwargs[param] = value
-    command = self._BuildCommand('load', **kwargs)
-    stdout, _ = vm.RobustRemoteCommand(command)
-    return ParseResults(str(stdout))
+    return self._StartCommand(vm, 'load', **kwargs)
 
   def _LoadThreaded(self, vms, workload_file, **kwargs):
     """Runs "Load" in parallel for each VM in VMs.
@@ -534,8 +1000,6 @@ class YCSBExecutor(object):
     Returns:
       List of sample.Sample objects.
     """
-    results = []
-
     remote_path = posixpath.join(vm_util.VM_TMP_DIR,
                                  os.path.basename(workload_file))
     kwargs.setdefault('threads', FLAGS.ycsb_preload_threads)
@@ -560,15 +1024,19 @@ class YCSBExecutor(object):
 
     kwargs['parameter_files'] = [remote_path]
 
-    def _Load(loader_index):
+    if FLAGS.ycsb_load_chunk_size:
+      return self._LoadChunks(vms, workload_file, record_count, workload_meta,
+                              **kwargs)
+
+    def _StartLoad(loader_index):
       start = sum(loader_counts[:loader_index])
       kw = kwargs.copy()
       kw.update(insertstart=start,
                 insertcount=loader_counts[loader_index])
-      results.append(self._Load(vms[loader_index], **kw))
-      logging.info('VM %d (%s) finished', loader_index, vms[loader_index])
+      return self._StartLoad(vms[loader_index], **kw)
 
-    vm_util.RunThreaded(_Load, range(len(vms)))
+    handles = vm_util.RunThreaded(_StartLoad, range(len(vms)))
+    results = _WaitForResults(handles)
 
     if len(results) != len(vms):
       raise IOError('Missing results: only {0}/{1} reported\n{2}'.format(
@@ -580,24 +1048,136 @@ class YCSBExecutor(object):
         samples.extend(_CreateSamples(
             result, result_type='individual', result_index=i,
             include_histogram=FLAGS.ycsb_histogram,
+            single_histogram_sample=FLAGS.ycsb_histogram_single_sample,
+            timeseries_warmup_seconds=FLAGS.ycsb_timeseries_warmup_seconds,
+            timeseries_cooldown_seconds=(
+                FLAGS.ycsb_timeseries_cooldown_seconds),
             **workload_meta))
 
     combined = _CombineResults(results)
     samples.extend(_CreateSamples(
         combined, result_type='combined',
         include_histogram=FLAGS.ycsb_histogram,
+        single_histogram_sample=FLAGS.ycsb_histogram_single_sample,
+        timeseries_warmup_seconds=FLAGS.ycsb_timeseries_warmup_seconds,
+        timeseries_cooldown_seconds=FLAGS.ycsb_timeseries_cooldown_seconds,
         **workload_meta))
 
     return samples
 
-  def _Run(self, vm, **kwargs):
-    """Run a single workload from a client vm."""
+  def _LoadChunks(self, vms, workload_file, record_count, workload_meta,
+                  **kwargs):
+    """Loads the records in chunks, from a work queue shared by all 'vms'.
+
+    Each VM runs --ycsb_load_concurrency_per_vm 'ycsb load' commands at a
+    time, each loading a chunk of --ycsb_load_chunk_size records from the
+    queue. The commands are waited on by a vm_util.RobustCommandMultiplexer,
+    and as each one completes, its chunk is recorded as complete and the VM
+    starts loading the next chunk, until the queue is empty. Chunks that an
+    earlier attempt in the same run completed are skipped.
+
+    Args:
+      vms: List of virtual machine instances. client nodes.
+      workload_file: YCSB Workload file to use.
+      record_count: int. Total number of records to load.
+      workload_meta: dict. Base metadata for each sample.
+      **kwargs: Additional key-value parameters to pass to YCSB.
+
+    Returns:
+      List of sample.Sample objects: the throughput of each chunk, followed by
+      samples for the combined results of the chunks loaded by this call.
+    """
+    chunk_size = FLAGS.ycsb_load_chunk_size
+    concurrency = FLAGS.ycsb_load_concurrency_per_vm
+    checkpoint = _LoadCheckpoint(os.path.join(
+        vm_util.GetTempDir(), 'ycsb-load-{0}-{1}-{2}-{3}.chunks'.format(
+            self.database, os.path.basename(workload_file), record_count,
+            chunk_size)))
+    completed = checkpoint.CompletedChunks()
+    chunks = [chunk for chunk in _SplitLoadChunks(record_count, chunk_size)
+              if chunk not in completed]
+    if completed:
+      logging.info('Skipping %s YCSB load chunks recorded in %s.',
+                   len(completed), checkpoint.path)
+
+    workload_meta = workload_meta.copy()
+    workload_meta.update(
+        clients=len(vms) * concurrency * FLAGS.ycsb_preload_threads,
+        load_chunk_size=chunk_size, load_concurrency_per_vm=concurrency,
+        load_chunks=len(chunks), skipped_load_chunks=len(completed))
+
+    work_queue = Queue.Queue()
+    for chunk in chunks:
+      work_queue.put(chunk)
+    # List of (LoadChunk, VM name, result) tuples.
+    chunk_results = []
+
+    multiplexer = vm_util.RobustCommandMultiplexer()
+
+    def StartNextChunk(vm):
+      try:
+        chunk = work_queue.get_nowait()
+      except Queue.Empty:
+        return
+      kw = kwargs.copy()
+      kw.update(insertstart=chunk.insertstart,
+                insertcount=chunk.insertcount)
+      handle = self._StartLoad(vm, **kw)
+      multiplexer.Add(handle, lambda handle, output: ChunkLoaded(
+          vm, chunk, handle, output[0]))
+
+    def ChunkLoaded(vm, chunk, handle, stdout):
+      result = _ParseHandleResult(handle, stdout)
+      throughput = result['groups']['overall']['statistics'][
+          'Throughput(ops/sec)']
+      checkpoint.Record(chunk, throughput=throughput, vm=vm.name)
+      chunk_results.append((chunk, vm.name, result))
+      StartNextChunk(vm)
+
+    start_time = time.time()
+    vm_util.RunThreaded(StartNextChunk,
+                        [vm for vm in vms for _ in xrange(concurrency)])
+    multiplexer.WaitAll()
+    elapsed = time.time() - start_time
+
+    samples = []
+    for chunk, vm_name, result in sorted(chunk_results):
+      meta = workload_meta.copy()
+      meta.update(insertstart=chunk.insertstart,
+                  insertcount=chunk.insertcount, vm=vm_name)
+      samples.append(sample.Sample(
+          'chunk load throughput',
+          result['groups']['overall']['statistics']['Throughput(ops/sec)'],
+          'ops/sec', meta))
+    if not chunk_results:
+      return samples
+
+    # Chunks run both concurrently and one after another, so the combined
+    # throughput and run time come from the wall time of the whole load.
+    combined = _CombineResults([result for _, _, result in chunk_results])
+    overall = combined['groups']['overall']['statistics']
+    overall['RunTime(ms)'] = elapsed * 1000
+    overall['Throughput(ops/sec)'] = (
+        sum(chunk.insertcount for chunk in chunks) / elapsed)
+    samples.extend(_CreateSamples(
+        combined, result_type='combined',
+        include_histogram=FLAGS.ycsb_histogram,
+        single_histogram_sample=FLAGS.ycsb_histogram_single_sample,
+        timeseries_warmup_seconds=FLAGS.ycsb_timeseries_warmup_seconds,
+        timeseries_cooldown_seconds=FLAGS.ycsb_timeseries_cooldown_seconds,
+        **workload_meta))
+    return samples
+
+  def _StartRun(self, vm, **kwargs):
+    """Start a single workload from a client vm.
+
+    Returns:
+      RobustCommandHandle.
+    """
     for pv in FLAGS.ycsb_run_parameters:
       param, value = pv.split('=', 1)
       kwargs[param] = value
-    command = self._BuildCommand('run', **kwargs)
-    stdout, _ = vm.RobustRemoteCommand(command)
-    return ParseResults(str(stdout))
+    return self._StartCommand(vm, 'run', **kwargs)
 
   def _RunThreaded(self, vms, **kwargs):
     """Run a single workload using `vms`."""
@@ -610,14 +1190,12 @@ class YCSBExecutor(object):
     else:
       targets = [target for _ in vms]
 
-    results = []
-
-    def _Run(loader_index):
-      vm = vms[loader_index]
-      kwargs['target'] = targets[loader_index]
-      results.append(self._Run(vm, **kwargs))
-      logging.info('VM %d (%s) finished', loader_index, vm)
-    vm_util.RunThreaded(_Run, range(len(vms)))
+    def _StartRun(loader_index):
+      kw = kwargs.copy()
+      kw['target'] = targets[loader_index]
+      return self._StartRun(vms[loader_index], **kw)
+    handles = vm_util.RunThreaded(_StartRun, range(len(vms)))
+    results = _WaitForResults(handles)
 
     if len(results) != len(vms):
       raise IOError('Missing results: only {0}/{1} reported\n{2}'.format(
@@ -625,6 +1203,27 @@ class YCSBExecutor(object):
 
     return results
 
+  def _PushRunWorkload(self, vms, workload_file, workload_index, **kwargs):
+    """Copy a workload file to 'vms' for the run stage.
+
+    Returns:
+      A tuple of the remote path of the workload file and its metadata.
+    """
+    remote_path = posixpath.join(vm_util.VM_TMP_DIR,
+                                 os.path.basename(workload_file))
+
+    with open(workload_file) as fp:
+      workload_meta = _ParseWorkload(fp.read())
+      workload_meta.update(kwargs)
+      workload_meta.update(workload_name=os.path.basename(workload_file),
+                           workload_index=workload_index,
+                           stage='run')
+
+    def PushWorkload(vm):
+      vm.PushFile(workload_file, remote_path)
+    vm_util.RunThreaded(PushWorkload, vms)
+    return remote_path, workload_meta
+
   def RunStaircaseLoads(self, vms, workloads, **kwargs):
     """Run each workload in 'workloads' in succession.
 
@@ -646,19 +1245,8 @@ class YCSBExecutor(object):
       if FLAGS.ycsb_timelimit:
         parameters['maxexecutiontime'] = FLAGS.ycsb_timelimit
       parameters.update(kwargs)
-      remote_path = posixpath.join(vm_util.VM_TMP_DIR,
-                                   os.path.basename(workload_file))
-
-      with open(workload_file) as fp:
-        workload_meta = _ParseWorkload(fp.read())
-        workload_meta.update(kwargs)
-        workload_meta.update(workload_name=os.path.basename(workload_file),
-                             workload_index=workload_index,
-                             stage='run')
-
-      def PushWorkload(vm):
-        vm.PushFile(workload_file, remote_path)
-      vm_util.RunThreaded(PushWorkload, vms)
+      remote_path, workload_meta = self._PushRunWorkload(
+          vms, workload_file, workload_index, **kwargs)
 
       parameters['parameter_files'] = [remote_path]
       for client_count in _GetThreadsPerLoaderList():
@@ -675,22 +1263,91 @@ class YCSBExecutor(object):
                 result_type='individual',
                 result_index=i,
                 include_histogram=FLAGS.ycsb_histogram,
+                single_histogram_sample=FLAGS.ycsb_histogram_single_sample,
+                timeseries_warmup_seconds=FLAGS.ycsb_timeseries_warmup_seconds,
+                timeseries_cooldown_seconds=(
+                    FLAGS.ycsb_timeseries_cooldown_seconds),
                 **client_meta))
 
         combined = _CombineResults(results)
         all_results.extend(_CreateSamples(
             combined, result_type='combined',
             include_histogram=FLAGS.ycsb_histogram,
+            single_histogram_sample=FLAGS.ycsb_histogram_single_sample,
+            timeseries_warmup_seconds=FLAGS.ycsb_timeseries_warmup_seconds,
+            timeseries_cooldown_seconds=(
+                FLAGS.ycsb_timeseries_cooldown_seconds),
             **client_meta))
 
     return all_results
 
+  def RunTargetSearch(self, vms, workloads, **kwargs):
+    """Search for the highest throughput that meets a latency SLO.
+
+    For each workload file, runs short iterations at a series of target
+    throughputs, as described in _SearchTarget, using the largest value in
+    ycsb_threads_per_client. An iteration meets the SLO if the
+    --ycsb_target_search_percentile latency of every operation is within
+    --ycsb_target_search_slo_ms and, if throttled, it came within
+    --ycsb_target_search_tolerance of its target.
+
+    Args:
+      vms: List of VirtualMachine objects to generate load from.
+      workloads: List of workload file paths.
+      **kwargs: Additional parameters to pass to each run.  See constructor for
+      options.
+
+    Returns:
+      List of sample.Sample objects describing the latency curve and the
+      highest throughput found for each workload.
+    """
+    slo_ms = FLAGS.ycsb_target_search_slo_ms
+    percentile = FLAGS.ycsb_target_search_percentile
+    tolerance = FLAGS.ycsb_target_search_tolerance
+    client_count = max(_GetThreadsPerLoaderList())
+    all_results = []
+    for workload_index, workload_file in enumerate(workloads):
+      parameters = {'operationcount': FLAGS.ycsb_operation_count,
+                    'recordcount': FLAGS.ycsb_record_count,
+                    'maxexecutiontime':
+                        FLAGS.ycsb_target_search_iteration_seconds}
+      parameters.update(kwargs)
+      remote_path, workload_meta = self._PushRunWorkload(
+          vms, workload_file, workload_index, **kwargs)
+      parameters.update(parameter_files=[remote_path], threads=client_count)
+      # The search sets the target of each iteration.
+      parameters.pop('target', None)
+      workload_meta.update(clients=len(vms) * client_count,
+                           threads_per_client_vm=client_count)
+
+      def Measure(target):
+        combined = _CombineResults(
+            self._RunThreaded(vms, target=target, **parameters))
+        throughput = combined['groups']['overall']['statistics'][
+            'Throughput(ops/sec)']
+        latency = _LatencyPercentile(combined, percentile)
+        meets_slo = latency is not None and latency <= slo_ms
+        if target is not None:
+          meets_slo = meets_slo and throughput >= target * (1 - tolerance)
+        logging.info('YCSB target %s: %s ops/sec, p%s latency %s ms.',
+                     target, throughput, percentile, latency)
+        return TargetSearchPoint(target, throughput, latency, meets_slo)
+
+      best, points = _SearchTarget(
+          Measure, FLAGS.ycsb_target_search_max_iterations, tolerance)
+      all_results.extend(_CreateTargetSearchSamples(
+          best, points, slo_ms, percentile, workload_meta))
+
+    return all_results
+
   def LoadAndRun(self, vms, workloads=None, load_kwargs=None, run_kwargs=None):
     """Load data using YCSB, then run each workload/client count combination.
 
     Loads data using the workload defined by 'workloads', then
     executes YCSB for each workload file in 'workloads', for each
-    client count defined in FLAGS.ycsb_threads_per_client.
+    client count defined in FLAGS.ycsb_threads_per_client. With
+    --ycsb_target_search, searches for the highest throughput that meets a
+    latency SLO for each workload file instead.
 
     Generally database benchmarks using YCSB should only need to call this
     method.
@@ -708,8 +1365,11 @@ class YCSBExecutor(object):
     assert workloads, 'no workloads'
     load_samples = list(self._LoadThreaded(vms, workloads[0],
                                            **(load_kwargs or {})))
-    run_samples = list(self.RunStaircaseLoads(vms, workloads,
-                                              **(run_kwargs or {})))
+    if FLAGS.ycsb_target_search:
+      run_samples = self.RunTargetSearch(vms, workloads, **(run_kwargs or {}))
+    else:
+      run_samples = list(self.RunStaircaseLoads(vms, workloads,
+                                                **(run_kwargs or {})))
     if FLAGS.ycsb_load_samples:
       return load_samples + run_samples
     else:
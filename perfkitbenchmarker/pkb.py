@@ -54,13 +54,16 @@ resources
 """
 
 import collections
+import functools
 import getpass
 import logging
 import sys
 import uuid
 
 from perfkitbenchmarker import archive
+from perfkitbenchmarker import artifact_cache
 from perfkitbenchmarker import benchmarks
+from perfkitbenchmarker import benchmark_scheduler
 from perfkitbenchmarker import benchmark_sets
 from perfkitbenchmarker import benchmark_spec
 from perfkitbenchmarker import benchmark_status
@@ -70,10 +73,14 @@ from perfkitbenchmarker import errors
 from perfkitbenchmarker import events
 from perfkitbenchmarker import flags
 from perfkitbenchmarker import log_util
+from perfkitbenchmarker import publisher
+from perfkitbenchmarker import sample
 from perfkitbenchmarker import static_virtual_machine
 from perfkitbenchmarker import timing_util
 from perfkitbenchmarker import traces
+from perfkitbenchmarker import tracing
 from perfkitbenchmarker import version
+from perfkitbenchmarker import vm_pool
 from perfkitbenchmarker import vm_util
 from perfkitbenchmarker import windows_benchmarks
 from perfkitbenchmarker.publisher import SampleCollector
@@ -85,11 +92,15 @@ STAGE_CLEANUP = 'cleanup'
 LOG_FILE_NAME = 'pkb.log'
 REQUIRED_INFO = ['scratch_disk', 'num_machines']
 REQUIRED_EXECUTABLES = frozenset(['ssh', 'ssh-keygen', 'scp', 'openssl'])
+# Command-line arguments that make the flags library print help text.
+_HELP_ARGS = frozenset(['-?', '-h', '-help', '--help', '-helpshort',
+                        '--helpshort', '-helpxml', '--helpxml'])
 FLAGS = flags.FLAGS
 
 flags.DEFINE_list('ssh_options', [], 'Additional options to pass to ssh.')
 flags.DEFINE_integer('parallelism', 1,
-                     'The number of benchmarks to run in parallel.')
+                     'The number of benchmarks to run in parallel. See '
+                     'benchmark_scheduler.py for how they are scheduled.')
 flags.DEFINE_list('benchmarks', [benchmark_sets.STANDARD_SET],
                   'Benchmarks and/or benchmark sets that should be run. The '
                   'default is the standard set. For more information about '
@@ -160,11 +171,12 @@ flags.DEFINE_bool('install_packages', True,
                   'packages installed.')
 flags.DEFINE_bool(
     'stop_after_benchmark_failure', False,
-    'Determines response when running multiple benchmarks serially and a '
-    'benchmark run fails. When True, no further benchmarks are scheduled, and '
-    'execution ends. When False, benchmarks continue to be scheduled. Does not '
-    'apply to keyboard interrupts, which will always prevent further '
-    'benchmarks from being scheduled.')
+    'Determines response when running multiple benchmarks and a benchmark '
+    'run fails. When True, no further benchmarks are scheduled, and '
+    'execution ends once the running benchmarks finish. When False, '
+    'benchmarks continue to be scheduled. Does not apply to keyboard '
+    'interrupts, which will always prevent further benchmarks from being '
+    'scheduled.')
 
 # Support for using a proxy in the cloud environment.
 flags.DEFINE_string('http_proxy', '',
@@ -212,6 +224,24 @@ def DoPreparePhase(benchmark, name, spec, timer):
     benchmark.Prepare(spec)
 
 
+def _CreatePackageInstallSamples(spec):
+  """Creates samples of the time taken to install each package on each VM.
+
+  Args:
+    spec: The BenchmarkSpec whose VMs were prepared.
+
+  Returns:
+    List of sample.Sample objects.
+  """
+  samples = []
+  for vm in spec.vms:
+    for package_name, install_time in vm.package_install_times.iteritems():
+      samples.append(sample.Sample(
+          'Package Install Runtime', install_time, 'seconds',
+          {'package': package_name, 'vm_name': vm.name}))
+  return samples
+
+
 def DoRunPhase(benchmark, name, spec, collector, timer):
   """Performs the Run phase of benchmark execution.
 
@@ -229,8 +259,11 @@ def DoRunPhase(benchmark, name, spec, collector, timer):
     with timer.Measure('Benchmark Run'):
       samples = benchmark.Run(spec)
   finally:
-    events.after_phase.send(events.RUN_PHASE, benchmark_spec=spec)
+    responses = events.after_phase.send(events.RUN_PHASE, benchmark_spec=spec)
   collector.AddSamples(samples, name, spec)
+  for _, trace_samples in responses:
+    if trace_samples:
+      collector.AddSamples(trace_samples, name, spec)
 
 
 def DoCleanupPhase(benchmark, name, spec, timer):
@@ -245,11 +278,15 @@ def DoCleanupPhase(benchmark, name, spec, timer):
   """
   logging.info('Cleaning up benchmark %s', name)
 
-  if spec.always_call_cleanup or any([vm.is_static for vm in spec.vms]):
+  # VMs are only returned to the pool once the benchmark has cleaned up after
+  # itself.
+  release_vms = vm_pool.IsEnabled()
+  if (spec.always_call_cleanup or release_vms or
+      any([vm.is_static for vm in spec.vms])):
     with timer.Measure('Benchmark Cleanup'):
       benchmark.Cleanup(spec)
   with timer.Measure('Resource Teardown'):
-    spec.Delete()
+    spec.Delete(release_vms=release_vms)
 
 
 def RunBenchmark(benchmark, collector, sequence_number, total_benchmarks,
@@ -318,6 +355,15 @@ def RunBenchmark(benchmark, collector, sequence_number, total_benchmarks,
       collector.AddSamples(
           detailed_timer.GenerateSamples(include_runtimes, include_timestamps),
           benchmark_name, spec)
+      if include_runtimes and FLAGS.run_stage in [STAGE_ALL, STAGE_PREPARE]:
+        collector.AddSamples(_CreatePackageInstallSamples(spec),
+                             benchmark_name, spec)
+      collector.AddSamples(artifact_cache.CreateSamples(spec.uid),
+                           benchmark_name, spec)
+      collector.AddSamples(vm_pool.CreateSamples(spec.uid), benchmark_name,
+                           spec)
+      collector.AddSamples(tracing.CreateSamples(spec.uid), benchmark_name,
+                           spec)
 
     except Exception:
       # Resource cleanup (below) can take a long time. Log the error to give
@@ -331,6 +377,7 @@ def RunBenchmark(benchmark, collector, sequence_number, total_benchmarks,
       raise
     finally:
       if spec:
+        collector.FinishBenchmark(benchmark_name, spec)
         if FLAGS.run_stage in [STAGE_ALL, STAGE_CLEANUP]:
           spec.Delete()
         # Pickle spec to save final resource state.
@@ -387,6 +434,9 @@ def SetUpPKB():
   logging.info('PerfKitBenchmarker version: %s', version.VERSION)
 
   vm_util.SSHKeyGen()
+  vm_util.SetMaxWorkerThreads(FLAGS.max_worker_threads)
+  if FLAGS.trace_spans:
+    tracing.Enable()
 
   events.initialization_complete.send(parsed_flags=FLAGS)
 
@@ -411,7 +461,12 @@ def RunBenchmarks(publish=True):
                   'running on Windows.')
     return 1
 
-  collector = SampleCollector()
+  if FLAGS.publish_streaming:
+    collector = publisher.StreamingSampleCollector(
+        vm_util.PrependTempDir(publisher.DEFAULT_JOURNAL_NAME),
+        FLAGS.publish_batch_size)
+  else:
+    collector = SampleCollector()
 
   if FLAGS.static_vm_file:
     with open(FLAGS.static_vm_file) as fp:
@@ -423,52 +478,44 @@ def RunBenchmarks(publish=True):
     benchmark_tuple_list = benchmark_sets.GetBenchmarksFromFlags()
     total_benchmarks = len(benchmark_tuple_list)
 
+    estimated_runtimes = {}
+    if FLAGS.parallelism > 1:
+      estimated_runtimes = benchmark_scheduler.GetEstimatedRuntimes(
+          FLAGS.results_store_path)
     benchmark_counts = collections.Counter()
-    args = []
+    tasks = []
     for i, benchmark_tuple in enumerate(benchmark_tuple_list):
       benchmark_module, user_config = benchmark_tuple
-      benchmark_uid = (benchmark_module.BENCHMARK_NAME +
-                       str(benchmark_counts[benchmark_module]))
+      benchmark_name = benchmark_module.BENCHMARK_NAME
+      benchmark_uid = benchmark_name + str(benchmark_counts[benchmark_module])
       benchmark_counts[benchmark_module] += 1
-      args.append(
-          ((benchmark_module, collector, i + 1, total_benchmarks,
-            benchmark_module.GetConfig(user_config), benchmark_uid), {}))
-
-    if FLAGS.parallelism > 1:
-      vm_util.RunThreaded(
-          RunBenchmark, args, max_concurrent_threads=FLAGS.parallelism)
-    else:
-      stop_scheduling_benchmarks = False
-      for run_args, _ in args:
-        benchmark_module, _, sequence_number, _, _, benchmark_uid = run_args
-        benchmark_name = benchmark_module.BENCHMARK_NAME
-        if stop_scheduling_benchmarks:
-          run_status_tuples.append((benchmark_name, benchmark_uid,
-                                    benchmark_status.SKIPPED))
-        else:
-          try:
-            RunBenchmark(*run_args)
-            run_status_tuples.append((benchmark_name, benchmark_uid,
-                                      benchmark_status.SUCCEEDED))
-          except BaseException as e:
-            run_status_tuples.append((benchmark_name, benchmark_uid,
-                                      benchmark_status.FAILED))
-            msg = 'Benchmark {0}/{1} {2} (UID: {3}) failed.'.format(
-                sequence_number, total_benchmarks, benchmark_name,
-                benchmark_uid)
-            if (isinstance(e, KeyboardInterrupt) or
-                FLAGS.stop_after_benchmark_failure):
-              logging.error('%s Execution will not continue.', msg)
-              stop_scheduling_benchmarks = True
-            else:
-              logging.error('%s Execution will continue.', msg)
+      benchmark_config = benchmark_module.GetConfig(user_config)
+      run = functools.partial(
+          RunBenchmark, benchmark_module, collector, i + 1, total_benchmarks,
+          benchmark_config, benchmark_uid)
+      tasks.append(benchmark_scheduler.Task(
+          benchmark_name, benchmark_uid, run,
+          benchmark_scheduler.GetDemand(benchmark_config),
+          estimated_runtimes.get(benchmark_name)))
+
+    scheduler = benchmark_scheduler.BenchmarkScheduler(
+        FLAGS.parallelism, max_vms=FLAGS.max_concurrent_vms,
+        max_vcpus=FLAGS.max_concurrent_vcpus,
+        stop_on_failure=FLAGS.stop_after_benchmark_failure)
+    run_status_tuples = scheduler.Run(tasks)
 
   finally:
-    if collector.samples:
+    vm_pool.DeleteAll()
+    if collector.samples or FLAGS.publish_streaming:
       collector.PublishSamples()
 
     if run_status_tuples:
       logging.info(benchmark_status.CreateSummary(run_status_tuples))
+    if tracing.IsEnabled():
+      trace_path = vm_util.PrependTempDir(tracing.TRACE_FILE_NAME)
+      tracing.WriteChromeTrace(trace_path)
+      logging.info('Spans written to %s.', trace_path)
+    logging.info('Worker thread pool stats: %s', vm_util.GetWorkerPoolStats())
     logging.info('Complete logs can be found at: %s',
                  vm_util.PrependTempDir(LOG_FILE_NAME))
 
@@ -514,6 +561,16 @@ def _GenerateBenchmarkDocumentation():
   return '\n\t'.join(benchmark_docs)
 
 
+def _IsHelpRequested(argv):
+  """Returns whether 'argv' asks for help text, e.g. with --help."""
+  for arg in argv[1:]:
+    if arg == '--':
+      break
+    if arg.split('=', 1)[0] in _HELP_ARGS:
+      return True
+  return False
+
+
 def Main(argv=sys.argv):
   logging.basicConfig(level=logging.INFO)
 
@@ -521,20 +578,22 @@ def Main(argv=sys.argv):
   # message.
   # Inject more help documentation
   # The following appends descriptions of the benchmarks and descriptions of
-  # the benchmark sets to the help text.
-  benchmark_sets_list = [
-      '%s:  %s' %
-      (set_name, benchmark_sets.BENCHMARK_SETS[set_name]['message'])
-      for set_name in benchmark_sets.BENCHMARK_SETS]
-  sys.modules['__main__'].__doc__ = (
-      'PerfKitBenchmarker version: {version}\n\n{doc}\n'
-      'Benchmarks (default requirements):\n'
-      '\t{benchmark_doc}').format(
-          version=version.VERSION,
-          doc=__doc__,
-          benchmark_doc=_GenerateBenchmarkDocumentation())
-  sys.modules['__main__'].__doc__ += ('\n\nBenchmark Sets:\n\t%s'
-                                      % '\n\t'.join(benchmark_sets_list))
+  # the benchmark sets to the help text. Generating them loads every
+  # benchmark's config, so it is only done when help is requested.
+  if _IsHelpRequested(argv):
+    benchmark_sets_list = [
+        '%s:  %s' %
+        (set_name, benchmark_sets.BENCHMARK_SETS[set_name]['message'])
+        for set_name in benchmark_sets.BENCHMARK_SETS]
+    sys.modules['__main__'].__doc__ = (
+        'PerfKitBenchmarker version: {version}\n\n{doc}\n'
+        'Benchmarks (default requirements):\n'
+        '\t{benchmark_doc}').format(
+            version=version.VERSION,
+            doc=__doc__,
+            benchmark_doc=_GenerateBenchmarkDocumentation())
+    sys.modules['__main__'].__doc__ += ('\n\nBenchmark Sets:\n\t%s'
+                                        % '\n\t'.join(benchmark_sets_list))
 
   try:
     argv = FLAGS(argv)  # parse flags
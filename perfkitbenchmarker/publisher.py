@@ -15,18 +15,22 @@
 """Classes to collect and publish performance samples to various sinks."""
 
 import abc
+import collections
 import io
 import itertools
 import json
 import logging
 import operator
+import os
 import sys
+import threading
 import time
 import uuid
 
 from perfkitbenchmarker import disk
 from perfkitbenchmarker import events
 from perfkitbenchmarker import flags
+from perfkitbenchmarker import results_store
 from perfkitbenchmarker import version
 from perfkitbenchmarker import vm_util
 
@@ -69,6 +73,13 @@ flags.DEFINE_string(
     'service_account_private_key', None,
     'Service private key for authenticating with BQ.')
 
+flags.DEFINE_string(
+    'results_store_path',
+    None,
+    'Path of a SQLite database to add results to. The database can hold the '
+    'results of any number of runs, and can be queried with '
+    '"python -m perfkitbenchmarker.results_store".')
+
 flags.DEFINE_string(
     'gsutil_path', 'gsutil', 'path to the "gsutil" executable')
 flags.DEFINE_string(
@@ -83,7 +94,24 @@ flags.DEFINE_list(
     'samples as metadata. Each key-value pair in the list should be colon '
     'separated.')
 
+flags.DEFINE_boolean(
+    'publish_streaming',
+    False,
+    'Write samples to a journal file as soon as they are collected, and '
+    'publish them from the journal in batches while benchmarks run, instead '
+    'of holding every sample in memory until the end of the run. Samples '
+    'that were not published when PKB was killed are published when it is '
+    'restarted with the same --run_uri. Results are appended to --json_path.')
+flags.DEFINE_integer(
+    'publish_batch_size',
+    1000,
+    'Maximum number of samples published at a time with --publish_streaming.',
+    lower_bound=1)
+
 DEFAULT_JSON_OUTPUT_NAME = 'perfkitbenchmarker_results.json'
+DEFAULT_JOURNAL_NAME = 'perfkitbenchmarker_samples.journal'
+# Seconds between publishing batches with --publish_streaming.
+STREAMING_PUBLISH_INTERVAL = 30
 DEFAULT_CREDENTIALS_JSON = 'credentials.json'
 GCS_OBJECT_NAME_LENGTH = 20
 
@@ -112,7 +140,10 @@ class MetadataProvider(object):
   def AddMetadata(self, metadata, benchmark_spec):
     """Add metadata to a dictionary.
 
-    Existing values will be overwritten.
+    Existing values will be overwritten. SampleCollector calls this once per
+    benchmark spec, starting from an empty dictionary, and shares the result
+    between all of the spec's samples, so it should only depend on the spec
+    and the run.
 
     Args:
       metadata: dict. Dictionary of metadata to update.
@@ -141,6 +172,7 @@ class DefaultMetadataProvider(MetadataProvider):
       metadata[name_prefix + 'zone'] = vm.zone
       metadata[name_prefix + 'machine_type'] = vm.machine_type
       metadata[name_prefix + 'image'] = vm.image
+      metadata.update(vm.GetSampleMetadata())
 
       if vm.scratch_disks:
         data_disk = vm.scratch_disks[0]
@@ -175,12 +207,13 @@ class SamplePublisher(object):
   def PublishSamples(self, samples):
     """Publishes 'samples'.
 
-    PublishSamples will be called exactly once. Calling
+    SampleCollector calls PublishSamples exactly once, and calling
     SamplePublisher.PublishSamples multiple times may result in data being
-    overwritten.
+    overwritten. StreamingSampleCollector calls it once per batch, and
+    configures its default publishers to append.
 
     Args:
-      samples: list of dicts to publish.
+      samples: list of dicts, or dict-like AnnotatedSamples, to publish.
     """
     raise NotImplementedError()
 
@@ -470,6 +503,172 @@ class CloudStoragePublisher(SamplePublisher):
       vm_util.IssueRetryableCommand(copy_cmd)
 
 
+class ResultsStorePublisher(SamplePublisher):
+  """Adds samples to a results_store.ResultsStore database.
+
+  Attributes:
+    path: string. Path of the database.
+    pkb_run_uri: string. The --run_uri to record with the samples.
+  """
+
+  def __init__(self, path, pkb_run_uri=None):
+    self.path = path
+    self.pkb_run_uri = pkb_run_uri
+
+  def __repr__(self):
+    return '<{0} path="{1}">'.format(type(self).__name__, self.path)
+
+  def PublishSamples(self, samples):
+    logging.info('Publishing %d samples to %s', len(samples), self.path)
+    with results_store.ResultsStore(self.path) as store:
+      store.AddSamples(samples, self.pkb_run_uri)
+
+
+class _MetadataView(collections.MutableMapping):
+  """The metadata of an AnnotatedSample.
+
+  Reads see the spec metadata laid over the sample's own metadata. Neither is
+  copied until the view is first modified.
+  """
+
+  __slots__ = ('_own', '_shared', '_data')
+
+  def __init__(self, own, shared):
+    self._own = own
+    self._shared = shared
+    self._data = None
+
+  def __getitem__(self, key):
+    if self._data is not None:
+      return self._data[key]
+    if key in self._shared:
+      return self._shared[key]
+    return self._own[key]
+
+  def __contains__(self, key):
+    if self._data is not None:
+      return key in self._data
+    return key in self._shared or key in self._own
+
+  def __iter__(self):
+    if self._data is not None:
+      return iter(self._data)
+    return itertools.chain(
+        self._shared, (k for k in self._own if k not in self._shared))
+
+  def __len__(self):
+    if self._data is not None:
+      return len(self._data)
+    return len(self._shared) + sum(1 for k in self._own
+                                   if k not in self._shared)
+
+  def _Materialize(self):
+    if self._data is None:
+      self._data = self.copy()
+    return self._data
+
+  def __setitem__(self, key, value):
+    self._Materialize()[key] = value
+
+  def __delitem__(self, key):
+    del self._Materialize()[key]
+
+  def copy(self):
+    """Returns the metadata as a new dict."""
+    if self._data is not None:
+      return self._data.copy()
+    metadata = self._own.copy()
+    metadata.update(self._shared)
+    return metadata
+
+  def __repr__(self):
+    return repr(self.copy())
+
+
+class AnnotatedSample(collections.MutableMapping):
+  """A Sample with the annotations that SampleCollector adds to it.
+
+  Behaves like the dict that publishers expect, with the keys of a Sample plus
+  'test', 'product_name', 'official', 'owner', 'run_uri' and 'sample_uri'.
+  The annotations and the spec metadata are shared with the other samples of
+  the same benchmark spec instead of being copied into each sample. copy()
+  returns the fully annotated sample as a plain dict, e.g. for serializing.
+  """
+
+  __slots__ = ('_sample', '_annotations', '_metadata', '_sample_uri', '_data')
+
+  _SAMPLE_KEYS = frozenset(['metric', 'value', 'unit', 'timestamp'])
+  _KEYS = ('metric', 'value', 'unit', 'metadata', 'timestamp', 'test',
+           'product_name', 'official', 'owner', 'run_uri', 'sample_uri')
+
+  def __init__(self, sample, annotations, spec_metadata):
+    """Initializes the sample.
+
+    Args:
+      sample: Sample. The sample to annotate.
+      annotations: dict. Maps the annotations other than 'metadata' and
+          'sample_uri' to their values. Not copied.
+      spec_metadata: dict. Metadata that overrides the sample's own. Not
+          copied.
+    """
+    self._sample = sample
+    self._annotations = annotations
+    self._metadata = _MetadataView(sample.metadata, spec_metadata)
+    self._sample_uri = None
+    self._data = None
+
+  def __getitem__(self, key):
+    if self._data is not None:
+      return self._data[key]
+    if key == 'metadata':
+      return self._metadata
+    if key == 'sample_uri':
+      if self._sample_uri is None:
+        self._sample_uri = str(uuid.uuid4())
+      return self._sample_uri
+    if key in self._SAMPLE_KEYS:
+      return getattr(self._sample, key)
+    return self._annotations[key]
+
+  def __iter__(self):
+    return iter(self._KEYS if self._data is None else self._data)
+
+  def __len__(self):
+    return len(self._KEYS if self._data is None else self._data)
+
+  def _Materialize(self):
+    if self._data is None:
+      self._data = dict((k, self[k]) for k in self._KEYS)
+    return self._data
+
+  def __setitem__(self, key, value):
+    self._Materialize()[key] = value
+
+  def __delitem__(self, key):
+    del self._Materialize()[key]
+
+  def copy(self):
+    """Returns the annotated sample as a new dict."""
+    if self._data is not None:
+      result = self._data.copy()
+      metadata = result.get('metadata')
+      if type(metadata) is _MetadataView:
+        result['metadata'] = metadata.copy()
+      return result
+    sample = self._sample
+    result = self._annotations.copy()
+    result['metric'] = sample.metric
+    result['value'] = sample.value
+    result['unit'] = sample.unit
+    result['metadata'] = self._metadata.copy()
+    result['timestamp'] = sample.timestamp
+    result['sample_uri'] = self['sample_uri']
+    return result
+
+  def __repr__(self):
+    return repr(self.copy())
+
+
 class SampleCollector(object):
   """A performance sample collector.
 
@@ -477,18 +676,22 @@ class SampleCollector(object):
   results via any number of SamplePublishers.
 
   Attributes:
-    samples: A list of Sample objects.
+    samples: A list of AnnotatedSample objects.
     metadata_providers: A list of MetadataProvider objects. Metadata providers
       to use.  Defaults to DEFAULT_METADATA_PROVIDERS.
     publishers: A list of SamplePublisher objects. If not specified, defaults to
       a LogPublisher, PrettyPrintStreamPublisher, NewlineDelimitedJSONPublisher,
-      a BigQueryPublisher if FLAGS.bigquery_table is specified, and a
-      CloudStoragePublisher if FLAGS.cloud_storage_bucket is specified. See
+      a BigQueryPublisher if FLAGS.bigquery_table is specified, a
+      CloudStoragePublisher if FLAGS.cloud_storage_bucket is specified, and a
+      ResultsStorePublisher if FLAGS.results_store_path is specified. See
       SampleCollector._DefaultPublishers.
     run_uri: A unique tag for the run.
   """
   def __init__(self, metadata_providers=None, publishers=None):
     self.samples = []
+    # Maps (benchmark name, BenchmarkSpec uid) to the (annotations, metadata)
+    # shared by the spec's samples, until FinishBenchmark is called.
+    self._shared_annotations = {}
 
     if metadata_providers is not None:
       self.metadata_providers = metadata_providers
@@ -498,17 +701,17 @@ class SampleCollector(object):
     if publishers is not None:
       self.publishers = publishers
     else:
-      self.publishers = SampleCollector._DefaultPublishers()
+      self.publishers = self._DefaultPublishers()
 
     logging.debug('Using publishers: {0}'.format(self.publishers))
 
   @classmethod
-  def _DefaultPublishers(cls):
+  def _DefaultPublishers(cls, json_mode='wb'):
     """Gets a list of default publishers."""
     publishers = [LogPublisher(), PrettyPrintStreamPublisher()]
     default_json_path = vm_util.PrependTempDir(DEFAULT_JSON_OUTPUT_NAME)
     publishers.append(NewlineDelimitedJSONPublisher(
-        FLAGS.json_path or default_json_path,
+        FLAGS.json_path or default_json_path, mode=json_mode,
         collapse_labels=FLAGS.collapse_labels))
     if FLAGS.bigquery_table:
       publishers.append(BigQueryPublisher(
@@ -522,6 +725,10 @@ class SampleCollector(object):
       publishers.append(CloudStoragePublisher(FLAGS.cloud_storage_bucket,
                                               gsutil_path=FLAGS.gsutil_path))
 
+    if FLAGS.results_store_path:
+      publishers.append(ResultsStorePublisher(FLAGS.results_store_path,
+                                              pkb_run_uri=FLAGS.run_uri))
+
     return publishers
 
   def AddSamples(self, samples, benchmark, benchmark_spec):
@@ -532,25 +739,214 @@ class SampleCollector(object):
       benchmark: string. The name of the benchmark.
       benchmark_spec: BenchmarkSpec. Benchmark specification.
     """
-    for s in samples:
-      # Annotate the sample.
-      sample = dict(s.asdict())
-      sample['test'] = benchmark
-
+    self._StoreSamples(self._AnnotateSamples(samples, benchmark,
+                                             benchmark_spec))
+
+  def _GetSharedAnnotations(self, benchmark, benchmark_spec):
+    """Returns the annotations and metadata shared by a spec's samples."""
+    key = benchmark, benchmark_spec.uid
+    shared = self._shared_annotations.get(key)
+    if shared is None:
+      annotations = {'test': benchmark,
+                     'product_name': FLAGS.product_name,
+                     'official': FLAGS.official,
+                     'owner': FLAGS.owner,
+                     'run_uri': benchmark_spec.uuid}
+      metadata = {}
       for meta_provider in self.metadata_providers:
-        sample['metadata'] = meta_provider.AddMetadata(
-            sample['metadata'], benchmark_spec)
-
-      sample['product_name'] = FLAGS.product_name
-      sample['official'] = FLAGS.official
-      sample['owner'] = FLAGS.owner
-      sample['run_uri'] = benchmark_spec.uuid
-      sample['sample_uri'] = str(uuid.uuid4())
-      events.sample_created.send(benchmark_spec=benchmark_spec,
-                                 sample=sample)
-      self.samples.append(sample)
+        metadata = meta_provider.AddMetadata(metadata, benchmark_spec)
+      shared = self._shared_annotations[key] = annotations, metadata
+    return shared
+
+  def FinishBenchmark(self, benchmark, benchmark_spec):
+    """Forgets the annotations shared by a spec's samples.
+
+    Call once no more samples will be added for the spec, so that the collector
+    doesn't keep the spec's annotations and metadata for the rest of the run.
+    Samples already added keep theirs.
+
+    Args:
+      benchmark: string. The name of the benchmark.
+      benchmark_spec: BenchmarkSpec. Benchmark specification.
+    """
+    self._shared_annotations.pop((benchmark, benchmark_spec.uid), None)
+
+  def _AnnotateSamples(self, samples, benchmark, benchmark_spec):
+    """Returns AnnotatedSamples of 'samples' with run metadata added."""
+    annotations, metadata = self._GetSharedAnnotations(benchmark,
+                                                       benchmark_spec)
+    annotated_samples = [AnnotatedSample(s, annotations, metadata)
+                         for s in samples]
+    if events.sample_created.receivers:
+      for sample in annotated_samples:
+        events.sample_created.send(benchmark_spec=benchmark_spec,
+                                   sample=sample)
+    return annotated_samples
+
+  def _StoreSamples(self, samples):
+    """Keeps annotated samples until they are published."""
+    self.samples.extend(samples)
 
   def PublishSamples(self):
     """Publish samples via all registered publishers."""
     for publisher in self.publishers:
       publisher.PublishSamples(self.samples)
+
+
+class SampleJournal(object):
+  """An append-only file of annotated samples, one JSON object per line.
+
+  The byte offset up to which the journal has been published is kept in a
+  second file next to it, so a new SampleJournal for the same path resumes
+  after the last published sample.
+
+  Attributes:
+    path: string. Path of the journal.
+    published_offset: int. Bytes of the journal that have been published.
+  """
+
+  def __init__(self, path):
+    self.path = path
+    self._offset_path = path + '.published'
+    self._lock = threading.Lock()
+    try:
+      with open(self._offset_path) as fp:
+        self.published_offset = int(fp.read())
+    except (IOError, ValueError):
+      self.published_offset = 0
+    with open(self.path, 'ab+') as fp:
+      # Drop a partially written sample left by a crash, so that appended
+      # samples start on a line of their own.
+      fp.seek(0, os.SEEK_END)
+      end = fp.tell()
+      line_end = end
+      while line_end:
+        start = max(0, line_end - 4096)
+        fp.seek(start)
+        newline = fp.read(line_end - start).rfind('\n')
+        if newline >= 0:
+          line_end = start + newline + 1
+          break
+        line_end = start
+      if line_end != end:
+        fp.truncate(line_end)
+
+  def Append(self, samples):
+    """Durably appends a list of sample dicts to the journal."""
+    data = ''.join(json.dumps(sample.copy()) + '\n' for sample in samples)
+    with self._lock:
+      with open(self.path, 'ab') as fp:
+        fp.write(data)
+        fp.flush()
+        os.fsync(fp.fileno())
+
+  def ReadUnpublished(self, max_samples):
+    """Reads samples after the published offset.
+
+    Args:
+      max_samples: int. Maximum number of samples to read.
+
+    Returns:
+      (samples, offset) tuple. 'samples' is a list of sample dicts, and
+      'offset' is the journal offset just after them.
+    """
+    samples = []
+    offset = self.published_offset
+    with open(self.path, 'rb') as fp:
+      fp.seek(offset)
+      while len(samples) < max_samples:
+        line = fp.readline()
+        if not line.endswith('\n'):
+          # Nothing left, or a sample that is still being written.
+          break
+        samples.append(json.loads(line))
+        offset += len(line)
+    return samples, offset
+
+  def MarkPublished(self, offset):
+    """Records that the journal has been published up to 'offset'."""
+    temp_path = self._offset_path + '.tmp'
+    with open(temp_path, 'wb') as fp:
+      fp.write(str(offset))
+      fp.flush()
+      os.fsync(fp.fileno())
+    os.rename(temp_path, self._offset_path)
+    self.published_offset = offset
+
+
+class StreamingSampleCollector(SampleCollector):
+  """A SampleCollector that publishes samples while benchmarks run.
+
+  Each batch of samples passed to AddSamples is appended to a SampleJournal
+  before AddSamples returns. A background thread publishes the journal to the
+  publishers in batches of at most 'batch_size' samples every
+  STREAMING_PUBLISH_INTERVAL seconds, and whenever that many samples are
+  waiting. Samples left unpublished in the journal by an earlier process are
+  published first.
+
+  Attributes:
+    journal: SampleJournal. Journal of the collected samples.
+    batch_size: int. Maximum number of samples to publish at a time.
+  """
+
+  def __init__(self, journal_path, batch_size, metadata_providers=None,
+               publishers=None):
+    super(StreamingSampleCollector, self).__init__(
+        metadata_providers=metadata_providers, publishers=publishers)
+    self.journal = SampleJournal(journal_path)
+    self.batch_size = batch_size
+    self._condition = threading.Condition()
+    self._unpublished_count = 0
+    self._stopping = False
+    # Serializes publishing between the background thread and PublishSamples.
+    self._publish_lock = threading.Lock()
+    self._thread = threading.Thread(target=self._PublishLoop,
+                                    name='SamplePublisher')
+    self._thread.daemon = True
+    self._thread.start()
+
+  @classmethod
+  def _DefaultPublishers(cls, json_mode='ab'):
+    return super(StreamingSampleCollector, cls)._DefaultPublishers(
+        json_mode=json_mode)
+
+  def _StoreSamples(self, samples):
+    self.journal.Append(samples)
+    with self._condition:
+      self._unpublished_count += len(samples)
+      if self._unpublished_count >= self.batch_size:
+        self._condition.notify()
+
+  def _PublishJournal(self):
+    """Publishes the unpublished samples in the journal, batch by batch."""
+    with self._publish_lock:
+      while True:
+        with self._condition:
+          self._unpublished_count = 0
+        samples, offset = self.journal.ReadUnpublished(self.batch_size)
+        if not samples:
+          return
+        for publisher in self.publishers:
+          publisher.PublishSamples(samples)
+        self.journal.MarkPublished(offset)
+
+  def _PublishLoop(self):
+    while True:
+      with self._condition:
+        if not self._stopping and self._unpublished_count < self.batch_size:
+          self._condition.wait(STREAMING_PUBLISH_INTERVAL)
+        if self._stopping:
+          return
+      try:
+        self._PublishJournal()
+      except Exception:
+        logging.exception('Publishing samples failed. Retrying in %s seconds.',
+                          STREAMING_PUBLISH_INTERVAL)
+
+  def PublishSamples(self):
+    """Stops the background thread and publishes the remaining samples."""
+    with self._condition:
+      self._stopping = True
+      self._condition.notify()
+    self._thread.join()
+    self._PublishJournal()
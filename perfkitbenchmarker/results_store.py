@@ -0,0 +1,300 @@
+# Copyright 2015 PerfKitBenchmarker Authors. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""A local SQLite store of published samples, and a CLI to query it.
+
+Samples from any number of runs are kept in one database file. Each sample's
+metadata is stored as one indexed row per label, so samples can be filtered
+by metric, benchmark, run, labels and time range without reading the others.
+
+Example usage:
+
+  python -m perfkitbenchmarker.results_store --db results.db query \\
+      --metric 'Throughput' --label zone=us-central1-a --since 2015-11-01
+
+  python -m perfkitbenchmarker.results_store --db results.db aggregate \\
+      --metric 'Throughput' --group_by test label:machine_type
+"""
+
+import argparse
+import calendar
+import datetime
+import json
+import sqlite3
+import sys
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS samples (
+  id INTEGER PRIMARY KEY,
+  pkb_run_uri TEXT,
+  run_uri TEXT,
+  sample_uri TEXT,
+  test TEXT,
+  metric TEXT,
+  value REAL,
+  unit TEXT,
+  timestamp REAL,
+  official INTEGER,
+  owner TEXT,
+  product_name TEXT
+);
+CREATE INDEX IF NOT EXISTS samples_metric ON samples (metric, timestamp);
+CREATE INDEX IF NOT EXISTS samples_test ON samples (test, timestamp);
+CREATE INDEX IF NOT EXISTS samples_pkb_run_uri ON samples (pkb_run_uri);
+CREATE TABLE IF NOT EXISTS labels (
+  sample_id INTEGER,
+  key TEXT,
+  value TEXT
+);
+CREATE INDEX IF NOT EXISTS labels_key_value ON labels (key, value, sample_id);
+CREATE INDEX IF NOT EXISTS labels_sample_id ON labels (sample_id);
+"""
+
+# Sample fields stored in the samples table, other than the metadata.
+_FIELDS = ('run_uri', 'sample_uri', 'test', 'metric', 'value', 'unit',
+           'timestamp', 'official', 'owner', 'product_name')
+# Columns that samples may be filtered and grouped by.
+_COLUMNS = frozenset(('pkb_run_uri', 'run_uri', 'test', 'metric', 'unit',
+                      'owner', 'official'))
+AGGREGATES = ('count', 'avg', 'min', 'max', 'sum')
+
+
+def _LabelValue(value):
+  return value if isinstance(value, basestring) else str(value)
+
+
+class ResultsStore(object):
+  """A SQLite database of samples.
+
+  Attributes:
+    path: string. Path of the database file.
+  """
+
+  def __init__(self, path):
+    self.path = path
+    self._connection = sqlite3.connect(path, timeout=60)
+    self._connection.executescript(_SCHEMA)
+
+  def Close(self):
+    self._connection.close()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *unused_args):
+    self.Close()
+
+  def AddSamples(self, samples, pkb_run_uri=None):
+    """Adds samples to the store in a single transaction.
+
+    Args:
+      samples: iterable of sample dicts, as passed to
+          SamplePublisher.PublishSamples.
+      pkb_run_uri: string. The --run_uri of the PKB run that produced them.
+    """
+    with self._connection:
+      cursor = self._connection.cursor()
+      labels = []
+      for sample in samples:
+        cursor.execute(
+            'INSERT INTO samples (pkb_run_uri, {0}) VALUES (?{1})'.format(
+                ', '.join(_FIELDS), ', ?' * len(_FIELDS)),
+            [pkb_run_uri] + [sample.get(field) for field in _FIELDS])
+        sample_id = cursor.lastrowid
+        labels.extend((sample_id, key, _LabelValue(value))
+                      for key, value in sample['metadata'].iteritems())
+      cursor.executemany(
+          'INSERT INTO labels (sample_id, key, value) VALUES (?, ?, ?)',
+          labels)
+
+  def _BuildFilter(self, filters, labels, start_time, end_time):
+    """Builds the WHERE clause selecting samples.
+
+    Args:
+      filters: dict mapping column names to required values.
+      labels: dict mapping label keys to required values.
+      start_time: float or None. Earliest Unix timestamp to select.
+      end_time: float or None. Unix timestamp before which to select.
+
+    Returns:
+      (clause, parameters) tuple.
+    """
+    conditions = []
+    parameters = []
+    for column, value in sorted(filters.iteritems()):
+      if column not in _COLUMNS:
+        raise ValueError('Unknown column: {0}'.format(column))
+      if value is not None:
+        conditions.append('s.{0} = ?'.format(column))
+        parameters.append(value)
+    for key, value in sorted((labels or {}).iteritems()):
+      conditions.append('s.id IN (SELECT sample_id FROM labels '
+                        'WHERE key = ? AND value = ?)')
+      parameters.extend((key, _LabelValue(value)))
+    if start_time is not None:
+      conditions.append('s.timestamp >= ?')
+      parameters.append(start_time)
+    if end_time is not None:
+      conditions.append('s.timestamp < ?')
+      parameters.append(end_time)
+    clause = ' WHERE ' + ' AND '.join(conditions) if conditions else ''
+    return clause, parameters
+
+  def Query(self, labels=None, start_time=None, end_time=None, **filters):
+    """Yields the stored samples that match all of the filters.
+
+    Args:
+      labels: dict mapping label keys to required values.
+      start_time: float or None. Earliest Unix timestamp to select.
+      end_time: float or None. Unix timestamp before which to select.
+      **filters: Required values of sample fields, e.g. metric='Throughput'
+          or pkb_run_uri='abc123'.
+
+    Yields:
+      Sample dicts with a 'metadata' dict, in the order they were added.
+    """
+    clause, parameters = self._BuildFilter(filters, labels, start_time,
+                                           end_time)
+    columns = ('id', 'pkb_run_uri') + _FIELDS
+    cursor = self._connection.execute(
+        'SELECT {0} FROM samples s{1} ORDER BY s.id'.format(
+            ', '.join('s.' + column for column in columns), clause),
+        parameters)
+    label_cursor = self._connection.cursor()
+    while True:
+      # Older SQLite versions allow at most 999 parameters per statement.
+      rows = cursor.fetchmany(500)
+      if not rows:
+        return
+      metadata = {row[0]: {} for row in rows}
+      label_cursor.execute(
+          'SELECT sample_id, key, value FROM labels WHERE sample_id '
+          'IN ({0})'.format(', '.join('?' * len(rows))),
+          [row[0] for row in rows])
+      for sample_id, key, value in label_cursor:
+        metadata[sample_id][key] = value
+      for row in rows:
+        sample = dict(zip(columns[1:], row[1:]))
+        sample['metadata'] = metadata[row[0]]
+        yield sample
+
+  def Aggregate(self, function='avg', group_by=('test', 'metric', 'unit'),
+                labels=None, start_time=None, end_time=None, **filters):
+    """Aggregates the values of the matching samples.
+
+    Args:
+      function: string. One of AGGREGATES.
+      group_by: sequence of column names, or 'label:<key>' to group by the
+          value of a label.
+      labels: dict mapping label keys to required values.
+      start_time: float or None. Earliest Unix timestamp to select.
+      end_time: float or None. Unix timestamp before which to select.
+      **filters: Required values of sample fields, as for Query.
+
+    Returns:
+      List of tuples of the group_by values, followed by the number of
+      samples and the aggregate value, sorted by the group_by values.
+    """
+    if function not in AGGREGATES:
+      raise ValueError('Unknown aggregate function: {0}'.format(function))
+    clause, parameters = self._BuildFilter(filters, labels, start_time,
+                                           end_time)
+    joins = []
+    join_parameters = []
+    groups = []
+    for i, group in enumerate(group_by):
+      if group.startswith('label:'):
+        joins.append('LEFT JOIN labels l{0} ON l{0}.sample_id = s.id AND '
+                     'l{0}.key = ?'.format(i))
+        join_parameters.append(group[len('label:'):])
+        groups.append('l{0}.value'.format(i))
+      elif group in _COLUMNS:
+        groups.append('s.' + group)
+      else:
+        raise ValueError('Unknown column: {0}'.format(group))
+    group_clause = ', '.join(groups)
+    query = 'SELECT {0}COUNT(s.value), {1}(s.value) FROM samples s {2}{3}'
+    query = query.format(group_clause + ', ' if groups else '',
+                         function.upper(), ' '.join(joins), clause)
+    if groups:
+      query += ' GROUP BY {0} ORDER BY {0}'.format(group_clause)
+    return self._connection.execute(
+        query, join_parameters + parameters).fetchall()
+
+
+def _ParseTime(value):
+  """Parses a Unix timestamp or a UTC date such as '2015-11-01T12:00:00'."""
+  try:
+    return float(value)
+  except ValueError:
+    pass
+  for time_format in ('%Y-%m-%dT%H:%M:%S', '%Y-%m-%d'):
+    try:
+      return calendar.timegm(
+          datetime.datetime.strptime(value, time_format).timetuple())
+    except ValueError:
+      pass
+  raise argparse.ArgumentTypeError('Invalid time: {0}'.format(value))
+
+
+def _ParseLabel(value):
+  if '=' not in value:
+    raise argparse.ArgumentTypeError(
+        'Labels must be of the form key=value: {0}'.format(value))
+  return tuple(value.split('=', 1))
+
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument('--db', required=True, help='Path of the database.')
+  subparsers = parser.add_subparsers(dest='command')
+  query_parser = subparsers.add_parser(
+      'query', help='Print matching samples as newline delimited JSON.')
+  aggregate_parser = subparsers.add_parser(
+      'aggregate', help='Print an aggregate of the matching samples\' values.')
+  for subparser in (query_parser, aggregate_parser):
+    for column in sorted(_COLUMNS - frozenset(['official'])):
+      subparser.add_argument('--' + column)
+    subparser.add_argument('--label', action='append', type=_ParseLabel,
+                           default=[], help='key=value. May be repeated.')
+    subparser.add_argument('--since', type=_ParseTime,
+                           help='Unix timestamp or UTC date.')
+    subparser.add_argument('--until', type=_ParseTime,
+                           help='Unix timestamp or UTC date.')
+  aggregate_parser.add_argument('--function', choices=AGGREGATES,
+                                default='avg')
+  aggregate_parser.add_argument(
+      '--group_by', nargs='+', default=['test', 'metric', 'unit'],
+      help='Columns, or label:<key>, to group by.')
+  args = parser.parse_args(argv)
+
+  filters = {column: getattr(args, column)
+             for column in _COLUMNS - frozenset(['official'])}
+  with ResultsStore(args.db) as store:
+    if args.command == 'query':
+      for sample in store.Query(labels=dict(args.label),
+                                start_time=args.since, end_time=args.until,
+                                **filters):
+        sys.stdout.write(json.dumps(sample) + '\n')
+    else:
+      rows = store.Aggregate(args.function, args.group_by,
+                             labels=dict(args.label), start_time=args.since,
+                             end_time=args.until, **filters)
+      sys.stdout.write('\t'.join(args.group_by + ['count', args.function]) +
+                       '\n')
+      for row in rows:
+        sys.stdout.write('\t'.join(str(value) for value in row) + '\n')
+
+
+if __name__ == '__main__':
+  main()
@@ -19,10 +19,10 @@
 
    Note: it is intentional that this test script is NOT dependant on the PKB
    package so we do not have to copy the entire PKB package to test VM just to
-   run this script.
+   run this script. The only PKB module it uses, histogram, only depends on the
+   standard library and is copied next to it.
 """
 
-import json
 import logging
 import sys
 from threading import Thread
@@ -35,6 +35,8 @@ import gflags as flags
 import gcs_oauth2_boto_plugin  # noqa
 from azure.storage.blob import BlobService
 
+import histogram
+
 FLAGS = flags.FLAGS
 
 flags.DEFINE_enum(
@@ -67,6 +69,11 @@ flags.DEFINE_integer('iterations', 1, 'The number of iterations to run for the '
                      'particular test scenario. Currently only applicable to '
                      'the ListConsistency scenario, ignored in others.')
 
+# Latencies are recorded with microsecond resolution, and bandwidths with a
+# resolution of 1 byte per second. Either way, larger values are recorded to
+# three significant digits.
+LATENCY_RESOLUTION_SECONDS = 1e-6
+
 STORAGE_TO_SCHEMA_DICT = {'GCS': 'gs', 'S3': 's3', 'AZURE': 'azure'}
 
 # If more than 5% of our upload or download operations fail for an iteration,
@@ -141,27 +148,9 @@ def _useBotoApi(storage_schema):
     return False
 
 
-def PercentileCalculator(numbers):
-  numbers_sorted = sorted(numbers)
-  count = len(numbers_sorted)
-  total = sum(numbers_sorted)
-  result = {}
-  result['p1'] = numbers_sorted[int(count * 0.01)]
-  result['p5'] = numbers_sorted[int(count * 0.05)]
-  result['p50'] = numbers_sorted[int(count * 0.5)]
-  result['p90'] = numbers_sorted[int(count * 0.9)]
-  result['p99'] = numbers_sorted[int(count * 0.99)]
-  result['p99.9'] = numbers_sorted[int(count * 0.999)]
-  if count > 0:
-    average = total / float(count)
-    result['average'] = average
-    if count > 1:
-      total_of_squares = sum([(i - average) ** 2 for i in numbers])
-      result['stddev'] = (total_of_squares / (count - 1)) ** 0.5
-    else:
-      result['stddev'] = 0
-
-  return result
+def _NewLatencyHistogram():
+  """Returns a histogram.Histogram for latencies, in seconds."""
+  return histogram.Histogram(unit=LATENCY_RESOLUTION_SECONDS)
 
 
 def _ListObjects(storage_schema, bucket, prefix, host_to_connect=None):
@@ -255,11 +244,11 @@ def WriteObjects(storage_schema, bucket, object_prefix, count,
     objects_written: A list of names of objects that have been successfully
         written by this function. Caller supplies the list and this function
         fills in the name of the objects.
-    latency_results: An optional parameter that caller can supply to hold
-        latency numbers, in seconds, for each object that is successfully
+    latency_results: An optional histogram.Histogram that caller can supply to
+        record the latency, in seconds, of each object that is successfully
         written.
-    bandwidth_results: An optional parameter that caller can supply to hold
-        bandwidth numbers, in bytes per second, for each object that is
+    bandwidth_results: An optional histogram.Histogram that caller can supply
+        to record the bandwidth, in bytes per second, of each object that is
         successfully written.
     host_to_connect: An optional endpoint string to connect to.
   """
@@ -301,10 +290,10 @@ def WriteObjects(storage_schema, bucket, object_prefix, count,
       latency = time.time() - start_time
 
       if latency_results is not None:
-        latency_results.append(latency)
+        latency_results.Add(latency)
 
       if bandwidth_results is not None and latency > 0.0:
-        bandwidth_results.append(size / latency)
+        bandwidth_results.Add(size / latency)
 
       objects_written.append(object_name)
     except:
@@ -320,8 +309,9 @@ def ReadObjects(storage_schema, bucket, objects_to_read, latency_results=None,
     storage_schema: The address schema identifying a storage. e.g., "gs"
     bucket: Name of the bucket.
     objects_to_read: A list of names of objects to read.
-    latency_results: An optional list to receive latency results.
-    bandwidth_results: An optional list to receive bandwidth results.
+    latency_results: An optional histogram.Histogram to record latencies in.
+    bandwidth_results: An optional histogram.Histogram to record bandwidths
+        in.
     object_size: Size of the object that will be read, used to calculate bw.
     host_to_connect: An optional endpoint string to connect to.
   """
@@ -340,11 +330,11 @@ def ReadObjects(storage_schema, bucket, objects_to_read, latency_results=None,
       latency = time.time() - start_time
 
       if latency_results is not None:
-        latency_results.append(latency)
+        latency_results.Add(latency)
 
       if (bandwidth_results is not None and
           object_size is not None and latency > 0.0):
-        bandwidth_results.append(object_size / latency)
+        bandwidth_results.Add(object_size / latency)
     except:
       logging.exception('Failed to read object %s', object_name)
 
@@ -472,7 +462,7 @@ def SingleStreamThroughputBenchmark(storage_schema, host_to_connect=None):
         instead of collecting performance numbers from this run.
   """
   object_prefix = 'pkb_single_stream_%f' % time.time()
-  write_bandwidth = []
+  write_bandwidth = histogram.Histogram()
   objects_written = []
 
   WriteObjects(storage_schema, FLAGS.bucket, object_prefix,
@@ -486,29 +476,21 @@ def SingleStreamThroughputBenchmark(storage_schema, host_to_connect=None):
       raise LowAvailabilityError('Failed to write required number of large '
                                  'objects, exiting.')
 
-    logging.info('Single stream upload individual results in Bps:')
-    for bandwidth in write_bandwidth:
-      logging.info('%f', bandwidth)
     logging.info('Single stream upload throughput in Bps: %s',
-                 json.dumps(PercentileCalculator(write_bandwidth),
-                            sort_keys=True))
+                 write_bandwidth.ToJson())
 
-    read_bandwidth = []
+    read_bandwidth = histogram.Histogram()
     ReadObjects(storage_schema, FLAGS.bucket, objects_written,
                 bandwidth_results=read_bandwidth,
                 object_size=LARGE_OBJECT_SIZE_BYTES,
                 host_to_connect=host_to_connect)
-    if len(read_bandwidth) < len(objects_written) * (
+    if read_bandwidth.total_count < len(objects_written) * (
         1 - LARGE_OBJECT_FAILURE_TOLERANCE):  # noqa
       raise LowAvailabilityError('Failed to read required number of objects, '
                                  'exiting.')
 
-    logging.info('Single stream download individual results in Bps:')
-    for bandwidth in read_bandwidth:
-      logging.info('%f', bandwidth)
     logging.info('Single stream download throughput in Bps: %s',
-                 json.dumps(PercentileCalculator(read_bandwidth),
-                            sort_keys=True))
+                 read_bandwidth.ToJson())
 
   finally:
     DeleteObjects(storage_schema, FLAGS.bucket, objects_written,
@@ -518,8 +500,8 @@ def SingleStreamThroughputBenchmark(storage_schema, host_to_connect=None):
 def OneByteRWBenchmark(storage_schema, host_to_connect=None):
   """ A benchmark test for one byte object read and write. It uploads and
   downloads ONE_BYTE_OBJECT_COUNT number of 1-byte objects to the storage
-  provider, keeps track of the latency of these operations, and print out the
-  result in JSON format at the end of the test.
+  provider, records the latency of these operations in histograms, and print
+  them out in JSON format at the end of the test.
 
   Args:
     storage_schema: The schema of the storage provider to use, e.g., "gs"
@@ -534,7 +516,7 @@ def OneByteRWBenchmark(storage_schema, host_to_connect=None):
   # One byte write
   object_prefix = 'pkb_one_byte_%f' % time.time()
 
-  one_byte_write_latency = []
+  one_byte_write_latency = _NewLatencyHistogram()
   one_byte_objects_written = []
 
   WriteObjects(storage_schema, FLAGS.bucket, object_prefix,
@@ -548,29 +530,19 @@ def OneByteRWBenchmark(storage_schema, host_to_connect=None):
       raise LowAvailabilityError('Failed to write required number of objects, '
                                  'exiting.')
 
-    logging.info('Individual results of one byte upload:')
-    for latency in one_byte_write_latency:
-      logging.info('%f', latency)
-    logging.info('One byte upload - %s',
-                 json.dumps(PercentileCalculator(one_byte_write_latency),
-                            sort_keys=True))
+    logging.info('One byte upload - %s', one_byte_write_latency.ToJson())
 
     # Now download these objects and measure the latencies.
-    one_byte_read_latency = []
+    one_byte_read_latency = _NewLatencyHistogram()
     ReadObjects(storage_schema, FLAGS.bucket, one_byte_objects_written,
                 one_byte_read_latency, host_to_connect)
 
-    success_count = len(one_byte_read_latency)
+    success_count = one_byte_read_latency.total_count
     if success_count < ONE_BYTE_OBJECT_COUNT * (1 - FAILURE_TOLERANCE):
       raise LowAvailabilityError('Failed to read required number of objects, '
                                  'exiting.')
 
-    logging.info('Individual results of one byte download:')
-    for latency in one_byte_read_latency:
-      logging.info('%f', latency)
-    logging.info('One byte download - %s',
-                 json.dumps(PercentileCalculator(one_byte_read_latency),
-                            sort_keys=True))
+    logging.info('One byte download - %s', one_byte_read_latency.ToJson())
   finally:
     DeleteObjects(storage_schema, FLAGS.bucket, one_byte_objects_written,
                   host_to_connect=host_to_connect)
@@ -762,8 +734,8 @@ def Main(argv=sys.argv):
     list_inconsistency_window = {}
     inconsistent_list_count = {}
     for scenario in [LIST_AFTER_WRITE_SCENARIO, LIST_AFTER_UPDATE_SCENARIO]:
-      list_latency[scenario] = []
-      list_inconsistency_window[scenario] = []
+      list_latency[scenario] = _NewLatencyHistogram()
+      list_inconsistency_window[scenario] = _NewLatencyHistogram()
       inconsistent_list_count[scenario] = 0.0
 
     logging.info('Running list consistency tests for %d iterations...',
@@ -775,11 +747,11 @@ def Main(argv=sys.argv):
         result_consistent = '%s%s' % (scenario, LIST_RESULT_SUFFIX_CONSISTENT)
         if result_consistent in result:
           if result[result_consistent]:
-            list_latency[scenario].append(
+            list_latency[scenario].Add(
                 result['%s%s' % (scenario, LIST_RESULT_SUFFIX_LATENCY)])
           else:
             inconsistent_list_count[scenario] += 1
-            list_inconsistency_window[scenario].append(
+            list_inconsistency_window[scenario].Add(
                 result['%s%s' % (scenario,
                                  LIST_RESULT_SUFFIX_INCONSISTENCY_WINDOW)])
 
@@ -790,16 +762,13 @@ def Main(argv=sys.argv):
                    100 *
                    (1 - inconsistent_list_count[scenario] / FLAGS.iterations))
 
-      if len(list_inconsistency_window[scenario]) > 0:
+      if list_inconsistency_window[scenario].total_count > 0:
         logging.info('%s inconsistency window: %s', scenario,
-                     json.dumps(PercentileCalculator(
-                         list_inconsistency_window[scenario]),
-                         sort_keys=True))
+                     list_inconsistency_window[scenario].ToJson())
 
-      if len(list_latency[scenario]) > 0:
+      if list_latency[scenario].total_count > 0:
         logging.info('%s latency: %s', scenario,
-                     json.dumps(PercentileCalculator(list_latency[scenario]),
-                                sort_keys=True))
+                     list_latency[scenario].ToJson())
 
     return 0
   elif FLAGS.scenario == 'SingleStreamThroughput':
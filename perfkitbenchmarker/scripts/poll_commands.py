@@ -0,0 +1,61 @@
+#!/usr/bin/env python2
+#
+# Copyright 2015 PerfKitBenchmarker Authors. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# -*- coding: utf-8 -*-
+
+"""Reports which commands started by execute_command.py are no longer running.
+
+Takes the status files of any number of commands. For each status file that is
+not exclusively locked by execute_command.py, prints a line containing the
+path and the file's contents, which is the command's exit status, or nothing
+if the wrapper script was interrupted or has not locked the file yet. For each
+status file that does not exist, because the wrapper script has not created
+it yet or never started, prints a line containing the path and MISSING.
+
+Unlike wait_for_command.py, this never blocks, so one invocation can check
+many commands.
+
+*Runs on the guest VM. Supports Python 2.6, 2.7, and 3.x.*
+"""
+
+import errno
+import fcntl
+import sys
+
+MISSING = 'missing'
+
+
+def main():
+  for path in sys.argv[1:]:
+    try:
+      status = open(path, 'r')
+    except IOError as e:
+      if e.errno == errno.ENOENT:
+        sys.stdout.write('{0} {1}\n'.format(path, MISSING))
+        continue
+      raise
+    with status:
+      try:
+        fcntl.lockf(status, fcntl.LOCK_SH | fcntl.LOCK_NB)
+      except IOError as e:
+        if e.errno in (errno.EACCES, errno.EAGAIN):
+          continue
+        raise
+      sys.stdout.write('{0} {1}\n'.format(path, status.read().strip()))
+  return 0
+
+if __name__ == '__main__':
+  sys.exit(main())
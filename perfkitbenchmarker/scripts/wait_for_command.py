@@ -42,6 +42,10 @@ def main():
   p.add_option('-s', '--status', dest='status', metavar='FILE',
                help='Get process exit status from FILE. '
                'Will block until a shared lock is acquired on FILE.')
+  p.add_option('--stdout-offset', dest='stdout_offset', type='int', default=0,
+               help='Skip the first N bytes of stdout.', metavar='N')
+  p.add_option('--stderr-offset', dest='stderr_offset', type='int', default=0,
+               help='Skip the first N bytes of stderr.', metavar='N')
   p.add_option('-d', '--delete', dest='delete', action='store_true',
                help='Delete stdout, stderr, and status files when finished.')
   options, args = p.parse_args()
@@ -73,6 +77,8 @@ def main():
         print >> sys.stderr, 'WARNING: wrapper script interrupted.'
         return_code = 1
 
+      stdout.seek(options.stdout_offset)
+      stderr.seek(options.stderr_offset)
       stderr_copier = threading.Thread(target=shutil.copyfileobj,
                                        args=[stderr, sys.stderr],
                                        name='stderr-copier')
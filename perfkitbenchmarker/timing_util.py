@@ -20,6 +20,7 @@ import time
 from perfkitbenchmarker import flags
 from perfkitbenchmarker import flags_validators
 from perfkitbenchmarker import sample
+from perfkitbenchmarker import tracing
 
 
 MEASUREMENTS_FLAG_NAME = 'timing_measurements'
@@ -143,11 +144,14 @@ class IntervalTimer(object):
   def Measure(self, name):
     """Records the start and stop times of the enclosed interval.
 
+    The interval is also recorded as a tracing span.
+
     Args:
       name: A string that names the interval.
     """
     start_time = time.time()
-    yield
+    with tracing.Span(name, tracing.PHASE):
+      yield
     stop_time = time.time()
     self.intervals.append((name, start_time, stop_time))
 
@@ -0,0 +1,155 @@
+# Copyright 2015 PerfKitBenchmarker Authors. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Utilities for turning system performance traces into samples.
+
+Trace collectors (see perfkitbenchmarker/traces) parse the files they fetch
+from each VM row by row into a WindowedSeries, which keeps only per-window sums
+and counts, and then summarize each downsampled metric with
+CreateSummarySamples.
+"""
+
+import array
+import collections
+
+from perfkitbenchmarker import flags
+from perfkitbenchmarker import sample
+
+flags.DEFINE_integer('trace_window_seconds', 10,
+                     'Width in seconds of the windows that system performance '
+                     'traces, such as --dstat and --collectd, are averaged '
+                     'into before being summarized.', lower_bound=1)
+flags.DEFINE_boolean('trace_window_samples', False,
+                     'Publish one sample per trace window for each system '
+                     'performance metric, in addition to the summary '
+                     'samples.')
+
+SUMMARY_PERCENTILES = 50, 99
+
+# A downsampled metric of one trace.
+#
+# Attributes:
+#   name: string. Name of the metric, e.g. 'cpu_utilization'.
+#   unit: string. Unit of the metric.
+#   windows: list of (window start time, value) tuples, in order.
+Metric = collections.namedtuple('Metric', ['name', 'unit', 'windows'])
+
+
+class WindowedSeries(object):
+  """Averages a stream of timestamped rows of values into fixed windows.
+
+  Windows are aligned to multiples of 'window_seconds' since the epoch, so the
+  windows of different VMs and traces line up.
+
+  Attributes:
+    num_columns: int. Number of values in each row.
+    window_seconds: int. Width of each window.
+    start_time: float or None. Rows before this Unix time are ignored.
+    end_time: float or None. Rows after this Unix time are ignored.
+  """
+
+  def __init__(self, num_columns, window_seconds, start_time=None,
+               end_time=None):
+    self.num_columns = num_columns
+    self.window_seconds = window_seconds
+    self.start_time = start_time
+    self.end_time = end_time
+    # Map window start time to arrays of per-column sums and counts.
+    self._sums = {}
+    self._counts = {}
+
+  def Add(self, timestamp, values):
+    """Adds a row of values. Values that are None are skipped."""
+    if ((self.start_time is not None and timestamp < self.start_time) or
+        (self.end_time is not None and timestamp > self.end_time)):
+      return
+    window = timestamp // self.window_seconds * self.window_seconds
+    sums = self._sums.get(window)
+    if sums is None:
+      sums = self._sums[window] = array.array('d', [0.]) * self.num_columns
+      counts = self._counts[window] = (
+          array.array('L', [0]) * self.num_columns)
+    else:
+      counts = self._counts[window]
+    for i, value in enumerate(values):
+      if value is not None:
+        sums[i] += value
+        counts[i] += 1
+
+  def Means(self, column):
+    """Returns a list of (window start, mean) tuples for one column.
+
+    Windows without any values in the column are omitted.
+    """
+    return [(window, self._sums[window][column] / self._counts[window][column])
+            for window in sorted(self._sums) if self._counts[window][column]]
+
+
+def CombineWindows(metrics, combine):
+  """Combines several per-window series into one, window by window.
+
+  Args:
+    metrics: list of lists of (window start, value) tuples.
+    combine: function taking the list of values in one window, e.g. sum.
+
+  Returns:
+    list of (window start, value) tuples, in order.
+  """
+  by_window = collections.defaultdict(list)
+  for windows in metrics:
+    for window, value in windows:
+      by_window[window].append(value)
+  return [(window, combine(by_window[window])) for window in sorted(by_window)]
+
+
+def _Percentile(sorted_values, percentile):
+  """Returns the nearest-rank percentile of a sorted, non-empty list."""
+  index = min(int(len(sorted_values) * percentile / 100.0),
+              len(sorted_values) - 1)
+  return sorted_values[index]
+
+
+def CreateSummarySamples(trace_name, metrics, metadata,
+                         include_windows=False):
+  """Creates samples summarizing the downsampled metrics of one trace.
+
+  Args:
+    trace_name: string. Name of the trace, e.g. 'dstat'. Prefixes each metric.
+    metrics: list of Metric.
+    metadata: dict. Metadata for each sample, e.g. the VM traced.
+    include_windows: bool. Whether to include a sample per window, as well as
+        the summary samples.
+
+  Returns:
+    List of sample.Sample objects. For each metric with any windows, there are
+    samples for the average and the SUMMARY_PERCENTILES of its window values.
+  """
+  samples = []
+  for metric in metrics:
+    if not metric.windows:
+      continue
+    name = ' '.join((trace_name, metric.name))
+    meta = metadata.copy()
+    meta['windows'] = len(metric.windows)
+    values = sorted(value for _, value in metric.windows)
+    samples.append(sample.Sample(name + ' average', sum(values) / len(values),
+                                 metric.unit, meta))
+    for percentile in SUMMARY_PERCENTILES:
+      samples.append(sample.Sample('{0} p{1}'.format(name, percentile),
+                                   _Percentile(values, percentile),
+                                   metric.unit, meta))
+    if include_windows:
+      for window, value in metric.windows:
+        samples.append(sample.Sample(name, value, metric.unit, metadata,
+                                     timestamp=window))
+  return samples
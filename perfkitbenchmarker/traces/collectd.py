@@ -14,14 +14,23 @@
 """Records system performance counters during benchmark runs using collectd.
 
 http://collectd.org
+
+The CSV files of each VM are parsed into summary samples of CPU utilization,
+disk throughput and latency, and network throughput during the run phase once
+they have been fetched.
 """
 
+import collections
+import csv
 import logging
 import os
 import posixpath
+import re
+import time
 
 from perfkitbenchmarker import events
 from perfkitbenchmarker import flags
+from perfkitbenchmarker import trace_util
 from perfkitbenchmarker import vm_util
 from perfkitbenchmarker.packages import collectd
 
@@ -29,21 +38,135 @@ flags.DEFINE_boolean('collectd', False,
                      'Install and run collectd on the guest.')
 flags.DEFINE_string('collectd_output', None, 'Path to store collectd results.')
 
+# collectd starts a new CSV file for each type every day.
+_DATE_SUFFIX_RE = re.compile(r'-\d{4}-\d\d-\d\d$')
+
+
+def _ParseFloat(value):
+  """Returns 'value' as a float, or None if it isn't a number."""
+  try:
+    value = float(value)
+  except ValueError:
+    return None
+  return None if value != value else value
+
+
+def _ReadCsvFiles(paths, window_seconds, start_time, end_time):
+  """Reads the CSV files of one collectd type, averaging them into windows.
+
+  Returns:
+    dict mapping column name, e.g. 'value' or 'rx', to a list of
+    (window start, mean) tuples.
+  """
+  series = None
+  for path in paths:
+    with open(path) as fp:
+      reader = csv.reader(fp)
+      header = next(reader, None)
+      if not header or header[0] != 'epoch':
+        continue
+      if series is None:
+        columns = header[1:]
+        series = trace_util.WindowedSeries(len(columns), window_seconds,
+                                           start_time, end_time)
+      for row in reader:
+        timestamp = _ParseFloat(row[0]) if row else None
+        if timestamp is not None:
+          series.Add(timestamp, [_ParseFloat(v) for v in row[1:]])
+  if series is None:
+    return {}
+  return dict((column, series.Means(i)) for i, column in enumerate(columns))
+
+
+def ParseCsvDirectory(directory, window_seconds, start_time=None,
+                      end_time=None):
+  """Parses the CSV files written by collectd, averaging them into windows.
+
+  Files are laid out as <plugin>-<instance>/<type>-<date>, e.g.
+  cpu-0/cpu-idle-2015-09-18 or interface-eth0/if_octets-2015-09-18.
+
+  Args:
+    directory: string. Local directory holding the files.
+    window_seconds: int. Width of the windows.
+    start_time: float or None. Unix time before which values are ignored.
+    end_time: float or None. Unix time after which values are ignored.
+
+  Returns:
+    List of trace_util.Metric.
+  """
+  paths = collections.defaultdict(list)
+  for dir_path, _, file_names in os.walk(directory):
+    plugin = os.path.basename(dir_path).split('-', 1)[0]
+    for file_name in sorted(file_names):
+      type_instance = _DATE_SUFFIX_RE.sub('', file_name)
+      paths[dir_path, plugin, type_instance].append(
+          os.path.join(dir_path, file_name))
+
+  # Maps (plugin, type instance) to one column dict per plugin instance.
+  types = collections.defaultdict(list)
+  for (_, plugin, type_instance), type_paths in sorted(paths.iteritems()):
+    types[plugin, type_instance].append(_ReadCsvFiles(
+        type_paths, window_seconds, start_time, end_time))
+
+  def Select(plugin, type_instance, column, combine):
+    return trace_util.CombineWindows(
+        [columns[column] for columns in types[plugin, type_instance]
+         if column in columns], combine)
+
+  # CPU time is reported in jiffies per second for each CPU and state.
+  cpu_states = [type_instance for plugin, type_instance in types
+                if plugin == 'cpu']
+  total_cpu = dict(trace_util.CombineWindows(
+      [Select('cpu', state, 'value', sum) for state in cpu_states], sum))
+  cpu_utilization = [(window, 100.0 * (1 - idle / total_cpu[window]))
+                     for window, idle in Select('cpu', 'cpu-idle', 'value',
+                                                sum)
+                     if total_cpu.get(window)]
+
+  return [
+      trace_util.Metric('cpu_utilization', '%', cpu_utilization),
+      trace_util.Metric('disk_read_bytes', 'bytes/sec',
+                        Select('disk', 'disk_octets', 'read', sum)),
+      trace_util.Metric('disk_write_bytes', 'bytes/sec',
+                        Select('disk', 'disk_octets', 'write', sum)),
+      # The average time per operation of the slowest disk.
+      trace_util.Metric('disk_read_await', 'ms',
+                        Select('disk', 'disk_time', 'read', max)),
+      trace_util.Metric('disk_write_await', 'ms',
+                        Select('disk', 'disk_time', 'write', max)),
+      trace_util.Metric('network_received_bytes', 'bytes/sec',
+                        Select('interface', 'if_octets', 'rx', sum)),
+      trace_util.Metric('network_sent_bytes', 'bytes/sec',
+                        Select('interface', 'if_octets', 'tx', sum))]
+
 
 class _CollectdCollector(object):
   """Manages running collectd during a test, and fetching the CSV results."""
 
-  def __init__(self, target_dir):
+  def __init__(self, target_dir, window_seconds=10, include_windows=False):
     self.target_dir = target_dir
+    self.window_seconds = window_seconds
+    self.include_windows = include_windows
+    self._start_time = None
+
+  def _FetchResults(self, vm, end_time):
+    """Stops collectd on the VM, fetches CSV results.
 
-  def _FetchResults(self, vm):
-    """Stops collectd on the VM, fetches CSV results."""
+    Returns:
+      List of sample.Sample objects summarizing the run phase.
+    """
     logging.info('Fetching collectd results')
     local_dir = os.path.join(self.target_dir, vm.name + '-collectd')
     # On the remote host, CSV files are in:
     # self.csv_dir/<fqdn>/<category>.
     # Since AWS VMs have a FQDN different from the VM name, we rename locally.
     vm.PullFile(local_dir, posixpath.join(collectd.CSV_DIR, '*', ''))
+    metrics = ParseCsvDirectory(local_dir, self.window_seconds,
+                                self._start_time, end_time)
+    return trace_util.CreateSummarySamples(
+        'collectd', metrics,
+        {'vm_name': vm.name, 'trace_window_seconds': self.window_seconds},
+        include_windows=self.include_windows)
 
   def Before(self, unused_sender, benchmark_spec):
     """Install collectd.
@@ -55,6 +178,7 @@ class _CollectdCollector(object):
     logging.info('Installing collectd')
     vms = benchmark_spec.vms
     vm_util.RunThreaded(lambda vm: vm.Install('collectd'), vms)
+    self._start_time = time.time()
 
   def After(self, unused_sender, benchmark_spec):
     """Stop / delete collectd, fetch results from VMs.
@@ -62,10 +186,16 @@ class _CollectdCollector(object):
     Args:
       benchmark_spec: benchmark_spec.BenchmarkSpec. The benchmark that stopped
           running.
+
+    Returns:
+      List of sample.Sample objects summarizing the run phase.
     """
     logging.info('Stopping collectd')
     vms = benchmark_spec.vms
-    vm_util.RunThreaded(self._FetchResults, vms)
+    end_time = time.time()
+    samples = vm_util.RunThreaded(
+        self._FetchResults, [((vm, end_time), {}) for vm in vms])
+    return [s for vm_samples in samples for s in vm_samples]
 
 
 def Register(parsed_flags):
@@ -79,6 +209,8 @@ def Register(parsed_flags):
   if not os.path.isdir(output_directory):
     raise IOError('collectd output directory does not exist: {0}'.format(
         output_directory))
-  collector = _CollectdCollector(output_directory)
+  collector = _CollectdCollector(
+      output_directory, window_seconds=parsed_flags.trace_window_seconds,
+      include_windows=parsed_flags.trace_window_samples)
   events.before_phase.connect(collector.Before, events.RUN_PHASE, weak=False)
   events.after_phase.connect(collector.After, events.RUN_PHASE, weak=False)
@@ -14,9 +14,14 @@
 """Records system performance counters during benchmark runs using dstat.
 
 http://dag.wiee.rs/home-made/dstat/
+
+The CSV output of each VM is parsed into summary samples of CPU utilization,
+disk and network throughput once it has been fetched.
 """
 
+import csv
 import functools
+import itertools
 import logging
 import os
 import posixpath
@@ -25,6 +30,7 @@ import uuid
 
 from perfkitbenchmarker import events
 from perfkitbenchmarker import flags
+from perfkitbenchmarker import trace_util
 from perfkitbenchmarker import vm_util
 
 flags.DEFINE_boolean('dstat', False,
@@ -39,6 +45,72 @@ flags.DEFINE_string('dstat_output', None,
                     'Only applicable when --dstat is specified. '
                     'Default: run temporary directory.')
 
+# Metrics derived from dstat output. Each is a tuple of the metric name, its
+# unit, the dstat group and column it is read from, and a function to apply to
+# the column's values, or None.
+_DSTAT_METRICS = [
+    ('cpu_utilization', '%', 'total cpu usage', 'idl',
+     lambda idle: 100.0 - idle),
+    ('disk_read_bytes', 'bytes/sec', 'dsk/total', 'read', None),
+    ('disk_write_bytes', 'bytes/sec', 'dsk/total', 'writ', None),
+    ('network_received_bytes', 'bytes/sec', 'net/total', 'recv', None),
+    ('network_sent_bytes', 'bytes/sec', 'net/total', 'send', None)]
+
+
+def ParseCsv(fp, window_seconds):
+  """Parses dstat CSV output, averaging it into windows.
+
+  dstat's CSV output starts with a preamble, followed by a row of column group
+  names, such as "total cpu usage", and a row of column names, such as "idl".
+  Each group name is only given for the group's first column.
+
+  Args:
+    fp: file. The CSV output, which is read line by line.
+    window_seconds: int. Width of the windows.
+
+  Returns:
+    List of trace_util.Metric, for each of _DSTAT_METRICS in the output.
+  """
+  reader = csv.reader(fp)
+  for row in reader:
+    if row and row[0] == 'epoch':
+      group_row = row
+      break
+  else:
+    return []
+  column_row = next(reader, [])
+
+  column_indices = {}
+  group = None
+  for i, (group_name, column_name) in enumerate(
+      itertools.izip_longest(group_row, column_row, fillvalue='')):
+    group = group_name or group
+    column_indices.setdefault((group, column_name), i)
+  metrics = [(metric, column_indices[metric[2], metric[3]])
+             for metric in _DSTAT_METRICS
+             if (metric[2], metric[3]) in column_indices]
+
+  series = trace_util.WindowedSeries(len(metrics), window_seconds)
+  for row in reader:
+    try:
+      timestamp = float(row[0])
+    except (IndexError, ValueError):
+      continue
+    values = []
+    for (_, _, _, _, function), index in metrics:
+      try:
+        value = float(row[index])
+      except (IndexError, ValueError):
+        value = None
+      else:
+        if function:
+          value = function(value)
+      values.append(value)
+    series.Add(timestamp, values)
+
+  return [trace_util.Metric(name, unit, series.Means(i))
+          for i, ((name, unit, _, _, _), _) in enumerate(metrics)]
+
 
 class _DStatCollector(object):
   """dstat collector.
@@ -46,15 +118,21 @@ class _DStatCollector(object):
   Installs and runs dstat on a collection of VMs.
   """
 
-  def __init__(self, interval=None, output_directory=None):
+  def __init__(self, interval=None, output_directory=None, window_seconds=10,
+               include_windows=False):
     """Runs dstat on 'vms'.
 
     Start dstat collection via `Start`. Stop via `Stop`.
 
     Args:
       interval: Optional int. Interval in seconds in which to collect samples.
+      window_seconds: int. Width of the windows that dstat output is averaged
+        into.
+      include_windows: bool. Whether to create a sample per window.
     """
     self.interval = interval
+    self.window_seconds = window_seconds
+    self.include_windows = include_windows
     self.output_directory = output_directory or vm_util.GetTempDir()
     self._lock = threading.Lock()
     self._pids = {}
@@ -91,10 +169,14 @@ class _DStatCollector(object):
       self._file_names[vm.name] = dstat_file
 
   def _StopOnVm(self, vm):
-    """Stop dstat on 'vm', copy the results to the run temporary directory."""
+    """Stop dstat on 'vm', copy the results to the run temporary directory.
+
+    Returns:
+      List of sample.Sample objects summarizing the results.
+    """
     if vm.name not in self._pids:
       logging.warn('No dstat PID for %s', vm.name)
-      return
+      return []
     else:
       with self._lock:
         pid = self._pids.pop(vm.name)
@@ -105,6 +187,14 @@ class _DStatCollector(object):
       vm.PullFile(self.output_directory, file_name)
     except:
       logging.exception('Failed fetching dstat result from %s.', vm.name)
+      return []
+    with open(os.path.join(self.output_directory,
+                           posixpath.basename(file_name))) as fp:
+      metrics = ParseCsv(fp, self.window_seconds)
+    return trace_util.CreateSummarySamples(
+        'dstat', metrics,
+        {'vm_name': vm.name, 'trace_window_seconds': self.window_seconds},
+        include_windows=self.include_windows)
 
   def Start(self, sender, benchmark_spec):
     """Install and start dstat on all VMs in 'benchmark_spec'."""
@@ -114,8 +204,13 @@ class _DStatCollector(object):
     vm_util.RunThreaded(start_on_vm, benchmark_spec.vms)
 
   def Stop(self, sender, benchmark_spec):
-    """Stop dstat on all VMs in 'benchmark_spec', fetch results."""
-    vm_util.RunThreaded(self._StopOnVm, benchmark_spec.vms)
+    """Stop dstat on all VMs in 'benchmark_spec', fetch results.
+
+    Returns:
+      List of sample.Sample objects summarizing the results.
+    """
+    samples = vm_util.RunThreaded(self._StopOnVm, benchmark_spec.vms)
+    return [s for vm_samples in samples for s in vm_samples]
 
 
 def Register(parsed_flags):
@@ -132,7 +227,9 @@ def Register(parsed_flags):
 
   if not os.path.isdir(output_directory):
     os.makedirs(output_directory)
-  collector = _DStatCollector(interval=parsed_flags.dstat_interval,
-                              output_directory=output_directory)
+  collector = _DStatCollector(
+      interval=parsed_flags.dstat_interval, output_directory=output_directory,
+      window_seconds=parsed_flags.trace_window_seconds,
+      include_windows=parsed_flags.trace_window_samples)
   events.before_phase.connect(collector.Start, events.RUN_PHASE, weak=False)
   events.after_phase.connect(collector.Stop, events.RUN_PHASE, weak=False)
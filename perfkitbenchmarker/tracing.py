@@ -0,0 +1,219 @@
+# Copyright 2015 PerfKitBenchmarker Authors. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Records nested spans of the time PKB spends on each operation.
+
+With --trace_spans, the benchmark phases, VM creation, package installs,
+remote commands, copies and local commands are each recorded as a span. A span
+started by a thread run with vm_util.RunThreaded is nested under the span that
+was current in the thread that called RunThreaded. Each span is tagged with
+the VM it acts on, the ThreadLogContext label and the benchmark.
+
+At the end of the run the spans are written to a Chrome trace file (open it at
+chrome://tracing), and each benchmark reports its slowest operations as
+samples. When tracing is disabled, Span costs a single global lookup.
+"""
+
+import collections
+import contextlib
+import itertools
+import json
+import os
+import threading
+import time
+
+from perfkitbenchmarker import context
+from perfkitbenchmarker import flags
+from perfkitbenchmarker import log_util
+from perfkitbenchmarker import sample
+
+TRACE_FILE_NAME = 'spans.json'
+
+flags.DEFINE_boolean('trace_spans', False,
+                     'Record how long each benchmark phase, VM creation, '
+                     'package install, remote command and copy takes. The '
+                     'spans are written to %s in the run\'s temp directory '
+                     'in Chrome trace format, and the slowest operations of '
+                     'each benchmark are reported as samples.' %
+                     TRACE_FILE_NAME)
+flags.DEFINE_integer('trace_span_samples', 10,
+                     'With --trace_spans, the number of slowest operations '
+                     'each benchmark reports as samples.', lower_bound=0)
+
+FLAGS = flags.FLAGS
+
+PHASE = 'phase'
+RESOURCE = 'resource'
+INSTALL = 'install'
+REMOTE_COMMAND = 'remote_command'
+COMMAND = 'command'
+
+# Longest string recorded for a span argument, such as a command.
+_MAX_ARG_LENGTH = 200
+
+# A finished span.
+#
+# Attributes:
+#   span_id: int. Unique id of the span.
+#   parent_id: int or None. Id of the span it is nested in.
+#   name: string. Name of the operation, e.g. 'RemoteHostCommand'.
+#   category: string. Kind of operation, e.g. REMOTE_COMMAND.
+#   start_time: float. Unix time the span started.
+#   duration: float. Seconds the span took.
+#   thread_id: int. Ident of the thread that ran the span.
+#   vm_name: string or None. Name of the VM the operation acted on.
+#   label: string. The thread's ThreadLogContext label.
+#   benchmark_uid: string or None. Uid of the benchmark that ran the span.
+#   args: dict. Details of the operation, such as the command run.
+SpanRecord = collections.namedtuple('SpanRecord', [
+    'span_id', 'parent_id', 'name', 'category', 'start_time', 'duration',
+    'thread_id', 'vm_name', 'label', 'benchmark_uid', 'args'])
+
+# List of SpanRecords, or None when tracing is disabled. Appending to a list
+# is atomic, so threads add to it without a lock.
+_spans = None
+_span_ids = itertools.count(1)
+_thread_names = {}
+_local = threading.local()
+
+
+def Enable():
+  """Starts recording spans."""
+  global _spans
+  _spans = []
+
+
+def IsEnabled():
+  return _spans is not None
+
+
+def GetCurrentSpan():
+  """Returns the id of the calling thread's innermost open span, or None."""
+  return getattr(_local, 'span_id', None)
+
+
+def SetCurrentSpan(span_id):
+  """Nests the calling thread's next spans under another span.
+
+  Args:
+    span_id: int or None. Id returned by GetCurrentSpan, possibly in another
+        thread.
+  """
+  _local.span_id = span_id
+
+
+def _FormatArg(value):
+  if isinstance(value, (list, tuple)):
+    value = ' '.join(str(v) for v in value)
+  elif not isinstance(value, basestring):
+    value = str(value)
+  return value[:_MAX_ARG_LENGTH]
+
+
+@contextlib.contextmanager
+def Span(name, category, vm=None, **kwargs):
+  """Records the enclosed block as a span.
+
+  Args:
+    name: string. Name of the operation.
+    category: string. Kind of operation, e.g. REMOTE_COMMAND.
+    vm: BaseVirtualMachine or None. The VM the operation acts on.
+    **kwargs: Details of the operation. Values are converted to strings when
+        the span is exported.
+  """
+  spans = _spans
+  if spans is None:
+    yield
+    return
+  parent_id = getattr(_local, 'span_id', None)
+  span_id = next(_span_ids)
+  _local.span_id = span_id
+  start_time = time.time()
+  try:
+    yield
+  finally:
+    duration = time.time() - start_time
+    _local.span_id = parent_id
+    thread = threading.current_thread()
+    _thread_names[thread.ident] = thread.name
+    spec = context.GetThreadBenchmarkSpec()
+    spans.append(SpanRecord(
+        span_id, parent_id, name, category, start_time, duration,
+        thread.ident, vm.name if vm else None,
+        log_util.GetThreadLogContext().label.strip(),
+        spec.uid if spec else None, kwargs))
+
+
+def WriteChromeTrace(path):
+  """Writes the recorded spans to a file in Chrome trace event format.
+
+  Args:
+    path: string. Path of the file to write.
+  """
+  spans = list(_spans or ())
+  start_time = min(s.start_time for s in spans) if spans else 0
+  pid = os.getpid()
+  events = [{'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': thread_id,
+             'args': {'name': thread_name}}
+            for thread_id, thread_name in _thread_names.items()]
+  for span in spans:
+    args = {key: _FormatArg(value) for key, value in span.args.iteritems()}
+    args.update(span_id=span.span_id, parent_id=span.parent_id,
+                vm_name=span.vm_name, label=span.label,
+                benchmark_uid=span.benchmark_uid)
+    events.append({'name': span.name, 'cat': span.category, 'ph': 'X',
+                   'ts': (span.start_time - start_time) * 1e6,
+                   'dur': span.duration * 1e6, 'pid': pid,
+                   'tid': span.thread_id, 'args': args})
+  with open(path, 'w') as trace_file:
+    json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, trace_file)
+
+
+def CreateSamples(benchmark_uid):
+  """Creates samples of a benchmark's slowest operations.
+
+  Only spans that have no spans nested in them are considered, so that each
+  sample points at the operation that was actually slow rather than at the
+  phase or install that contained it. A local command run for a remote
+  command is reported as the remote command.
+
+  Args:
+    benchmark_uid: string. The uid of the BenchmarkSpec.
+
+  Returns:
+    List of up to --trace_span_samples sample.Sample objects, slowest first.
+    Empty if tracing is disabled.
+  """
+  if not _spans or not FLAGS.trace_span_samples:
+    return []
+  spans = {s.span_id: s for s in _spans}
+  parent_ids = set(s.parent_id for s in spans.itervalues())
+  leaves = {}
+  for span in spans.itervalues():
+    if span.benchmark_uid != benchmark_uid or span.span_id in parent_ids:
+      continue
+    parent = spans.get(span.parent_id)
+    if parent and parent.category == REMOTE_COMMAND:
+      span = parent
+    leaves[span.span_id] = span
+  leaves = sorted(leaves.itervalues(), key=lambda s: s.duration, reverse=True)
+  samples = []
+  for rank, span in enumerate(leaves[:FLAGS.trace_span_samples], 1):
+    metadata = {key: _FormatArg(value) for key, value in span.args.iteritems()}
+    metadata.update(operation=span.name, category=span.category, rank=rank,
+                    label=span.label)
+    if span.vm_name:
+      metadata['vm_name'] = span.vm_name
+    samples.append(sample.Sample('Slow Operation Runtime', span.duration,
+                                 'seconds', metadata))
+  return samples
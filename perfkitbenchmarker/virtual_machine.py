@@ -19,6 +19,7 @@ operate on the VM: boot, shutdown, etc.
 """
 
 import abc
+import collections
 import os.path
 import threading
 
@@ -185,6 +186,17 @@ class BaseVirtualMachine(resource.BaseResource):
     """
     pass
 
+  def GetSampleMetadata(self):
+    """Returns metadata about the VM to add to its benchmark's samples.
+
+    The default implementation returns no metadata. Providers should override
+    it to report VM settings that affect results.
+
+    Returns:
+      dict mapping metadata keys to values.
+    """
+    return {}
+
 
 class BaseOsMixin(object):
   """The base class for OS Mixin classes.
@@ -196,6 +208,8 @@ class BaseOsMixin(object):
   Attributes:
     bootable_time: The time when the VM finished booting.
     hostname: The VM's hostname.
+    package_install_times: OrderedDict mapping the names of the PerfKit
+        packages installed on the VM to the seconds each took to install.
     remote_access_ports: A list of ports which must be opened on the firewall
         in order to access the VM.
   """
@@ -205,6 +219,7 @@ class BaseOsMixin(object):
   def __init__(self):
     super(BaseOsMixin, self).__init__()
     self._installed_packages = set()
+    self.package_install_times = collections.OrderedDict()
 
     self.bootable_time = None
     self.hostname = None
@@ -304,6 +319,13 @@ class BaseOsMixin(object):
     """Perform OS specific setup on any local disks that exist."""
     pass
 
+  def CloseRemoteConnections(self):
+    """Closes any persistent connections held open to the VM.
+
+    This will be called once before the VM is deleted.
+    """
+    pass
+
   def PushFile(self, source_path, remote_path=''):
     """Copies a file or a directory to the VM.
 
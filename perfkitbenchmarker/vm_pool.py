@@ -0,0 +1,253 @@
+# Copyright 2015 PerfKitBenchmarker Authors. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""A pool of provisioned VMs that later benchmarks of the same run reuse.
+
+With --vm_pool, the VMs of a benchmark that finishes cleanly are kept instead
+of deleted. A later benchmark that asks for a VM with the same cloud, OS type,
+VM spec (zone, machine type, image, ...) and disk specs leases one of them
+instead of creating a new one, as long as the VM is on the same network and
+firewall as the benchmark's other VMs. The VMs the benchmark creates after
+leasing one join its network. A leased VM has its PerfKit packages
+uninstalled, its system packages restored to the snapshot taken when it was
+first prepared, and its scratch disks emptied. The VMs left in the pool are
+deleted at the end of the run.
+"""
+
+import collections
+import logging
+import threading
+import time
+
+from perfkitbenchmarker import flags
+from perfkitbenchmarker import sample
+from perfkitbenchmarker import vm_util
+
+flags.DEFINE_boolean('vm_pool', False,
+                     'Keep the VMs of each benchmark that finishes cleanly '
+                     'and reuse them for later benchmarks of the same run '
+                     'that need VMs with the same specs, instead of creating '
+                     'new VMs. Only applies to Linux VMs with '
+                     '--run_stage=all.')
+
+FLAGS = flags.FLAGS
+
+_lock = threading.Lock()
+# Maps a pool key to a list of idle VMs.
+_idle = collections.defaultdict(list)
+# Maps each VM that may be returned to the pool to its _PoolEntry.
+_entries = {}
+# Networks and firewalls that pooled VMs may use.
+_networks = []
+_firewalls = []
+# Maps a benchmark uid to a list of (seconds saved, seconds to reset) tuples,
+# one per leased VM.
+_savings = collections.defaultdict(list)
+
+# A VM that may be returned to the pool.
+#
+# Attributes:
+#   key: tuple. The pool key of the VM's specs.
+#   provision_time: float. Seconds it took to create and prepare the VM.
+_PoolEntry = collections.namedtuple('_PoolEntry', ['key', 'provision_time'])
+
+
+def IsEnabled():
+  return FLAGS.vm_pool and FLAGS.run_stage == 'all'
+
+
+def _SpecItems(spec):
+  return tuple(sorted((name, repr(value))
+                      for name, value in vars(spec).iteritems()))
+
+
+def GetKey(cloud, os_type, vm_spec, disk_specs):
+  """Returns the key under which a VM with the given specs is pooled.
+
+  Args:
+    cloud: string. The cloud of the VM.
+    os_type: string. The OS type of the VM.
+    vm_spec: BaseVmSpec. The spec of the VM, with flags applied.
+    disk_specs: list of BaseDiskSpec. The specs of the VM's scratch disks.
+
+  Returns:
+    A hashable tuple.
+  """
+  return (cloud, os_type, type(vm_spec).__name__, _SpecItems(vm_spec),
+          tuple(_SpecItems(disk_spec) for disk_spec in disk_specs))
+
+
+def Register(vm, key, provision_time):
+  """Makes a newly prepared VM eligible to be returned to the pool.
+
+  Snapshots the VM's packages, so that they can be restored when it is
+  leased.
+
+  Args:
+    vm: BaseVirtualMachine. The VM.
+    key: tuple. The pool key of the VM's specs, from GetKey.
+    provision_time: float. Seconds it took to create and prepare the VM.
+  """
+  vm.SnapshotPackages()
+  with _lock:
+    _entries[vm] = _PoolEntry(key, provision_time)
+
+
+def Lease(key, accept=None):
+  """Takes an idle VM out of the pool.
+
+  The VM must be passed to Reset before it is used.
+
+  Args:
+    key: tuple. The pool key of the needed VM's specs, from GetKey.
+    accept: function that takes an idle VM and returns whether it may be
+        leased, e.g. whether it is on the caller's networks. If None, any idle
+        VM with the specs may be leased.
+
+  Returns:
+    BaseVirtualMachine, or None if there is no idle VM with the specs that is
+    accepted.
+  """
+  with _lock:
+    idle = _idle.get(key, [])
+    for i in reversed(xrange(len(idle))):
+      if accept is None or accept(idle[i]):
+        return idle.pop(i)
+  return None
+
+
+def Reset(vm, benchmark_uid):
+  """Resets a leased VM for a new benchmark.
+
+  If the reset fails, the VM is no longer returned to the pool, so the
+  benchmark that leased it deletes it.
+
+  Args:
+    vm: BaseVirtualMachine. A VM returned by Lease.
+    benchmark_uid: string. The uid of the benchmark leasing the VM.
+  """
+  start_time = time.time()
+  try:
+    vm.ResetPackages()
+    for scratch_disk in vm.scratch_disks:
+      if scratch_disk.mount_point:
+        vm.RemoteCommand('sudo find {0} -mindepth 1 -delete'.format(
+            scratch_disk.mount_point))
+  except:
+    with _lock:
+      _entries.pop(vm, None)
+    raise
+  reset_time = time.time() - start_time
+  with _lock:
+    saved_time = _entries[vm].provision_time - reset_time
+    _savings[benchmark_uid].append((saved_time, reset_time))
+  logging.info('Reused pooled VM %s, saving %.1f seconds.', vm.name,
+               saved_time)
+
+
+def Release(vm, networks, firewalls):
+  """Returns a VM to the pool once its benchmark is done with it.
+
+  Args:
+    vm: BaseVirtualMachine. The VM.
+    networks: iterable of BaseNetwork. Networks of the VM's benchmark, which
+        are then deleted with the pool instead of by the benchmark.
+    firewalls: iterable of BaseFirewall. Firewalls of the VM's benchmark,
+        likewise.
+
+  Returns:
+    True if the VM was returned to the pool, or False if the caller should
+    delete it.
+  """
+  with _lock:
+    entry = _entries.get(vm)
+    if entry is None:
+      return False
+    _idle[entry.key].append(vm)
+    _networks.extend(network for network in networks
+                     if network not in _networks)
+    _firewalls.extend(firewall for firewall in firewalls
+                      if firewall not in _firewalls)
+  return True
+
+
+def KeepFirewalls(firewalls):
+  """Leaves firewalls to be closed with the pool instead of by a benchmark.
+
+  Benchmarks may share firewall rules, e.g. GCE names them after the run, so
+  closing the firewalls of a benchmark whose VMs were not pooled could close
+  ports that pooled VMs still need.
+
+  Args:
+    firewalls: iterable of BaseFirewall.
+  """
+  with _lock:
+    _firewalls.extend(firewall for firewall in firewalls
+                      if firewall not in _firewalls)
+
+
+def _DeleteVm(vm):
+  vm.CloseRemoteConnections()
+  vm.Delete()
+  vm.DeleteScratchDisks()
+
+
+def DeleteAll():
+  """Deletes the idle VMs, and the networks and firewalls they used."""
+  with _lock:
+    vms = [vm for idle in _idle.itervalues() for vm in idle]
+    networks = list(_networks)
+    firewalls = list(_firewalls)
+    _idle.clear()
+    _entries.clear()
+    del _networks[:]
+    del _firewalls[:]
+  if vms:
+    logging.info('Deleting %d pooled VMs.', len(vms))
+    try:
+      vm_util.RunThreaded(_DeleteVm, vms)
+    except Exception:
+      logging.exception('Got an exception deleting pooled VMs. '
+                        'Attempting to continue tearing down.')
+  for firewall in firewalls:
+    try:
+      firewall.DisallowAllPorts()
+    except Exception:
+      logging.exception('Got an exception disabling firewalls. '
+                        'Attempting to continue tearing down.')
+  for network in networks:
+    try:
+      network.Delete()
+    except Exception:
+      logging.exception('Got an exception deleting networks. '
+                        'Attempting to continue tearing down.')
+
+
+def CreateSamples(benchmark_uid):
+  """Creates a sample of the provisioning time that leased VMs saved.
+
+  Args:
+    benchmark_uid: string. The uid of the BenchmarkSpec.
+
+  Returns:
+    List of sample.Sample objects. Empty if the benchmark didn't lease VMs.
+  """
+  with _lock:
+    savings = _savings.pop(benchmark_uid, None)
+  if not savings:
+    return []
+  return [sample.Sample(
+      'VM Pool Provisioning Time Saved',
+      sum(saved_time for saved_time, _ in savings), 'seconds',
+      {'pooled_vms': len(savings),
+       'pool_reset_time': sum(reset_time for _, reset_time in savings)})]
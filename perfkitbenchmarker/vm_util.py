@@ -14,6 +14,7 @@
 
 """Set of utility functions for working with virtual machines."""
 
+import collections
 from collections import namedtuple
 from concurrent import futures
 import contextlib
@@ -25,6 +26,7 @@ import random
 import re
 import string
 import subprocess
+import sys
 import tempfile
 import threading
 import time
@@ -38,6 +40,7 @@ from perfkitbenchmarker import errors
 from perfkitbenchmarker import flags
 from perfkitbenchmarker import log_util
 from perfkitbenchmarker import regex_util
+from perfkitbenchmarker import tracing
 
 FLAGS = flags.FLAGS
 
@@ -54,6 +57,9 @@ VM_TMP_DIR = '/tmp/pkb'
 # Default timeout for issuing a command.
 DEFAULT_TIMEOUT = 300
 
+# Default maximum number of threads used by RunParallelThreads.
+DEFAULT_MAX_WORKER_THREADS = 400
+
 # Defaults for retrying commands.
 POLL_INTERVAL = 30
 TIMEOUT = 1200
@@ -67,11 +73,26 @@ OUTPUT_STDOUT = 0
 OUTPUT_STDERR = 1
 OUTPUT_EXIT_CODE = 2
 
+# Seconds between status checks while a RobustCommandMultiplexer waits.
+ROBUST_COMMAND_POLL_INTERVAL = 10
+# Number of consecutive status checks that must find a command's status file
+# missing, or unlocked but empty, before its wrapper script is assumed to have
+# died or never started.
+ROBUST_COMMAND_MAX_EMPTY_STATUS_POLLS = 3
+
+# Number of trailing output lines that IssueCommand keeps for a stream that
+# is passed to a line consumer.
+STREAMED_OUTPUT_TAIL_LINES = 100
+
 flags.DEFINE_integer('default_timeout', TIMEOUT, 'The default timeout for '
                      'retryable commands in seconds.')
 flags.DEFINE_integer('burn_cpu_seconds', 0,
                      'Amount of time in seconds to burn cpu on vm.')
 flags.DEFINE_integer('burn_cpu_threads', 1, 'Number of threads to burn cpu.')
+flags.DEFINE_integer('max_worker_threads', DEFAULT_MAX_WORKER_THREADS,
+                     'The maximum number of persistent worker threads used to '
+                     'run parallel function calls, such as those issued to '
+                     'every VM at once.', lower_bound=1)
 
 
 class IpAddressSubset(object):
@@ -208,9 +229,133 @@ ThreadCallResult = namedtuple('ThreadCallResult', [
     'call_id', 'return_value', 'traceback'])
 
 
-def _ExecuteThreadCall(target_arg_tuple, call_id, queue, parent_log_context,
-                       parent_benchmark_spec):
-  """Function invoked in another thread by RunParallelThreads.
+class _WorkerPool(object):
+  """A process-wide pool of persistent worker threads.
+
+  Worker threads are started on demand, up to max_workers, and then
+  reused for subsequent tasks rather than being torn down after each call. A
+  worker that blocks waiting on a nested RunParallelThreads call lends its slot
+  to a new worker for the duration of the wait, so nested calls cannot exhaust
+  the pool and deadlock.
+
+  Attributes:
+    max_workers: int. Maximum number of worker threads, not counting those
+        started to stand in for blocked workers.
+    num_workers: int. Number of worker threads currently alive.
+  """
+
+  def __init__(self, max_workers=DEFAULT_MAX_WORKER_THREADS):
+    self.max_workers = max_workers
+    self._lock = threading.Lock()
+    self._tasks = Queue.Queue()
+    self._local = threading.local()
+    self._num_idle = 0
+    self._num_blocked = 0
+    self.num_workers = 0
+    self._num_tasks = 0
+    self._max_queue_depth = 0
+    self._total_wait_time = 0.
+    self._max_wait_time = 0.
+
+  def _GetWorkerLimit(self):
+    return self.max_workers + self._num_blocked
+
+  def _MaybeStartWorker(self):
+    """Starts a worker if queued tasks outnumber idle workers.
+
+    Must be called while holding self._lock.
+    """
+    if (self._tasks.qsize() > self._num_idle and
+        self.num_workers < self._GetWorkerLimit()):
+      thread = threading.Thread(target=self._WorkerLoop)
+      thread.daemon = True
+      thread.start()
+      self.num_workers += 1
+
+  def Submit(self, task):
+    """Queues a callable to be run by a worker thread.
+
+    Args:
+      task: callable taking no arguments. Exceptions it raises are logged and
+          otherwise ignored, so it should report its own failures.
+    """
+    with self._lock:
+      self._tasks.put((task, time.time()))
+      self._num_tasks += 1
+      self._max_queue_depth = max(self._max_queue_depth, self._tasks.qsize())
+      self._MaybeStartWorker()
+
+  def _WorkerLoop(self):
+    self._local.is_worker = True
+    while True:
+      with self._lock:
+        if self.num_workers > self._GetWorkerLimit():
+          # The pool grew while another worker was blocked; shrink back.
+          self.num_workers -= 1
+          return
+        self._num_idle += 1
+      task, submit_time = self._tasks.get()
+      wait_time = time.time() - submit_time
+      with self._lock:
+        self._num_idle -= 1
+        self._total_wait_time += wait_time
+        self._max_wait_time = max(self._max_wait_time, wait_time)
+      try:
+        task()
+      except:
+        logging.exception('Unhandled exception in worker thread.')
+
+  @contextlib.contextmanager
+  def Blocking(self):
+    """Context manager for a caller about to block on tasks in this pool.
+
+    If the calling thread is itself a worker, another worker may be started in
+    its place until the block is exited.
+    """
+    if not getattr(self._local, 'is_worker', False):
+      yield
+      return
+    with self._lock:
+      self._num_blocked += 1
+      self._MaybeStartWorker()
+    try:
+      yield
+    finally:
+      with self._lock:
+        self._num_blocked -= 1
+
+  def GetStats(self):
+    """Returns a dict describing the tasks run by the pool so far."""
+    with self._lock:
+      return {
+          'num_workers': self.num_workers,
+          'num_tasks': self._num_tasks,
+          'max_queue_depth': self._max_queue_depth,
+          'total_queue_wait_time': self._total_wait_time,
+          'max_queue_wait_time': self._max_wait_time}
+
+
+_worker_pool = _WorkerPool()
+
+
+def SetMaxWorkerThreads(max_workers):
+  """Sets the maximum number of threads used by RunParallelThreads."""
+  _worker_pool.max_workers = max_workers
+
+
+def GetWorkerPoolStats():
+  """Returns statistics about the threads used by RunParallelThreads.
+
+  Returns:
+    dict with the number of worker threads started, the number of tasks
+    submitted to them, the largest number of tasks queued at once, and the
+    total and maximum seconds that a task spent queued before starting.
+  """
+  return _worker_pool.GetStats()
+
+
+def _ExecuteThreadCall(target_arg_tuple, call_id):
+  """Function invoked in a worker thread by RunParallelThreads.
 
   Executes a specified function call and captures the traceback upon exception.
 
@@ -219,28 +364,35 @@ def _ExecuteThreadCall(target_arg_tuple, call_id, queue, parent_log_context,
         call and the arguments to pass it.
     call_id: int. Index corresponding to the call in the thread_params argument
         of RunParallelThreads.
-    queue: Queue. Receives a ThreadCallResult.
-    parent_log_context: ThreadLogContext of the parent thread.
-    parent_benchmark_spec: BenchmarkSpec of the parent thread.
+
+  Returns:
+    ThreadCallResult.
   """
   target, args, kwargs = target_arg_tuple
   try:
-    log_context = log_util.ThreadLogContext(parent_log_context)
-    log_util.SetThreadLogContext(log_context)
-    context.SetThreadBenchmarkSpec(parent_benchmark_spec)
-    queue.put(ThreadCallResult(call_id, target(*args, **kwargs), None))
+    return ThreadCallResult(call_id, target(*args, **kwargs), None)
   except:
-    queue.put(ThreadCallResult(call_id, None, traceback.format_exc()))
+    return ThreadCallResult(call_id, None, traceback.format_exc())
+
 
+def RunParallelThreads(target_arg_tuples, max_concurrency, timeout=None,
+                       cancel_on_failure=False):
+  """Executes function calls concurrently in worker threads.
 
-def RunParallelThreads(target_arg_tuples, max_concurrency):
-  """Executes function calls concurrently in separate threads.
+  The calls run on a shared pool of persistent threads (see
+  SetMaxWorkerThreads). Each call inherits the calling thread's
+  ThreadLogContext, benchmark spec and tracing span.
 
   Args:
     target_arg_tuples: list of (target, args, kwargs) tuples. Each tuple
         contains the function to call and the arguments to pass it.
-    max_concurrency: int or None. The maximum number of concurrent new
-        threads.
+    max_concurrency: int or None. The maximum number of calls to run at once.
+    timeout: int, float, or None. If provided, the number of seconds each call
+        may run. A call that exceeds it is treated as failed and abandoned; its
+        thread is left to finish in the background.
+    cancel_on_failure: boolean. If True, calls that have not started yet are
+        skipped once any call fails. Calls that are already running are still
+        waited on.
 
   Returns:
     list of function return values in the order corresponding to the order of
@@ -248,46 +400,109 @@ def RunParallelThreads(target_arg_tuples, max_concurrency):
 
   Raises:
     errors.VmUtil.ThreadException: When an exception occurred in any of the
-        called functions.
+        called functions, or a call timed out.
   """
   queue = Queue.Queue()
   log_context = log_util.GetThreadLogContext()
   benchmark_spec = context.GetThreadBenchmarkSpec()
-  max_concurrency = min(max_concurrency, len(target_arg_tuples))
-  results = [None] * len(target_arg_tuples)
+  parent_span = tracing.GetCurrentSpan()
+  num_calls = len(target_arg_tuples)
+  max_concurrency = min(max_concurrency, num_calls)
+  results = [None] * num_calls
   error_strings = []
-  for call_id in xrange(max_concurrency):
-    target_arg_tuple = target_arg_tuples[call_id]
-    thread = threading.Thread(
-        target=_ExecuteThreadCall,
-        args=(target_arg_tuple, call_id, queue, log_context, benchmark_spec))
-    thread.daemon = True
-    thread.start()
-  active_thread_count = max_concurrency
-  next_call_id = max_concurrency
-  while active_thread_count:
+  lock = threading.Lock()
+  pending_call_ids = collections.deque(xrange(num_calls))
+  start_times = {}
+  unfinished_call_ids = set(xrange(num_calls))
+  cancelled = []
+
+  def RunCalls():
+    """Runs calls from the pending queue until it is empty or cancelled."""
     try:
+      while True:
+        with lock:
+          if cancelled or not pending_call_ids:
+            return
+          call_id = pending_call_ids.popleft()
+          start_times[call_id] = time.time()
+        # Each call starts from the caller's context, regardless of what
+        # earlier calls run by this worker did to theirs.
+        log_util.SetThreadLogContext(log_util.ThreadLogContext(log_context))
+        context.SetThreadBenchmarkSpec(benchmark_spec)
+        tracing.SetCurrentSpan(parent_span)
+        result = _ExecuteThreadCall(target_arg_tuples[call_id], call_id)
+        if result.traceback and cancel_on_failure:
+          with lock:
+            cancelled.append(call_id)
+        queue.put(result)
+    finally:
+      log_util.SetThreadLogContext(log_util.ThreadLogContext())
+      context.SetThreadBenchmarkSpec(None)
+      tracing.SetCurrentSpan(None)
+
+  def HandleFailure(call_id, msg):
+    logging.error(msg)
+    error_strings.append(msg)
+    unfinished_call_ids.discard(call_id)
+    if cancel_on_failure:
+      with lock:
+        cancelled.append(call_id)
+        skipped_call_ids = list(pending_call_ids)
+        pending_call_ids.clear()
+      if skipped_call_ids:
+        unfinished_call_ids.difference_update(skipped_call_ids)
+        msg = 'Cancelled {0} call(s) that had not started: {1}'.format(
+            len(skipped_call_ids),
+            ', '.join(_GetCallString(target_arg_tuples[i])
+                      for i in skipped_call_ids))
+        logging.error(msg)
+        error_strings.append(msg)
+
+  with _worker_pool.Blocking():
+    for _ in xrange(max_concurrency):
+      _worker_pool.Submit(RunCalls)
+    while unfinished_call_ids:
       # Using a timeout makes this wait interruptable.
-      call_id, result, stacktrace = queue.get(block=True, timeout=1000)
-    except Queue.Empty:
-      continue
-    results[call_id] = result
-    if stacktrace:
-      msg = ('Exception occurred while calling {0}:{1}{2}'.format(
-          _GetCallString(target_arg_tuples[call_id]), os.linesep, stacktrace))
-      logging.error(msg)
-      error_strings.append(msg)
-    if next_call_id == len(target_arg_tuples):
-      active_thread_count -= 1
-    else:
-      target_arg_tuple = target_arg_tuples[next_call_id]
-      thread = threading.Thread(
-          target=_ExecuteThreadCall,
-          args=(target_arg_tuple, next_call_id, queue, log_context,
-                benchmark_spec))
-      thread.daemon = True
-      thread.start()
-      next_call_id += 1
+      wait_time = 1000
+      if timeout is not None:
+        # Wake up in time to enforce the earliest deadline. Calls that have not
+        # started yet will have a deadline no earlier than timeout from now.
+        with lock:
+          deadlines = [start_times[i] + timeout for i in unfinished_call_ids
+                       if i in start_times]
+        wait_time = max(0, min(deadlines + [time.time() + timeout]) -
+                        time.time())
+      try:
+        call_id, result, stacktrace = queue.get(block=True, timeout=wait_time)
+      except Queue.Empty:
+        if timeout is None:
+          continue
+        now = time.time()
+        with lock:
+          timed_out_call_ids = [
+              i for i in unfinished_call_ids
+              if i in start_times and now - start_times[i] >= timeout]
+        for call_id in sorted(timed_out_call_ids):
+          HandleFailure(call_id, 'Call {0} timed out after {1} seconds.'.format(
+              _GetCallString(target_arg_tuples[call_id]), timeout))
+          # The abandoned call still occupies its thread, so start another to
+          # take its place in the concurrency limit.
+          with lock:
+            replace = bool(pending_call_ids) and not cancelled
+          if replace:
+            _worker_pool.Submit(RunCalls)
+        continue
+      if call_id not in unfinished_call_ids:
+        # The call already timed out.
+        continue
+      results[call_id] = result
+      if stacktrace:
+        HandleFailure(
+            call_id, 'Exception occurred while calling {0}:{1}{2}'.format(
+                _GetCallString(target_arg_tuples[call_id]), os.linesep,
+                stacktrace))
+      else:
+        unfinished_call_ids.discard(call_id)
   if error_strings:
     raise errors.VmUtil.ThreadException(
         'The following exceptions occurred during threaded execution:'
@@ -295,7 +510,8 @@ def RunParallelThreads(target_arg_tuples, max_concurrency):
   return results
 
 
-def RunThreaded(target, thread_params, max_concurrent_threads=200):
+def RunThreaded(target, thread_params, max_concurrent_threads=200,
+                timeout=None, cancel_on_failure=False):
   """Runs the target method in parallel threads.
 
   The method starts up threads with one arg from thread_params as the first arg.
@@ -306,6 +522,10 @@ def RunThreaded(target, thread_params, max_concurrent_threads=200):
         in the list can either be a singleton or a (args, kwargs) tuple/list.
         Usually this is a list of VMs.
     max_concurrent_threads: The maximum number of concurrent threads to allow.
+    timeout: int, float, or None. If provided, the number of seconds each call
+        may run before it is treated as failed.
+    cancel_on_failure: boolean. If True, calls that have not started yet are
+        skipped once any call fails.
 
   Returns:
     List of the same length as thread_params. Contains the return value from
@@ -347,7 +567,151 @@ def RunThreaded(target, thread_params, max_concurrent_threads=200):
     target_arg_tuples = [(target, args, kwargs)
                          for args, kwargs in thread_params]
 
-  return RunParallelThreads(target_arg_tuples, max_concurrent_threads)
+  return RunParallelThreads(target_arg_tuples, max_concurrent_threads,
+                            timeout=timeout,
+                            cancel_on_failure=cancel_on_failure)
+
+
+class RobustCommandMultiplexer(object):
+  """Waits on many commands started by RobustRemoteCommandAsync at once.
+
+  Rather than holding an SSH session and a thread per command for as long as
+  the command runs, the multiplexer periodically checks every VM that has
+  outstanding commands with one short remote command per VM. It fetches each
+  command's output only once the command has completed.
+
+  Example:
+    multiplexer = RobustCommandMultiplexer()
+    for vm in vms:
+      multiplexer.Add(vm.RobustRemoteCommandAsync(command))
+    outputs = multiplexer.WaitAll()
+
+  A handle can be added with a callback that runs when its command completes
+  and may add more handles, so that work can be handed out from a queue as
+  each command completes while WaitAll runs.
+
+  Handles need a 'vm' attribute whose PollRobustCommands method reports which
+  of them have completed, a ReadNewOutput method that passes output written so
+  far to the handle's line consumers, if any, and a Wait method that returns
+  their output.
+  """
+
+  def __init__(self, poll_interval=ROBUST_COMMAND_POLL_INTERVAL):
+    """Initializes the multiplexer.
+
+    Args:
+      poll_interval: Number of seconds between checks on the commands.
+    """
+    self.poll_interval = poll_interval
+    self._handles = []
+    # Maps id(handle) to the function to call when its command completes.
+    self._callbacks = {}
+    # Maps id(handle) to the number of consecutive polls that found its status
+    # file missing, or unlocked but empty.
+    self._empty_status_polls = collections.defaultdict(int)
+
+  def Add(self, handle, callback=None):
+    """Adds a RobustCommandHandle to wait on.
+
+    Args:
+      handle: The RobustCommandHandle.
+      callback: A function or None. Once the command has completed
+          successfully, it is called with the handle and the (stdout, stderr)
+          tuple that Wait returned. It may call Add, including while WaitAll
+          runs, and WaitAll then also waits on the handles it adds.
+    """
+    self._callbacks[id(handle)] = callback
+    self._handles.append(handle)
+
+  def _PollVm(self, vm, handles):
+    """Returns the handles in 'handles' whose commands are no longer running."""
+    try:
+      statuses = vm.PollRobustCommands(handles)
+    except errors.VirtualMachine.RemoteCommandError:
+      logging.warning('Could not check commands on %s. Will try again.', vm,
+                      exc_info=True)
+      return []
+    done = []
+    for handle in handles:
+      if handle.status_file not in statuses:
+        self._empty_status_polls[id(handle)] = 0
+      elif statuses[handle.status_file]:
+        done.append(handle)
+      else:
+        # The wrapper script either hasn't created or locked the status file
+        # yet, or it died without writing to it or never started, e.g.
+        # because /tmp is full. Give it a few polls to tell those apart. If it
+        # never started, Wait fails because the status file is missing.
+        self._empty_status_polls[id(handle)] += 1
+        if (self._empty_status_polls[id(handle)] >=
+            ROBUST_COMMAND_MAX_EMPTY_STATUS_POLLS):
+          done.append(handle)
+    for handle in handles:
+      if handle not in done:
+        handle.ReadNewOutput()
+    return done
+
+  def WaitAll(self, should_log=False, timeout=None):
+    """Waits for all added commands to complete.
+
+    Args:
+      should_log: A boolean indicating whether the commands' output should be
+          logged at the info level.
+      timeout: Number of seconds to wait for, or None to wait indefinitely.
+
+    Returns:
+      list of (stdout, stderr) tuples in the order the handles were added.
+
+    Raises:
+      RemoteCommandError: If any command exited with a non-zero status, which
+          is raised once all commands have completed, or if the timeout is
+          reached.
+    """
+    # Maps id(handle) to its (stdout, stderr) tuple.
+    results = {}
+    finished = set()
+    error_strings = []
+    deadline = None if timeout is None else time.time() + timeout
+
+    def FetchResult(handle):
+      try:
+        result = handle.Wait(should_log=should_log)
+      except errors.VirtualMachine.RemoteCommandError as e:
+        error_strings.append(str(e))
+        return
+      results[id(handle)] = result
+      callback = self._callbacks.get(id(handle))
+      if callback:
+        callback(handle, result)
+
+    while True:
+      pending = [h for h in self._handles if id(h) not in finished]
+      if not pending:
+        break
+      handles_by_vm = collections.OrderedDict()
+      for handle in pending:
+        handles_by_vm.setdefault(handle.vm, []).append(handle)
+      done = RunThreaded(
+          self._PollVm, [((vm, handles), {})
+                         for vm, handles in handles_by_vm.iteritems()])
+      done = [handle for handles in done for handle in handles]
+      if done:
+        RunThreaded(FetchResult, done)
+        finished.update(id(handle) for handle in done)
+      pending = [h for h in self._handles if id(h) not in finished]
+      if not pending:
+        break
+      if deadline is not None and time.time() >= deadline:
+        raise errors.VirtualMachine.RemoteCommandError(
+            'Timed out after %s seconds waiting for %s of %s commands: %s' % (
+                timeout, len(pending), len(self._handles),
+                ', '.join(handle.command for handle in pending)))
+      time.sleep(self.poll_interval)
+
+    if error_strings:
+      raise errors.VirtualMachine.RemoteCommandError(
+          'The following commands failed:\n%s' % '\n'.join(error_strings))
+    return [results.get(id(handle)) for handle in self._handles]
 
 
 def _ExecuteProcCall(target_arg_tuple):
@@ -478,8 +842,71 @@ def Retry(poll_interval=POLL_INTERVAL, max_retries=MAX_RETRIES,
   return Wrap
 
 
+def _ReadOutputLines(pipe, consumer, lines, exc_info):
+  """Reads a subprocess output pipe line by line until it is closed.
+
+  Args:
+    pipe: file. The pipe to read.
+    consumer: callable or None. Called with each decoded line. If None, every
+        line is appended to 'lines'.
+    lines: list or deque. Receives decoded lines. If consumer is set, this
+        should be bounded.
+    exc_info: list. Receives sys.exc_info() if consumer raises. The rest of the
+        output is then drained without being consumed, so that the subprocess
+        doesn't block on a full pipe.
+  """
+  for line in iter(pipe.readline, b''):
+    line = line.decode('ascii', 'ignore')
+    lines.append(line)
+    if consumer and not exc_info:
+      try:
+        consumer(line)
+      except:
+        exc_info.append(sys.exc_info())
+  pipe.close()
+
+
+def _CommunicateStreaming(process, input, stdout_consumer, stderr_consumer):
+  """Like process.communicate(input), but feeds lines to consumers.
+
+  Returns:
+    A tuple of stdout and stderr. For a stream with a consumer, only its last
+    STREAMED_OUTPUT_TAIL_LINES lines are returned.
+  """
+  exc_info = []
+  outputs = []
+  threads = []
+  for pipe, consumer in ((process.stdout, stdout_consumer),
+                         (process.stderr, stderr_consumer)):
+    lines = (collections.deque(maxlen=STREAMED_OUTPUT_TAIL_LINES) if consumer
+             else [])
+    outputs.append(lines)
+    thread = threading.Thread(target=_ReadOutputLines,
+                              args=(pipe, consumer, lines, exc_info))
+    thread.daemon = True
+    thread.start()
+    threads.append(thread)
+  try:
+    if input:
+      process.stdin.write(input)
+  except IOError:
+    # The process exited without reading all of its input. This is also
+    # ignored by communicate().
+    pass
+  process.stdin.close()
+  for thread in threads:
+    # Using a timeout makes this wait interruptable.
+    while thread.is_alive():
+      thread.join(1000)
+  process.wait()
+  if exc_info:
+    raise exc_info[0][0], exc_info[0][1], exc_info[0][2]
+  return tuple(''.join(lines) for lines in outputs)
+
+
 def IssueCommand(cmd, force_info_log=False, suppress_warning=False,
-                 env=None, timeout=DEFAULT_TIMEOUT, input=None):
+                 env=None, timeout=DEFAULT_TIMEOUT, input=None,
+                 stdout_consumer=None, stderr_consumer=None):
   """Tries running the provided command once.
 
   Args:
@@ -500,6 +927,15 @@ def IssueCommand(cmd, force_info_log=False, suppress_warning=False,
         return code will indicate an error, and stdout and stderr will
         contain what had already been written to them before the process was
         killed.
+    input: A string to write to the command's stdin.
+    stdout_consumer: A callable or None. If provided, it is called with each
+        line the command writes to stdout as soon as that line is read,
+        including its trailing newline. Only the last STREAMED_OUTPUT_TAIL_LINES
+        lines of stdout are kept in memory, logged, and returned, so memory
+        use stays bounded however much the command prints. If the consumer
+        raises, it is not called again, the rest of the output is discarded,
+        and the exception is re-raised once the command has finished.
+    stderr_consumer: A callable or None. Like stdout_consumer, but for stderr.
 
   Returns:
     A tuple of stdout, stderr, and retcode from running the provided command.
@@ -509,26 +945,31 @@ def IssueCommand(cmd, force_info_log=False, suppress_warning=False,
   full_cmd = ' '.join(cmd)
   logging.info('Running: %s', full_cmd)
 
-  shell_value = RunningOnWindows()
-  process = subprocess.Popen(cmd, env=env, shell=shell_value,
-                             stdin=subprocess.PIPE, stdout=subprocess.PIPE,
-                             stderr=subprocess.PIPE)
-
-  def _KillProcess():
-    logging.error('IssueCommand timed out after %d seconds. '
-                  'Killing command "%s".', timeout, full_cmd)
-    process.kill()
+  with tracing.Span('IssueCommand', tracing.COMMAND, command=cmd):
+    shell_value = RunningOnWindows()
+    process = subprocess.Popen(cmd, env=env, shell=shell_value,
+                               stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                               stderr=subprocess.PIPE)
 
-  timer = threading.Timer(timeout, _KillProcess)
-  timer.start()
+    def _KillProcess():
+      logging.error('IssueCommand timed out after %d seconds. '
+                    'Killing command "%s".', timeout, full_cmd)
+      process.kill()
 
-  try:
-    stdout, stderr = process.communicate(input)
-  finally:
-    timer.cancel()
+    timer = threading.Timer(timeout, _KillProcess)
+    timer.start()
 
-  stdout = stdout.decode('ascii', 'ignore')
-  stderr = stderr.decode('ascii', 'ignore')
+    try:
+      if stdout_consumer or stderr_consumer:
+        stdout, stderr = _CommunicateStreaming(process, input,
+                                               stdout_consumer,
+                                               stderr_consumer)
+      else:
+        stdout, stderr = process.communicate(input)
+        stdout = stdout.decode('ascii', 'ignore')
+        stderr = stderr.decode('ascii', 'ignore')
+    finally:
+      timer.cancel()
 
   debug_text = ('Ran %s. Got return code (%s).\nSTDOUT: %s\nSTDERR: %s' %
                 (full_cmd, process.returncode, stdout, stderr))
@@ -549,16 +990,18 @@ def IssueBackgroundCommand(cmd, stdout_path, stderr_path, env=None):
     stderr_path: Redirect stderr here. Overwritten.
     env: A dict of key/value strings, such as is given to the subprocess.Popen()
         constructor, that contains environment variables to be injected.
+
+  Returns:
+    The subprocess.Popen object of the spawned command.
   """
   logging.debug('Environment variables: %s' % env)
 
   full_cmd = ' '.join(cmd)
   logging.info('Spawning: %s', full_cmd)
-  outfile = open(stdout_path, 'w')
-  errfile = open(stderr_path, 'w')
   shell_value = RunningOnWindows()
-  subprocess.Popen(cmd, env=env, shell=shell_value,
-                   stdout=outfile, stderr=errfile, close_fds=True)
+  with open(stdout_path, 'w') as outfile, open(stderr_path, 'w') as errfile:
+    return subprocess.Popen(cmd, env=env, shell=shell_value,
+                            stdout=outfile, stderr=errfile, close_fds=True)
 
 
 @Retry()
@@ -24,14 +24,6 @@ directory, then it also needs to define an uninstall function (Uninstall(vm)).
 from perfkitbenchmarker import import_util
 
 
-def _LoadPackages():
-  """Imports all package modules and returns a dictionary of packages.
-
-  This imports all package modules in this directory and then creates a
-  mapping from module names to the modules themselves and returns it.
-  """
-  return {module.__name__.split('.')[-1]: module for module in
-          import_util.LoadModulesForPath(__path__, __name__)}
-
-
-PACKAGES = _LoadPackages()
+# Maps package names to package modules. Each module is only imported when it
+# is first looked up, e.g. by vm.Install.
+PACKAGES = import_util.LazyModuleDict(__path__, __name__)
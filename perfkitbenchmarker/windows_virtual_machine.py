@@ -18,6 +18,7 @@ import time
 from perfkitbenchmarker import disk
 from perfkitbenchmarker import errors
 from perfkitbenchmarker import flags
+from perfkitbenchmarker import tracing
 from perfkitbenchmarker import virtual_machine
 from perfkitbenchmarker import vm_util
 from perfkitbenchmarker import windows_packages
@@ -82,9 +83,11 @@ class WindowsMixin(virtual_machine.BaseOsMixin):
     cmd = ';'.join([set_error_pref, create_cred,
                     create_session, invoke_command])
 
-    stdout, stderr, retcode = vm_util.IssueCommand(
-        ['powershell', '-Command', cmd], timeout=timeout,
-        suppress_warning=suppress_warning, force_info_log=should_log)
+    with tracing.Span('RemoteCommand', tracing.REMOTE_COMMAND, vm=self,
+                      command=command):
+      stdout, stderr, retcode = vm_util.IssueCommand(
+          ['powershell', '-Command', cmd], timeout=timeout,
+          suppress_warning=suppress_warning, force_info_log=should_log)
 
     if retcode and not ignore_failure:
       error_text = ('Got non-zero return code (%s) executing %s\n'
@@ -135,8 +138,10 @@ class WindowsMixin(virtual_machine.BaseOsMixin):
     cmd = ';'.join([set_error_pref, create_cred, create_psdrive,
                     copy_item, delete_connection])
 
-    stdout, stderr, retcode = vm_util.IssueCommand(
-        ['powershell', '-Command', cmd], timeout=None)
+    with tracing.Span('RemoteCopy', tracing.REMOTE_COMMAND, vm=self,
+                      from_path=from_path, to_path=to_path):
+      stdout, stderr, retcode = vm_util.IssueCommand(
+          ['powershell', '-Command', cmd], timeout=None)
 
     if retcode:
       error_text = ('Got non-zero return code (%s) executing %s\n'
@@ -168,7 +173,9 @@ class WindowsMixin(virtual_machine.BaseOsMixin):
       return
     if package_name not in self._installed_packages:
       package = windows_packages.PACKAGES[package_name]
-      package.Install(self)
+      with tracing.Span('Install', tracing.INSTALL, vm=self,
+                        package=package_name):
+        package.Install(self)
       self._installed_packages.add(package_name)
 
   def Uninstall(self, package_name):
@@ -0,0 +1,104 @@
+# Copyright 2015 PerfKitBenchmarker Authors. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for perfkitbenchmarker.artifact_cache."""
+
+import hashlib
+import os
+import shutil
+import tempfile
+import unittest
+import urllib
+
+import mock
+
+from perfkitbenchmarker import artifact_cache
+from perfkitbenchmarker import errors
+from perfkitbenchmarker import vm_util
+
+_CONTENTS = 'artifact contents'
+
+
+class _FakeVm(object):
+
+  def __init__(self, name):
+    self.name = name
+    self.files = {}
+
+  def RemoteCopy(self, local_path, remote_path):
+    with open(local_path) as local_file:
+      self.files[remote_path] = local_file.read()
+
+  def MoveFile(self, target, source_path, remote_path):
+    target.files[remote_path] = self.files[source_path]
+
+
+class ArtifactCacheTestCase(unittest.TestCase):
+
+  def setUp(self):
+    self.temp_dir = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, self.temp_dir)
+    self.source_path = os.path.join(self.temp_dir, 'ycsb.tar.gz')
+    with open(self.source_path, 'w') as source_file:
+      source_file.write(_CONTENTS)
+    self.url = 'file://' + urllib.pathname2url(self.source_path)
+    p = mock.patch(artifact_cache.__name__ + '.FLAGS')
+    self.flags = p.start()
+    self.addCleanup(p.stop)
+    self.flags.artifact_cache = True
+    self.flags.artifact_cache_dir = os.path.join(self.temp_dir, 'cache')
+    self.flags.artifact_cache_fanout = 2
+
+  def testFetchCachesByUrl(self):
+    path = artifact_cache.Fetch(self.url)
+    with open(path) as cached_file:
+      self.assertEqual(_CONTENTS, cached_file.read())
+    os.remove(self.source_path)
+    self.assertEqual(path, artifact_cache.Fetch(self.url))
+
+  def testFetchVerifiesChecksum(self):
+    with self.assertRaises(errors.Error):
+      artifact_cache.Fetch(self.url, checksum='0' * 64)
+    checksum = hashlib.sha256(_CONTENTS).hexdigest()
+    path = artifact_cache.Fetch(self.url, checksum=checksum)
+    self.assertEqual(checksum, os.path.basename(path))
+
+  def testDistributesFromCacheAndPeers(self):
+    vms = [_FakeVm('vm%d' % i) for i in range(7)]
+    with mock.patch.object(_FakeVm, 'RemoteCopy', autospec=True,
+                           side_effect=_FakeVm.RemoteCopy) as remote_copy:
+      vm_util.RunThreaded(
+          lambda vm: artifact_cache.DownloadToVm(vm, self.url, '/tmp/a'), vms)
+    self.assertEqual(1, remote_copy.call_count)
+    for vm in vms:
+      self.assertEqual({'/tmp/a': _CONTENTS}, vm.files)
+
+    samples = artifact_cache.CreateSamples(None)
+    self.assertEqual(['Artifact Bytes From Origin',
+                      'Artifact Bytes From Cache'],
+                     [s.metric for s in samples])
+    self.assertEqual(len(_CONTENTS), samples[0].value)
+    self.assertEqual(7 * len(_CONTENTS), samples[1].value)
+    self.assertEqual(6 * len(_CONTENTS), samples[1].metadata['peer_bytes'])
+    self.assertEqual([], artifact_cache.CreateSamples(None))
+
+  def testDisabledDownloadsOnVm(self):
+    self.flags.artifact_cache = False
+    vm = mock.Mock()
+    artifact_cache.DownloadToVm(vm, 'http://example.com/a.tgz', '/tmp/a.tgz')
+    vm.RemoteCommand.assert_called_once_with(
+        'curl -L -o /tmp/a.tgz http://example.com/a.tgz')
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,167 @@
+# Copyright 2015 PerfKitBenchmarker Authors. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for perfkitbenchmarker.benchmark_scheduler."""
+
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from perfkitbenchmarker import benchmark_scheduler
+from perfkitbenchmarker import benchmark_status
+from perfkitbenchmarker import configs
+from perfkitbenchmarker import results_store
+
+CONFIG = """
+name:
+  vm_groups:
+    servers:
+      vm_count: 3
+      vm_spec:
+        GCP:
+          machine_type: n1-standard-4
+        AWS:
+          machine_type: c3.2xlarge
+    clients:
+      cloud: AWS
+      vm_count: 2
+      vm_spec:
+        AWS:
+          machine_type: m3.medium
+      static_vms:
+        - ip_address: 1.1.1.1
+          ssh_private_key: /path/to/key1
+          user_name: user1
+"""
+
+
+class _Recorder(object):
+  """Runs fake benchmarks, recording their order and concurrency."""
+
+  def __init__(self):
+    self.lock = threading.Lock()
+    self.started = []
+    self.running = 0
+    self.max_running = 0
+
+  def Task(self, name, vms=1, vcpus=1, runtime=None, fail=False):
+    def Run():
+      with self.lock:
+        self.started.append(name)
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+      try:
+        if fail:
+          raise ValueError(name)
+      finally:
+        with self.lock:
+          self.running -= 1
+    return benchmark_scheduler.Task(
+        name, name + '0', Run, benchmark_scheduler.Demand(vms, vcpus), runtime)
+
+
+class GetDemandTestCase(unittest.TestCase):
+
+  def testVcpus(self):
+    self.assertEqual(4, benchmark_scheduler.GetVcpus('n1-standard-4'))
+    self.assertEqual(4, benchmark_scheduler.GetVcpus('custom-4-16384'))
+    self.assertEqual(2, benchmark_scheduler.GetVcpus('n1-custom-2-7680'))
+    self.assertEqual(8, benchmark_scheduler.GetVcpus('e2-custom-8-32768'))
+    self.assertEqual(6, benchmark_scheduler.GetVcpus('custom-6-46080-ext'))
+    self.assertEqual(8, benchmark_scheduler.GetVcpus('c3.2xlarge'))
+    self.assertEqual(4, benchmark_scheduler.GetVcpus('m3.xlarge'))
+    self.assertEqual(1, benchmark_scheduler.GetVcpus('m3.medium'))
+    self.assertEqual(4, benchmark_scheduler.GetVcpus('Large'))
+    self.assertIsNone(benchmark_scheduler.GetVcpus('f1-micro'))
+
+  def testDemandFromConfig(self):
+    config = configs.LoadConfig(CONFIG, {}, 'name')
+    # Three GCP VMs with 4 vCPUs, and one AWS VM with 1 vCPU beside the
+    # static VM.
+    self.assertEqual(benchmark_scheduler.Demand(4, 13),
+                     benchmark_scheduler.GetDemand(config))
+
+  def testEstimatedRuntimes(self):
+    temp_dir = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, temp_dir)
+    path = os.path.join(temp_dir, 'results.db')
+    self.assertEqual({}, benchmark_scheduler.GetEstimatedRuntimes(path))
+    self.assertFalse(os.path.exists(path))
+    with results_store.ResultsStore(path) as store:
+      store.AddSamples([
+          {'test': 'iperf', 'metric': 'End to End Runtime', 'value': value,
+           'unit': 'seconds', 'metadata': {}} for value in (100, 200)])
+    self.assertEqual({'iperf': 150},
+                     benchmark_scheduler.GetEstimatedRuntimes(path))
+
+
+class BenchmarkSchedulerTestCase(unittest.TestCase):
+
+  def setUp(self):
+    self.recorder = _Recorder()
+
+  def testSerialKeepsOrderAndStopsAfterFailure(self):
+    tasks = [self.recorder.Task('a', runtime=1),
+             self.recorder.Task('b', runtime=5, fail=True),
+             self.recorder.Task('c', runtime=9)]
+    scheduler = benchmark_scheduler.BenchmarkScheduler(
+        1, stop_on_failure=True)
+    self.assertEqual([('a', 'a0', benchmark_status.SUCCEEDED),
+                      ('b', 'b0', benchmark_status.FAILED),
+                      ('c', 'c0', benchmark_status.SKIPPED)],
+                     scheduler.Run(tasks))
+    self.assertEqual(['a', 'b'], self.recorder.started)
+
+  def testLongestFirstWithinBudget(self):
+    tasks = [self.recorder.Task('short', vms=2, runtime=10),
+             self.recorder.Task('long', vms=2, runtime=100),
+             self.recorder.Task('unknown', vms=2),
+             self.recorder.Task('huge', vms=5, runtime=1)]
+    scheduler = benchmark_scheduler.BenchmarkScheduler(4, max_vms=2)
+    statuses = scheduler.Run(tasks)
+    self.assertEqual([benchmark_status.SUCCEEDED] * 4,
+                     [status for _, _, status in statuses])
+    self.assertEqual(['unknown', 'long', 'short', 'huge'],
+                     self.recorder.started)
+    self.assertEqual(1, self.recorder.max_running)
+
+  def testSmallerTasksDoNotOvertakeBlockedTask(self):
+    tasks = [self.recorder.Task('small', vms=1, runtime=10),
+             self.recorder.Task('full', vms=4, runtime=50),
+             self.recorder.Task('smaller', vms=1, runtime=5),
+             self.recorder.Task('first', vms=2, runtime=100)]
+    scheduler = benchmark_scheduler.BenchmarkScheduler(4, max_vms=4)
+    scheduler.Run(tasks)
+    self.assertEqual(['first', 'full', 'small', 'smaller'],
+                     self.recorder.started)
+
+  def testFailureDoesNotStopByDefault(self):
+    tasks = [self.recorder.Task('a', fail=True), self.recorder.Task('b')]
+    scheduler = benchmark_scheduler.BenchmarkScheduler(2, max_vcpus=1)
+    self.assertEqual([('a', 'a0', benchmark_status.FAILED),
+                      ('b', 'b0', benchmark_status.SUCCEEDED)],
+                     scheduler.Run(tasks))
+
+  def testStopAfterFailure(self):
+    tasks = [self.recorder.Task('a', fail=True), self.recorder.Task('b')]
+    scheduler = benchmark_scheduler.BenchmarkScheduler(
+        2, max_vcpus=1, stop_on_failure=True)
+    self.assertEqual([('a', 'a0', benchmark_status.FAILED),
+                      ('b', 'b0', benchmark_status.SKIPPED)],
+                     scheduler.Run(tasks))
+
+
+if __name__ == '__main__':
+  unittest.main()
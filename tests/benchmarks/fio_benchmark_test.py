@@ -14,10 +14,15 @@
 
 """Tests for fio_benchmark."""
 
+import json
+import os
+import shutil
+import tempfile
 import unittest
 
 import mock
 
+from perfkitbenchmarker import errors
 from perfkitbenchmarker import vm_util
 from perfkitbenchmarker.benchmarks import fio_benchmark
 
@@ -154,6 +159,178 @@ class TestRunForMinutes(unittest.TestCase):
     self.assertEquals(proc.call_count, 0)
 
 
+class TestAddLogParameters(unittest.TestCase):
+
+  def testAddsToGlobalSection(self):
+    job_file = fio_benchmark.AddLogParameters(
+        '[global]\nioengine=libaio\n\n[job1]\nrw=read\n', '/tmp/fio', 500)
+    self.assertEqual(
+        '[global]\nwrite_bw_log=/tmp/fio\nwrite_iops_log=/tmp/fio\n'
+        'write_lat_log=/tmp/fio\nlog_avg_msec=500\nioengine=libaio\n\n'
+        '[job1]\nrw=read\n', job_file)
+
+  def testAddsGlobalSection(self):
+    job_file = fio_benchmark.AddLogParameters('[job1]\nrw=read\n',
+                                              '/tmp/fio', 500)
+    self.assertTrue(job_file.startswith('[global]\nwrite_bw_log=/tmp/fio\n'))
+    self.assertTrue(job_file.endswith('log_avg_msec=500\n[job1]\nrw=read\n'))
+
+
+class TestSteadyState(unittest.TestCase):
+
+  def testFlat(self):
+    self.assertTrue(fio_benchmark.IsSteadyState([100, 105, 95, 100, 102],
+                                                0.2))
+
+  def testRangeTooWide(self):
+    self.assertFalse(fio_benchmark.IsSteadyState([100, 125, 100, 100, 100],
+                                                 0.2))
+
+  def testSlopeTooSteep(self):
+    # The range is within 20% of the average, but the values trend upward by
+    # more than 10% of it across the window.
+    self.assertFalse(fio_benchmark.IsSteadyState([92, 96, 100, 104, 108],
+                                                 0.2))
+
+  def testStopsAtSteadyState(self):
+    proc = mock.Mock(side_effect=[500, 300, 200, 100, 101, 99, 100, 100, 100])
+    steady, values = fio_benchmark.RunUntilSteadyState(proc, 20, 5, 0.2)
+    self.assertTrue(steady)
+    self.assertEqual(8, proc.call_count)
+    self.assertEqual([500, 300, 200, 100, 101, 99, 100, 100], values)
+
+  def testMaxRounds(self):
+    proc = mock.Mock(side_effect=[500, 300, 200])
+    steady, values = fio_benchmark.RunUntilSteadyState(proc, 3, 2, 0.2)
+    self.assertFalse(steady)
+    self.assertEqual(3, len(values))
+
+
+class TestRunCluster(unittest.TestCase):
+
+  def setUp(self):
+    data_dir = os.path.join(os.path.dirname(__file__), '..', 'data')
+    with open(os.path.join(data_dir, 'fio-parser-sample-result.json')) as f:
+      self.result = f.read()
+    with open(os.path.join(data_dir, 'fio.job')) as f:
+      self.job_file = f.read()
+    p = mock.patch(fio_benchmark.__name__ + '.FLAGS')
+    self.flags = p.start()
+    self.addCleanup(p.stop)
+    self.flags.fio_target_mode = 'against_device_without_fill'
+    self.flags.fio_cluster_per_vm_metadata = True
+    self.flags.__getitem__.return_value.present = False
+    for target in ('GetOrGenerateJobFileString', 'open'):
+      p = mock.patch.object(fio_benchmark, target, create=True)
+      self.addCleanup(p.stop)
+      p.start().return_value = mock.MagicMock()
+    fio_benchmark.GetOrGenerateJobFileString.return_value = self.job_file
+    p = mock.patch(vm_util.__name__ + '.GetTempDir', return_value='/tmp')
+    p.start()
+    self.addCleanup(p.stop)
+
+  def testRunsOnAllDisks(self):
+    vms = []
+    for i in xrange(2):
+      vm = mock.Mock(scratch_disks=[mock.Mock(), mock.Mock()])
+      vm.name = 'pkb-vm-%s' % i
+      vm.RemoteCommand.return_value = ('1445000000.5\n', '')
+      vm.RobustRemoteCommand.return_value = (self.result, '')
+      vms.append(vm)
+    samples = fio_benchmark.RunCluster(vms)
+
+    commands = [c[0][0] for v in vms
+                for c in v.RobustRemoteCommand.call_args_list]
+    self.assertEqual(4, len(commands))
+    for command in commands:
+      self.assertIn('1445000015.5', command)
+    self.assertItemsEqual(
+        ['/tmp/pkb/fio-disk-0.job', '/tmp/pkb/fio-disk-1.job'],
+        [c[0][1] for c in vms[0].PushFile.call_args_list])
+
+    samples = {s.metric: s for s in samples}
+    bandwidth = samples['sequential_write:write:bandwidth']
+    single_bandwidth = json.loads(self.result)['jobs'][0]['write']['bw']
+    self.assertEqual(4 * single_bandwidth, bandwidth.value)
+    self.assertDictContainsSubset(
+        {'fio_vms': 2, 'fio_disks': 4,
+         'per_vm_bandwidth': 'pkb-vm-0=%s,pkb-vm-1=%s' % (
+             2 * single_bandwidth, 2 * single_bandwidth)},
+        bandwidth.metadata)
+    self.assertIn('per_vm_iops',
+                  samples['sequential_write:write:iops'].metadata)
+    self.assertNotIn('per_vm_iops',
+                     samples['sequential_write:write:latency'].metadata)
+
+
+class TestFillDevice(unittest.TestCase):
+
+  def setUp(self):
+    p = mock.patch(fio_benchmark.__name__ + '.FLAGS')
+    self.flags = p.start()
+    self.addCleanup(p.stop)
+    self.flags.fio_fill_jobs = 4
+    self.flags.fio_fill_io_depth = 16
+    self.flags.fio_fill_progress_seconds = 30
+    temp_dir = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, temp_dir)
+    self.flags.fio_fill_record_file = os.path.join(temp_dir, 'fills.json')
+    p = mock.patch(vm_util.__name__ + '.RobustCommandMultiplexer')
+    self.multiplexer = p.start().return_value
+    self.addCleanup(p.stop)
+    self.vm = mock.Mock(is_static=True, ip_address='10.0.0.2')
+    self.vm.RemoteCommand.side_effect = [('1073741824\n', ''),
+                                         ('SERIAL-1\n', '')] * 2
+    self.disk = mock.Mock()
+    self.disk.GetDevicePath.return_value = '/dev/sdb'
+
+  def testParseFillSize(self):
+    self.assertEqual(512, fio_benchmark.ParseFillSize('50%', 1024))
+    self.assertEqual(1024, fio_benchmark.ParseFillSize('100%', 1024))
+    self.assertEqual(10 << 30, fio_benchmark.ParseFillSize('10G', 1 << 40))
+    self.assertEqual(1 << 20, fio_benchmark.ParseFillSize('4096m', 1 << 20))
+    with self.assertRaises(errors.Benchmarks.PrepareException):
+      fio_benchmark.ParseFillSize('a lot', 1024)
+
+  def testGetFillRanges(self):
+    block = fio_benchmark.FILL_BLOCK_SIZE
+    self.assertEqual(
+        [(0, 2 * block), (2 * block, 2 * block), (4 * block, 3 * block + 1)],
+        fio_benchmark.GetFillRanges(7 * block + 1, 3))
+    self.assertEqual([(0, 100)], fio_benchmark.GetFillRanges(100, 4))
+
+  def testProgressParser(self):
+    parser = fio_benchmark.FillProgressParser('/dev/sdb')
+    parser('fill-device-0: (g=0): rw=write, bs=512K-512K/512K-512K\n')
+    self.assertEqual(0, parser.percent_done)
+    parser('Jobs: 4 (f=4): [W(4)] [10.0% done] [0KB/300.1MB/0KB /s] '
+           '[0/600/0 iops] [eta 00m:54s]\rJobs: 4 (f=4): [W(4)] '
+           '[12.5% done] [0KB/310.5MB/0KB /s] [0/621/0 iops] '
+           '[eta 00m:52s]\n')
+    self.assertEqual(12.5, parser.percent_done)
+
+  def testFillsRangesAtOnce(self):
+    self.vm.is_static = False
+    fio_benchmark.FillDevice(self.vm, self.disk, '100%')
+    command = self.vm.RobustRemoteCommandAsync.call_args[0][0]
+    self.assertIn('--filename=/dev/sdb', command)
+    self.assertIn('--iodepth=16', command)
+    self.assertIn('--eta-newline=30s', command)
+    for offset in 0, 268435456, 536870912, 805306368:
+      self.assertIn('--offset=%d --size=268435456' % offset, command)
+    self.assertEqual(1, self.multiplexer.WaitAll.call_count)
+    self.assertFalse(os.path.exists(self.flags.fio_fill_record_file))
+
+  def testSkipsRecordedFill(self):
+    fio_benchmark.FillDevice(self.vm, self.disk, '100%')
+    with open(self.flags.fio_fill_record_file) as record_file:
+      self.assertEqual({'serial:SERIAL-1': 1073741824}, json.load(record_file))
+    fio_benchmark.FillDevice(self.vm, self.disk, '50%')
+    self.assertEqual(1, self.vm.RobustRemoteCommandAsync.call_count)
+    self.assertTrue(fio_benchmark.IsFillRecorded('serial:SERIAL-1', 1 << 30))
+    self.assertFalse(fio_benchmark.IsFillRecorded('serial:SERIAL-2', 1))
+
+
 class TestFioTargetModeFlag(unittest.TestCase):
   def doTargetModeTest(self, mode,
                        expect_fill_device=None,
@@ -167,6 +344,9 @@ class TestFioTargetModeFlag(unittest.TestCase):
             mock.patch(fio_benchmark.__name__ + '.FLAGS') as fio_FLAGS:
       fio_FLAGS.fio_target_mode = mode
       fio_FLAGS.fio_run_for_minutes = 0
+      fio_FLAGS.fio_steady_state = False
+      fio_FLAGS.fio_cluster = False
+      fio_FLAGS.fio_log_avg_msec = None
       benchmark_spec = mock.MagicMock()
       fio_benchmark.Prepare(benchmark_spec)
       fio_benchmark.Run(benchmark_spec)
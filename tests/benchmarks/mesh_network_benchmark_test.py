@@ -0,0 +1,105 @@
+# Copyright 2015 PerfKitBenchmarker Authors. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for mesh_network_benchmark."""
+
+import unittest
+
+import mock
+
+from perfkitbenchmarker import errors
+from perfkitbenchmarker import network_mesh
+from perfkitbenchmarker.benchmarks import mesh_network_benchmark
+
+
+class MeshNetworkBenchmarkTestCase(unittest.TestCase):
+
+  def setUp(self):
+    p = mock.patch(mesh_network_benchmark.__name__ + '.FLAGS')
+    self.flags = p.start()
+    self.addCleanup(p.stop)
+    self.flags.num_connections = 2
+    self.flags.num_iterations = 1
+    self.flags.duration_in_seconds = None
+    self.flags.mesh_network_seed = 1
+    self.vms = [mock.Mock(internal_ip='10.0.0.%d' % i, zone='zone-%d' % i)
+                for i in xrange(3)]
+
+    def RemoteCommand(command):
+      rate = 1000.0 + 100 * int(command.split('-H 10.0.0.')[1][0])
+      if '-t TCP_RR' in command:
+        rows = ['%s,Trans/s,%s,%s,%s' % (rate, 1e6 / rate, 900, 1500),
+                '%s,Trans/s,%s,%s,%s' % (rate, 1e6 / rate, 950, 2000)]
+      else:
+        rows = ['%s,10^6bits/s,-1,-1,-1' % rate] * 2
+      return '\n'.join(rows) + '\n', ''
+
+    for vm in self.vms:
+      vm.RemoteCommand.side_effect = RemoteCommand
+
+  def testParseNetperfOutput(self):
+    output = ('MIGRATED TCP STREAM TEST from 0.0.0.0 to 10.0.0.1\n'
+              'Throughput,Throughput Units,Mean Latency Microseconds,'
+              '50th Percentile Latency Microseconds,99th Percentile Latency '
+              'Microseconds\n'
+              '941.20,10^6bits/s,-1.00,-1,-1\n')
+    self.assertEqual(
+        [{'THROUGHPUT': '941.20', 'THROUGHPUT_UNITS': '10^6bits/s',
+          'MEAN_LATENCY': '-1.00', 'P50_LATENCY': '-1',
+          'P99_LATENCY': '-1'}],
+        mesh_network_benchmark.ParseNetperfOutput(output))
+
+  def testMissingConnection(self):
+    self.vms[0].RemoteCommand.side_effect = None
+    self.vms[0].RemoteCommand.return_value = ('941.20,10^6bits/s,-1,-1,-1\n',
+                                              '')
+    with self.assertRaises(errors.Benchmarks.RunError):
+      mesh_network_benchmark.RunNetperf(self.vms[0], 'TCP_STREAM',
+                                        self.vms[1])
+
+  def testAllPairs(self):
+    self.flags.mesh_network_pattern = network_mesh.ALL_PAIRS
+    samples = mesh_network_benchmark.Run(mock.Mock(vms=self.vms))
+    pair_samples = [s for s in samples
+                    if s.metric == 'TCP_STREAM_Pair_Throughput']
+    self.assertEqual(6, len(pair_samples))
+    samples = {s.metric: s for s in samples}
+    # Each of the two rounds sends to every VM once.
+    self.assertEqual(2 * (2000 + 2200 + 2400),
+                     2 * samples['TCP_STREAM_Total_Throughput'].value)
+    worst = samples['TCP_STREAM_Worst_Pair_Throughput']
+    self.assertEqual(2000, worst.value)
+    self.assertEqual(0, worst.metadata['receiving_vm'])
+    self.assertDictContainsSubset(
+        {'number_machines': 3, 'number_pairs': 6, 'number_rounds': 2},
+        worst.metadata)
+    self.assertNotIn('TCP_STREAM_Bisection_Bandwidth', samples)
+    latency = samples['TCP_RR_Worst_Pair_Latency']
+    self.assertAlmostEqual(1e6 / 1000, latency.value)
+    self.assertEqual(2000, samples['TCP_RR_Pair_Latency'].metadata[
+        'p99_latency'])
+
+  def testBisection(self):
+    self.flags.mesh_network_pattern = network_mesh.BISECTION
+    self.vms.append(mock.Mock(internal_ip='10.0.0.3', zone='zone-3'))
+    self.vms[3].RemoteCommand.side_effect = self.vms[0].RemoteCommand
+    samples = {s.metric: s for s in
+               mesh_network_benchmark.Run(mock.Mock(vms=self.vms))}
+    self.assertEqual(2000 + 2200 + 2400 + 2600,
+                     samples['TCP_STREAM_Bisection_Bandwidth'].value)
+    self.assertEqual(1, samples['TCP_STREAM_Bisection_Bandwidth'].metadata[
+        'seed'])
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -37,15 +37,15 @@ class MySQLServiceBenchmarkTestCase(unittest.TestCase,
         self.contents, results, metadata)
     logging.info('results are, %s', results)
     expected_results = [
-        sample.Sample('sysbench tps p1', 526.38, 'NA', {}),
-        sample.Sample('sysbench tps p5', 526.38, 'NA', {}),
-        sample.Sample('sysbench tps p50', 579.5, 'NA', {}),
-        sample.Sample('sysbench tps p90', 636.0, 'NA', {}),
-        sample.Sample('sysbench tps p99', 636.0, 'NA', {}),
-        sample.Sample('sysbench tps p99.9', 636.0, 'NA', {}),
+        sample.Sample('sysbench tps p1', 526.08, 'NA', {}),
+        sample.Sample('sysbench tps p5', 526.08, 'NA', {}),
+        sample.Sample('sysbench tps p50', 574.4, 'NA', {}),
+        sample.Sample('sysbench tps p90', 635.84, 'NA', {}),
+        sample.Sample('sysbench tps p99', 635.84, 'NA', {}),
+        sample.Sample('sysbench tps p99.9', 635.84, 'NA', {}),
         sample.Sample('sysbench tps average', 583.61, 'NA', {}),
-        sample.Sample('sysbench tps stddev', 33.639045340624214, 'NA', {}),
-        sample.Sample('sysbench tps cv', 0.05763959723209714, 'NA', {}),
+        sample.Sample('sysbench tps stddev', 33.63904534062421, 'NA', {}),
+        sample.Sample('sysbench tps cv', 0.057639597232097134, 'NA', {}),
         sample.Sample('sysbench latency min', 18.31, 'milliseconds', {}),
         sample.Sample('sysbench latency avg', 27.26, 'milliseconds', {}),
         sample.Sample('sysbench latency max', 313.5, 'milliseconds', {}),
@@ -105,3 +105,36 @@ class NetperfBenchmarkTestCase(unittest.TestCase):
     for i, meta in enumerate(expected_meta):
       self.assertIsInstance(result[i][3], dict)
       self.assertDictContainsSubset(meta, result[i][3])
+
+  def testMergesHistogramsOfRuns(self):
+    self._ConfigureIpTypes(run_external=False)
+    histogram_output = (
+        '\n\nHistogram of request/response times\n'
+        'UNIT_USEC     :    0:    0:    0:    0:    0:    0:    0:    0:    0:'
+        '    0\n'
+        'HUNDRED_USEC  :    0:  999:    0:    0:    0:    0:    0:    0:    0:'
+        '    0\n'
+        'UNIT_MSEC     :    0:    0:    0:    0:    0:    %d:    0:    0:    0:'
+        '    0\n')
+    vm_spec = mock.MagicMock(spec=benchmark_spec.BenchmarkSpec)
+    vm_spec.vms = [mock.MagicMock(), mock.MagicMock()]
+    vm_spec.vms[0].RemoteCommand.side_effect = [
+        (self.expected_stdout[1] + histogram_output % 1, ''),
+        (self.expected_stdout[1] + histogram_output % 0, '')]
+    with mock.patch(netperf_benchmark.__name__ + '.NETPERF_BENCHMARKS',
+                    ['TCP_RR']), \
+        mock.patch(netperf_benchmark.__name__ + '.FLAGS') as flags:
+      flags.netperf_num_runs = 2
+      flags.netperf_max_iter = None
+      result = netperf_benchmark.Run(vm_spec)
+
+    self.assertEqual([0, 1], [s.metadata['run_number'] for s in result
+                              if s.metric == 'TCP_RR_Transaction_Rate'])
+    samples = {s.metric: s for s in result}
+    self.assertEqual(100, samples['TCP_RR_Latency_p99.9'].value)
+    self.assertEqual(5000, samples['TCP_RR_Latency_p99.99'].value)
+    histogram_sample = samples['TCP_RR_Latency_Histogram']
+    self.assertEqual(1999, histogram_sample.value)
+    self.assertDictContainsSubset({'ip_type': 'internal', 'num_runs': 2},
+                                  histogram_sample.metadata)
+    self.assertIn('histogram', histogram_sample.metadata)
@@ -0,0 +1,75 @@
+# Copyright 2015 PerfKitBenchmarker Authors. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for ping_benchmark."""
+
+import unittest
+
+import mock
+
+from perfkitbenchmarker import histogram
+from perfkitbenchmarker.benchmarks import ping_benchmark
+
+
+PING_OUTPUT = """\
+PING 10.240.0.3 (10.240.0.3) 56(84) bytes of data.
+64 bytes from 10.240.0.3: icmp_seq=1 ttl=64 time=0.345 ms
+64 bytes from 10.240.0.3: icmp_seq=2 ttl=64 time=0.201 ms
+64 bytes from 10.240.0.3: icmp_seq=3 ttl=64 time=0.254 ms
+
+--- 10.240.0.3 ping statistics ---
+3 packets transmitted, 3 received, 0% packet loss, time 1999ms
+rtt min/avg/max/mdev = 0.201/0.266/0.345/0.060 ms
+"""
+
+
+def _RunSerially(target, call_args_list):
+  return [target(*args, **kwargs) for args, kwargs in call_args_list]
+
+
+class PingBenchmarkTestCase(unittest.TestCase):
+
+  def testParseReplyTimes(self):
+    latencies = ping_benchmark.ParseReplyTimes(PING_OUTPUT)
+    self.assertEqual(latencies.total_count, 3)
+    self.assertAlmostEqual(latencies.mean, 0.8 / 3)
+    self.assertAlmostEqual(latencies.Percentiles([100])['p100'], 0.345,
+                           places=3)
+
+  def testRunMergesLatenciesOfBothVms(self):
+    vms = [mock.Mock(internal_ip='10.240.0.%d' % i) for i in (2, 3)]
+    for vm in vms:
+      vm.RemoteCommand.return_value = PING_OUTPUT, ''
+    benchmark_spec = mock.Mock(vms=vms)
+    with mock.patch(ping_benchmark.__name__ + '.vm_util.RunThreaded',
+                    side_effect=_RunSerially):
+      results = ping_benchmark.Run(benchmark_spec)
+
+    vms[0].RemoteCommand.assert_called_once_with('ping -c 100 10.240.0.3',
+                                                 should_log=True)
+    vms[1].RemoteCommand.assert_called_once_with('ping -c 100 10.240.0.2',
+                                                 should_log=True)
+    by_metric = dict((r.metric, r) for r in results)
+    self.assertEqual(by_metric['Average Latency'].value, 0.266)
+    self.assertEqual(by_metric['Latency p50'].metadata,
+                     {'ip_type': 'internal', 'num_vms': 2})
+    latency_histogram = by_metric['Latency Histogram']
+    self.assertEqual(latency_histogram.value, 6)
+    merged = histogram.Histogram.FromJson(
+        latency_histogram.metadata['histogram'])
+    self.assertEqual(merged.total_count, 6)
+
+
+if __name__ == '__main__':
+  unittest.main()
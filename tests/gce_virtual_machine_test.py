@@ -36,6 +36,7 @@ class GCEPreemptibleVMFlagTestCase(unittest.TestCase):
       vm._Create()
       self.assertEquals(issue_command.call_count, 1)
       self.assertIn('--preemptible', issue_command.call_args[0][0])
+      self.assertEqual({'preemptible': True}, vm.GetSampleMetadata())
 
 if __name__ == '__main__':
   unittest.main()
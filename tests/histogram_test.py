@@ -0,0 +1,130 @@
+# Copyright 2015 PerfKitBenchmarker Authors. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for perfkitbenchmarker.histogram."""
+
+import pickle
+import unittest
+
+from perfkitbenchmarker import histogram
+
+
+class HistogramTestCase(unittest.TestCase):
+
+  def testSmallValuesAreExact(self):
+    hist = histogram.Histogram(sub_bucket_count=16)
+    hist.AddAll([(0, 1), (3, 2), (15, 4)])
+    self.assertEqual([(0, 1), (3, 2), (15, 4)], hist.Items())
+
+  def testLargeValuesShareLogBuckets(self):
+    hist = histogram.Histogram(sub_bucket_count=16)
+    for value in (16, 17, 31, 32, 33, 35, 1000):
+      hist.Add(value)
+    # [16, 32) has buckets of width 2, [32, 64) of width 4, and so on.
+    self.assertEqual([(16, 2), (30, 1), (32, 3), (960, 1)], hist.Items())
+
+  def testRelativeError(self):
+    hist = histogram.Histogram(sub_bucket_count=64)
+    for value in xrange(0, 100000, 7):
+      index = hist._GetIndex(value)
+      lower = hist._GetLowerBound(index)
+      self.assertLessEqual(lower, value)
+      self.assertLessEqual(value - lower, value * 2. / 64)
+      self.assertEqual(index, hist._GetIndex(lower))
+
+  def testUnit(self):
+    hist = histogram.Histogram(unit=0.5)
+    hist.Add(1.7)
+    self.assertEqual([(1.5, 1)], hist.Items())
+
+  def testWholeUnitsAreNotFlooredBelow(self):
+    hist = histogram.Histogram(unit=0.001)
+    hist.Add(0.345)
+    self.assertEqual([(345 * 0.001, 1)], hist.Items())
+
+  def testInvalid(self):
+    with self.assertRaises(ValueError):
+      histogram.Histogram(sub_bucket_count=100)
+    with self.assertRaises(ValueError):
+      histogram.Histogram().Add(-1)
+    with self.assertRaises(ValueError):
+      histogram.Histogram().Percentiles([50])
+
+  def testPercentiles(self):
+    hist = histogram.Histogram()
+    hist.AddAll([(1, 50), (2, 40), (10, 9), (100, 1)])
+    self.assertEqual(
+        [('p99.9', 100), ('p0', 1), ('p50', 1), ('p90', 2), ('p99', 10),
+         ('p100', 100)],
+        hist.Percentiles([99.9, 0, 50, 90, 99, 100]).items())
+
+  def testMerge(self):
+    h1 = histogram.Histogram()
+    h1.AddAll([(1, 1), (5, 2)])
+    h2 = histogram.Histogram()
+    h2.AddAll([(5, 1), (5000, 1)])
+    merged = histogram.Merge([h1, h2])
+    self.assertEqual([(1, 1), (5, 3), (5000, 1)], merged.Items())
+    self.assertEqual(5, merged.total_count)
+    self.assertEqual([(1, 1), (5, 2)], h1.Items())
+
+  def testSummary(self):
+    hist = histogram.Histogram(unit=0.001)
+    for value in (0.0105, 0.02, 0.03, 0.04):
+      hist.Add(value)
+    summary = hist.Summary([50, 99])
+    self.assertEqual(['average', 'p50', 'p99', 'stddev'], sorted(summary))
+    self.assertAlmostEqual(0.02, summary['p50'])
+    self.assertAlmostEqual(0.04, summary['p99'])
+    # The mean and standard deviation are those of the exact values.
+    self.assertAlmostEqual(0.025125, summary['average'])
+    self.assertAlmostEqual(0.012717, summary['stddev'], places=6)
+    self.assertIsNone(histogram.Histogram().stddev)
+
+  def testMergedStatistics(self):
+    values = [3.5, 7, 7, 100, 2500.25]
+    h1 = histogram.Histogram()
+    h2 = histogram.Histogram()
+    for value in values[:2]:
+      h1.Add(value)
+    for value in values[2:]:
+      h2.Add(value)
+    merged = histogram.Merge([h1, h2])
+    mean = sum(values) / len(values)
+    self.assertAlmostEqual(mean, merged.mean)
+    self.assertAlmostEqual(
+        (sum((v - mean) ** 2 for v in values) / (len(values) - 1)) ** 0.5,
+        merged.stddev)
+
+  def testMergeIncompatible(self):
+    with self.assertRaises(ValueError):
+      histogram.Histogram(unit=1).Merge(histogram.Histogram(unit=2))
+
+  def testSerialization(self):
+    hist = histogram.Histogram(sub_bucket_count=32, unit=0.1)
+    hist.AddAll([(0.3, 2), (77.7, 5)])
+    self.assertEqual(hist, histogram.Histogram.FromJson(hist.ToJson()))
+    self.assertEqual(hist, pickle.loads(pickle.dumps(hist)))
+    self.assertNotEqual(hist, histogram.Histogram(sub_bucket_count=32,
+                                                  unit=0.1))
+
+  def testDeserializesWithoutStatistics(self):
+    hist = histogram.Histogram.FromDict(
+        {'sub_bucket_count': 16, 'unit': 1, 'buckets': [[2, 1], [4, 3]]})
+    self.assertEqual(3.5, hist.mean)
+    self.assertEqual(3.5, histogram.Histogram.FromJson(hist.ToJson()).mean)
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,58 @@
+# Copyright 2015 PerfKitBenchmarker Authors. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for perfkitbenchmarker.import_util."""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+from perfkitbenchmarker import import_util
+
+
+class LazyModuleDictTestCase(unittest.TestCase):
+
+  def setUp(self):
+    self.temp_dir = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, self.temp_dir)
+    package_dir = os.path.join(self.temp_dir, 'lazy_test_package')
+    os.mkdir(package_dir)
+    for name, contents in (('__init__.py', ''), ('a.py', 'VALUE = 1\n'),
+                           ('b.py', 'raise ImportError("b")\n')):
+      with open(os.path.join(package_dir, name), 'w') as fp:
+        fp.write(contents)
+    sys.path.insert(0, self.temp_dir)
+    self.addCleanup(sys.path.remove, self.temp_dir)
+    self.addCleanup(lambda: [sys.modules.pop(name) for name in
+                             list(sys.modules)
+                             if name.startswith('lazy_test_package')])
+    self.modules = import_util.LazyModuleDict([package_dir],
+                                              'lazy_test_package')
+
+  def testListsModulesWithoutImporting(self):
+    self.assertItemsEqual(['a', 'b'], self.modules.keys())
+    self.assertNotIn('lazy_test_package.a', sys.modules)
+
+  def testImportsOnLookup(self):
+    self.assertEqual(1, self.modules['a'].VALUE)
+    self.assertIs(sys.modules['lazy_test_package.a'], self.modules['a'])
+    with self.assertRaises(ImportError):
+      self.modules['b']
+    with self.assertRaises(KeyError):
+      self.modules['c']
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,289 @@
+# Copyright 2015 PerfKitBenchmarker Authors. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for perfkitbenchmarker.linux_virtual_machine."""
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+
+import mock
+
+from perfkitbenchmarker import data
+from perfkitbenchmarker import errors
+from perfkitbenchmarker import linux_virtual_machine
+from perfkitbenchmarker import packages
+from perfkitbenchmarker import vm_util
+
+
+def _FakePackage(dependencies=(), apt_packages=None, apt_install=None):
+  return mock.Mock(spec=['DEPENDENCIES', 'APT_PACKAGES', 'AptInstall'],
+                   DEPENDENCIES=dependencies, APT_PACKAGES=apt_packages,
+                   AptInstall=apt_install)
+
+
+class PackageInstallTestCase(unittest.TestCase):
+
+  def setUp(self):
+    self.installed = []
+    install = lambda vm: self.installed.append('ycsb')
+    self.packages = {
+        'curl': _FakePackage(apt_packages='curl'),
+        'openjdk7': _FakePackage(apt_packages='openjdk-7-jdk'),
+        'hadoop': _FakePackage(['openjdk7', 'curl'], 'libsnappy1'),
+        'ycsb': _FakePackage(['openjdk7', 'curl'], apt_install=install),
+        'hbase': _FakePackage(['hadoop', 'curl']),
+    }
+    p = mock.patch.dict(packages.PACKAGES._modules, self.packages)
+    p.start()
+    self.addCleanup(p.stop)
+    p = mock.patch(linux_virtual_machine.__name__ + '.FLAGS')
+    p.start().install_packages = True
+    self.addCleanup(p.stop)
+    self.vm = linux_virtual_machine.DebianMixin()
+    self.vm.is_static = False
+    self.vm.InstallPackages = mock.Mock()
+
+  def testGetInstallLevels(self):
+    self.assertEqual([['curl', 'openjdk7'], ['hadoop', 'ycsb'], ['hbase']],
+                     packages.GetInstallLevels(['hbase', 'ycsb']))
+    self.assertEqual([['hadoop'], ['hbase']],
+                     packages.GetInstallLevels(['hbase'],
+                                               installed=['curl', 'openjdk7']))
+
+  def testGetInstallLevelsDetectsCycles(self):
+    self.packages['curl'].DEPENDENCIES = ['hbase']
+    with self.assertRaises(ValueError):
+      packages.GetInstallLevels(['hbase'])
+
+  def testSystemPackagesAreInstalledPerLevel(self):
+    self.vm.Install('hbase')
+    self.assertEqual([mock.call('curl openjdk-7-jdk'), mock.call('libsnappy1')],
+                     self.vm.InstallPackages.call_args_list)
+    self.assertEqual(['curl', 'hadoop', 'hbase', 'openjdk7'],
+                     sorted(self.vm.package_install_times))
+
+    self.vm.Install('ycsb')
+    self.assertEqual(2, self.vm.InstallPackages.call_count)
+    self.assertEqual(['ycsb'], self.installed)
+
+
+class SshConnectionPoolTestCase(unittest.TestCase):
+
+  def setUp(self):
+    self.temp_dir = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, self.temp_dir)
+    p = mock.patch(vm_util.__name__ + '.GetTempDir',
+                   return_value=self.temp_dir)
+    p.start()
+    self.addCleanup(p.stop)
+    p = mock.patch(linux_virtual_machine.__name__ + '.FLAGS')
+    self.flags = p.start()
+    self.addCleanup(p.stop)
+    self.flags.ssh_control_persist = 60
+    self.vm = mock.MagicMock(ssh_port=22, user_name='perfkit',
+                             ip_address='1.2.3.4', ssh_private_key='key')
+    self.vm.name = 'pkb-test-0'
+    self.pool = linux_virtual_machine.SshConnectionPool(self.vm)
+
+  def testControlPathInTempDir(self):
+    self.assertEqual(os.path.join(self.temp_dir, 'ssh-pkb-test-0'),
+                     self.pool.control_path)
+
+  def testNoMasterConnectsDirectly(self):
+    self.assertEqual([], self.pool.GetSshOptions())
+    self.assertEqual(1, self.pool.new_connections)
+    self.assertEqual(0, self.pool.reused_connections)
+
+  def testOpenMasterIsReused(self):
+    open(self.pool.control_path, 'w').close()
+    options = self.pool.GetSshOptions()
+    self.assertIn('ControlPath=%s' % self.pool.control_path, options)
+    self.assertIn('ControlMaster=no', options)
+    self.assertEqual(0, self.pool.new_connections)
+    self.assertEqual(1, self.pool.reused_connections)
+
+  def testOpenStartsMaster(self):
+    with mock.patch(vm_util.__name__ + '.GetSshOptions', return_value=[]), \
+        mock.patch(vm_util.__name__ + '.IssueBackgroundCommand') as issue:
+      issue.return_value.wait.return_value = 0
+      self.pool.Open()
+    cmd = issue.call_args[0][0]
+    self.assertEqual(['ssh', '-N'], cmd[:2])
+    self.assertIn('perfkit@1.2.3.4', cmd)
+    self.assertIn('ControlMaster=yes', cmd)
+    self.assertIn('ControlPersist=60', cmd)
+
+  def testOpenIsNoopWhenMasterIsUp(self):
+    open(self.pool.control_path, 'w').close()
+    with mock.patch(vm_util.__name__ + '.IssueBackgroundCommand') as issue:
+      self.pool.Open()
+    self.assertFalse(issue.called)
+
+  def testFailedMasterIsNotRetried(self):
+    with mock.patch(vm_util.__name__ + '.GetSshOptions', return_value=[]), \
+        mock.patch(vm_util.__name__ + '.IssueBackgroundCommand') as issue, \
+        mock.patch(linux_virtual_machine.__name__ + '.logging') as log:
+      issue.return_value.wait.return_value = 255
+      self.pool.Open()
+      self.pool.Open()
+    self.assertEqual(1, issue.call_count)
+    self.assertEqual(1, log.warning.call_count)
+    self.assertEqual([], self.pool.GetSshOptions())
+
+  def testCloseStopsMaster(self):
+    open(self.pool.control_path, 'w').close()
+    with mock.patch(vm_util.__name__ + '.IssueCommand') as issue:
+      self.pool.Close()
+    cmd = issue.call_args[0][0]
+    self.assertEqual(['ssh', '-O', 'exit'], cmd[:3])
+
+
+
+def _RunLocally(command, **_):
+  stdout, stderr, retcode = vm_util.IssueCommand(['bash', '-c', command])
+  return stdout, stderr
+
+
+class RunCommandBatchTestCase(unittest.TestCase):
+
+  def _RunBatch(self, commands, ignore_failure=False):
+    return linux_virtual_machine._RunCommandBatch(
+        _RunLocally, commands, should_log=False, ignore_failure=ignore_failure,
+        suppress_warning=False, timeout=None)
+
+  def testEmpty(self):
+    self.assertEqual([], self._RunBatch([]))
+
+  def testPerCommandOutput(self):
+    results = self._RunBatch(['echo a; echo b >&2', 'printf c', 'true'])
+    self.assertEqual(
+        [linux_virtual_machine.RemoteCommandResult(
+            'echo a; echo b >&2', 'a\n', 'b\n', 0),
+         linux_virtual_machine.RemoteCommandResult('printf c', 'c', '', 0),
+         linux_virtual_machine.RemoteCommandResult('true', '', '', 0)],
+        results)
+
+  def testCommandsRunInSubshells(self):
+    results = self._RunBatch(['cd /; export X=1', 'pwd; echo "x$X"'])
+    self.assertEqual(os.getcwd() + '\nx\n', results[1].stdout)
+
+  def testStopsAtFirstFailure(self):
+    with self.assertRaises(errors.VirtualMachine.RemoteCommandError):
+      self._RunBatch(['true', 'echo oops >&2; exit 3', 'echo unreachable'])
+
+  def testIgnoreFailure(self):
+    results = self._RunBatch(
+        ['true', 'echo oops >&2; exit 3', 'echo unreachable'],
+        ignore_failure=True)
+    self.assertEqual(2, len(results))
+    self.assertEqual(3, results[1].retcode)
+    self.assertEqual('oops\n', results[1].stderr)
+
+
+class _LocalVm(object):
+  """Runs "remote" commands locally, with this interpreter as python."""
+
+  def RemoteCommand(self, command, should_log=False, ignore_failure=False,
+                    suppress_warning=False, stdout_consumer=None,
+                    stderr_consumer=None):
+    if command.startswith('python '):
+      command = sys.executable + command[len('python'):]
+    stdout, stderr, _ = vm_util.IssueCommand(
+        ['bash', '-c', command], stdout_consumer=stdout_consumer,
+        stderr_consumer=stderr_consumer)
+    return stdout, stderr
+
+
+class RobustCommandHandleTestCase(unittest.TestCase):
+
+  def setUp(self):
+    self.temp_dir = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, self.temp_dir)
+    p = mock.patch.object(
+        vm_util, 'VM_TMP_DIR',
+        os.path.dirname(data.ResourcePath(
+            linux_virtual_machine.WAIT_FOR_COMMAND)))
+    p.start()
+    self.addCleanup(p.stop)
+    self.lines = []
+    self.handle = linux_virtual_machine.RobustCommandHandle(
+        _LocalVm(), 'cmd', os.path.join(self.temp_dir, 'cmd'),
+        stderr_consumer=self.lines.append)
+    for path in (self.handle.stdout_file, self.handle.stderr_file):
+      with open(path, 'w'):
+        pass
+
+  def _Append(self, path, contents):
+    with open(path, 'a') as f:
+      f.write(contents)
+
+  def testOutputIsConsumedOnce(self):
+    self._Append(self.handle.stdout_file, 'out\n')
+    self._Append(self.handle.stderr_file, 'a\nb\npart')
+    self.handle.ReadNewOutput()
+    self.assertEqual(['a\n', 'b\n'], self.lines)
+    self.handle.ReadNewOutput()
+    self.assertEqual(['a\n', 'b\n'], self.lines)
+
+    self._Append(self.handle.stderr_file, 'ial\nc\n')
+    self._Append(self.handle.status_file, '0')
+    stdout, _ = self.handle.Wait()
+    self.assertEqual('out\n', stdout)
+    self.assertEqual(['a\n', 'b\n', 'partial\n', 'c\n'], self.lines)
+
+
+class PollCommandsScriptTestCase(unittest.TestCase):
+
+  def setUp(self):
+    self.temp_dir = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, self.temp_dir)
+
+  def _RunScript(self, script, *args):
+    return subprocess.Popen(
+        [sys.executable, data.ResourcePath(script)] + list(args),
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+  def _Poll(self, *status_files):
+    stdout, _ = self._RunScript(linux_virtual_machine.POLL_COMMANDS,
+                                *status_files).communicate()
+    return stdout
+
+  def testReportsCompletedCommands(self):
+    base = os.path.join(self.temp_dir, 'cmd')
+    missing = os.path.join(self.temp_dir, 'missing.status')
+    with open(base + '.go', 'w'):
+      pass
+    execute = self._RunScript(
+        linux_virtual_machine.EXECUTE_COMMAND, '--stdout', base + '.stdout',
+        '--stderr', base + '.stderr', '--status', base + '.status',
+        '--command', 'while [ -e %s.go ]; do sleep 0.01; done; exit 3' % base)
+    while not os.path.exists(base + '.status'):
+      time.sleep(0.01)
+    # Wait for the wrapper to lock the status file.
+    while self._Poll(base + '.status'):
+      time.sleep(0.01)
+    os.remove(base + '.go')
+    execute.wait()
+    self.assertEqual('%s.status 3\n%s %s\n' % (
+        base, missing, linux_virtual_machine.POLL_COMMANDS_MISSING),
+                     self._Poll(base + '.status', missing))
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,87 @@
+# Copyright 2015 PerfKitBenchmarker Authors. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for perfkitbenchmarker.network_mesh."""
+
+import random
+import unittest
+
+from perfkitbenchmarker import network_mesh
+
+
+class NetworkMeshTestCase(unittest.TestCase):
+
+  def assertRoundsDoNotConflict(self, rounds):
+    for round_pairs in rounds:
+      clients = [client for client, _ in round_pairs]
+      servers = [server for _, server in round_pairs]
+      self.assertEqual(len(set(clients)), len(clients))
+      self.assertEqual(len(set(servers)), len(servers))
+
+  def testAllPairs(self):
+    pairs = network_mesh.GetPairs(5, network_mesh.ALL_PAIRS, None)
+    self.assertItemsEqual([(c, s) for c in xrange(5) for s in xrange(5)
+                           if c != s], pairs)
+    rounds = network_mesh.ScheduleRounds(pairs)
+    self.assertEqual(4, len(rounds))
+    self.assertTrue(all(len(round_pairs) == 5 for round_pairs in rounds))
+    self.assertRoundsDoNotConflict(rounds)
+
+  def testRing(self):
+    pairs = network_mesh.GetPairs(3, network_mesh.RING, None)
+    self.assertEqual([(0, 1), (1, 2), (2, 0)], pairs)
+    self.assertEqual([pairs], network_mesh.ScheduleRounds(pairs))
+
+  def testPermutation(self):
+    pairs = network_mesh.GetPairs(8, network_mesh.PERMUTATION,
+                                  random.Random(0))
+    self.assertEqual(range(8), [client for client, _ in pairs])
+    self.assertEqual(range(8), sorted(server for _, server in pairs))
+    self.assertTrue(all(client != server for client, server in pairs))
+    self.assertEqual(1, len(network_mesh.ScheduleRounds(pairs)))
+
+  def testBisection(self):
+    pairs = network_mesh.GetPairs(7, network_mesh.BISECTION, random.Random(0))
+    self.assertEqual(6, len(pairs))
+    half = set(client for client, _ in pairs[:3])
+    for client, server in pairs:
+      self.assertNotEqual(client in half, server in half)
+    rounds = network_mesh.ScheduleRounds(pairs)
+    self.assertEqual(1, len(rounds))
+    self.assertRoundsDoNotConflict(rounds)
+
+  def testUnknownPattern(self):
+    with self.assertRaises(ValueError):
+      network_mesh.GetPairs(2, 'star', None)
+
+  def testMatrixStatistics(self):
+    rounds = [[(0, 1), (1, 0)], [(0, 2)]]
+    throughputs = {(0, 1): 900.0, (1, 0): 800.0, (0, 2): 500.0}
+    vms = ['vm0', 'vm1', 'vm2']
+    flows = network_mesh.RunRounds(
+        vms, rounds, lambda c, s: {'throughput': throughputs[
+            vms.index(c), vms.index(s)]})
+    self.assertEqual([0, 0, 1], [flow.round_index for flow in flows])
+    matrix = network_mesh.GetMatrix(flows, lambda r: r['throughput'])
+    self.assertEqual(throughputs, matrix)
+    self.assertEqual([1700.0, 500.0],
+                     network_mesh.GetRoundTotals(flows, matrix))
+    self.assertEqual((0, 2), network_mesh.GetWorstPair(matrix, True))
+    self.assertEqual((0, 1), network_mesh.GetWorstPair(matrix, False))
+    table = network_mesh.FormatMatrix(3, matrix).splitlines()
+    self.assertEqual(4, len(table))
+    self.assertEqual(['1', '800.0', '-', '-'], table[2].split())
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -15,6 +15,8 @@
 
 import json
 import os
+import shutil
+import tempfile
 import unittest
 
 import mock
@@ -428,5 +430,82 @@ class FioTestCase(unittest.TestCase, test_util.SamplesTestMixin):
             'filename'))
 
 
+  def testMergeResults(self):
+    merged = fio.MergeResults([self.result_contents, self.result_contents])
+    self.assertEqual(
+        [job['jobname'] for job in self.result_contents['jobs']],
+        [job['jobname'] for job in merged['jobs']])
+    original = self.result_contents['jobs'][0]['write']
+    write = merged['jobs'][0]['write']
+    self.assertEqual(2 * original['bw'], write['bw'])
+    self.assertEqual(2 * original['iops'], write['iops'])
+    self.assertEqual(original['bw'], write['bw_max'])
+    self.assertEqual(0, merged['jobs'][0]['read']['io_bytes'])
+    self.assertAlmostEqual(original['clat']['mean'], write['clat']['mean'])
+    self.assertAlmostEqual(original['clat']['stddev'], write['clat']['stddev'],
+                           places=3)
+    for key, value in original['clat']['percentile'].iteritems():
+      if key != '0.00':
+        self.assertAlmostEqual(value, write['clat']['percentile'][key],
+                               delta=value * 0.001)
+
+  def testMergeResultsWeightsLatencies(self):
+    fast = {'jobs': [{'jobname': 'job', 'read': {
+        'io_bytes': 900, 'bw': 900, 'iops': 900, 'runtime': 1000,
+        'clat': {'min': 10, 'max': 10, 'mean': 10, 'stddev': 0,
+                 'percentile': {'%f' % p: 10
+                                for p in fio.CLAT_PERCENTILES}}}}]}
+    slow = {'jobs': [{'jobname': 'job', 'read': {
+        'io_bytes': 100, 'bw': 100, 'iops': 100, 'runtime': 1000,
+        'clat': {'min': 1000, 'max': 1000, 'mean': 1000, 'stddev': 0,
+                 'percentile': {'%f' % p: 1000
+                                for p in fio.CLAT_PERCENTILES}}}}]}
+    for result in fast, slow:
+      for mode in 'write', 'trim':
+        result['jobs'][0][mode] = {'io_bytes': 0, 'bw': 0, 'iops': 0,
+                                   'runtime': 0}
+    read = fio.MergeResults([fast, slow])['jobs'][0]['read']
+    self.assertEqual(10, read['clat']['percentile']['90.000000'])
+    self.assertEqual(1000, read['clat']['percentile']['95.000000'])
+    self.assertEqual(10, read['clat']['min'])
+    self.assertAlmostEqual(109, read['clat']['mean'])
+
+  def testGetJobNames(self):
+    self.assertEqual(
+        ['sequential_write', 'sequential_read', 'random_write_test',
+         'random_read_test', 'random_read_test_parallel'],
+        fio.GetJobNames(self.job_contents))
+
+  def testParseLogFile(self):
+    log_lines = ['1000, 10, 0, 4096', '1000, 100, 1, 4096',
+                 '2000, 30, 0, 4096', '2000, 300, 1, 4096',
+                 '3000, 50, 0, 4096', '']
+    self.assertEqual(
+        [('read', 0, 20.0), ('write', 0, 200.0), ('read', 2000, 50.0)],
+        list(fio.ParseLogFile(log_lines, 2000)))
+
+  def testParseLogFiles(self):
+    temp_dir = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, temp_dir)
+    log_paths = []
+    for file_name, contents in (('fio_iops.2.log', '1000, 5, 0, 4096\n'),
+                                ('fio_slat.2.log', '1000, 5, 0, 4096\n'),
+                                ('fio_clat.1.log', '1000, 80, 1, 512\n')):
+      log_paths.append(os.path.join(temp_dir, file_name))
+      with open(log_paths[-1], 'w') as log_file:
+        log_file.write(contents)
+    samples = fio.ParseLogFiles(
+        self.job_contents, ['sequential_write', 'sequential_read'],
+        log_paths, 1000, base_metadata={'steady_state_round': 3})
+    self.assertEqual(
+        [('sequential_write:write:latency:window', 80.0, 'usec'),
+         ('sequential_read:read:iops:window', 5.0, '')],
+        [(s.metric, s.value, s.unit) for s in samples])
+    self.assertDictContainsSubset(
+        {'fio_job': 'sequential_read', 'rw': 'read', 'window_seconds': 1.0,
+         'window_start_seconds': 0.0, 'steady_state_round': 3},
+        samples[1].metadata)
+
+
 if __name__ == '__main__':
   unittest.main()
@@ -0,0 +1,56 @@
+# Copyright 2015 PerfKitBenchmarker Authors. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for perfkitbenchmarker.packages.netperf."""
+
+import unittest
+
+from perfkitbenchmarker.packages import netperf
+
+HISTOGRAM_OUTPUT = """MIGRATED TCP REQUEST/RESPONSE TEST
+Throughput,Throughput Units
+1405.50,Trans/s
+
+Histogram of request/response times
+UNIT_USEC     :    0:    0:    0:    0:    0:    0:    0:    0:    0:    0
+TEN_USEC      :    0:    0:    0:    0:    0:    0:    0:    0:    3:    7
+HUNDRED_USEC  :    0: 3580: 5325:  281:   53:   12:    4:    2:    1:    0
+UNIT_MSEC     :    0:    2:    0:    0:    0:    0:    0:    0:    0:    0
+TEN_MSEC      :    0:    0:    0:    0:    0:    0:    0:    0:    0:    0
+HUNDRED_MSEC  :    0:    0:    0:    0:    0:    0:    0:    0:    0:    0
+UNIT_SEC      :    0:    0:    0:    0:    0:    0:    0:    0:    0:    0
+TEN_SEC       :    0:    0:    0:    0:    0:    0:    0:    0:    0:    0
+>100_SECS: 1
+HIST_TOTAL:      9271
+"""
+
+
+class ParseHistogramTestCase(unittest.TestCase):
+
+  def testParseHistogram(self):
+    latencies = netperf.ParseHistogram(HISTOGRAM_OUTPUT)
+    self.assertEqual(9271, latencies.total_count)
+    self.assertEqual(
+        [(80, 3), (90, 7), (100, 3580), (200, 5325), (300, 281), (400, 53),
+         (500, 12), (600, 4), (700, 2), (800, 1), (1000, 2)],
+        latencies.Items()[:-1])
+    self.assertEqual(1, latencies.Items()[-1][1])
+    self.assertGreater(latencies.Items()[-1][0], 99 * 10 ** 6)
+
+  def testNoHistogram(self):
+    csv_output = HISTOGRAM_OUTPUT.split('\n\n')[0]
+    self.assertIsNone(netperf.ParseHistogram(csv_output))
+
+
+if __name__ == '__main__':
+  unittest.main()
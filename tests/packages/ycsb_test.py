@@ -15,9 +15,14 @@
 
 import copy
 import os
+import shutil
+import tempfile
 import unittest
 
+import mock
 
+from perfkitbenchmarker import histogram as histogram_lib
+from perfkitbenchmarker import vm_util
 from perfkitbenchmarker.packages import ycsb
 
 
@@ -114,33 +119,6 @@ class DetailedResultParserTestCase(unittest.TestCase):
     self.assertEqual(385, percentiles['p99'])
 
 
-class WeightedQuantileTestCase(unittest.TestCase):
-
-  def testEvenlyWeightedSamples(self):
-    x = range(1, 101)  # 1-100
-    weights = [1 for _ in x]
-    self.assertEqual(50, ycsb._WeightedQuantile(x, weights, 0.50))
-    self.assertEqual(75, ycsb._WeightedQuantile(x, weights, 0.75))
-    self.assertEqual(90, ycsb._WeightedQuantile(x, weights, 0.90))
-    self.assertEqual(95, ycsb._WeightedQuantile(x, weights, 0.95))
-    self.assertEqual(99, ycsb._WeightedQuantile(x, weights, 0.99))
-    self.assertEqual(100, ycsb._WeightedQuantile(x, weights, 1))
-
-  def testLowWeight(self):
-    x = [1, 4]
-    weights = [99, 1]
-    for i in xrange(100):
-      self.assertEqual(1, ycsb._WeightedQuantile(x, weights, i / 100.0))
-    self.assertEqual(4, ycsb._WeightedQuantile(x, weights, 0.995))
-
-  def testMidWeight(self):
-    x = [0, 1.2, 4]
-    weights = [1, 98, 1]
-    for i in xrange(2, 99):
-      self.assertAlmostEqual(1.2, ycsb._WeightedQuantile(x, weights, i / 100.0))
-    self.assertEqual(4, ycsb._WeightedQuantile(x, weights, 0.995))
-
-
 class ParseWorkloadTestCase(unittest.TestCase):
 
   def testParsesEmptyString(self):
@@ -239,3 +217,235 @@ class CombineResultsTestCase(unittest.TestCase):
     self.assertEqual(r, r_copy)
     r['groups']['read']['statistics'] = {}
     self.assertEqual(r, combined)
+
+  def testCombineHistograms(self):
+    def Result(histogram):
+      return {'client': '', 'command_line': '',
+              'groups': {'read': {'group': 'read', 'statistics': {},
+                                  'histogram': histogram}}}
+    combined = ycsb._CombineResults([Result([(0, 2), (5, 1)]),
+                                     Result([(5, 3)]),
+                                     Result([(1, 1), (1000, 1)])])
+    self.assertEqual([(0, 2), (1, 1), (5, 4), (1000, 1)],
+                     combined['groups']['read']['histogram'])
+
+
+class CreateSamplesTestCase(unittest.TestCase):
+
+  def setUp(self):
+    self.result = {
+        'client': '', 'command_line': 'ycsb run',
+        'groups': {'read': {'group': 'read', 'statistics': {},
+                            'histogram': [(1, 9), (20, 1)]}}}
+
+  def testSamplePerBucket(self):
+    samples = list(ycsb._CreateSamples(self.result))
+    self.assertIn('read_latency_histogram_20_ms',
+                  [s.metric for s in samples])
+
+  def testSingleHistogramSample(self):
+    samples = list(ycsb._CreateSamples(self.result,
+                                       single_histogram_sample=True))
+    histogram_samples = [s for s in samples
+                         if s.metric.startswith('read_latency_histogram')]
+    self.assertEqual(1, len(histogram_samples))
+    self.assertEqual(10, histogram_samples[0].value)
+    histogram = histogram_lib.Histogram.FromJson(
+        histogram_samples[0].metadata['histogram'])
+    self.assertEqual([(1, 9), (20, 1)], histogram.Items())
+    self.assertNotIn('histogram', samples[0].metadata)
+
+
+class StatusParserTestCase(unittest.TestCase):
+
+  def testParsesStatusLines(self):
+    parser = ycsb.StatusParser(10)
+    for line in [
+        'Loading workload...\n',
+        '2015-09-18 22:13:41:553 10 sec: 7528 operations; 752.8 current '
+        'ops/sec; [INSERT AverageLatency(us)=1500]\n',
+        '2015-09-18 22:13:41:553 10 sec: 7528 operations; 752.8 current '
+        'ops/sec; [INSERT AverageLatency(us)=1500]\n',
+        '2015-09-18 22:13:51:560 20 sec: 9528 operations; '
+        '[READ: Count=1500, Max=9000, Min=100, Avg=2000.0, 90=3000] '
+        '[UPDATE: Count=500, Max=9000, Min=100, Avg=NaN]\n']:
+      parser(line)
+    self.assertEqual(2, len(parser.intervals))
+    first, second = parser.intervals
+    self.assertEqual(1442614410, first.timestamp)
+    self.assertEqual(752.8, first.throughput)
+    self.assertEqual({'insert': (1.5, 752.8)}, first.latencies)
+    self.assertEqual(1442614420, second.timestamp)
+    self.assertEqual(200.0, second.throughput)
+    self.assertEqual({'read': (2.0, 1500)}, second.latencies)
+
+
+class StatusIntervalsTestCase(unittest.TestCase):
+
+  def testMergeAlignsClientsByWindow(self):
+    client_a = [ycsb.StatusInterval(0, 100.0, {'read': (1.0, 100)}, 1),
+                ycsb.StatusInterval(10, 100.0, {'read': (1.0, 100)}, 1)]
+    client_b = [ycsb.StatusInterval(10, 300.0, {'read': (2.0, 300)}, 1),
+                ycsb.StatusInterval(10, 100.0, {'read': (2.0, 100)}, 1)]
+    merged = ycsb._MergeStatusIntervals([client_a, client_b])
+    self.assertEqual(
+        [ycsb.StatusInterval(0, 100.0, {'read': (1.0, 100)}, 1),
+         ycsb.StatusInterval(10, 300.0, {'read': (1.8, 500)}, 2)],
+        merged)
+
+  def testCombineResultsMergesIntervals(self):
+    def Result(intervals):
+      return {'client': '', 'command_line': '', 'groups': {},
+              'status_intervals': intervals}
+    combined = ycsb._CombineResults([
+        Result([ycsb.StatusInterval(0, 1.0, {}, 1)]),
+        Result([ycsb.StatusInterval(0, 2.0, {}, 1)])])
+    self.assertEqual([ycsb.StatusInterval(0, 3.0, {}, 2)],
+                     combined['status_intervals'])
+
+  def testTimeseriesSamples(self):
+    intervals = [ycsb.StatusInterval(t, float(t), {'read': (t / 10.0, 1)}, 1)
+                 for t in xrange(0, 60, 10)]
+    samples = ycsb._CreateTimeseriesSamples(intervals, {}, warmup_seconds=20,
+                                            cooldown_seconds=10)
+    throughput = [s for s in samples
+                  if s.metric == 'overall interval throughput']
+    self.assertEqual([0, 10, 20, 30, 40, 50], [s.timestamp for s in throughput])
+    self.assertEqual([False, False, True, True, True, False],
+                     [s.metadata['steady_state'] for s in throughput])
+    steady = dict((s.metric, s.value) for s in samples
+                  if 'steady state' in s.metric)
+    self.assertEqual({'overall steady state throughput': 30.0,
+                      'read steady state average latency': 3.0}, steady)
+
+
+class TargetSearchTestCase(unittest.TestCase):
+
+  def _Measure(self, target):
+    # Saturates at 1000 ops/sec; latency exceeds the SLO above 600 ops/sec.
+    throughput = 1000.0 if target is None else min(target, 1000.0)
+    latency = 5.0 if throughput <= 600 else 50.0
+    return ycsb.TargetSearchPoint(target, throughput, latency, latency <= 10)
+
+  def testBisectsToKnee(self):
+    best, points = ycsb._SearchTarget(self._Measure, max_iterations=20,
+                                      tolerance=0.01)
+    targets = [p.target for p in points]
+    self.assertEqual([None, 500, 750, 625, 562, 593], targets[:6])
+    self.assertLessEqual(best.target, 600)
+    self.assertGreater(best.target, 590)
+    self.assertTrue(all(p.meets_slo == (p.throughput <= 600) for p in points))
+
+  def testStopsAfterMaxIterations(self):
+    best, points = ycsb._SearchTarget(self._Measure, max_iterations=3,
+                                      tolerance=0.01)
+    self.assertEqual([None, 500, 750], [p.target for p in points])
+    self.assertEqual(500, best.target)
+
+  def testUnthrottledMeetsSlo(self):
+    measure = lambda target: ycsb.TargetSearchPoint(target, 100.0, 1.0, True)
+    best, points = ycsb._SearchTarget(measure, max_iterations=5,
+                                      tolerance=0.01)
+    self.assertEqual([best], points)
+
+  def testLatencyPercentileIsWorstOperation(self):
+    result = {'groups': {
+        'read': {'histogram': [(1, 99), (5, 1)]},
+        'update': {'histogram': [(2, 99), (3, 1)]},
+        'cleanup': {'histogram': [(100, 1)]}}}
+    self.assertEqual(2, ycsb._LatencyPercentile(result, 99))
+    self.assertEqual(5, ycsb._LatencyPercentile(result, 100))
+
+  def testSamples(self):
+    points = [ycsb.TargetSearchPoint(None, 1000.0, 50.0, False),
+              ycsb.TargetSearchPoint(500, 500.0, 5.0, True)]
+    samples = ycsb._CreateTargetSearchSamples(points[1], points, 10.0, 99,
+                                              {'workload_name': 'a'})
+    self.assertEqual(['target search latency', 'target search throughput'] * 2 +
+                     ['max throughput under latency SLO'],
+                     [s.metric for s in samples])
+    self.assertEqual(500.0, samples[-1].value)
+    self.assertEqual(500, samples[-1].metadata['target'])
+    self.assertEqual('a', samples[-1].metadata['workload_name'])
+
+
+class LoadChunksTestCase(unittest.TestCase):
+
+  def setUp(self):
+    self.temp_dir = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, self.temp_dir)
+    p = mock.patch(vm_util.__name__ + '.GetTempDir',
+                   return_value=self.temp_dir)
+    p.start()
+    self.addCleanup(p.stop)
+    p = mock.patch(ycsb.__name__ + '.FLAGS')
+    self.flags = p.start()
+    self.addCleanup(p.stop)
+    self.flags.ycsb_load_chunk_size = 10
+    self.flags.ycsb_load_concurrency_per_vm = 2
+    self.flags.ycsb_preload_threads = 1
+    self.flags.ycsb_load_parameters = []
+    self.flags.ycsb_timeseries = False
+    self.flags.ycsb_histogram = False
+    p = mock.patch(vm_util.__name__ + '.time.sleep')
+    p.start()
+    self.addCleanup(p.stop)
+    path = os.path.join(os.path.dirname(__file__), '..', 'data',
+                        'ycsb-test-run.dat')
+    with open(path) as fp:
+      self.contents = fp.read()
+
+  def _CreateVm(self, name):
+    vm = mock.MagicMock()
+    vm.name = name
+
+    def StartCommand(command, stderr_consumer=None):
+      handle = mock.MagicMock(vm=vm, command=command, status_file=command,
+                              stderr_consumer=stderr_consumer)
+      handle.Wait.return_value = (self.contents, '')
+      return handle
+
+    vm.RobustRemoteCommandAsync.side_effect = StartCommand
+    vm.PollRobustCommands.side_effect = lambda handles: {
+        handle.status_file: '0' for handle in handles}
+    return vm
+
+  def _Load(self, vms):
+    executor = ycsb.YCSBExecutor('basic')
+    return executor._LoadChunks(vms, 'workloada', 25, {}, threads=1)
+
+  def testSplitLoadChunks(self):
+    self.assertEqual([ycsb.LoadChunk(0, 10), ycsb.LoadChunk(10, 10),
+                      ycsb.LoadChunk(20, 5)],
+                     ycsb._SplitLoadChunks(25, 10))
+
+  def testChunksSharedAcrossVms(self):
+    vms = [self._CreateVm('vm0'), self._CreateVm('vm1')]
+    samples = self._Load(vms)
+    chunk_samples = [s for s in samples if s.metric == 'chunk load throughput']
+    self.assertEqual([0, 10, 20],
+                     [s.metadata['insertstart'] for s in chunk_samples])
+    self.assertEqual(3, sum(vm.RobustRemoteCommandAsync.call_count
+                            for vm in vms))
+    commands = [c[0][0] for vm in vms
+                for c in vm.RobustRemoteCommandAsync.call_args_list]
+    self.assertTrue(any('-p insertstart=20' in c and '-p insertcount=5' in c
+                        for c in commands))
+    self.assertIn('overall Throughput', [s.metric for s in samples])
+    # Each VM waits on its chunks by polling rather than with Wait alone.
+    self.assertTrue(all(vm.PollRobustCommands.called for vm in vms))
+
+  def testResumesFromCheckpoint(self):
+    self._Load([self._CreateVm('vm0')])
+    vm = self._CreateVm('vm0')
+    samples = self._Load([vm])
+    self.assertEqual(0, vm.RobustRemoteCommandAsync.call_count)
+    self.assertEqual([], samples)
+
+  def testIgnoresTruncatedRecord(self):
+    checkpoint = ycsb._LoadCheckpoint(os.path.join(self.temp_dir, 'chunks'))
+    checkpoint.Record(ycsb.LoadChunk(0, 10), vm='vm0')
+    with open(checkpoint.path, 'a') as fp:
+      fp.write('{"insertcount": 10, "inse')
+    self.assertEqual(set([ycsb.LoadChunk(0, 10)]),
+                     checkpoint.CompletedChunks())
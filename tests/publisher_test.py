@@ -16,7 +16,9 @@
 import collections
 import io
 import json
+import os
 import re
+import shutil
 import tempfile
 import uuid
 import unittest
@@ -214,6 +216,46 @@ class SampleCollectorTestCase(unittest.TestCase):
     self.instance.AddSamples(samples, self.benchmark, self.benchmark_spec)
     self._VerifyResult()
 
+  def testAddSamples_SharesSpecMetadata(self):
+    provider = mock.Mock(spec=publisher.MetadataProvider)
+    provider.AddMetadata.return_value = {'cloud': 'GCP'}
+    self.instance.metadata_providers = [provider]
+    self.instance.AddSamples([self.sample, self.sample], self.benchmark,
+                             self.benchmark_spec)
+    self.instance.AddSamples([self.sample], self.benchmark,
+                             self.benchmark_spec)
+    provider.AddMetadata.assert_called_once_with({}, self.benchmark_spec)
+
+    first, second, _ = self.instance.samples
+    self.assertDictContainsSubset({'foo': 'bar', 'cloud': 'GCP'},
+                                  first['metadata'])
+    first['metadata']['foo'] = 'baz'
+    self.assertEqual('baz', first['metadata']['foo'])
+    self.assertEqual({'foo': 'bar'}, self.sample.metadata)
+    self.assertDictContainsSubset({'foo': 'bar', 'cloud': 'GCP'},
+                                  second['metadata'])
+    self.assertNotEqual(first['sample_uri'], second['sample_uri'])
+    self.assertEqual(first['sample_uri'], first.copy()['sample_uri'])
+
+  def testFinishBenchmarkForgetsSharedMetadata(self):
+    provider = mock.Mock(spec=publisher.MetadataProvider)
+    provider.AddMetadata.return_value = {'cloud': 'GCP'}
+    self.instance.metadata_providers = [provider]
+    self.instance.AddSamples([self.sample], self.benchmark,
+                             self.benchmark_spec)
+    self.instance.FinishBenchmark(self.benchmark, self.benchmark_spec)
+    self.assertEqual({}, self.instance._shared_annotations)
+    self.assertDictContainsSubset({'cloud': 'GCP'},
+                                  self.instance.samples[0]['metadata'])
+
+  def testAddSamples_CopyIsPlainDict(self):
+    self.instance.AddSamples([self.sample], self.benchmark,
+                             self.benchmark_spec)
+    copy = self.instance.samples[0].copy()
+    self.assertIs(dict, type(copy))
+    self.assertIs(dict, type(copy['metadata']))
+    self.assertEqual(self.benchmark, copy['test'])
+
   def testAddSamples_WithTimestamp(self):
     timestamp_sample = sample.Sample('widgets', 100, 'oz', {}, 1.0)
     samples = [timestamp_sample]
@@ -225,6 +267,52 @@ class SampleCollectorTestCase(unittest.TestCase):
         self.instance.samples[0])
 
 
+class StreamingSampleCollectorTestCase(unittest.TestCase):
+
+  def setUp(self):
+    temp_dir = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, temp_dir)
+    self.journal_path = os.path.join(temp_dir, 'samples.journal')
+    self.publisher = mock.Mock(spec=publisher.SamplePublisher)
+    self.benchmark_spec = mock.MagicMock(uuid='run-uuid')
+
+  def _CreateCollector(self):
+    return publisher.StreamingSampleCollector(
+        self.journal_path, 2, metadata_providers=[],
+        publishers=[self.publisher])
+
+  def _GetPublishedMetrics(self):
+    return [[s['metric'] for s in call[0][0]]
+            for call in self.publisher.PublishSamples.call_args_list]
+
+  def testPublishesInBatches(self):
+    collector = self._CreateCollector()
+    collector.AddSamples([sample.Sample(str(i), i, 'oz') for i in range(5)],
+                         'test', self.benchmark_spec)
+    collector.PublishSamples()
+    self.assertEqual([], collector.samples)
+    self.assertEqual(['0', '1', '2', '3', '4'],
+                     sum(self._GetPublishedMetrics(), []))
+    self.assertTrue(all(len(metrics) <= 2
+                        for metrics in self._GetPublishedMetrics()))
+    self.assertEqual(os.path.getsize(self.journal_path),
+                     collector.journal.published_offset)
+
+  def testReplaysUnpublishedSamples(self):
+    journal = publisher.SampleJournal(self.journal_path)
+    journal.Append([{'metric': 'published'}, {'metric': 'unpublished'}])
+    journal.MarkPublished(len(json.dumps({'metric': 'published'})) + 1)
+    with open(self.journal_path, 'ab') as fp:
+      fp.write('{"metric": "trunc')
+
+    collector = self._CreateCollector()
+    collector.AddSamples([sample.Sample('new', 1, 'oz')], 'test',
+                         self.benchmark_spec)
+    collector.PublishSamples()
+    self.assertEqual(['unpublished', 'new'],
+                     sum(self._GetPublishedMetrics(), []))
+
+
 class DefaultMetadataProviderTestCase(unittest.TestCase):
 
   def setUp(self):
@@ -284,6 +372,13 @@ class DefaultMetadataProviderTestCase(unittest.TestCase):
                     scratch_disk_type=disk.REMOTE_SSD)
     self._RunTest(self.mock_spec, expected)
 
+  def testAddMetadata_VmSampleMetadata(self):
+    self.mock_vm.GetSampleMetadata.return_value = {'preemptible': True}
+    expected = self.default_meta.copy()
+    expected.pop('num_striped_disks')
+    expected.update(preemptible=True)
+    self._RunTest(self.mock_spec, expected)
+
   def testAddMetadata_PIOPS(self):
     self.mock_disk.configure_mock(disk_type=disk.PIOPS, iops=1000)
     self.mock_vm.configure_mock(scratch_disks=[self.mock_disk])
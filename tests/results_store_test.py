@@ -0,0 +1,78 @@
+# Copyright 2015 PerfKitBenchmarker Authors. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for perfkitbenchmarker.results_store."""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from perfkitbenchmarker import publisher
+from perfkitbenchmarker import results_store
+
+
+def _Sample(metric, value, timestamp, **metadata):
+  return {'test': 'iperf', 'metric': metric, 'value': value,
+          'unit': 'Mbits/sec', 'timestamp': timestamp, 'run_uri': 'uri',
+          'sample_uri': str(value), 'official': False, 'owner': 'me',
+          'product_name': 'PKB',
+          'metadata': metadata}
+
+
+class ResultsStoreTestCase(unittest.TestCase):
+
+  def setUp(self):
+    temp_dir = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, temp_dir)
+    self.path = os.path.join(temp_dir, 'results.db')
+    store_publisher = publisher.ResultsStorePublisher(self.path,
+                                                      pkb_run_uri='run1')
+    store_publisher.PublishSamples(
+        [_Sample('Throughput', 10.0, 100, zone='a', vcpus=4),
+         _Sample('Throughput', 20.0, 200, zone='b', vcpus=4),
+         _Sample('Latency', 1.0, 300, zone='a')])
+    self.store = results_store.ResultsStore(self.path)
+    self.addCleanup(self.store.Close)
+    self.store.AddSamples([_Sample('Throughput', 30.0, 400, zone='a')],
+                          pkb_run_uri='run2')
+
+  def testQueryByMetricAndLabels(self):
+    samples = list(self.store.Query(metric='Throughput', labels={'zone': 'a'}))
+    self.assertEqual([10.0, 30.0], [s['value'] for s in samples])
+    self.assertEqual({'zone': 'a', 'vcpus': '4'}, samples[0]['metadata'])
+    self.assertEqual('run1', samples[0]['pkb_run_uri'])
+    self.assertEqual('iperf', samples[0]['test'])
+
+  def testQueryByTimeRangeAndRun(self):
+    self.assertEqual(
+        [20.0, 1.0],
+        [s['value'] for s in self.store.Query(start_time=200, end_time=400)])
+    self.assertEqual([30.0],
+                     [s['value'] for s in self.store.Query(pkb_run_uri='run2')])
+
+  def testQueryUnknownColumn(self):
+    with self.assertRaises(ValueError):
+      list(self.store.Query(value=1))
+
+  def testAggregateByLabel(self):
+    rows = self.store.Aggregate('avg', ['metric', 'label:zone'],
+                                test='iperf')
+    self.assertEqual([('Latency', 'a', 1, 1.0),
+                      ('Throughput', 'a', 2, 20.0),
+                      ('Throughput', 'b', 1, 20.0)], rows)
+    self.assertEqual([(4, 61.0)], self.store.Aggregate('sum', []))
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,75 @@
+# Copyright 2015 PerfKitBenchmarker Authors. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for tools/side-by-side/side_by_side.py."""
+
+import imp
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+
+from perfkitbenchmarker import results_store
+
+side_by_side = imp.load_source(
+    'side_by_side', os.path.join(os.path.dirname(__file__), '..', 'tools',
+                                 'side-by-side', 'side_by_side.py'))
+
+
+def _Sample(value, run_uri):
+  return {'test': 'iperf', 'metric': 'Throughput', 'value': value,
+          'unit': 'Mbits/sec', 'timestamp': 100, 'run_uri': run_uri,
+          'sample_uri': run_uri, 'official': False, 'owner': 'me',
+          'product_name': 'PKB', 'metadata': {'zone': 'a'}}
+
+
+class SideBySideTestCase(unittest.TestCase):
+
+  def setUp(self):
+    self.temp_dir = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, self.temp_dir)
+    self.store_path = os.path.join(self.temp_dir, 'results.db')
+    with results_store.ResultsStore(self.store_path) as store:
+      store.AddSamples([_Sample(10.0, 'base')], pkb_run_uri='base')
+      store.AddSamples([_Sample(12.0, 'head')], pkb_run_uri='head')
+    self.json_path = os.path.join(self.temp_dir, 'out.json')
+    self.html_path = os.path.join(self.temp_dir, 'out.html')
+
+  def _RunMain(self, *args):
+    argv = ['side_by_side.py'] + list(args) + [self.json_path,
+                                               self.html_path]
+    with mock.patch('sys.argv', argv), \
+        mock.patch.object(side_by_side, 'RunPerfKitBenchmarker') as run:
+      side_by_side.main()
+    self.assertFalse(run.called)
+
+  def testResultsStore(self):
+    self._RunMain('--results-store', self.store_path, '--base', 'base',
+                  '--head', 'head')
+    with open(self.json_path) as json_file:
+      results = json.load(json_file)
+    self.assertEqual([10.0], [s['value'] for s in results['base']['samples']])
+    self.assertEqual([12.0], [s['value'] for s in results['head']['samples']])
+    self.assertTrue(os.path.getsize(self.html_path))
+
+    # The JSON output can then be rendered again.
+    os.remove(self.html_path)
+    self._RunMain('--rerender')
+    self.assertTrue(os.path.getsize(self.html_path))
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,74 @@
+# Copyright 2015 PerfKitBenchmarker Authors. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for perfkitbenchmarker.trace_util."""
+
+import unittest
+
+from perfkitbenchmarker import trace_util
+
+
+class WindowedSeriesTestCase(unittest.TestCase):
+
+  def testMeansPerColumn(self):
+    series = trace_util.WindowedSeries(2, 10)
+    series.Add(100.5, [1.0, None])
+    series.Add(109.9, [3.0, None])
+    series.Add(110.0, [5.0, 7.0])
+    self.assertEqual([(100, 2.0), (110, 5.0)], series.Means(0))
+    self.assertEqual([(110, 7.0)], series.Means(1))
+
+  def testTimeRange(self):
+    series = trace_util.WindowedSeries(1, 10, start_time=105, end_time=125)
+    for timestamp in xrange(100, 131, 5):
+      series.Add(timestamp, [timestamp])
+    self.assertEqual([(100, 105.0), (110, 112.5), (120, 122.5)],
+                     series.Means(0))
+
+
+class CombineWindowsTestCase(unittest.TestCase):
+
+  def testCombine(self):
+    self.assertEqual(
+        [(0, 1), (10, 5)],
+        trace_util.CombineWindows([[(0, 1), (10, 2)], [(10, 3)]], sum))
+
+
+class CreateSummarySamplesTestCase(unittest.TestCase):
+
+  def setUp(self):
+    self.metrics = [
+        trace_util.Metric('cpu_utilization', '%',
+                          [(t, float(t)) for t in xrange(100)]),
+        trace_util.Metric('disk_read_await', 'ms', [])]
+
+  def testSummary(self):
+    samples = trace_util.CreateSummarySamples('dstat', self.metrics,
+                                              {'vm_name': 'vm0'})
+    self.assertEqual(
+        [('dstat cpu_utilization average', 49.5),
+         ('dstat cpu_utilization p50', 50.0),
+         ('dstat cpu_utilization p99', 99.0)],
+        [(s.metric, s.value) for s in samples])
+    self.assertEqual({'vm_name': 'vm0', 'windows': 100}, samples[0].metadata)
+
+  def testWindows(self):
+    samples = trace_util.CreateSummarySamples(
+        'dstat', self.metrics, {'vm_name': 'vm0'}, include_windows=True)
+    windows = [s for s in samples if s.metric == 'dstat cpu_utilization']
+    self.assertEqual(100, len(windows))
+    self.assertEqual((7, 7.0), (windows[7].timestamp, windows[7].value))
+
+
+if __name__ == '__main__':
+  unittest.main()
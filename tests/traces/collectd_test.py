@@ -0,0 +1,78 @@
+# Copyright 2015 PerfKitBenchmarker Authors. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for perfkitbenchmarker.traces.collectd."""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from perfkitbenchmarker.traces import collectd
+
+
+class ParseCsvDirectoryTestCase(unittest.TestCase):
+
+  def setUp(self):
+    self.temp_dir = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, self.temp_dir)
+
+  def _WriteCsv(self, plugin_instance, file_name, header, *rows):
+    directory = os.path.join(self.temp_dir, plugin_instance)
+    if not os.path.isdir(directory):
+      os.makedirs(directory)
+    with open(os.path.join(directory, file_name), 'w') as fp:
+      fp.write(header + '\n')
+      for row in rows:
+        fp.write(row + '\n')
+
+  def _Parse(self, start_time=None, end_time=None):
+    return dict((m.name, m.windows) for m in collectd.ParseCsvDirectory(
+        self.temp_dir, 10, start_time, end_time))
+
+  def testCpuUtilization(self):
+    for cpu in ('cpu-0', 'cpu-1'):
+      self._WriteCsv(cpu, 'cpu-idle-2015-09-18', 'epoch,value',
+                     '100.000,75', '110.000,25')
+      self._WriteCsv(cpu, 'cpu-user-2015-09-18', 'epoch,value',
+                     '100.000,25', '110.000,nan')
+      self._WriteCsv(cpu, 'cpu-system-2015-09-18', 'epoch,value',
+                     '110.000,75')
+    self.assertEqual([(100, 25.0), (110, 75.0)],
+                     self._Parse()['cpu_utilization'])
+
+  def testDisksAndInterfaces(self):
+    for disk, disk_time in (('sda', '1.5'), ('sdb', '4.0')):
+      self._WriteCsv('disk-' + disk, 'disk_octets-2015-09-18',
+                     'epoch,read,write', '100.000,10,20')
+      self._WriteCsv('disk-' + disk, 'disk_time-2015-09-18',
+                     'epoch,read,write', '100.000,%s,1' % disk_time)
+    self._WriteCsv('interface-eth0', 'if_octets-2015-09-18', 'epoch,rx,tx',
+                   '100.000,300,400')
+    self._WriteCsv('interface-eth0', 'if_octets-2015-09-19', 'epoch,rx,tx',
+                   '120.000,500,600')
+    metrics = self._Parse()
+    self.assertEqual([(100, 20.0)], metrics['disk_read_bytes'])
+    self.assertEqual([(100, 4.0)], metrics['disk_read_await'])
+    self.assertEqual([(100, 300.0), (120, 500.0)],
+                     metrics['network_received_bytes'])
+
+  def testRunPhaseOnly(self):
+    self._WriteCsv('interface-eth0', 'if_octets-2015-09-18', 'epoch,rx,tx',
+                   '100.000,1,1', '110.000,2,2', '120.000,3,3')
+    self.assertEqual([(110, 2.0)],
+                     self._Parse(105, 115)['network_received_bytes'])
+
+
+if __name__ == '__main__':
+  unittest.main()
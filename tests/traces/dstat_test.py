@@ -0,0 +1,50 @@
+# Copyright 2015 PerfKitBenchmarker Authors. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for perfkitbenchmarker.traces.dstat."""
+
+import io
+import os
+import unittest
+
+from perfkitbenchmarker.traces import dstat
+
+
+class ParseCsvTestCase(unittest.TestCase):
+
+  def setUp(self):
+    path = os.path.join(os.path.dirname(__file__), '..', 'data',
+                        'dstat-output.csv')
+    with open(path) as fp:
+      self.metrics = dict((m.name, m) for m in dstat.ParseCsv(fp, 10))
+
+  def testMetrics(self):
+    self.assertItemsEqual(['cpu_utilization', 'disk_read_bytes',
+                           'disk_write_bytes', 'network_received_bytes',
+                           'network_sent_bytes'], self.metrics)
+    self.assertEqual('%', self.metrics['cpu_utilization'].unit)
+
+  def testWindows(self):
+    self.assertEqual([(1442614420, 25.0), (1442614430, 50.0)],
+                     self.metrics['cpu_utilization'].windows)
+    self.assertEqual([(1442614420, 2000.0), (1442614430, 0.0)],
+                     self.metrics['disk_read_bytes'].windows)
+    self.assertEqual([(1442614420, 500.0), (1442614430, 100.0)],
+                     self.metrics['network_sent_bytes'].windows)
+
+  def testMissingHeader(self):
+    self.assertEqual([], dstat.ParseCsv(io.BytesIO('1,2,3\n'), 10))
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,117 @@
+# Copyright 2015 PerfKitBenchmarker Authors. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for perfkitbenchmarker.tracing."""
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+
+from perfkitbenchmarker import context
+from perfkitbenchmarker import log_util
+from perfkitbenchmarker import tracing
+from perfkitbenchmarker import vm_util
+
+
+class TracingTestCase(unittest.TestCase):
+
+  def setUp(self):
+    tracing.Enable()
+    self.addCleanup(setattr, tracing, '_spans', None)
+    p = mock.patch(tracing.__name__ + '.FLAGS')
+    self.flags = p.start()
+    self.addCleanup(p.stop)
+    self.flags.trace_span_samples = 10
+    context.SetThreadBenchmarkSpec(mock.Mock(uid='iperf0'))
+    self.addCleanup(context.SetThreadBenchmarkSpec, None)
+    self.vm = mock.Mock()
+    self.vm.name = 'pkb-vm-0'
+
+  def _GetSpans(self):
+    return {span.name: span for span in tracing._spans}
+
+  def testDisabled(self):
+    tracing._spans = None
+    with tracing.Span('Install', tracing.INSTALL):
+      self.assertIsNone(tracing.GetCurrentSpan())
+    self.assertEqual([], tracing.CreateSamples('iperf0'))
+
+  def testNestedAcrossThreads(self):
+    def RemoteCommand(command):
+      with tracing.Span('RemoteHostCommand', tracing.REMOTE_COMMAND,
+                        vm=self.vm, command=command):
+        with tracing.Span('IssueCommand', tracing.COMMAND,
+                          command=['ssh', command]):
+          pass
+
+    with log_util.GetThreadLogContext().ExtendLabel('iperf(1/1)'):
+      with tracing.Span('Install', tracing.INSTALL, vm=self.vm,
+                        package='iperf'):
+        vm_util.RunThreaded(RemoteCommand, ['make'])
+    self.assertIsNone(tracing.GetCurrentSpan())
+
+    spans = self._GetSpans()
+    self.assertIsNone(spans['Install'].parent_id)
+    self.assertEqual(spans['Install'].span_id,
+                     spans['RemoteHostCommand'].parent_id)
+    self.assertEqual(spans['RemoteHostCommand'].span_id,
+                     spans['IssueCommand'].parent_id)
+    self.assertNotEqual(spans['Install'].thread_id,
+                        spans['RemoteHostCommand'].thread_id)
+    self.assertEqual('pkb-vm-0', spans['RemoteHostCommand'].vm_name)
+    self.assertEqual('iperf(1/1)', spans['RemoteHostCommand'].label)
+    self.assertEqual('iperf0', spans['IssueCommand'].benchmark_uid)
+
+    # The local ssh command is reported as the remote command it ran.
+    samples = tracing.CreateSamples('iperf0')
+    self.assertEqual(1, len(samples))
+    self.assertEqual('Slow Operation Runtime', samples[0].metric)
+    self.assertDictContainsSubset(
+        {'operation': 'RemoteHostCommand', 'command': 'make',
+         'vm_name': 'pkb-vm-0', 'rank': 1}, samples[0].metadata)
+    self.assertEqual([], tracing.CreateSamples('netperf0'))
+
+  def testSlowestFirst(self):
+    with mock.patch('time.time', side_effect=[0, 5, 10, 11, 20, 23]):
+      for name in 'abc':
+        with tracing.Span(name, tracing.COMMAND):
+          pass
+    self.flags.trace_span_samples = 2
+    samples = tracing.CreateSamples('iperf0')
+    self.assertEqual([('a', 5), ('c', 3)],
+                     [(s.metadata['operation'], s.value) for s in samples])
+
+  def testWriteChromeTrace(self):
+    with tracing.Span('Benchmark Run', tracing.PHASE):
+      with tracing.Span('IssueCommand', tracing.COMMAND, command=['ls', '-l']):
+        pass
+    temp_dir = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, temp_dir)
+    path = os.path.join(temp_dir, tracing.TRACE_FILE_NAME)
+    tracing.WriteChromeTrace(path)
+    with open(path) as trace_file:
+      events = json.load(trace_file)['traceEvents']
+    spans = {e['name']: e for e in events if e['ph'] == 'X'}
+    self.assertEqual('ls -l', spans['IssueCommand']['args']['command'])
+    self.assertEqual('phase', spans['Benchmark Run']['cat'])
+    self.assertLessEqual(spans['Benchmark Run']['ts'],
+                         spans['IssueCommand']['ts'])
+    self.assertIn('thread_name', [e['name'] for e in events])
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,176 @@
+# Copyright 2015 PerfKitBenchmarker Authors. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for perfkitbenchmarker.vm_pool."""
+
+import unittest
+
+import mock
+
+from perfkitbenchmarker import benchmark_spec
+from perfkitbenchmarker import configs
+from perfkitbenchmarker import context
+from perfkitbenchmarker import disk
+from perfkitbenchmarker import errors
+from perfkitbenchmarker import virtual_machine
+from perfkitbenchmarker import vm_pool
+
+NAME = 'name'
+CONFIG = """
+name:
+  vm_groups:
+    default:
+      vm_count: 2
+      vm_spec:
+        GCP:
+          machine_type: n1-standard-4
+          zone: us-central1-c
+          project: my-project
+"""
+
+
+def _Key(machine_type='n1-standard-4', disk_size=10):
+  vm_spec = virtual_machine.BaseVmSpec(zone='us-central1-c',
+                                       machine_type=machine_type)
+  return vm_pool.GetKey('GCP', 'debian', vm_spec,
+                        [disk.BaseDiskSpec(disk_size=disk_size)])
+
+
+class VmPoolTestCase(unittest.TestCase):
+
+  def setUp(self):
+    p = mock.patch(vm_pool.__name__ + '.FLAGS')
+    self.flags = p.start()
+    self.addCleanup(p.stop)
+    self.flags.vm_pool = True
+    self.flags.run_stage = 'all'
+    self.addCleanup(vm_pool.DeleteAll)
+    self.addCleanup(context.SetThreadBenchmarkSpec, None)
+
+  def testKeysDependOnSpecs(self):
+    self.assertEqual(_Key(), _Key())
+    self.assertNotEqual(_Key(), _Key(machine_type='n1-standard-8'))
+    self.assertNotEqual(_Key(), _Key(disk_size=20))
+
+  def testLeaseAndReset(self):
+    vm = mock.Mock(scratch_disks=[mock.Mock(mount_point='/scratch')])
+    network = mock.Mock()
+    self.assertFalse(vm_pool.Release(vm, [network], []))
+    vm_pool.Register(vm, _Key(), 100)
+    vm.SnapshotPackages.assert_called_once_with()
+    self.assertIsNone(vm_pool.Lease(_Key()))
+    self.assertTrue(vm_pool.Release(vm, [network], []))
+    self.assertIsNone(vm_pool.Lease(_Key(machine_type='n1-standard-8')))
+    self.assertIs(vm, vm_pool.Lease(_Key()))
+    self.assertIsNone(vm_pool.Lease(_Key()))
+
+    vm_pool.Reset(vm, 'uid0')
+    vm.ResetPackages.assert_called_once_with()
+    vm.RemoteCommand.assert_called_once_with(
+        'sudo find /scratch -mindepth 1 -delete')
+    samples = vm_pool.CreateSamples('uid0')
+    self.assertEqual(['VM Pool Provisioning Time Saved'],
+                     [s.metric for s in samples])
+    self.assertGreater(samples[0].value, 99)
+    self.assertEqual(1, samples[0].metadata['pooled_vms'])
+    self.assertEqual([], vm_pool.CreateSamples('uid0'))
+
+    self.assertTrue(vm_pool.Release(vm, [network], []))
+    vm_pool.DeleteAll()
+    vm.Delete.assert_called_once_with()
+    network.Delete.assert_called_once_with()
+
+  def testFailedResetIsNotPooled(self):
+    vm = mock.Mock(scratch_disks=[])
+    vm.ResetPackages.side_effect = errors.VirtualMachine.RemoteCommandError()
+    vm_pool.Register(vm, _Key(), 100)
+    with self.assertRaises(errors.VirtualMachine.RemoteCommandError):
+      vm_pool.Reset(vm, 'uid0')
+    self.assertFalse(vm_pool.Release(vm, [], []))
+
+  def testSpecsLeasePooledVms(self):
+    config = configs.LoadConfig(CONFIG, {}, NAME)
+    spec = benchmark_spec.BenchmarkSpec(config, NAME, 'name0')
+    spec.ConstructVirtualMachines()
+    for vm in spec.vms:
+      self.assertFalse(vm_pool.Release(vm, [], []))
+      with mock.patch.object(vm, 'SnapshotPackages'):
+        vm_pool.Register(vm, spec._vm_pool_keys[vm], 100)
+      self.assertTrue(vm_pool.Release(vm, [], []))
+
+    spec2 = benchmark_spec.BenchmarkSpec(config, NAME, 'name1')
+    spec2.ConstructVirtualMachines()
+    self.assertItemsEqual(spec.vms, spec2.vms)
+    vm = spec2.vms[0]
+    with mock.patch.object(vm_pool, 'Reset') as reset, \
+        mock.patch.object(vm, 'AddMetadata'), \
+        mock.patch.object(vm, 'Create') as create:
+      spec2.PrepareVm(vm)
+    reset.assert_called_once_with(vm, 'name1')
+    self.assertFalse(create.called)
+
+  def _ConstructSpec(self, config, uid):
+    spec = benchmark_spec.BenchmarkSpec(config, NAME, uid)
+    spec.ConstructVirtualMachines()
+    return spec
+
+  def _PoolVm(self, spec):
+    vm = spec.vms[0]
+    with mock.patch.object(vm, 'SnapshotPackages'):
+      vm_pool.Register(vm, spec._vm_pool_keys[vm], 100)
+    vm_pool.Release(vm, spec.networks.values(), spec.firewalls.values())
+    return vm
+
+  def testPartialLeaseSharesNetwork(self):
+    config = configs.LoadConfig(CONFIG, {}, NAME)
+    pooled_vm = self._PoolVm(self._ConstructSpec(config, 'name0'))
+
+    spec = self._ConstructSpec(config, 'name1')
+    leased_vm, new_vm = spec.vms
+    self.assertIs(pooled_vm, leased_vm)
+    self.assertIsNot(pooled_vm, new_vm)
+    self.assertIs(pooled_vm.network, new_vm.network)
+    self.assertIs(pooled_vm.firewall, new_vm.firewall)
+    self.assertEqual([pooled_vm.network], spec.networks.values())
+
+    with mock.patch.object(pooled_vm.network, 'Create') as create_network, \
+        mock.patch.object(spec, 'PrepareVm'), \
+        mock.patch('perfkitbenchmarker.vm_util.GenerateSSHConfig'):
+      spec.Prepare()
+    self.assertFalse(create_network.called)
+
+    with mock.patch.object(spec, 'DeleteVm'), \
+        mock.patch.object(pooled_vm.network, 'Delete') as delete_network, \
+        mock.patch.object(pooled_vm.firewall,
+                          'DisallowAllPorts') as disallow:
+      spec.Delete()
+    self.assertFalse(delete_network.called)
+    self.assertFalse(disallow.called)
+
+  def testDoesNotLeaseVmOnOtherNetwork(self):
+    config = configs.LoadConfig(CONFIG, {}, NAME)
+    # Both specs are constructed before either VM is pooled, so each VM is on
+    # its own spec's network.
+    pooled_specs = [self._ConstructSpec(config, 'name0'),
+                    self._ConstructSpec(config, 'name1')]
+    pooled_vms = [self._PoolVm(pooled_spec) for pooled_spec in pooled_specs]
+    self.assertIsNot(pooled_vms[0].network, pooled_vms[1].network)
+    spec = self._ConstructSpec(config, 'name2')
+    leased_vms = [vm for vm in spec.vms if vm in pooled_vms]
+    self.assertEqual(1, len(leased_vms))
+    self.assertEqual([leased_vms[0].network],
+                     [vm.network for vm in spec.vms if vm not in pooled_vms])
+
+
+if __name__ == '__main__':
+  unittest.main()
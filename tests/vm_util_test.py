@@ -195,6 +195,43 @@ class RunParallelThreadsTestCase(unittest.TestCase):
       vm_util.RunParallelThreads(calls, max_concurrency=1)
     self.assertEqual(int_list, [0, 1])
 
+  def testCancelOnFailure(self):
+    int_list = []
+    calls = [(_AppendLength, (int_list,), {}), (_RaiseValueError, (), {}),
+             (_AppendLength, (int_list,), {})]
+    with self.assertRaises(errors.VmUtil.ThreadException) as cm:
+      vm_util.RunParallelThreads(calls, max_concurrency=1,
+                                 cancel_on_failure=True)
+    self.assertEqual(int_list, [0])
+    self.assertIn('Cancelled 1 call(s)', str(cm.exception))
+
+  def testTimeout(self):
+    event = threading.Event()
+    calls = [(event.wait, (), {}), (_ReturnArgs, ('a',), {})]
+    try:
+      with self.assertRaises(errors.VmUtil.ThreadException) as cm:
+        vm_util.RunParallelThreads(calls, max_concurrency=1, timeout=0.1)
+    finally:
+      event.set()
+    self.assertIn('timed out', str(cm.exception))
+    self.assertNotIn('_ReturnArgs', str(cm.exception))
+
+  def testWorkerThreadsAreReused(self):
+    calls = [(threading.current_thread, (), {}) for _ in range(10)]
+    threads = vm_util.RunParallelThreads(calls, max_concurrency=1)
+    self.assertEqual(len(set(threads)), 1)
+    num_workers = vm_util._worker_pool.num_workers
+    vm_util.RunParallelThreads(calls, max_concurrency=1)
+    self.assertEqual(vm_util._worker_pool.num_workers, num_workers)
+
+  def testNestedCallsDoNotDeadlock(self):
+    def RunNested(i):
+      return vm_util.RunThreaded(_ReturnArgs, [i])
+    calls = [(RunNested, (i,), {}) for i in range(4)]
+    with mock.patch.object(vm_util._worker_pool, 'max_workers', 2):
+      result = vm_util.RunParallelThreads(calls, max_concurrency=4)
+    self.assertEqual(result, [[(None, i)] for i in range(4)])
+
 
 class RunThreadedTestCase(unittest.TestCase):
 
@@ -220,6 +257,114 @@ class RunThreadedTestCase(unittest.TestCase):
     self.assertEqual(result, [(None, 'red'), ('blue', 'green')])
 
 
+class _FakeRobustCommandHandle(object):
+
+  def __init__(self, vm, status_file, output, retcode=0):
+    self.vm = vm
+    self.command = 'cmd ' + status_file
+    self.status_file = status_file
+    self.output = output
+    self.retcode = retcode
+    self.read_new_output_calls = 0
+
+  def ReadNewOutput(self):
+    self.read_new_output_calls += 1
+
+  def Wait(self, should_log=False):
+    if self.retcode:
+      raise errors.VirtualMachine.RemoteCommandError(self.command + ' failed')
+    return self.output, ''
+
+
+class RobustCommandMultiplexerTestCase(unittest.TestCase):
+
+  def setUp(self):
+    self.multiplexer = vm_util.RobustCommandMultiplexer(poll_interval=0)
+
+  def _AddHandles(self, vm, *handle_args):
+    handles = [_FakeRobustCommandHandle(vm, *args) for args in handle_args]
+    for handle in handles:
+      self.multiplexer.Add(handle)
+    return handles
+
+  def testOnePollPerVmAndResultsInOrder(self):
+    vm1 = mock.MagicMock()
+    vm1.PollRobustCommands.side_effect = [{}, {'a': '0', 'b': '0'}]
+    vm2 = mock.MagicMock()
+    vm2.PollRobustCommands.side_effect = [{'c': '0'}]
+    handles = self._AddHandles(vm1, ('a', 'out a'), ('b', 'out b'))
+    handles += self._AddHandles(vm2, ('c', 'out c'))
+    results = self.multiplexer.WaitAll()
+    self.assertEqual([('out a', ''), ('out b', ''), ('out c', '')], results)
+    self.assertEqual(2, vm1.PollRobustCommands.call_count)
+    vm1.PollRobustCommands.assert_called_with(handles[:2])
+    vm2.PollRobustCommands.assert_called_once_with(handles[2:])
+    # Output is read from commands that were still running after a poll.
+    self.assertEqual([1, 1, 0], [h.read_new_output_calls for h in handles])
+
+  def testFailuresRaisedAfterAllComplete(self):
+    vm = mock.MagicMock()
+    vm.PollRobustCommands.side_effect = [{'a': '1'}, {'b': '0'}]
+    handles = self._AddHandles(vm, ('a', '', 1), ('b', 'out b'))
+    handles[1].Wait = mock.MagicMock(return_value=('out b', ''))
+    with self.assertRaises(errors.VirtualMachine.RemoteCommandError) as cm:
+      self.multiplexer.WaitAll()
+    self.assertIn('cmd a failed', str(cm.exception))
+    handles[1].Wait.assert_called_once_with(should_log=False)
+
+  def testPollErrorsAreRetried(self):
+    vm = mock.MagicMock()
+    vm.PollRobustCommands.side_effect = [
+        errors.VirtualMachine.RemoteCommandError(), {'a': '0'}]
+    self._AddHandles(vm, ('a', 'out a'))
+    self.assertEqual([('out a', '')], self.multiplexer.WaitAll())
+
+  def testEmptyStatusEventuallyCompletes(self):
+    vm = mock.MagicMock()
+    vm.PollRobustCommands.return_value = {'a': ''}
+    self._AddHandles(vm, ('a', '', 1))
+    with self.assertRaises(errors.VirtualMachine.RemoteCommandError):
+      self.multiplexer.WaitAll()
+    self.assertEqual(vm_util.ROBUST_COMMAND_MAX_EMPTY_STATUS_POLLS,
+                     vm.PollRobustCommands.call_count)
+
+  def testCallbacksAddHandles(self):
+    vm = mock.MagicMock()
+    vm.PollRobustCommands.side_effect = lambda handles: {
+        handle.status_file: '0' for handle in handles}
+    completed = []
+
+    def Callback(handle, output):
+      completed.append(output)
+      if handle.status_file == 'a':
+        self.multiplexer.Add(_FakeRobustCommandHandle(vm, 'b', 'out b'),
+                             Callback)
+
+    self.multiplexer.Add(_FakeRobustCommandHandle(vm, 'a', 'out a'),
+                         Callback)
+    self.assertEqual([('out a', ''), ('out b', '')],
+                     self.multiplexer.WaitAll())
+    self.assertEqual([('out a', ''), ('out b', '')], completed)
+    self.assertEqual(2, vm.PollRobustCommands.call_count)
+
+  def testMissingStatusEventuallyCompletes(self):
+    vm = mock.MagicMock()
+    vm.PollRobustCommands.return_value = {'a': None}
+    self._AddHandles(vm, ('a', '', 1))
+    with self.assertRaises(errors.VirtualMachine.RemoteCommandError):
+      self.multiplexer.WaitAll()
+    self.assertEqual(vm_util.ROBUST_COMMAND_MAX_EMPTY_STATUS_POLLS,
+                     vm.PollRobustCommands.call_count)
+
+  def testTimeout(self):
+    vm = mock.MagicMock()
+    vm.PollRobustCommands.return_value = {}
+    self._AddHandles(vm, ('a', ''))
+    with self.assertRaises(errors.VirtualMachine.RemoteCommandError) as cm:
+      self.multiplexer.WaitAll(timeout=0)
+    self.assertIn('Timed out', str(cm.exception))
+
+
 class RunParallelProcessesTestCase(unittest.TestCase):
 
   def testFewerThreadsThanConcurrencyLimit(self):
@@ -268,6 +413,36 @@ class IssueCommandTestCase(unittest.TestCase):
         vm_util.IssueCommand(['sleep', '2s'], timeout=None)
     self.assertFalse(HaveSleepSubprocess())
 
+  def testStdoutConsumer(self):
+    lines = []
+    stdout, stderr, retcode = vm_util.IssueCommand(
+        ['sh', '-c', 'echo a; echo b >&2; echo c'],
+        stdout_consumer=lines.append)
+    self.assertEqual(retcode, 0)
+    self.assertEqual(lines, ['a\n', 'c\n'])
+    self.assertEqual(stdout, 'a\nc\n')
+    self.assertEqual(stderr, 'b\n')
+
+  def testStdoutConsumerBoundsReturnedOutput(self):
+    lines = []
+    with mock.patch.object(vm_util, 'STREAMED_OUTPUT_TAIL_LINES', 2):
+      stdout, _, _ = vm_util.IssueCommand(['seq', '5'],
+                                          stdout_consumer=lines.append)
+    self.assertEqual(len(lines), 5)
+    self.assertEqual(stdout, '4\n5\n')
+
+  def testStdoutConsumerWithInput(self):
+    lines = []
+    vm_util.IssueCommand(['cat'], input='x\ny\n',
+                         stdout_consumer=lines.append)
+    self.assertEqual(lines, ['x\n', 'y\n'])
+
+  def testStdoutConsumerException(self):
+    consumer = mock.MagicMock(side_effect=ValueError())
+    with self.assertRaises(ValueError):
+      vm_util.IssueCommand(['seq', '3'], stdout_consumer=consumer)
+    consumer.assert_called_once_with('1\n')
+
 
 if __name__ == '__main__':
   unittest.main()
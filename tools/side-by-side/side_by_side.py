@@ -19,6 +19,9 @@
 Given a pair of revisions (e.g., 'dev', 'master') and command-line arguments,
 this tool runs 'pkb.py' with for each and creates a report showing the
 differences in the results between the two runs.
+
+With --results-store, it instead compares two runs already recorded in a
+results store (see perfkitbenchmarker/results_store.py).
 """
 
 import argparse
@@ -33,6 +36,7 @@ import pprint
 import shlex
 import shutil
 import subprocess
+import sys
 import tempfile
 
 import jinja2
@@ -155,6 +159,38 @@ def RunPerfKitBenchmarker(revision, flags):
                                       samples=samples, description=description)
 
 
+def LoadPerfKitBenchmarkerResult(results_store_path, run_uri):
+  """Loads the results of an earlier run from a results store.
+
+  Args:
+    results_store_path: string. Path of a database written with pkb.py
+      --results_store_path.
+    run_uri: string. The --run_uri of the run to load.
+
+  Returns:
+    PerfKitBenchmarkerResult, with samples in the same form as the JSON output
+      of `pkb.py`.
+  """
+  sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+  from perfkitbenchmarker import results_store
+
+  samples = []
+  with results_store.ResultsStore(results_store_path) as store:
+    for sample in store.Query(pkb_run_uri=run_uri):
+      metadata = sample.pop('metadata')
+      sample.pop('pkb_run_uri')
+      sample['labels'] = ','.join('|{0}:{1}|'.format(k, v)
+                                  for k, v in sorted(metadata.iteritems()))
+      samples.append(sample)
+  if not samples:
+    raise ValueError('No samples for run {0} in {1}.'.format(
+        run_uri, results_store_path))
+  version = metadata.get('perfkitbenchmarker_version', '')
+  return PerfKitBenchmarkerResult(name=run_uri, sha1=version, flags=[],
+                                  samples=samples,
+                                  description='Run ' + run_uri)
+
+
 def _SplitLabels(labels):
   """Parse the 'labels' key from a PerfKitBenchmarker record.
 
@@ -354,6 +390,10 @@ def main():
                  help="""Run concurrently""")
   p.add_argument('--rerender', help="""Re-render the HTML report from a JSON
                  file [for developers].""", action='store_true')
+  p.add_argument('--results-store', default=None, help="""Compare two runs
+                 recorded in this results store instead of running pkb.py.
+                 --base and --head are then the --run_uri values of the
+                 runs.""")
   p.add_argument('json_output', help="""JSON output path.""")
   p.add_argument('html_output', help="""HTML output path.""")
   a = p.parse_args()
@@ -372,7 +412,10 @@ def main():
     a.base_flags = a.flags or list(DEFAULT_FLAGS)
     a.head_flags = a.flags or list(DEFAULT_FLAGS)
 
-  if not a.rerender:
+  if a.results_store:
+    base_res = LoadPerfKitBenchmarkerResult(a.results_store, a.base)
+    head_res = LoadPerfKitBenchmarkerResult(a.results_store, a.head)
+  elif not a.rerender:
     if a.parallel:
       from concurrent import futures
       with futures.ThreadPoolExecutor(max_workers=2) as executor:
@@ -385,7 +428,15 @@ def main():
     else:
       base_res = RunPerfKitBenchmarker(a.base, a.base_flags)
       head_res = RunPerfKitBenchmarker(a.head, a.head_flags)
+  else:
+    logging.info('Loading results from %s', a.json_output)
+    with argparse.FileType('r')(a.json_output) as json_fp:
+      d = json.load(json_fp)
+      base_res = PerfKitBenchmarkerResult(**d['base'])
+      head_res = PerfKitBenchmarkerResult(**d['head'])
 
+  # Unless the results were loaded from json_output, save them there.
+  if a.results_store or not a.rerender:
     logging.info('Base result: %s', base_res)
     logging.info('Head result: %s', head_res)
 
@@ -396,12 +447,6 @@ def main():
                 json_fp,
                 indent=2)
       json_fp.write('\n')
-  else:
-    logging.info('Loading results from %s', a.json_output)
-    with argparse.FileType('r')(a.json_output) as json_fp:
-      d = json.load(json_fp)
-      base_res = PerfKitBenchmarkerResult(**d['base'])
-      head_res = PerfKitBenchmarkerResult(**d['head'])
 
   with argparse.FileType('w')(a.html_output) as html_fp:
     logging.info('Writing HTML to %s', a.html_output)